@@ -0,0 +1,55 @@
+"""Add (created_at, id) indexes for keyset pagination
+
+Revision ID: 008_add_keyset_pagination_indexes
+Revises: 007_add_analytics_rollups
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008_add_keyset_pagination_indexes'
+down_revision = '007_add_analytics_rollups'
+branch_labels = None
+depends_on = None
+
+
+PAGINATED_TABLES = [
+    'users',
+    'orders',
+    'invoices',
+    'payments',
+    'support_tickets',
+    'staff_audit_logs',
+    'staff_activity_logs',
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    for table in PAGINATED_TABLES:
+        if table not in tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        name = f'ix_{table}_created_at_id'
+        if name not in existing:
+            op.create_index(name, table, ['created_at', 'id'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    for table in PAGINATED_TABLES:
+        if table not in tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        name = f'ix_{table}_created_at_id'
+        if name in existing:
+            op.drop_index(name, table_name=table)
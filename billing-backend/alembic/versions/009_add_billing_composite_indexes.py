@@ -0,0 +1,53 @@
+"""Add composite indexes for order, invoice and payment hot queries
+
+Revision ID: 009_add_billing_composite_indexes
+Revises: 008_add_keyset_pagination_indexes
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009_add_billing_composite_indexes'
+down_revision = '008_add_keyset_pagination_indexes'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_orders_customer_id_created_at', 'orders', ['customer_id', 'created_at']),
+    ('ix_orders_status_created_at', 'orders', ['status', 'created_at']),
+    ('ix_invoices_user_id_created_at', 'invoices', ['user_id', 'created_at']),
+    ('ix_invoices_status_due_date', 'invoices', ['status', 'due_date']),
+    ('ix_payments_user_id_created_at', 'payments', ['user_id', 'created_at']),
+    ('ix_payments_status_created_at', 'payments', ['status', 'created_at']),
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    for name, table, columns in INDEXES:
+        if table not in tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    for name, table, columns in INDEXES:
+        if table not in tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table)}
+        if name in existing:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,40 @@
+"""Add number_sequences table for order/invoice numbers
+
+Revision ID: 010_add_number_sequences
+Revises: 009_add_billing_composite_indexes
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010_add_number_sequences'
+down_revision = '009_add_billing_composite_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    
+    if 'number_sequences' not in inspector.get_table_names():
+        op.create_table(
+            'number_sequences',
+            sa.Column('name', sa.String(64), nullable=False),
+            sa.Column('next_value', sa.BigInteger(), nullable=False, server_default='1'),
+            sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.PrimaryKeyConstraint('name')
+        )
+    
+    # Rows are created on first use, seeded from the highest number already issued
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    
+    if 'number_sequences' in inspector.get_table_names():
+        op.drop_table('number_sequences')
@@ -0,0 +1,54 @@
+"""Add report_jobs table for background exports
+
+Revision ID: 011_add_report_jobs
+Revises: 010_add_number_sequences
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011_add_report_jobs'
+down_revision = '010_add_number_sequences'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    
+    if 'report_jobs' not in inspector.get_table_names():
+        op.create_table(
+            'report_jobs',
+            sa.Column('id', sa.String(36), nullable=False),
+            sa.Column('kind', sa.String(32), nullable=False),
+            sa.Column('parameters', sa.JSON(), nullable=True),
+            sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'COMPLETED', 'FAILED', name='reportjobstatus'), nullable=False),
+            sa.Column('requested_by', sa.String(36), nullable=True),
+            sa.Column('total_rows', sa.Integer(), nullable=True),
+            sa.Column('rows_written', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('file_path', sa.String(500), nullable=True),
+            sa.Column('file_size', sa.BigInteger(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+            sa.ForeignKeyConstraint(['requested_by'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_report_jobs_status_created_at', 'report_jobs', ['status', 'created_at'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    
+    if 'report_jobs' in inspector.get_table_names():
+        op.drop_index('ix_report_jobs_status_created_at', table_name='report_jobs')
+        op.drop_table('report_jobs')
+        sa.Enum(name='reportjobstatus').drop(conn, checkfirst=True)
@@ -0,0 +1,53 @@
+"""Add email_outbox table for queued email delivery
+
+Revision ID: 012_add_email_outbox
+Revises: 011_add_report_jobs
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012_add_email_outbox'
+down_revision = '011_add_report_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    
+    if 'email_outbox' not in inspector.get_table_names():
+        op.create_table(
+            'email_outbox',
+            sa.Column('id', sa.String(36), nullable=False),
+            sa.Column('to_email', sa.String(255), nullable=False),
+            sa.Column('recipient_domain', sa.String(255), nullable=False),
+            sa.Column('subject', sa.String(998), nullable=False),
+            sa.Column('body', sa.Text(), nullable=False),
+            sa.Column('html_body', sa.Text(), nullable=True),
+            sa.Column('attachment_filename', sa.String(255), nullable=True),
+            sa.Column('attachment_content', sa.LargeBinary(), nullable=True),
+            sa.Column('status', sa.Enum('PENDING', 'SENDING', 'SENT', 'DEAD', name='emailoutboxstatus'), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+            sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_email_outbox_status_next_attempt_at', 'email_outbox', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    
+    if 'email_outbox' in inspector.get_table_names():
+        op.drop_index('ix_email_outbox_status_next_attempt_at', table_name='email_outbox')
+        op.drop_table('email_outbox')
+        sa.Enum(name='emailoutboxstatus').drop(conn, checkfirst=True)
@@ -0,0 +1,55 @@
+"""Add invoice idempotency keys and the subscription renewal index
+
+Revision ID: 013_add_renewal_idempotency
+Revises: 012_add_email_outbox
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '013_add_renewal_idempotency'
+down_revision = '012_add_email_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+    
+    if 'invoices' in tables:
+        columns = {column['name'] for column in inspector.get_columns('invoices')}
+        if 'idempotency_key' not in columns:
+            op.add_column('invoices', sa.Column('idempotency_key', sa.String(100), nullable=True))
+        existing = {index['name'] for index in inspector.get_indexes('invoices')}
+        if 'ix_invoices_idempotency_key' not in existing:
+            op.create_index('ix_invoices_idempotency_key', 'invoices', ['idempotency_key'], unique=True)
+    
+    if 'subscriptions' in tables:
+        existing = {index['name'] for index in inspector.get_indexes('subscriptions')}
+        if 'ix_subscriptions_status_period_end' not in existing:
+            op.create_index('ix_subscriptions_status_period_end', 'subscriptions', ['status', 'current_period_end'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+    
+    if 'subscriptions' in tables:
+        existing = {index['name'] for index in inspector.get_indexes('subscriptions')}
+        if 'ix_subscriptions_status_period_end' in existing:
+            op.drop_index('ix_subscriptions_status_period_end', table_name='subscriptions')
+    
+    if 'invoices' in tables:
+        existing = {index['name'] for index in inspector.get_indexes('invoices')}
+        if 'ix_invoices_idempotency_key' in existing:
+            op.drop_index('ix_invoices_idempotency_key', table_name='invoices')
+        columns = {column['name'] for column in inspector.get_columns('invoices')}
+        if 'idempotency_key' in columns:
+            with op.batch_alter_table('invoices') as batch_op:
+                batch_op.drop_column('idempotency_key')
@@ -0,0 +1,39 @@
+"""Add job_leases table for single-owner background jobs
+
+Revision ID: 014_add_job_leases
+Revises: 013_add_renewal_idempotency
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '014_add_job_leases'
+down_revision = '013_add_renewal_idempotency'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    
+    if 'job_leases' not in inspector.get_table_names():
+        op.create_table(
+            'job_leases',
+            sa.Column('name', sa.String(128), nullable=False),
+            sa.Column('owner', sa.String(128), nullable=False),
+            sa.Column('acquired_at', sa.DateTime(timezone=True), nullable=False),
+            sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint('name')
+        )
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    
+    if 'job_leases' in inspector.get_table_names():
+        op.drop_table('job_leases')
@@ -0,0 +1,99 @@
+"""Add charge_schedule table and backfill it from orders.auto_charge_config
+
+Revision ID: 015_add_charge_schedule
+Revises: 014_add_job_leases
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from datetime import datetime
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '015_add_charge_schedule'
+down_revision = '014_add_job_leases'
+branch_labels = None
+depends_on = None
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+    
+    if 'charge_schedule' in tables:
+        return
+    
+    charge_schedule = op.create_table(
+        'charge_schedule',
+        sa.Column('id', sa.String(36), nullable=False),
+        sa.Column('order_id', sa.String(36), sa.ForeignKey('orders.id'), nullable=False),
+        sa.Column('payment_method_id', sa.String(255), nullable=True),
+        sa.Column('status', sa.Enum('SCHEDULED', 'SUCCEEDED', 'FAILED', 'DISABLED', name='chargeschedulestatus'), nullable=False),
+        sa.Column('next_charge_date', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='3'),
+        sa.Column('retry_interval_days', sa.Integer(), nullable=False, server_default='3'),
+        sa.Column('last_attempt_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('configured_by', sa.String(36), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('order_id')
+    )
+    op.create_index('ix_charge_schedule_status_next_charge_date', 'charge_schedule', ['status', 'next_charge_date'])
+    
+    if 'orders' not in tables:
+        return
+    # Orders configured before this table existed
+    orders = sa.table(
+        'orders',
+        sa.column('id', sa.String),
+        sa.column('status', sa.String),
+        sa.column('auto_charge_config', sa.JSON)
+    )
+    rows = []
+    now = datetime.utcnow()
+    for order_id, order_status, config in conn.execute(
+        sa.select(orders.c.id, orders.c.status, orders.c.auto_charge_config)
+        .where(orders.c.auto_charge_config.isnot(None))
+    ):
+        if not isinstance(config, dict):
+            continue
+        enabled = config.get('enabled') in (True, 'true') and order_status == 'PENDING'
+        rows.append({
+            'id': str(uuid.uuid4()),
+            'order_id': order_id,
+            'payment_method_id': config.get('payment_method_id'),
+            'status': 'SCHEDULED' if enabled else 'DISABLED',
+            'next_charge_date': _parse_date(config.get('next_charge_date')) or now,
+            'attempts': 0,
+            'max_attempts': config.get('max_retry_attempts') or 3,
+            'retry_interval_days': config.get('retry_interval_days') or 3,
+            'configured_by': config.get('configured_by'),
+        })
+    if rows:
+        op.bulk_insert(charge_schedule, rows)
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    
+    if 'charge_schedule' in inspector.get_table_names():
+        op.drop_index('ix_charge_schedule_status_next_charge_date', table_name='charge_schedule')
+        op.drop_table('charge_schedule')
+        sa.Enum(name='chargeschedulestatus').drop(conn, checkfirst=True)
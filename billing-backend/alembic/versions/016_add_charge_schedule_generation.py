@@ -0,0 +1,38 @@
+"""Add generation to charge_schedule
+
+Revision ID: 016_add_charge_schedule_generation
+Revises: 015_add_charge_schedule
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '016_add_charge_schedule_generation'
+down_revision = '015_add_charge_schedule'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Check if column already exists (for existing databases)
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    columns = [col['name'] for col in inspector.get_columns('charge_schedule')]
+    
+    if 'generation' not in columns:
+        # Part of the auto-charge idempotency key, bumped on every reconfigure
+        with op.batch_alter_table('charge_schedule', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('generation', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    columns = [col['name'] for col in inspector.get_columns('charge_schedule')]
+    
+    if 'generation' in columns:
+        with op.batch_alter_table('charge_schedule', schema=None) as batch_op:
+            batch_op.drop_column('generation')
@@ -11,7 +11,7 @@ from app.core.security import get_current_user_id, hash_password
 from app.models import (
     User, License, Plan, Payment, Domain, 
     Subscription, Invoice, PaymentStatus,
-    LicenseStatus, InvoiceStatus
+    LicenseStatus, InvoiceStatus, RollupMetric
 )
 from app.schemas import (
     UserResponse,
@@ -23,6 +23,7 @@ from app.schemas import (
     AdminUserCreateRequest,
     AdminUserUpdateRequest
 )
+from app.services.rollup_service import rollup_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -452,25 +453,24 @@ async def get_revenue_chart(
     days: int = 30
 ):
     """Get daily revenue data for chart (admin only)"""
-    # TODO: Implement actual daily revenue aggregation
-    # For now, return mock data
+    today = datetime.utcnow().date()
     
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    result = await db.execute(
-        select(func.sum(Payment.amount))
-        .where(
-            and_(
-                Payment.status == PaymentStatus.SUCCEEDED,
-                Payment.created_at >= start_date
-            )
-        )
+    # Served from the daily payment rollups: whole days, today included, so the
+    # bars add up to the total
+    series = await rollup_service.daily_series(
+        db, RollupMetric.PAYMENTS, today - timedelta(days=max(days, 1) - 1), today,
+        statuses=[PaymentStatus.SUCCEEDED]
     )
-    total = result.scalar() or 0.0
     
     return {
         "period": f"Last {days} days",
-        "total_revenue": total,
-        "note": "Daily breakdown to be implemented"
+        "total_revenue": sum(day["amount"] for day in series),
+        "data": [
+            {
+                "date": day["date"].isoformat(),
+                "revenue": day["amount"],
+                "payments": day["count"]
+            }
+            for day in series
+        ]
     }
-
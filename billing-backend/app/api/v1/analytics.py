@@ -8,6 +8,7 @@ from typing import List, Dict, Any
 from datetime import datetime, timedelta
 from app.core.database import get_db
 from app.core.security import get_current_user_id
+from app.core.time_buckets import bucket_expression, dialect_name, parse_bucket
 from app.models import (
     User, License, Payment, Domain, Invoice,
     PaymentStatus, LicenseStatus, InvoiceStatus
@@ -92,12 +93,10 @@ async def get_monthly_revenue(
     months: int = 12
 ):
     """Get monthly revenue breakdown"""
-    # TODO: Implement proper monthly aggregation
-    # For now, return summary
-    
+    month = bucket_expression(Payment.created_at, "month", dialect_name(db)).label('month')
     result = await db.execute(
         select(
-            func.date_trunc('month', Payment.created_at).label('month'),
+            month,
             func.sum(Payment.amount).label('revenue'),
             func.count(Payment.id).label('count')
         )
@@ -107,15 +106,16 @@ async def get_monthly_revenue(
                 Payment.status == PaymentStatus.SUCCEEDED
             )
         )
-        .group_by('month')
-        .order_by('month')
+        .group_by(month)
+        .order_by(month)
         .limit(months)
     )
     
     monthly_data = []
     for row in result:
+        month_start = parse_bucket(row.month)
         monthly_data.append({
-            "month": row.month.strftime('%Y-%m') if row.month else None,
+            "month": month_start.strftime('%Y-%m') if month_start else None,
             "revenue": float(row.revenue or 0),
             "payment_count": row.count or 0
         })
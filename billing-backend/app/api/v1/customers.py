@@ -1,14 +1,15 @@
 """
 Customer management API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func, and_, or_, case
 from typing import List, Optional
 from datetime import datetime, timedelta
 
 from app.core.database import get_db
 from app.core.security import get_current_user_id, hash_password
+from app.core.pagination import paginate, set_next_cursor
 from app.models import (
     User, License, Subscription, Payment, Domain, Invoice, Order,
     LicenseStatus, SubscriptionStatus, PaymentStatus, InvoiceStatus, Plan
@@ -203,6 +204,95 @@ async def get_customer_stats(
     )
 
 
+async def _customer_page_statistics(db: AsyncSession, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Licenses and per-customer counters for a page of customers.
+    
+    Issues a fixed number of queries (one bulk license fetch plus one grouped
+    aggregate per related table) regardless of how many customers are on the page.
+    """
+    stats: Dict[str, Dict[str, Any]] = {
+        user_id: {
+            "licenses": [],
+            "total_subscriptions": 0,
+            "active_subscriptions": 0,
+            "total_domains": 0,
+            "total_payments": 0.0,
+            "last_payment_date": None,
+            "total_invoices": 0,
+            "outstanding_invoices": 0,
+        }
+        for user_id in user_ids
+    }
+    if not user_ids:
+        return stats
+    
+    # Licenses
+    result = await db.execute(
+        select(License).where(License.user_id.in_(user_ids)).order_by(License.created_at)
+    )
+    for lic in result.scalars().all():
+        stats[lic.user_id]["licenses"].append(lic)
+    
+    # Subscriptions (total and active) per license owner
+    result = await db.execute(
+        select(
+            License.user_id,
+            func.count(Subscription.id),
+            func.coalesce(func.sum(case((Subscription.status == SubscriptionStatus.ACTIVE, 1), else_=0)), 0)
+        )
+        .select_from(Subscription)
+        .join(License)
+        .where(License.user_id.in_(user_ids))
+        .group_by(License.user_id)
+    )
+    for user_id, total, active in result.all():
+        stats[user_id]["total_subscriptions"] = total or 0
+        stats[user_id]["active_subscriptions"] = active or 0
+    
+    # Domains
+    result = await db.execute(
+        select(Domain.user_id, func.count(Domain.id))
+        .where(Domain.user_id.in_(user_ids))
+        .group_by(Domain.user_id)
+    )
+    for user_id, total in result.all():
+        stats[user_id]["total_domains"] = total or 0
+    
+    # Successful payments: sum and most recent
+    result = await db.execute(
+        select(Payment.user_id, func.sum(Payment.amount), func.max(Payment.created_at))
+        .where(
+            and_(
+                Payment.user_id.in_(user_ids),
+                Payment.status == PaymentStatus.SUCCEEDED
+            )
+        )
+        .group_by(Payment.user_id)
+    )
+    for user_id, total, last_payment_date in result.all():
+        stats[user_id]["total_payments"] = total or 0.0
+        stats[user_id]["last_payment_date"] = last_payment_date
+    
+    # Invoices (total and outstanding)
+    result = await db.execute(
+        select(
+            Invoice.user_id,
+            func.count(Invoice.id),
+            func.coalesce(func.sum(case(
+                (Invoice.status.in_([InvoiceStatus.OPEN, InvoiceStatus.OVERDUE]), 1), else_=0
+            )), 0)
+        )
+        .where(Invoice.user_id.in_(user_ids))
+        .group_by(Invoice.user_id)
+    )
+    for user_id, total, outstanding in result.all():
+        stats[user_id]["total_invoices"] = total or 0
+        stats[user_id]["outstanding_invoices"] = outstanding or 0
+    
+    return stats
+
+
 @router.get("", response_model=List[CustomerDetailResponse])
 async def get_customers(
     skip: int = Query(0, ge=0),
@@ -210,10 +300,12 @@ async def get_customers(
     search: Optional[str] = None,
     is_active: Optional[bool] = None,
     has_licenses: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    response: Response = None,
     admin: User = Depends(verify_admin),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get list of all customers with their details (admin only)"""
+    """Get list of all customers with their details (admin only, offset or cursor pagination)"""
     
     query = select(User).where(User.is_admin == False)
     
@@ -238,81 +330,18 @@ async def get_customers(
             query = query.outerjoin(License).where(License.id == None)
     
     # Get customers
-    query = query.offset(skip).limit(limit)
+    query = paginate(query, User, db, limit, offset=skip, cursor=cursor)
     result = await db.execute(query)
     customers = result.scalars().all()
+    set_next_cursor(response, customers, limit)
+    
+    # Enrich with statistics for the whole page at once
+    stats = await _customer_page_statistics(db, [customer.id for customer in customers])
     
-    # Enrich with statistics
     customer_list = []
     for customer in customers:
-        # Get licenses
-        result = await db.execute(
-            select(License).where(License.user_id == customer.id)
-        )
-        licenses = result.scalars().all()
-        
-        active_licenses = sum(1 for lic in licenses if lic.status == LicenseStatus.ACTIVE)
-        
-        # Get subscriptions
-        result = await db.execute(
-            select(func.count(Subscription.id)).select_from(Subscription).join(License).where(
-                License.user_id == customer.id
-            )
-        )
-        subscription_count = result.scalar() or 0
-        
-        result = await db.execute(
-            select(func.count(Subscription.id)).select_from(Subscription).join(License).where(
-                and_(
-                    License.user_id == customer.id,
-                    Subscription.status == SubscriptionStatus.ACTIVE
-                )
-            )
-        )
-        active_subscription_count = result.scalar() or 0
-        
-        # Get domains
-        result = await db.execute(
-            select(func.count(Domain.id)).where(Domain.user_id == customer.id)
-        )
-        domain_count = result.scalar() or 0
-        
-        # Get payments
-        result = await db.execute(
-            select(func.sum(Payment.amount)).where(
-                and_(
-                    Payment.user_id == customer.id,
-                    Payment.status == PaymentStatus.SUCCEEDED
-                )
-            )
-        )
-        total_payments = result.scalar() or 0.0
-        
-        result = await db.execute(
-            select(Payment).where(
-                and_(
-                    Payment.user_id == customer.id,
-                    Payment.status == PaymentStatus.SUCCEEDED
-                )
-            ).order_by(Payment.created_at.desc()).limit(1)
-        )
-        last_payment = result.scalars().first()
-        
-        # Get invoices
-        result = await db.execute(
-            select(func.count(Invoice.id)).where(Invoice.user_id == customer.id)
-        )
-        total_invoices = result.scalar() or 0
-        
-        result = await db.execute(
-            select(func.count(Invoice.id)).where(
-                and_(
-                    Invoice.user_id == customer.id,
-                    Invoice.status.in_([InvoiceStatus.OPEN, InvoiceStatus.OVERDUE])
-                )
-            )
-        )
-        outstanding_invoices = result.scalar() or 0
+        customer_stats = stats[customer.id]
+        licenses = customer_stats["licenses"]
         
         # Convert licenses to response format
         license_responses = [
@@ -344,14 +373,14 @@ async def get_customers(
             is_admin=customer.is_admin,
             created_at=customer.created_at,
             total_licenses=len(licenses),
-            active_licenses=active_licenses,
-            total_subscriptions=subscription_count,
-            active_subscriptions=active_subscription_count,
-            total_domains=domain_count,
-            total_payments=total_payments,
-            total_invoices=total_invoices,
-            outstanding_invoices=outstanding_invoices,
-            last_payment_date=last_payment.created_at if last_payment else None,
+            active_licenses=sum(1 for lic in licenses if lic.status == LicenseStatus.ACTIVE),
+            total_subscriptions=customer_stats["total_subscriptions"],
+            active_subscriptions=customer_stats["active_subscriptions"],
+            total_domains=customer_stats["total_domains"],
+            total_payments=customer_stats["total_payments"],
+            total_invoices=customer_stats["total_invoices"],
+            outstanding_invoices=customer_stats["outstanding_invoices"],
+            last_payment_date=customer_stats["last_payment_date"],
             licenses=license_responses
         )
         
@@ -9,9 +9,11 @@ from typing import Dict, Any, List, Optional
 
 from app.core.database import get_db
 from app.core.security import get_current_user_id
+from app.core.time_buckets import bucketed_totals, fill_series, iter_buckets, truncate
+from app.services.dashboard_stats_service import DashboardStatsService
 from app.models import (
-    User, License, Plan, Payment, Domain, Invoice, Subscription, Order,
-    LicenseStatus, PaymentStatus, InvoiceStatus, SubscriptionStatus, OrderStatus
+    User, License, Plan, Payment, Order,
+    LicenseStatus, PaymentStatus, OrderStatus
 )
 from pydantic import BaseModel
 
@@ -126,6 +128,78 @@ async def verify_user_or_admin(
     return user_id, user.is_admin
 
 
+DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+def _chart_buckets(period: str, period_start: datetime, period_end: datetime):
+    """
+    How a chart period is bucketed: (granularity, slots, labels).
+    slots lists (bucket_start, label) for every bucket in the range; labels,
+    when given, fixes which labels appear and in what order.
+    """
+    if period in ["today", "yesterday"]:
+        # Hours from midnight to the current hour (today) or the whole day (yesterday)
+        day_start = truncate(period_start, "day")
+        end_hour = period_end.hour if period == "today" else 23
+        slots = [(day_start + timedelta(hours=hour), f"{hour:02d}:00") for hour in range(end_hour + 1)]
+        return "hour", slots, None
+    
+    if period == "week":
+        # The last 7 days, labelled by weekday
+        end_day = truncate(period_end, "day")
+        slots = []
+        for i in range(7):
+            day = end_day - timedelta(days=6 - i)
+            slots.append((day, DAY_NAMES[day.weekday()]))
+        return "day", slots, None
+    
+    if period == "month":
+        slots = [(day, day.strftime('%m/%d')) for day in iter_buckets(period_start, period_end, "day")]
+        return "day", slots, None
+    
+    if period == "year":
+        # Month names only; the month the range starts and ends in share a label
+        slots = [(month, MONTH_NAMES[month.month - 1]) for month in iter_buckets(period_start, period_end, "month")]
+        return "month", slots, None
+    
+    # custom: pick the grouping from the length of the range
+    days_diff = (period_end - period_start).days
+    if days_diff <= 1:
+        slots = [(hour, f"{hour.hour:02d}:00") for hour in iter_buckets(period_start, period_end, "hour")]
+        return "hour", slots, [f"{hour:02d}:00" for hour in range(24)]
+    if days_diff <= 30:
+        slots = [(day, day.strftime('%m/%d')) for day in iter_buckets(period_start, period_end, "day")]
+        return "day", slots, None
+    slots = [
+        (month, f"{MONTH_NAMES[month.month - 1]} {month.year}")
+        for month in iter_buckets(period_start, period_end, "month")
+    ]
+    return "month", slots, None
+
+
+async def _time_series(
+    db: AsyncSession,
+    period: str,
+    period_start: datetime,
+    period_end: datetime,
+    aggregate,
+    conditions: List[Any],
+    default
+) -> List[tuple]:
+    """Aggregate orders per chart bucket in SQL and return [(label, value)]"""
+    granularity, slots, labels = _chart_buckets(period, period_start, period_end)
+    buckets = await bucketed_totals(
+        db,
+        Order.created_at,
+        granularity,
+        [aggregate],
+        where=[Order.created_at.between(period_start, period_end), *conditions]
+    )
+    values = {bucket: (row[0] or default) for bucket, row in buckets.items()}
+    return fill_series(values, slots, labels=labels, default=default)
+
+
 @router.get("/stats", response_model=DashboardStatsResponse)
 async def get_dashboard_stats(
     period: str = Query("week", regex="^(today|yesterday|week|month|year|custom)$"),
@@ -178,299 +252,10 @@ async def get_dashboard_stats(
         period_start = now - timedelta(days=7)
         period_end = now
     
-    # Also keep these for specific calculations
-    first_day_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    week_ago = now - timedelta(days=7)
-    day_ago = now - timedelta(days=1)
-    
-    # Customer Stats (customers with activity in the period)
-    # Count unique customers who placed orders during the period
-    result = await db.execute(
-        select(func.count(func.distinct(Payment.user_id))).where(
-            Payment.created_at.between(period_start, period_end)
-        )
-    )
-    total_customers = result.scalar() or 0
-    
-    # Count unique active customers who placed orders during the period
-    result = await db.execute(
-        select(func.count(func.distinct(Payment.user_id)))
-        .select_from(Payment)
-        .join(User, Payment.user_id == User.id)
-        .where(
-            and_(
-                User.is_admin == False,
-                User.is_active == True,
-                Payment.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    active_customers = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(User.id)).where(
-            and_(User.is_admin == False, User.created_at >= first_day_of_month)
-        )
-    )
-    new_customers_this_month = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(User.id)).where(
-            and_(User.is_admin == False, User.created_at >= week_ago)
-        )
-    )
-    new_customers_this_week = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(User.id)).where(
-            and_(User.is_admin == False, User.created_at >= day_ago)
-        )
-    )
-    recent_signups = result.scalar() or 0
-    
-    # Product Stats
-    result = await db.execute(select(func.count(Plan.id)))
-    total_products = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(Plan.id)).where(Plan.is_active == True)
-    )
-    active_products = result.scalar() or 0
-    
-    # License Stats (filtered by period)
-    result = await db.execute(
-        select(func.count(License.id)).where(
-            License.created_at.between(period_start, period_end)
-        )
-    )
-    total_licenses = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(License.id)).where(
-            and_(
-                License.status == LicenseStatus.ACTIVE,
-                License.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    active_licenses = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(License.id)).where(
-            and_(
-                License.status == LicenseStatus.SUSPENDED,
-                License.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    suspended_licenses = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(License.id)).where(
-            and_(
-                License.status == LicenseStatus.EXPIRED,
-                License.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    expired_licenses = result.scalar() or 0
-    
-    # Subscription Stats (filtered by period)
-    result = await db.execute(
-        select(func.count(Subscription.id)).where(
-            Subscription.created_at.between(period_start, period_end)
-        )
-    )
-    total_subscriptions = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(Subscription.id)).where(
-            and_(
-                Subscription.status == SubscriptionStatus.ACTIVE,
-                Subscription.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    active_subscriptions = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(Subscription.id)).where(
-            and_(
-                Subscription.status == SubscriptionStatus.CANCELLED,
-                Subscription.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    cancelled_subscriptions = result.scalar() or 0
-    
-    # Order Stats (from Order table, filtered by period)
-    result = await db.execute(
-        select(func.count(Order.id)).where(
-            Order.created_at.between(period_start, period_end)
-        )
-    )
-    total_orders = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(Order.id)).where(
-            and_(
-                Order.status == OrderStatus.PENDING,
-                Order.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    pending_orders = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(Order.id)).where(
-            and_(
-                Order.status == OrderStatus.COMPLETED,
-                Order.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    completed_orders = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(Order.id)).where(
-            and_(
-                Order.created_at >= day_ago,
-                Order.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    recent_orders = result.scalar() or 0
-    
-    # Revenue Stats (from Order table, filtered by period)
-    result = await db.execute(
-        select(func.sum(Order.total)).where(
-            and_(
-                Order.status == OrderStatus.COMPLETED,
-                Order.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    total_revenue = result.scalar() or 0.0
+    # One conditional-aggregation query per table, run concurrently
+    stats = await DashboardStatsService(db).get_stats(period_start, period_end, now)
     
-    # For monthly and weekly revenue, we'll use the selected period's total
-    # These fields now represent revenue within the selected period
-    result = await db.execute(
-        select(func.sum(Order.total)).where(
-            and_(
-                Order.status == OrderStatus.COMPLETED,
-                Order.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    monthly_revenue = result.scalar() or 0.0
-    
-    result = await db.execute(
-        select(func.sum(Order.total)).where(
-            and_(
-                Order.status == OrderStatus.COMPLETED,
-                Order.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    weekly_revenue = result.scalar() or 0.0
-    
-    result = await db.execute(
-        select(func.count(Payment.id)).where(
-            and_(
-                Payment.status == PaymentStatus.SUCCEEDED,
-                Payment.created_at >= day_ago,
-                Payment.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    recent_payments = result.scalar() or 0
-    
-    # Invoice Stats (filtered by period)
-    result = await db.execute(
-        select(func.count(Invoice.id)).where(
-            Invoice.created_at.between(period_start, period_end)
-        )
-    )
-    total_invoices = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(Invoice.id)).where(
-            and_(
-                Invoice.status == InvoiceStatus.PAID,
-                Invoice.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    paid_invoices = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(Invoice.id)).where(
-            and_(
-                Invoice.status.in_([InvoiceStatus.OPEN, InvoiceStatus.DRAFT]),
-                Invoice.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    unpaid_invoices = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(Invoice.id)).where(
-            and_(
-                Invoice.status == InvoiceStatus.OVERDUE,
-                Invoice.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    overdue_invoices = result.scalar() or 0
-    
-    # Domain Stats (filtered by period)
-    result = await db.execute(
-        select(func.count(Domain.id)).where(
-            Domain.created_at.between(period_start, period_end)
-        )
-    )
-    total_domains = result.scalar() or 0
-    
-    result = await db.execute(
-        select(func.count(Domain.id)).where(
-            and_(
-                Domain.status == "active",
-                Domain.created_at.between(period_start, period_end)
-            )
-        )
-    )
-    active_domains = result.scalar() or 0
-    
-    return DashboardStatsResponse(
-        total_customers=total_customers,
-        active_customers=active_customers,
-        new_customers_this_month=new_customers_this_month,
-        new_customers_this_week=new_customers_this_week,
-        total_products=total_products,
-        active_products=active_products,
-        total_licenses=total_licenses,
-        active_licenses=active_licenses,
-        suspended_licenses=suspended_licenses,
-        expired_licenses=expired_licenses,
-        total_subscriptions=total_subscriptions,
-        active_subscriptions=active_subscriptions,
-        cancelled_subscriptions=cancelled_subscriptions,
-        total_orders=total_orders,
-        pending_orders=pending_orders,
-        completed_orders=completed_orders,
-        total_revenue=total_revenue,
-        monthly_revenue=monthly_revenue,
-        weekly_revenue=weekly_revenue,
-        total_invoices=total_invoices,
-        paid_invoices=paid_invoices,
-        unpaid_invoices=unpaid_invoices,
-        overdue_invoices=overdue_invoices,
-        total_domains=total_domains,
-        active_domains=active_domains,
-        recent_signups=recent_signups,
-        recent_payments=recent_payments,
-        recent_orders=recent_orders
-    )
+    return DashboardStatsResponse(**stats)
 
 
 @router.get("/revenue/time-series")
@@ -523,172 +308,14 @@ async def get_revenue_time_series(
         period_start = now - timedelta(days=7)
         period_end = now
     
-    # Get all completed orders in the period
-    result = await db.execute(
-        select(Order.created_at, Order.total)
-        .where(
-            and_(
-                Order.status == OrderStatus.COMPLETED,
-                Order.created_at.between(period_start, period_end)
-            )
-        )
-        .order_by(Order.created_at)
+    # Bucket completed orders inside the database, then fill gaps in one pass
+    data = await _time_series(
+        db, period, period_start, period_end,
+        aggregate=func.sum(Order.total),
+        conditions=[Order.status == OrderStatus.COMPLETED],
+        default=0.0
     )
-    orders = result.all()
-    
-    # Group by time period based on selected period
-    data = []
-    if period in ["today", "yesterday"]:
-        # Group by hour
-        hourly_revenue = {}
-        for order in orders:
-            hour = order.created_at.hour
-            if hour not in hourly_revenue:
-                hourly_revenue[hour] = 0.0
-            hourly_revenue[hour] += float(order.total or 0)
-        
-        # Fill in all hours for the period
-        if period == "today":
-            # Show hours from 0 to current hour
-            start_hour = 0
-            end_hour = period_end.hour
-        else:  # yesterday
-            # Show all 24 hours
-            start_hour = 0
-            end_hour = 23
-        
-        for hour in range(start_hour, end_hour + 1):
-            data.append({
-                "period": f"{hour:02d}:00",
-                "revenue": hourly_revenue.get(hour, 0.0)
-            })
-    elif period == "week":
-        # Group by day (last 7 days)
-        daily_revenue = {}
-        day_names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-        for order in orders:
-            date_key = order.created_at.date()
-            if date_key not in daily_revenue:
-                daily_revenue[date_key] = 0.0
-            daily_revenue[date_key] += float(order.total or 0)
-        
-        # Fill in all 7 days, even if no revenue
-        for i in range(7):
-            check_date = (period_end - timedelta(days=6-i)).date()
-            day_name = day_names[check_date.weekday()]
-            revenue = daily_revenue.get(check_date, 0.0)
-            data.append({
-                "period": day_name,
-                "revenue": revenue
-            })
-    elif period == "month":
-        # Group by day - fill all days in the month period
-        daily_revenue = {}
-        for order in orders:
-            date_key = order.created_at.date()
-            if date_key not in daily_revenue:
-                daily_revenue[date_key] = 0.0
-            daily_revenue[date_key] += float(order.total or 0)
-        
-        # Fill in all days in the period
-        current_date = period_start.date()
-        end_date = period_end.date()
-        while current_date <= end_date:
-            revenue = daily_revenue.get(current_date, 0.0)
-            data.append({
-                "period": current_date.strftime('%m/%d'),
-                "revenue": revenue
-            })
-            current_date += timedelta(days=1)
-    elif period == "year":
-        # Group by month - fill all 12 months
-        monthly_revenue = {}
-        month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-        for order in orders:
-            month_key = order.created_at.month
-            if month_key not in monthly_revenue:
-                monthly_revenue[month_key] = 0.0
-            monthly_revenue[month_key] += float(order.total or 0)
-        
-        # Fill in all months in the year period
-        current_date = period_start
-        while current_date <= period_end:
-            month_key = current_date.month
-            month_name = month_names[month_key - 1]
-            # Only add if not already added
-            if not any(d['period'] == month_name for d in data):
-                data.append({
-                    "period": month_name,
-                    "revenue": monthly_revenue.get(month_key, 0.0)
-                })
-            # Move to next month
-            if current_date.month == 12:
-                current_date = current_date.replace(year=current_date.year + 1, month=1)
-            else:
-                current_date = current_date.replace(month=current_date.month + 1)
-    else:  # custom
-        # Determine grouping based on date range
-        days_diff = (period_end - period_start).days
-        if days_diff <= 1:
-            # Group by hour
-            hourly_revenue = {}
-            for order in orders:
-                hour = order.created_at.hour
-                if hour not in hourly_revenue:
-                    hourly_revenue[hour] = 0.0
-                hourly_revenue[hour] += float(order.total or 0)
-            
-            for hour in range(24):
-                data.append({
-                    "period": f"{hour:02d}:00",
-                    "revenue": hourly_revenue.get(hour, 0.0)
-                })
-        elif days_diff <= 30:
-            # Group by day
-            daily_revenue = {}
-            for order in orders:
-                date_key = order.created_at.date()
-                if date_key not in daily_revenue:
-                    daily_revenue[date_key] = 0.0
-                daily_revenue[date_key] += float(order.total or 0)
-            
-            current_date = period_start.date()
-            end_date = period_end.date()
-            while current_date <= end_date:
-                revenue = daily_revenue.get(current_date, 0.0)
-                data.append({
-                    "period": current_date.strftime('%m/%d'),
-                    "revenue": revenue
-                })
-                current_date += timedelta(days=1)
-        else:
-            # Group by month
-            monthly_revenue = {}
-            month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-            for order in orders:
-                month_key = order.created_at.month
-                year_key = order.created_at.year
-                key = (year_key, month_key)
-                if key not in monthly_revenue:
-                    monthly_revenue[key] = 0.0
-                monthly_revenue[key] += float(order.total or 0)
-            
-            current_date = period_start
-            while current_date <= period_end:
-                month_name = month_names[current_date.month - 1]
-                key = (current_date.year, current_date.month)
-                revenue = monthly_revenue.get(key, 0.0)
-                period_label = f"{month_name} {current_date.year}"
-                if not any(d['period'] == period_label for d in data):
-                    data.append({
-                        "period": period_label,
-                        "revenue": revenue
-                    })
-                # Move to next month
-                if current_date.month == 12:
-                    current_date = current_date.replace(year=current_date.year + 1, month=1)
-                else:
-                    current_date = current_date.replace(month=current_date.month + 1)
+    data = [{"period": label, "revenue": float(value)} for label, value in data]
     
     return {"data": data}
 
@@ -743,153 +370,14 @@ async def get_orders_time_series(
         period_start = now - timedelta(days=7)
         period_end = now
     
-    # Get all orders in the period (all statuses, not just completed)
-    result = await db.execute(
-        select(Order.created_at)
-        .where(
-            Order.created_at.between(period_start, period_end)
-        )
-        .order_by(Order.created_at)
+    # Bucket all orders (all statuses, not just completed) inside the database
+    data = await _time_series(
+        db, period, period_start, period_end,
+        aggregate=func.count(Order.id),
+        conditions=[],
+        default=0
     )
-    orders = result.all()
-    
-    # Group by time period based on selected period
-    data = []
-    if period in ["today", "yesterday"]:
-        # Group by hour
-        hourly_orders = {}
-        for order in orders:
-            hour = order.created_at.hour
-            hourly_orders[hour] = hourly_orders.get(hour, 0) + 1
-        
-        # Fill in all hours for the period
-        if period == "today":
-            start_hour = 0
-            end_hour = period_end.hour
-        else:  # yesterday
-            start_hour = 0
-            end_hour = 23
-        
-        for hour in range(start_hour, end_hour + 1):
-            data.append({
-                "period": f"{hour:02d}:00",
-                "orders": hourly_orders.get(hour, 0)
-            })
-    elif period == "week":
-        # Group by day (last 7 days)
-        daily_orders = {}
-        day_names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-        for order in orders:
-            date_key = order.created_at.date()
-            daily_orders[date_key] = daily_orders.get(date_key, 0) + 1
-        
-        # Fill in all 7 days, even if no orders
-        for i in range(7):
-            check_date = (period_end - timedelta(days=6-i)).date()
-            day_name = day_names[check_date.weekday()]
-            orders_count = daily_orders.get(check_date, 0)
-            data.append({
-                "period": day_name,
-                "orders": orders_count
-            })
-    elif period == "month":
-        # Group by day - fill all days in the month period
-        daily_orders = {}
-        for order in orders:
-            date_key = order.created_at.date()
-            daily_orders[date_key] = daily_orders.get(date_key, 0) + 1
-        
-        # Fill in all days in the period
-        current_date = period_start.date()
-        end_date = period_end.date()
-        while current_date <= end_date:
-            orders_count = daily_orders.get(current_date, 0)
-            data.append({
-                "period": current_date.strftime('%m/%d'),
-                "orders": orders_count
-            })
-            current_date += timedelta(days=1)
-    elif period == "year":
-        # Group by month - fill all 12 months
-        monthly_orders = {}
-        month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-        for order in orders:
-            month_key = order.created_at.month
-            monthly_orders[month_key] = monthly_orders.get(month_key, 0) + 1
-        
-        # Fill in all months in the year period
-        current_date = period_start
-        while current_date <= period_end:
-            month_key = current_date.month
-            month_name = month_names[month_key - 1]
-            # Only add if not already added
-            if not any(d['period'] == month_name for d in data):
-                data.append({
-                    "period": month_name,
-                    "orders": monthly_orders.get(month_key, 0)
-                })
-            # Move to next month
-            if current_date.month == 12:
-                current_date = current_date.replace(year=current_date.year + 1, month=1)
-            else:
-                current_date = current_date.replace(month=current_date.month + 1)
-    else:  # custom
-        # Determine grouping based on date range
-        days_diff = (period_end - period_start).days
-        if days_diff <= 1:
-            # Group by hour
-            hourly_orders = {}
-            for order in orders:
-                hour = order.created_at.hour
-                hourly_orders[hour] = hourly_orders.get(hour, 0) + 1
-            
-            for hour in range(24):
-                data.append({
-                    "period": f"{hour:02d}:00",
-                    "orders": hourly_orders.get(hour, 0)
-                })
-        elif days_diff <= 30:
-            # Group by day
-            daily_orders = {}
-            for order in orders:
-                date_key = order.created_at.date()
-                daily_orders[date_key] = daily_orders.get(date_key, 0) + 1
-            
-            current_date = period_start.date()
-            end_date = period_end.date()
-            while current_date <= end_date:
-                orders_count = daily_orders.get(current_date, 0)
-                data.append({
-                    "period": current_date.strftime('%m/%d'),
-                    "orders": orders_count
-                })
-                current_date += timedelta(days=1)
-        else:
-            # Group by month
-            monthly_orders = {}
-            month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-            for order in orders:
-                month_key = order.created_at.month
-                year_key = order.created_at.year
-                key = (year_key, month_key)
-                monthly_orders[key] = monthly_orders.get(key, 0) + 1
-            
-            current_date = period_start
-            while current_date <= period_end:
-                month_name = month_names[current_date.month - 1]
-                key = (current_date.year, current_date.month)
-                orders_count = monthly_orders.get(key, 0)
-                period_label = f"{month_name} {current_date.year}"
-                if not any(d['period'] == period_label for d in data):
-                    data.append({
-                        "period": period_label,
-                        "orders": orders_count
-                    })
-                # Move to next month
-                if current_date.month == 12:
-                    current_date = current_date.replace(year=current_date.year + 1, month=1)
-                else:
-                    current_date = current_date.replace(month=current_date.month + 1)
+    data = [{"period": label, "orders": int(value)} for label, value in data]
     
     return {"data": data}
 
@@ -11,6 +11,7 @@ from app.core.security import get_current_user_id, verify_admin
 from app.models import EmailTemplate, EmailTemplateType, User
 from app.schemas import BaseModel
 from app.services.email_service import EmailService
+from app.services.email_template_compiler import template_compiler
 from pydantic import Field, EmailStr
 from typing import Dict, Any
 import logging
@@ -58,6 +59,10 @@ class RenderTemplateRequest(BaseModel):
     variables: dict = Field(default_factory=dict)
 
 
+class RenderTemplateBatchRequest(BaseModel):
+    contexts: List[Dict[str, Any]] = Field(..., min_length=1, max_length=1000)
+
+
 @router.post("/", response_model=EmailTemplateResponse, status_code=status.HTTP_201_CREATED)
 async def create_email_template(
     request: EmailTemplateCreateRequest,
@@ -180,6 +185,7 @@ async def update_email_template(
     
     await db.commit()
     await db.refresh(template)
+    template_compiler.invalidate(template.id)
     
     logger.info(f"Email template updated: {template.name} by user {user_id}")
     return template
@@ -203,6 +209,7 @@ async def delete_email_template(
     
     await db.delete(template)
     await db.commit()
+    template_compiler.invalidate(template.id)
     
     logger.info(f"Email template deleted: {template.name} by user {user_id}")
 
@@ -221,24 +228,28 @@ async def render_email_template(
     if not template:
         raise HTTPException(status_code=404, detail="Email template not found")
     
-    # Render template
-    def render_text(text: str, vars: dict) -> str:
-        if not text:
-            return ""
-        result_text = text
-        for key, value in vars.items():
-            result_text = result_text.replace(f"{{{{{key}}}}}", str(value))
-        return result_text
+    rendered = template_compiler.render(template, request.variables)
+    return {field: value or "" for field, value in rendered.items()}
+
+
+@router.post("/{template_id}/render-batch", response_model=List[dict])
+async def render_email_template_batch(
+    template_id: str,
+    request: RenderTemplateBatchRequest,
+    user_id: str = Depends(verify_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Render email template once per variables dict, in order (admin only)"""
+    result = await db.execute(select(EmailTemplate).where(EmailTemplate.id == template_id))
+    template = result.scalars().first()
     
-    rendered_subject = render_text(template.subject, request.variables)
-    rendered_body_text = render_text(template.body_text, request.variables)
-    rendered_body_html = render_text(template.body_html, request.variables)
+    if not template:
+        raise HTTPException(status_code=404, detail="Email template not found")
     
-    return {
-        "subject": rendered_subject,
-        "body_text": rendered_body_text,
-        "body_html": rendered_body_html
-    }
+    return [
+        {field: value or "" for field, value in rendered.items()}
+        for rendered in template_compiler.render_batch(template, request.contexts)
+    ]
 
 
 class SendEmailRequest(BaseModel):
@@ -291,20 +302,12 @@ async def send_email_to_customer(
             **request.variables
         }
         
-        # Render template
-        def render_text(text: str, vars: dict) -> str:
-            if not text:
-                return ""
-            result_text = text
-            for key, value in vars.items():
-                result_text = result_text.replace(f"{{{{{key}}}}}", str(value))
-            return result_text
+        rendered = template_compiler.render(template, variables)
         
         # Use template subject, but allow request subject to override if provided
-        template_subject = render_text(template.subject, variables)
-        subject = request.subject if request.subject else template_subject
-        body_text = render_text(template.body_text or "", variables)
-        body_html = render_text(template.body_html or "", variables) if template.body_html else None
+        subject = request.subject if request.subject else rendered["subject"]
+        body_text = rendered["body_text"] or ""
+        body_html = rendered["body_html"]
     
     # Send email
     email_service = EmailService()
@@ -312,7 +315,8 @@ async def send_email_to_customer(
         to_email=customer.email,
         subject=subject,
         body=body_text,
-        html_body=body_html
+        html_body=body_html,
+        db=db
     )
     
     if not success:
@@ -2,7 +2,7 @@
 Comprehensive Invoice Management API endpoints
 Supports: manual & automated invoicing, recurring billing, partial payments, bulk operations
 """
-from fastapi import APIRouter, Depends, HTTPException, Response, Query
+from fastapi import APIRouter, Depends, HTTPException, Response, Query, Header
 from fastapi import status as http_status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_, func
@@ -10,6 +10,7 @@ from typing import List, Optional
 from datetime import datetime, timedelta
 from app.core.database import get_db
 from app.core.security import get_current_user_id
+from app.core.pagination import paginate, set_next_cursor
 from app.models import (
     Invoice, Payment, User, InvoiceStatus, PaymentStatus,
     PartialPayment, InvoiceTemplate, RecurringInterval
@@ -26,6 +27,7 @@ from app.schemas import (
     BulkInvoiceRequest
 )
 from app.services.invoice_service import InvoiceService
+from app.services.pdf_cache import etag_matches
 from app.api.v1.events import broadcast_event
 import logging
 
@@ -121,7 +123,9 @@ async def list_invoices(
     max_amount: Optional[float] = None,
     is_recurring: Optional[bool] = None,
     limit: int = 50,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    response: Response = None
 ):
     """
     List user's invoices with advanced filtering:
@@ -129,7 +133,7 @@ async def list_invoices(
     - Filter by date range
     - Filter by amount range
     - Filter recurring vs one-time
-    - Pagination support
+    - Pagination support (offset, or the X-Next-Cursor header value as cursor)
     - If user is admin, returns all invoices
     """
     try:
@@ -195,13 +199,14 @@ async def list_invoices(
         if is_recurring is not None:
             query = query.where(Invoice.is_recurring == is_recurring)
         
-        query = query.order_by(Invoice.created_at.desc()).limit(limit).offset(offset)
+        query = paginate(query, Invoice, db, limit, offset=offset, cursor=cursor)
         
         try:
             logger.info("Executing invoice query...")
             result = await db.execute(query)
             invoices = result.scalars().all()
             logger.info(f"Query executed successfully, found {len(invoices)} invoices")
+            set_next_cursor(response, invoices, limit)
         except Exception as query_exec_err:
             logger.error(f"Error executing query: {query_exec_err}", exc_info=True)
             import traceback
@@ -603,12 +608,14 @@ async def void_invoice(
 @router.get("/{invoice_id}/pdf")
 async def download_invoice_pdf(
     invoice_id: str,
+    if_none_match: Optional[str] = Header(None),
     user_id: str = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Download invoice as PDF
     Generates a professional PDF invoice with company branding
+    Supports If-None-Match: unchanged invoices answer 304 without rendering
     """
     result = await db.execute(
         select(Invoice).where(
@@ -641,13 +648,19 @@ async def download_invoice_pdf(
         'email': 'billing@nextpanel.com'
     }
     
+    etag = invoice_service.pdf_etag(invoice, user, company_info)
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=http_status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    
     pdf_content = await invoice_service.generate_pdf(invoice, user, company_info)
     
     return Response(
         content=pdf_content,
         media_type="application/pdf",
         headers={
-            "Content-Disposition": f"attachment; filename=invoice-{invoice.invoice_number}.pdf"
+            "Content-Disposition": f"attachment; filename=invoice-{invoice.invoice_number}.pdf",
+            **cache_headers
         }
     )
 
@@ -965,14 +978,7 @@ async def bulk_send_reminders(
     
     # Send reminders
     invoice_service = InvoiceService()
-    sent_count = 0
-    
-    for invoice in invoices:
-        try:
-            await invoice_service.send_payment_reminder(invoice, user, db)
-            sent_count += 1
-        except Exception as e:
-            logger.error(f"Failed to send reminder for invoice {invoice.invoice_number}: {str(e)}")
+    sent_count = await invoice_service.send_payment_reminders(db, [(invoice, user) for invoice in invoices]) if user else 0
     
     logger.info(f"Sent {sent_count} payment reminders")
     return {
@@ -19,7 +19,7 @@ async def send_test_email(
     user_id: str = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
-    """Send a test email to verify email configuration"""
+    """Send a test email to verify email configuration (delivered immediately, not queued)"""
     # Get user
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalars().first()
@@ -29,12 +29,17 @@ async def send_test_email(
     
     email_service = EmailService()
     
-    success = await email_service.send_email(
-        to_email=user.email,
-        subject="Test Email from NextPanel Billing",
-        body="This is a test email to verify your email configuration is working correctly.",
-        html_body="<html><body><h2>Test Email</h2><p>This is a test email to verify your email configuration is working correctly.</p></body></html>"
-    )
+    try:
+        await email_service.deliver(
+            to_email=user.email,
+            subject="Test Email from NextPanel Billing",
+            body="This is a test email to verify your email configuration is working correctly.",
+            html_body="<html><body><h2>Test Email</h2><p>This is a test email to verify your email configuration is working correctly.</p></body></html>"
+        )
+        success = True
+    except Exception as e:
+        logger.error(f"Test email to {user.email} failed: {e}")
+        success = False
     
     return {
         "status": "success" if success else "failed",
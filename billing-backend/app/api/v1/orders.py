@@ -1,54 +1,40 @@
 """
 Orders API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Header
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, cast, Date, text, and_
+from sqlalchemy import select, cast, Date, text, and_
+from sqlalchemy.orm import joinedload
 from typing import List, Optional
 from datetime import datetime, timedelta
 import logging
 
 from app.core.database import get_db
 from app.core.security import get_current_user_id
+from app.core.pagination import paginate, set_next_cursor
+from app.core.time_buckets import dialect_name, timestamp_bound
 from app.models import Order, OrderStatus, User, Domain, DomainStatus, License, Plan, Invoice, InvoiceStatus, Payment, PaymentStatus
 from app.services.payment_service import PaymentService
+from app.services.sequence_service import sequence_allocator, seed_from_max
+from app.services.pdf_cache import etag_matches
 from pydantic import BaseModel, Field
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+ORDER_NUMBER_SEQUENCE = "order_number"
+
+
+async def _seed_order_number(db: AsyncSession) -> int:
+    """Highest INV-NNNN number issued before the sequence existed"""
+    return await seed_from_max(db, Order.invoice_number, "INV-")
+
+
 async def generate_invoice_number(db: AsyncSession) -> str:
     """Generate sequential invoice number like INV-0008"""
-    from datetime import datetime
-    
-    # Find the highest invoice number
-    result = await db.execute(
-        select(func.max(Order.invoice_number))
-        .where(Order.invoice_number.like('INV-%'))
-    )
-    max_invoice = result.scalar()
-    
-    if max_invoice:
-        # Extract the number part and increment
-        try:
-            # Handle both old format (INV-2024-0001) and new format (INV-0008)
-            parts = max_invoice.split('-')
-            if len(parts) == 3:
-                # Old format: INV-2024-0001
-                number = int(parts[-1])
-            else:
-                # New format: INV-0008
-                number = int(parts[-1])
-            next_number = number + 1
-        except (ValueError, IndexError):
-            next_number = 1
-    else:
-        # First invoice
-        next_number = 1
-    
-    # Format: INV-0008
-    return f"INV-{next_number:04d}"
+    number = await sequence_allocator.next_value(db, ORDER_NUMBER_SEQUENCE, seed=_seed_order_number)
+    return f"INV-{number:04d}"
 
 
 async def provision_services_from_order(order: Order, db: AsyncSession):
@@ -305,6 +291,34 @@ class OrderResponse(BaseModel):
         from_attributes = True
 
 
+def build_order_response(order: Order) -> OrderResponse:
+    """Build an OrderResponse from an order whose customer relationship is already loaded"""
+    customer = order.customer
+    return OrderResponse(
+        id=order.id,
+        customer_id=order.customer_id,
+        status=order.status.value,
+        invoice_number=order.invoice_number,
+        order_number=order.order_number,
+        items=order.items,
+        subtotal=order.subtotal,
+        tax=order.tax,
+        total=order.total,
+        payment_method=order.payment_method,
+        billing_info=order.billing_info,
+        billing_period=order.billing_period,
+        due_date=order.due_date,
+        created_at=order.created_at,
+        updated_at=order.updated_at,
+        customer=CustomerInfo(
+            id=customer.id,
+            email=customer.email,
+            full_name=customer.full_name,
+            company_name=customer.company_name
+        ) if customer else None
+    )
+
+
 @router.get("/stats")
 async def get_order_stats(
     user_id: str = Depends(get_current_user_id),
@@ -528,10 +542,15 @@ async def list_orders(
     end_date: Optional[str] = None,
     min_amount: Optional[float] = None,
     max_amount: Optional[float] = None,
+    cursor: Optional[str] = None,
+    response: Response = None,
     user_id: str = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
-    """List orders (admin or customer's own orders)"""
+    """
+    List orders (admin or customer's own orders).
+    Pass the X-Next-Cursor header of a full page as cursor to seek instead of skip.
+    """
     
     # Get user to check if admin
     result = await db.execute(select(User).where(User.id == user_id))
@@ -541,7 +560,7 @@ async def list_orders(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Build query
-    query = select(Order)
+    query = select(Order).options(joinedload(Order.customer))
     
     # If not admin, only show user's own orders
     if not user.is_admin:
@@ -565,9 +584,10 @@ async def list_orders(
         try:
             # Handle both date-only (YYYY-MM-DD) and datetime formats
             if len(start_date) == 10:  # Date only format YYYY-MM-DD
-                # Use func.date() which works with SQLite and extracts date part
-                # Compare date part as string (YYYY-MM-DD format)
-                query = query.where(func.date(Order.created_at) >= start_date)
+                # Half-open timestamp range so the created_at indexes stay usable
+                start = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+                column, bound = timestamp_bound(Order.created_at, start, dialect_name(db))
+                query = query.where(column >= bound)
                 logger.info(f"Date filter: start_date '{start_date}' filtering orders from {start_date}")
             else:
                 # Full datetime format
@@ -584,9 +604,10 @@ async def list_orders(
         try:
             # Handle both date-only (YYYY-MM-DD) and datetime formats
             if len(end_date) == 10:  # Date only format YYYY-MM-DD
-                # Use func.date() which works with SQLite and extracts date part
-                # Compare date part as string (YYYY-MM-DD format)
-                query = query.where(func.date(Order.created_at) <= end_date)
+                # Everything before the start of the following day
+                end = datetime.strptime(end_date, "%Y-%m-%d").replace(tzinfo=timezone.utc) + timedelta(days=1)
+                column, bound = timestamp_bound(Order.created_at, end, dialect_name(db))
+                query = query.where(column < bound)
                 logger.info(f"Date filter: end_date '{end_date}' filtering orders until {end_date}")
             else:
                 # Full datetime format
@@ -606,43 +627,13 @@ async def list_orders(
     if max_amount is not None:
         query = query.where(Order.total <= max_amount)
     
-    # Get orders with customer details
-    query = query.offset(skip).limit(limit).order_by(Order.created_at.desc())
+    # Get orders with customer details (joined in the same query)
+    query = paginate(query, Order, db, limit, offset=skip, cursor=cursor)
     result = await db.execute(query)
     orders = result.scalars().all()
+    set_next_cursor(response, orders, limit)
     
-    # Fetch customer details for each order
-    orders_with_customers = []
-    for order in orders:
-        result = await db.execute(select(User).where(User.id == order.customer_id))
-        customer = result.scalars().first()
-        
-        order_response = OrderResponse(
-            id=order.id,
-            customer_id=order.customer_id,
-            status=order.status.value,
-            invoice_number=order.invoice_number,
-            order_number=order.order_number,
-            items=order.items,
-            subtotal=order.subtotal,
-            tax=order.tax,
-            total=order.total,
-            payment_method=order.payment_method,
-            billing_info=order.billing_info,
-            billing_period=order.billing_period,
-            due_date=order.due_date,
-            created_at=order.created_at,
-            updated_at=order.updated_at,
-            customer=CustomerInfo(
-                id=customer.id,
-                email=customer.email,
-                full_name=customer.full_name,
-                company_name=customer.company_name
-            ) if customer else None
-        )
-        orders_with_customers.append(order_response)
-    
-    return orders_with_customers
+    return [build_order_response(order) for order in orders]
 
 
 @router.get("/{order_id}", response_model=OrderResponse)
@@ -654,50 +645,27 @@ async def get_order(
     """Get order details"""
     
     # Get order
-    result = await db.execute(select(Order).where(Order.id == order_id))
+    result = await db.execute(select(Order).options(joinedload(Order.customer)).where(Order.id == order_id))
     order = result.scalars().first()
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    
-    # Get user to check if admin
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalars().first()
-    
+
+    # Get user to check if admin (the owner was already loaded with the order)
+    if order.customer is not None and order.customer.id == user_id:
+        user = order.customer
+    else:
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalars().first()
+
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    
+
     # Check if user has access to this order
     if not user.is_admin and order.customer_id != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
-    
-    # Fetch customer details
-    result = await db.execute(select(User).where(User.id == order.customer_id))
-    customer = result.scalars().first()
-    
-    return OrderResponse(
-        id=order.id,
-        customer_id=order.customer_id,
-        status=order.status.value,
-        invoice_number=order.invoice_number,
-        order_number=order.order_number,
-        items=order.items,
-        subtotal=order.subtotal,
-        tax=order.tax,
-        total=order.total,
-        payment_method=order.payment_method,
-        billing_info=order.billing_info,
-        billing_period=order.billing_period,
-        due_date=order.due_date,
-        created_at=order.created_at,
-        updated_at=order.updated_at,
-        customer=CustomerInfo(
-            id=customer.id,
-            email=customer.email,
-            full_name=customer.full_name,
-            company_name=customer.company_name
-        ) if customer else None
-    )
+
+    return build_order_response(order)
 
 
 @router.patch("/{order_id}", response_model=OrderResponse)
@@ -717,7 +685,7 @@ async def update_order_status(
         raise HTTPException(status_code=403, detail="Admin access required")
     
     # Get order
-    result = await db.execute(select(Order).where(Order.id == order_id))
+    result = await db.execute(select(Order).options(joinedload(Order.customer)).where(Order.id == order_id))
     order = result.scalars().first()
     
     if not order:
@@ -732,33 +700,7 @@ async def update_order_status(
     await db.commit()
     await db.refresh(order)
     
-    # Fetch customer details
-    result = await db.execute(select(User).where(User.id == order.customer_id))
-    customer = result.scalars().first()
-    
-    return OrderResponse(
-        id=order.id,
-        customer_id=order.customer_id,
-        status=order.status.value,
-        invoice_number=order.invoice_number,
-        order_number=order.order_number,
-        items=order.items,
-        subtotal=order.subtotal,
-        tax=order.tax,
-        total=order.total,
-        payment_method=order.payment_method,
-        billing_info=order.billing_info,
-        billing_period=order.billing_period,
-        due_date=order.due_date,
-        created_at=order.created_at,
-        updated_at=order.updated_at,
-        customer=CustomerInfo(
-            id=customer.id,
-            email=customer.email,
-            full_name=customer.full_name,
-            company_name=customer.company_name
-        ) if customer else None
-    )
+    return build_order_response(order)
 
 
 @router.put("/{order_id}", response_model=OrderResponse)
@@ -778,7 +720,7 @@ async def update_order(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get order
-    result = await db.execute(select(Order).where(Order.id == order_id))
+    result = await db.execute(select(Order).options(joinedload(Order.customer)).where(Order.id == order_id))
     order = result.scalars().first()
     
     if not order:
@@ -826,33 +768,7 @@ async def update_order(
     await db.commit()
     await db.refresh(order)
     
-    # Fetch customer details
-    result = await db.execute(select(User).where(User.id == order.customer_id))
-    customer = result.scalars().first()
-    
-    return OrderResponse(
-        id=order.id,
-        customer_id=order.customer_id,
-        status=order.status.value,
-        invoice_number=order.invoice_number,
-        order_number=order.order_number,
-        items=order.items,
-        subtotal=order.subtotal,
-        tax=order.tax,
-        total=order.total,
-        payment_method=order.payment_method,
-        billing_info=order.billing_info,
-        billing_period=order.billing_period,
-        due_date=order.due_date,
-        created_at=order.created_at,
-        updated_at=order.updated_at,
-        customer=CustomerInfo(
-            id=customer.id,
-            email=customer.email,
-            full_name=customer.full_name,
-            company_name=customer.company_name
-        ) if customer else None
-    )
+    return build_order_response(order)
 
 
 @router.post("/{order_id}/pay")
@@ -934,6 +850,7 @@ async def download_order_pdf_options(order_id: str):
 @router.get("/{order_id}/pdf")
 async def download_order_pdf(
     order_id: str,
+    if_none_match: Optional[str] = Header(None),
     user_id: str = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
@@ -1018,6 +935,13 @@ async def download_order_pdf(
         logger.info(f"User info: id={user.id}, email={getattr(user, 'email', 'N/A')}, full_name={getattr(user, 'full_name', 'N/A')}")
         logger.info(f"Order info: id={order.id}, customer_id={order.customer_id}, items_count={len(order.items or [])}")
         
+        etag = invoice_service.pdf_etag(order_invoice, user, company_info)
+        if etag_matches(if_none_match, etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers={"ETag": etag, "Cache-Control": "private, no-cache", "Access-Control-Allow-Origin": "*"}
+            )
+        
         pdf_content = await invoice_service.generate_pdf(order_invoice, user, company_info)
         
         if not pdf_content or len(pdf_content) == 0:
@@ -1037,7 +961,9 @@ async def download_order_pdf(
                 "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
                 "Access-Control-Allow-Headers": "*",
                 "Access-Control-Allow-Credentials": "true",
-                "Access-Control-Expose-Headers": "Content-Disposition, Content-Type",
+                "Access-Control-Expose-Headers": "Content-Disposition, Content-Type, ETag",
+                "ETag": etag,
+                "Cache-Control": "private, no-cache",
             }
         )
         return response
@@ -1075,7 +1001,7 @@ async def send_order_email(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get order
-    result = await db.execute(select(Order).where(Order.id == order_id))
+    result = await db.execute(select(Order).options(joinedload(Order.customer)).where(Order.id == order_id))
     order = result.scalars().first()
     
     if not order:
@@ -1085,9 +1011,8 @@ async def send_order_email(
     if not user.is_admin and order.customer_id != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Get customer details
-    result = await db.execute(select(User).where(User.id == order.customer_id))
-    customer = result.scalars().first()
+    # Customer was loaded with the order
+    customer = order.customer
     
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
@@ -1,7 +1,7 @@
 """
 Payment Management API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List, Optional, Dict, Any
@@ -11,8 +11,10 @@ import logging
 
 from app.core.database import get_db
 from app.core.security import get_current_user_id
+from app.core.pagination import paginate, set_next_cursor
 from app.core.config import settings
 from app.models import Order, OrderStatus, User, Payment, PaymentStatus, PaymentGatewayType
+from app.services.auto_charge_scheduler import due_charges, upsert_charge_schedule, scheduler as auto_charge_scheduler
 from pydantic import BaseModel, Field
 
 logger = logging.getLogger(__name__)
@@ -231,10 +233,6 @@ async def configure_auto_charge(
         raise HTTPException(status_code=404, detail="Order not found")
     
     # Update order with auto-charge configuration
-    if not hasattr(order, 'auto_charge_config'):
-        # Add auto_charge_config field to order if it doesn't exist
-        order.auto_charge_config = {}
-    
     order.auto_charge_config = {
         "enabled": config.enabled,
         "payment_method_id": config.payment_method_id,
@@ -244,7 +242,18 @@ async def configure_auto_charge(
         "configured_by": user_id,
         "configured_at": datetime.utcnow().isoformat()
     }
-    
+    # The scheduler reads the indexed charge_schedule row, not the JSON above
+    await upsert_charge_schedule(
+        db,
+        order,
+        enabled=config.enabled,
+        payment_method_id=config.payment_method_id,
+        next_charge_date=config.next_charge_date,
+        max_attempts=config.retry_attempts,
+        retry_interval_days=config.retry_interval_days,
+        configured_by=user_id
+    )
+
     await db.commit()
     await db.refresh(order)
     
@@ -391,28 +400,11 @@ async def get_auto_charge_queue(
     if not user or not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    # Get orders with auto-charge enabled and due for charging
-    now = datetime.utcnow()
-    result = await db.execute(
-        select(Order).where(
-            Order.status == OrderStatus.PENDING,
-            Order.auto_charge_config["enabled"].astext == "true",
-            Order.auto_charge_config["next_charge_date"].astext <= now.isoformat()
-        )
-    )
-    orders = result.scalars().all()
+    # Due charges straight off the (status, next_charge_date) index
+    orders = await due_charges(db, datetime.utcnow())
     
     return {
-        "orders": [
-            {
-                "id": order.id,
-                "invoice_number": order.invoice_number,
-                "total": order.total,
-                "next_charge_date": order.auto_charge_config.get("next_charge_date"),
-                "retry_attempts": order.auto_charge_config.get("retry_attempts", 0)
-            }
-            for order in orders
-        ],
+        "orders": orders,
         "count": len(orders)
     }
 
@@ -431,77 +423,10 @@ async def process_auto_charge_queue(
     if not user or not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    # Get orders queued for auto-charging
-    now = datetime.utcnow()
-    result = await db.execute(
-        select(Order).where(
-            Order.status == OrderStatus.PENDING,
-            Order.auto_charge_config["enabled"].astext == "true",
-            Order.auto_charge_config["next_charge_date"].astext <= now.isoformat()
-        )
-    )
-    orders = result.scalars().all()
-    
-    processed = 0
-    successful = 0
-    failed = 0
-    
-    for order in orders:
-        try:
-            config = order.auto_charge_config
-            payment_method_id = config.get("payment_method_id")
-            
-            if not payment_method_id:
-                logger.warning(f"No payment method configured for order {order.id}")
-                continue
-            
-            # Create payment intent
-            intent = stripe.PaymentIntent.create(
-                amount=int(order.total * 100),
-                currency="usd",
-                payment_method=payment_method_id,
-                confirm=True,
-                metadata={
-                    "order_id": order.id,
-                    "invoice_number": order.invoice_number or order.order_number,
-                    "auto_charge": "true"
-                }
-            )
-            
-            # Create payment record
-            payment = Payment(
-                order_id=order.id,
-                amount=order.total,
-                currency="USD",
-                status=PaymentStatus.SUCCEEDED if intent.status == "succeeded" else PaymentStatus.PENDING,
-                payment_method=payment_method_id,
-                gateway_type=PaymentGatewayType.STRIPE,
-                gateway_transaction_id=intent.id,
-                gateway_response=intent.to_dict()
-            )
-            
-            db.add(payment)
-            
-            # Update order status if payment succeeded
-            if intent.status == "succeeded":
-                order.status = OrderStatus.COMPLETED
-                order.paid_at = datetime.utcnow()
-                successful += 1
-            else:
-                # Schedule retry
-                retry_interval = config.get("retry_interval_days", 3)
-                next_charge_date = now + timedelta(days=retry_interval)
-                order.auto_charge_config["next_charge_date"] = next_charge_date.isoformat()
-                order.auto_charge_config["retry_attempts"] = config.get("retry_attempts", 0) + 1
-                failed += 1
-            
-            processed += 1
-            
-        except Exception as e:
-            logger.error(f"Error processing auto-charge for order {order.id}: {str(e)}")
-            failed += 1
-    
-    await db.commit()
+    # Same claim-and-charge path as the background scheduler, so a manual run
+    # never double-charges an order the scheduler is working on
+    summary = await auto_charge_scheduler.process_auto_charge_queue()
+    processed, successful, failed = summary["processed"], summary["successful"], summary["failed"]
     
     return {
         "success": True,
@@ -561,10 +486,12 @@ async def list_payments(
     date_to: Optional[str] = None,
     min_amount: Optional[float] = None,
     max_amount: Optional[float] = None,
+    cursor: Optional[str] = None,
+    response: Response = None,
     user_id: str = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
-    """List all payments with optional filtering"""
+    """List all payments with optional filtering (offset or cursor pagination)"""
     
     # Get user to check if admin
     result = await db.execute(select(User).where(User.id == user_id))
@@ -599,11 +526,12 @@ async def list_payments(
             pass
     
     # Apply pagination
-    query = query.offset(offset).limit(limit).order_by(Payment.created_at.desc())
+    query = paginate(query, Payment, db, limit, offset=offset, cursor=cursor)
     
     # Execute query
     result = await db.execute(query)
     payments = result.scalars().all()
+    set_next_cursor(response, payments, limit)
     
     result_list = []
     for payment in payments:
@@ -20,8 +20,8 @@ async def process_renewals(
 ):
     """Manually trigger renewal processing (admin only)"""
     service = RecurringBillingService()
-    await service.process_renewals(db)
-    return {"message": "Renewal processing completed"}
+    summary = await service.process_renewals(db)
+    return {"message": "Renewal processing completed", **summary}
 
 
 @router.post("/process-dunning")
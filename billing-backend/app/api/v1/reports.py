@@ -1,87 +1,79 @@
 """
 Reports and Export API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, text
-from typing import List, Optional
+from sqlalchemy import text
+from typing import AsyncIterator, List, Optional, Tuple
 from datetime import datetime, timedelta
 from app.core.database import get_db
 from app.core.security import verify_admin
-from app.models import Order, Invoice, Payment, Subscription, User
-import csv
-import io
+from app.models import Payment, Subscription, RollupMetric, ReportJob, ReportJobStatus
+from app.schemas import ReportJobRequest, ReportJobResponse
+from app.services import report_exports
+from app.services.report_exports import CSVEncoder, export_query
+from app.services.report_job_service import report_job_worker
+from app.services.rollup_service import rollup_service
+import asyncio
 import logging
+import os
+import re
+import zlib
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/reports", tags=["reports"])
 
 
+async def _stream_csv(bind, query, header: List[str], compress: bool) -> AsyncIterator[bytes]:
+    """
+    Encode query rows as CSV, EXPORT_CHUNK_SIZE rows per database fetch and per
+    yielded chunk, optionally gzip-compressed on the fly.
+
+    The request's session is closed before a streaming body is sent, so the
+    export reads through its own session on the same engine.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31: gzip container
+    encoder = CSVEncoder()
+
+    def take(rows) -> bytes:
+        data = encoder.encode(rows)
+        return compressor.compress(data) if compressor else data
+
+    yield take([header])
+
+    async with AsyncSession(bind) as session:
+        result = await session.stream(query.execution_options(yield_per=report_exports.EXPORT_CHUNK_SIZE))
+        async for rows in result.partitions():
+            chunk = take(rows)
+            if chunk:
+                yield chunk
+
+    if compressor:
+        yield compressor.flush()
+
+
+def _csv_response(db: AsyncSession, kind: str, start_date, end_date, status, compress: bool) -> StreamingResponse:
+    header, query = export_query(kind, start_date, end_date, status)
+    filename = f"{kind}_export.csv" + (".gz" if compress else "")
+    return StreamingResponse(
+        _stream_csv(db.bind, query, header, compress),
+        media_type="application/gzip" if compress else "text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
 @router.get("/orders/export")
 async def export_orders_csv(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
+    gzip: bool = Query(False, description="Compress the CSV (orders_export.csv.gz)"),
     user_id: str = Depends(verify_admin),
     db: AsyncSession = Depends(get_db)
 ):
-    """Export orders to CSV (admin only)"""
-    query = select(Order)
-    
-    if start_date:
-        try:
-            start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            query = query.where(Order.created_at >= start)
-        except:
-            pass
-    
-    if end_date:
-        try:
-            end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            query = query.where(Order.created_at <= end)
-        except:
-            pass
-    
-    if status:
-        query = query.where(Order.status == status)
-    
-    result = await db.execute(query)
-    orders = result.scalars().all()
-    
-    # Create CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow([
-        'Order ID', 'Invoice Number', 'Customer Email', 'Status', 'Subtotal', 
-        'Tax', 'Total', 'Currency', 'Created At', 'Due Date'
-    ])
-    
-    # Rows
-    for order in orders:
-        user_result = await db.execute(select(User).where(User.id == order.customer_id))
-        user = user_result.scalars().first()
-        
-        writer.writerow([
-            order.id,
-            order.invoice_number or order.order_number or '',
-            user.email if user else '',
-            order.status.value if hasattr(order.status, 'value') else str(order.status),
-            order.subtotal,
-            order.tax,
-            order.total,
-            order.currency or 'USD',
-            order.created_at.isoformat() if order.created_at else '',
-            order.due_date.isoformat() if order.due_date else ''
-        ])
-    
-    output.seek(0)
-    return Response(
-        content=output.getvalue(),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=orders_export.csv"}
-    )
+    """Export orders to CSV (admin only), streamed in chunks"""
+    return _csv_response(db, "orders", start_date, end_date, status, gzip)
 
 
 @router.get("/invoices/export")
@@ -89,67 +81,12 @@ async def export_invoices_csv(
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
+    gzip: bool = Query(False, description="Compress the CSV (invoices_export.csv.gz)"),
     user_id: str = Depends(verify_admin),
     db: AsyncSession = Depends(get_db)
 ):
-    """Export invoices to CSV (admin only)"""
-    query = select(Invoice)
-    
-    if start_date:
-        try:
-            start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            query = query.where(Invoice.invoice_date >= start)
-        except:
-            pass
-    
-    if end_date:
-        try:
-            end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            query = query.where(Invoice.invoice_date <= end)
-        except:
-            pass
-    
-    if status:
-        query = query.where(Invoice.status == status)
-    
-    result = await db.execute(query)
-    invoices = result.scalars().all()
-    
-    # Create CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow([
-        'Invoice Number', 'Customer Email', 'Status', 'Subtotal', 'Tax', 
-        'Total', 'Amount Paid', 'Amount Due', 'Currency', 'Invoice Date', 'Due Date'
-    ])
-    
-    # Rows
-    for invoice in invoices:
-        user_result = await db.execute(select(User).where(User.id == invoice.user_id))
-        user = user_result.scalars().first()
-        
-        writer.writerow([
-            invoice.invoice_number,
-            user.email if user else '',
-            invoice.status.value if hasattr(invoice.status, 'value') else str(invoice.status),
-            invoice.subtotal,
-            invoice.tax,
-            invoice.total,
-            invoice.amount_paid,
-            invoice.amount_due,
-            invoice.currency,
-            invoice.invoice_date.isoformat() if invoice.invoice_date else '',
-            invoice.due_date.isoformat() if invoice.due_date else ''
-        ])
-    
-    output.seek(0)
-    return Response(
-        content=output.getvalue(),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=invoices_export.csv"}
-    )
+    """Export invoices to CSV (admin only), streamed in chunks"""
+    return _csv_response(db, "invoices", start_date, end_date, status, gzip)
 
 
 @router.get("/revenue-summary")
@@ -177,38 +114,9 @@ async def get_revenue_summary(
     else:
         end = datetime.utcnow()
     
-    # Get paid invoices in period
-    result = await db.execute(
-        select(
-            func.sum(Invoice.total).label('total_revenue'),
-            func.sum(Invoice.tax).label('total_tax'),
-            func.count(Invoice.id).label('invoice_count')
-        )
-        .where(
-            and_(
-                Invoice.status == 'paid',
-                Invoice.paid_at >= start,
-                Invoice.paid_at <= end
-            )
-        )
-    )
-    stats = result.first()
-    
-    # Get orders in period
-    order_result = await db.execute(
-        select(
-            func.sum(Order.total).label('total_orders'),
-            func.count(Order.id).label('order_count')
-        )
-        .where(
-            and_(
-                Order.status == 'completed',
-                Order.created_at >= start,
-                Order.created_at <= end
-            )
-        )
-    )
-    order_stats = order_result.first()
+    # Paid invoices (by paid_at) and completed orders, served from the rollups
+    stats = await rollup_service.totals(db, RollupMetric.INVOICE_REVENUE, start, end)
+    order_stats = await rollup_service.totals(db, RollupMetric.ORDERS, start, end, statuses=['completed'])
     
     return {
         "period": {
@@ -216,14 +124,150 @@ async def get_revenue_summary(
             "end_date": end.isoformat()
         },
         "revenue": {
-            "total": float(stats.total_revenue or 0),
-            "tax": float(stats.total_tax or 0),
-            "net": float((stats.total_revenue or 0) - (stats.total_tax or 0)),
-            "invoice_count": stats.invoice_count or 0
+            "total": stats["amount"],
+            "tax": stats["tax"],
+            "net": stats["amount"] - stats["tax"],
+            "invoice_count": stats["count"]
         },
         "orders": {
-            "total": float(order_stats.total_orders or 0),
-            "count": order_stats.order_count or 0
+            "total": order_stats["amount"],
+            "count": order_stats["count"]
         }
     }
 
+
+
+# Background report jobs
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def _job_response(job: ReportJob) -> ReportJobResponse:
+    progress = None
+    if job.status == ReportJobStatus.COMPLETED:
+        progress = 100.0
+    elif job.total_rows:
+        progress = round(100.0 * job.rows_written / job.total_rows, 1)
+    elif job.total_rows == 0:
+        progress = 0.0
+    return ReportJobResponse(
+        id=job.id,
+        kind=job.kind,
+        parameters=job.parameters,
+        status=job.status.value,
+        total_rows=job.total_rows,
+        rows_written=job.rows_written or 0,
+        progress=progress,
+        file_size=job.file_size,
+        error=job.error,
+        download_url=f"/api/v1/reports/jobs/{job.id}/download" if job.status == ReportJobStatus.COMPLETED else None,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        completed_at=job.completed_at
+    )
+
+
+def _parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) for a single "bytes=" range, None to send the whole
+    file (no header, a multi-range request, or a header that does not parse,
+    which RFC 7233 says to ignore); raises 416 if the range is unsatisfiable
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if not re.fullmatch(r"[0-9]*-[0-9]*", spec) or spec == "-":
+        return None
+    first, _, last = spec.partition("-")
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        start, end = (max(0, size - length), size - 1) if length else (size, size - 1)
+    else:
+        start = int(first)
+        if last and int(last) < start:
+            return None  # last-byte-pos before first-byte-pos: invalid, ignored
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+async def _read_file(path: str, start: int, length: int) -> AsyncIterator[bytes]:
+    handle = await asyncio.to_thread(open, path, "rb")
+    try:
+        await asyncio.to_thread(handle.seek, start)
+        while length > 0:
+            chunk = await asyncio.to_thread(handle.read, min(DOWNLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(handle.close)
+
+
+@router.post("/jobs", response_model=ReportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_report_job(
+    request: ReportJobRequest,
+    user_id: str = Depends(verify_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Queue a background export (admin only); poll GET /reports/jobs/{id} for progress"""
+    job = await report_job_worker.enqueue(db, request.kind, request.model_dump(exclude={"kind"}), user_id)
+    await db.commit()
+    logger.info(f"Queued {request.kind} report job {job.id}")
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=ReportJobResponse)
+async def get_report_job(
+    job_id: str,
+    user_id: str = Depends(verify_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Report job status and progress (admin only)"""
+    job = await db.get(ReportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Report job not found")
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_report_job(
+    job_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    user_id: str = Depends(verify_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Download a finished export (gzip CSV, admin only); supports single byte ranges for resuming"""
+    job = await db.get(ReportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Report job not found")
+    if job.status != ReportJobStatus.COMPLETED or not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Report is not ready (status: {job.status.value})")
+
+    size = os.path.getsize(job.file_path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{job.id}-{size}"',
+        "Content-Disposition": f"attachment; filename={job.kind}_export_{job.id[:8]}.csv.gz",
+    }
+    byte_range = _parse_range(range_header, size)
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_read_file(job.file_path, 0, size), media_type="application/gzip", headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _read_file(job.file_path, start, end - start + 1),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type="application/gzip",
+        headers=headers
+    )
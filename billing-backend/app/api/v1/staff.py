@@ -1,13 +1,14 @@
 """
 Staff Management API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_, func
 from typing import List, Optional
 from datetime import datetime
 from app.core.database import get_db
 from app.core.security import get_current_user_id
+from app.core.pagination import paginate, set_next_cursor
 from app.models import (
     User, StaffRole, StaffPermission, StaffRolePermission, UserRole,
     ChatSession, SupportTicket, TicketReply, StaffAuditLog, StaffActivityLog,
@@ -1102,10 +1103,12 @@ async def get_audit_logs(
     offset: int = 0,
     action_type: Optional[str] = None,
     user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    response: Response = None,
     admin_id: str = Depends(verify_admin),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get audit logs"""
+    """Get audit logs (offset or cursor pagination)"""
     query = select(StaffAuditLog)
     
     if action_type:
@@ -1113,10 +1116,11 @@ async def get_audit_logs(
     if user_id:
         query = query.where(StaffAuditLog.performed_by == user_id)
     
-    query = query.order_by(StaffAuditLog.created_at.desc()).limit(limit).offset(offset)
+    query = paginate(query, StaffAuditLog, db, limit, offset=offset, cursor=cursor)
     
     result = await db.execute(query)
     logs = result.scalars().all()
+    set_next_cursor(response, logs, limit)
     
     return [{
         "id": log.id,
@@ -1140,10 +1144,12 @@ async def get_activity_logs(
     entity_type: Optional[str] = None,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
+    response: Response = None,
     admin_id: str = Depends(verify_admin),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get activity logs"""
+    """Get activity logs (offset or cursor pagination)"""
     query = select(StaffActivityLog)
     
     if user_id:
@@ -1153,10 +1159,11 @@ async def get_activity_logs(
     if entity_type:
         query = query.where(StaffActivityLog.entity_type == entity_type)
     
-    query = query.order_by(StaffActivityLog.created_at.desc()).limit(limit).offset(offset)
+    query = paginate(query, StaffActivityLog, db, limit, offset=offset, cursor=cursor)
     
     result = await db.execute(query)
     logs = result.scalars().all()
+    set_next_cursor(response, logs, limit)
     
     return [{
         "id": log.id,
@@ -1,13 +1,15 @@
 """
 Support Ticket System API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_, func
 from typing import List, Optional
 from datetime import datetime, timedelta
 from app.core.database import get_db
 from app.core.security import get_current_user_id
+from app.core.pagination import paginate, set_next_cursor
+from app.core.time_buckets import dialect_name, timestamp_bound
 from app.models import SupportTicket, TicketReply, User, TicketStatus, TicketPriority
 from app.schemas import (
     TicketCreateRequest,
@@ -28,9 +30,13 @@ async def generate_ticket_number(db: AsyncSession) -> str:
     
     # Count tickets today
     today = datetime.utcnow().date()
+    day_start = datetime.combine(today, datetime.min.time())
+    dialect = dialect_name(db)
+    start_col, start = timestamp_bound(SupportTicket.created_at, day_start, dialect)
+    end_col, end = timestamp_bound(SupportTicket.created_at, day_start + timedelta(days=1), dialect)
     result = await db.execute(
         select(func.count(SupportTicket.id))
-        .where(func.date(SupportTicket.created_at) == today)
+        .where(start_col >= start, end_col < end)
     )
     count = result.scalar() or 0
     
@@ -329,9 +335,11 @@ async def admin_list_all_tickets(
     status_filter: str = None,
     priority_filter: str = None,
     limit: int = 50,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    response: Response = None
 ):
-    """List all support tickets (admin only)"""
+    """List all support tickets (admin only, offset or cursor pagination)"""
     await verify_admin(user_id, db)
     
     query = select(SupportTicket)
@@ -342,10 +350,11 @@ async def admin_list_all_tickets(
     if priority_filter:
         query = query.where(SupportTicket.priority == priority_filter)
     
-    query = query.order_by(SupportTicket.created_at.desc()).limit(limit).offset(offset)
+    query = paginate(query, SupportTicket, db, limit, offset=offset, cursor=cursor)
     
     result = await db.execute(query)
     tickets = result.scalars().all()
+    set_next_cursor(response, tickets, limit)
     
     return tickets
 
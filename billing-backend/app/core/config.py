@@ -19,6 +19,15 @@ class Settings(BaseSettings):
     
     # Redis
     REDIS_URL: str = "redis://redis:6379/0"
+    # License validation limits without Redis: licenses and IP addresses
+    # tracked per process, seconds before Redis is tried again after a failure
+    LICENSE_LIMITER_MAX_KEYS: int = 10000
+    LICENSE_LIMITER_REDIS_RETRY: float = 30.0
+    # License validation log (written behind): rows per INSERT, milliseconds
+    # between flushes, rows held while the database cannot be written
+    VALIDATION_LOG_BATCH_SIZE: int = 200
+    VALIDATION_LOG_FLUSH_MS: int = 250
+    VALIDATION_LOG_MAX_PENDING: int = 20000
     
     # Security
     SECRET_KEY: str = "change_this_secret_key_to_something_random"
@@ -44,12 +53,80 @@ class Settings(BaseSettings):
     NEXTPANEL_API_URL: str = "http://localhost:9000/api"
     NEXTPANEL_API_KEY: Optional[str] = None
     
+    # Document numbers: values reserved per process per round-trip (hi/lo)
+    NUMBER_SEQUENCE_BLOCK_SIZE: int = 50
+    
+    # PDF rendering: worker processes (0 = thread, no pool), max queued renders, seconds per render
+    PDF_RENDER_WORKERS: int = 2
+    PDF_RENDER_MAX_QUEUE: int = 64
+    PDF_RENDER_TIMEOUT: float = 30.0
+    # Rendered PDF cache (relative paths are under billing-backend/; 0 bytes disables it)
+    PDF_CACHE_DIR: str = "cache/pdf"
+    PDF_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    
+    # Background report exports: output directory (relative to billing-backend/),
+    # whether the API process runs the worker (disable when scripts/report_worker.py
+    # runs separately), poll interval, seconds without progress before a running
+    # job is re-queued, attempts before a job fails
+    REPORT_EXPORT_DIR: str = "exports/reports"
+    REPORT_WORKER_ENABLED: bool = True
+    REPORT_WORKER_POLL_INTERVAL: float = 2.0
+    REPORT_JOB_STALE_AFTER: int = 600
+    REPORT_JOB_MAX_ATTEMPTS: int = 3
+    
+    # Background scheduler: longest sleep between runs of a job without a known
+    # deadline, how often jobs whose rows other processes write are re-checked
+    # (writes in this process wake the scheduler at once), shortest gap between
+    # two runs of the same job
+    SCHEDULER_MAX_INTERVAL: float = 3600.0
+    SCHEDULER_RESCAN_INTERVAL: float = 300.0
+    SCHEDULER_MIN_INTERVAL: float = 1.0
+    
+    # Automation rules: rules claimed per batch, rules executed concurrently
+    AUTOMATION_BATCH_SIZE: int = 200
+    AUTOMATION_CONCURRENCY: int = 8
+    
+    # Auto-charge: due charge_schedule rows claimed per batch
+    AUTO_CHARGE_BATCH_SIZE: int = 100
+    
+    # Dunning: reminders queued and committed per batch
+    DUNNING_BATCH_SIZE: int = 500
+    
+    # Background job ownership: seconds a job lease or a claimed work item is
+    # held before another worker may take it over (leases are renewed while held)
+    JOB_LEASE_TTL: int = 300
+    
+    # Subscription renewals: subscriptions loaded and committed per batch,
+    # concurrent payment calls within a batch
+    RENEWAL_BATCH_SIZE: int = 500
+    RENEWAL_CONCURRENCY: int = 16
+    
     # Email
     SMTP_HOST: str = "localhost"
     SMTP_PORT: int = 1025
     SMTP_USER: Optional[str] = None
     SMTP_PASSWORD: Optional[str] = None
     EMAIL_FROM: str = "noreply@billing.local"
+    # Pooled SMTP connections: connections kept per server, seconds an idle
+    # connection is reused, messages sent before a connection is recycled
+    SMTP_POOL_SIZE: int = 4
+    SMTP_POOL_IDLE_TIMEOUT: float = 60.0
+    SMTP_POOL_MAX_MESSAGES: int = 100
+    # Email outbox worker: run it in the API process, batch size, concurrent
+    # deliveries, poll seconds, claim lease seconds, attempts before
+    # dead-lettering, retry backoff base/cap seconds, messages per minute per
+    # recipient domain
+    EMAIL_OUTBOX_WORKER_ENABLED: bool = True
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    EMAIL_OUTBOX_CONCURRENCY: int = 8
+    EMAIL_OUTBOX_POLL_INTERVAL: float = 1.0
+    EMAIL_OUTBOX_LEASE_SECONDS: int = 300
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 8
+    EMAIL_OUTBOX_BACKOFF_BASE: float = 30.0
+    EMAIL_OUTBOX_BACKOFF_MAX: float = 6 * 3600.0
+    EMAIL_OUTBOX_DOMAIN_RATE: int = 120
+    # Compiled email templates kept in memory (per process)
+    EMAIL_TEMPLATE_CACHE_SIZE: int = 256
     
     class Config:
         env_file = ".env"
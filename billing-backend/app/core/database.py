@@ -1,6 +1,7 @@
 """
 Database configuration and session management
 """
+from sqlalchemy import inspect
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from app.core.config import settings
@@ -58,6 +59,7 @@ async def get_db():
 async def init_db():
     """Initialize database tables"""
     async with engine.begin() as conn:
+        had_rollups = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("daily_rollups"))
         await conn.run_sync(Base.metadata.create_all)
         
         # Add migration for order_id column if it doesn't exist
@@ -73,4 +75,11 @@ async def init_db():
                 print("✅ Added order_id column to payments table")
         except Exception as e:
             print(f"⚠️ Migration warning: {e}")
-
+    
+    if not had_rollups:
+        # Rollup tables were just created: roll up the existing history, the
+        # dashboard and revenue reports read whole days from them
+        from app.services.rollup_service import rollup_service
+        async with AsyncSessionLocal() as session:
+            await rollup_service.rebuild(session)
+            await session.commit()
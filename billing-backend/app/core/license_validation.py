@@ -15,16 +15,62 @@ except ImportError:
     redis = None
 from app.core.database import get_db
 from app.core.license_security import license_security
-from app.models import License, LicenseValidationLog
+from app.core.local_rate_limiter import LocalUsageCounters
+from app.models import License
 from app.core.config import settings
+from app.services.validation_log_writer import validation_log_writer
 import json
 
 
+# Per-license and per-IP validation limits: (max requests, window seconds)
+LICENSE_RATE_LIMIT = (100, 60)
+IP_RATE_LIMIT = (1000, 3600)
+# Anomaly thresholds: validations per hour, distinct IPs per day
+ANOMALY_MAX_VALIDATIONS = (500, 3600)
+ANOMALY_MAX_IPS = (10, 86400)
+
+# Every rate-limit and anomaly counter in one round trip. Stops at the first
+# exceeded limit, like the checks it replaces, so a rejected request does not
+# count towards the later limits. Returns {license, ip, validations, ips};
+# counters that were not reached are -1.
+USAGE_COUNTERS_SCRIPT = """
+local license_limit, license_window = tonumber(ARGV[1]), tonumber(ARGV[2])
+local ip_limit, ip_window = tonumber(ARGV[3]), tonumber(ARGV[4])
+local validations_limit, validations_window = tonumber(ARGV[5]), tonumber(ARGV[6])
+local ips_window = tonumber(ARGV[7])
+local now = tonumber(ARGV[8])
+
+local license_count = redis.call('INCR', KEYS[1])
+if license_count == 1 then redis.call('EXPIRE', KEYS[1], license_window) end
+if license_count > license_limit then return {license_count, -1, -1, -1} end
+
+local ip_count = redis.call('INCR', KEYS[2])
+if ip_count == 1 then redis.call('EXPIRE', KEYS[2], ip_window) end
+if ip_count > ip_limit then return {license_count, ip_count, -1, -1} end
+
+redis.call('ZADD', KEYS[3], now, ARGV[8])
+redis.call('ZREMRANGEBYSCORE', KEYS[3], 0, now - validations_window)
+local validations = redis.call('ZCARD', KEYS[3])
+if validations > validations_limit then return {license_count, ip_count, validations, -1} end
+
+redis.call('SADD', KEYS[4], ARGV[9])
+redis.call('EXPIRE', KEYS[4], ips_window)
+return {license_count, ip_count, validations, redis.call('SCARD', KEYS[4])}
+"""
+
+
 class LicenseValidator:
     """Validates licenses with rate limiting and anomaly detection"""
     
     def __init__(self):
         self.redis_client: Optional[redis.Redis] = None
+        self._usage_script = None
+        # Used while Redis is unavailable, and for a while after it fails
+        self.local_usage = LocalUsageCounters(
+            LICENSE_RATE_LIMIT, IP_RATE_LIMIT, ANOMALY_MAX_VALIDATIONS, ANOMALY_MAX_IPS,
+            settings.LICENSE_LIMITER_MAX_KEYS
+        )
+        self._redis_retry_at = 0.0
     
     async def get_redis(self):
         """Get Redis connection"""
@@ -75,10 +121,10 @@ class LicenseValidator:
             )
             return False, "Invalid request signature or expired timestamp", None
         
-        # Step 3: Rate limiting check
-        rate_limit_ok, rate_limit_msg = await self._check_rate_limit(
-            license_key, request.client.host if request.client else "unknown"
-        )
+        # Step 3: Rate limiting check (counters for steps 3 and 4 come from one Redis call)
+        ip_address = request.client.host if request.client else "unknown"
+        counters = await self._usage_counters(license_key, ip_address)
+        rate_limit_ok, rate_limit_msg = self._check_rate_limit(counters)
         if not rate_limit_ok:
             await self._log_validation(
                 license_key, feature, False, f"Rate limit exceeded: {rate_limit_msg}",
@@ -87,7 +133,7 @@ class LicenseValidator:
             return False, rate_limit_msg, None
         
         # Step 4: Check for anomaly patterns
-        anomaly_detected = await self._check_anomalies(license_key, request)
+        anomaly_detected = self._check_anomalies(counters)
         if anomaly_detected:
             await self._log_validation(
                 license_key, feature, False, "Anomalous usage pattern detected",
@@ -195,90 +241,67 @@ class LicenseValidator:
         
         return True, None, quota_info
     
-    async def _check_rate_limit(self, license_key: str, ip_address: str) -> Tuple[bool, str]:
+    async def _usage_counters(self, license_key: str, ip_address: str) -> Dict[str, int]:
+        """
+        Rate-limit and anomaly counters for this request, updated and read in
+        one round trip (USAGE_COUNTERS_SCRIPT). Counted in this process
+        instead when Redis is unavailable or has just failed.
+        """
+        now = time.time()
+        redis_client = await self.get_redis() if now >= self._redis_retry_at else None
+        if not redis_client:
+            return self.local_usage.hit(license_key, ip_address)
+        
+        try:
+            if self._usage_script is None:
+                self._usage_script = redis_client.register_script(USAGE_COUNTERS_SCRIPT)
+            license_count, ip_count, validations, ips = await self._usage_script(
+                keys=[
+                    f"license:rate:{license_key}",
+                    f"ip:rate:{ip_address}",
+                    f"license:validations:{license_key}",
+                    f"license:ips:{license_key}",
+                ],
+                args=[
+                    *LICENSE_RATE_LIMIT, *IP_RATE_LIMIT, *ANOMALY_MAX_VALIDATIONS, ANOMALY_MAX_IPS[1],
+                    repr(now), ip_address
+                ]
+            )
+            return {"license": license_count, "ip": ip_count, "validations": validations, "ips": ips}
+        except Exception:
+            # Don't pay a failing connection attempt on every request
+            self._redis_retry_at = now + settings.LICENSE_LIMITER_REDIS_RETRY
+            return self.local_usage.hit(license_key, ip_address)
+    
+    def _check_rate_limit(self, counters: Dict[str, int]) -> Tuple[bool, str]:
         """
         Check rate limits:
         - 100 validations per minute per license
         - 1000 validations per hour per IP
         """
-        redis_client = await self.get_redis()
-        if not redis_client:
-            # If Redis unavailable, allow (graceful degradation)
-            return True, ""
+        if counters["license"] > LICENSE_RATE_LIMIT[0]:
+            return False, "Rate limit exceeded: Too many validations for this license"
         
-        try:
-            # Per-license rate limit (100/minute)
-            license_key_limit = f"license:rate:{license_key}"
-            license_count = await redis_client.incr(license_key_limit)
-            if license_count == 1:
-                await redis_client.expire(license_key_limit, 60)  # 1 minute window
-            
-            if license_count > 100:
-                return False, "Rate limit exceeded: Too many validations for this license"
-            
-            # Per-IP rate limit (1000/hour)
-            ip_key_limit = f"ip:rate:{ip_address}"
-            ip_count = await redis_client.incr(ip_key_limit)
-            if ip_count == 1:
-                await redis_client.expire(ip_key_limit, 3600)  # 1 hour window
-            
-            if ip_count > 1000:
-                return False, "Rate limit exceeded: Too many validations from this IP"
-            
-            return True, ""
-        except Exception as e:
-            # On error, allow (don't block legitimate requests)
-            return True, ""
+        if counters["ip"] > IP_RATE_LIMIT[0]:
+            return False, "Rate limit exceeded: Too many validations from this IP"
+        
+        return True, ""
     
-    async def _check_anomalies(self, license_key: str, request: Request) -> bool:
+    def _check_anomalies(self, counters: Dict[str, int]) -> bool:
         """
         Detect anomalous usage patterns:
-        - Unusual validation frequency
-        - Multiple IP addresses
-        - Suspicious time patterns
+        - More than 500 validations per hour
+        - More than 10 different IP addresses in 24h
         """
-        redis_client = await self.get_redis()
-        if not redis_client:
-            return False
+        # Flag if more than 500 validations per hour (suspicious)
+        if counters["validations"] > ANOMALY_MAX_VALIDATIONS[0]:
+            return True
         
-        try:
-            # Track validation timestamps
-            validation_key = f"license:validations:{license_key}"
-            current_time = time.time()
-            
-            # Add current validation timestamp
-            await redis_client.zadd(validation_key, {str(current_time): current_time})
-            
-            # Keep only last hour of validations
-            one_hour_ago = current_time - 3600
-            await redis_client.zremrangebyscore(validation_key, 0, one_hour_ago)
-            
-            # Count validations in last hour
-            count = await redis_client.zcard(validation_key)
-            
-            # Flag if more than 500 validations per hour (suspicious)
-            if count > 500:
-                return True
-            
-            # Track IP addresses for this license
-            ip_key = f"license:ips:{license_key}"
-            ip_address = request.client.host if request.client else "unknown"
-            
-            # Add IP to set
-            await redis_client.sadd(ip_key, ip_address)
-            await redis_client.expire(ip_key, 86400)  # 24 hours
-            
-            # Count unique IPs
-            ip_count = await redis_client.scard(ip_key)
-            
-            # Flag if license used from more than 10 different IPs in 24h (suspicious)
-            if ip_count > 10:
-                return True
-            
-            return False
-        except Exception:
-            # On error, don't block
-            return False
+        # Flag if license used from more than 10 different IPs in 24h (suspicious)
+        if counters["ips"] > ANOMALY_MAX_IPS[0]:
+            return True
+        
+        return False
     
     async def _log_validation(
         self,
@@ -290,30 +313,21 @@ class LicenseValidator:
         db: Optional[AsyncSession],
         license_id: Optional[str] = None
     ):
-        """Log license validation attempt"""
+        """Log license validation attempt (written behind, see validation_log_writer)"""
         if not db:
             return
         
-        try:
-            ip_address = request.client.host if request.client else "unknown"
-            user_agent = request.headers.get("user-agent", "unknown")
-            
-            log_entry = LicenseValidationLog(
-                license_key=license_key,
-                license_id=license_id,
-                feature=feature,
-                success=success,
-                ip_address=ip_address,
-                user_agent=user_agent[:255],  # Truncate if too long
-                message=message,
-                validated_at=datetime.utcnow()
-            )
-            
-            db.add(log_entry)
-            await db.commit()
-        except Exception:
-            # Don't fail validation if logging fails
-            await db.rollback()
+        ip_address = request.client.host if request.client else "unknown"
+        user_agent = request.headers.get("user-agent", "unknown")
+        validation_log_writer.record(
+            license_key=license_key,
+            license_id=license_id,
+            feature=feature,
+            success=success,
+            ip_address=ip_address,
+            user_agent=user_agent[:255],  # Truncate if too long
+            message=message,
+        )
     
     async def _update_license_fingerprint(
         self,
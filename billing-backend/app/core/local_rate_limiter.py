@@ -0,0 +1,127 @@
+"""
+In-process License Usage Counters
+
+Fallback for the Redis counters behind license validation rate limiting and
+anomaly detection, used when Redis is not configured or not reachable (e.g.
+single-box installs). Counts are per process and use sliding-window counters:
+the previous fixed window's count weighted by how much of it still overlaps the
+sliding window, plus the current window's count. That is two integers per
+window and O(1) per hit, at the cost of assuming hits in the previous window
+were evenly spread.
+
+Memory is bounded: at most max_keys licenses and max_keys IP addresses are
+tracked, and the least recently seen key is dropped first. An evicted key
+simply starts counting again from zero.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class SlidingWindow:
+    """Approximate number of hits in the last `window` seconds"""
+
+    __slots__ = ("window", "start", "current", "previous")
+
+    def __init__(self, window: float):
+        self.window = window
+        self.start = 0.0
+        self.current = 0
+        self.previous = 0
+
+    def hit(self, now: float) -> int:
+        """Record one hit at now and return the count including it"""
+        elapsed = now - self.start
+        if elapsed >= self.window:
+            # Roll over: the current window becomes the previous one, unless
+            # more than a whole window has gone by without hits
+            self.previous = self.current if elapsed < 2 * self.window else 0
+            self.start = now - (elapsed % self.window)
+            self.current = 0
+            elapsed = now - self.start
+        self.current += 1
+        return self.current + int(self.previous * (1 - elapsed / self.window))
+
+
+class LicenseUsage:
+    """Counters kept per license key"""
+
+    __slots__ = ("rate", "validations", "ips")
+
+    def __init__(self, rate_window: float, validations_window: float):
+        self.rate = SlidingWindow(rate_window)
+        self.validations = SlidingWindow(validations_window)
+        # IP address -> last seen, oldest first; capped, see LocalUsageCounters.hit
+        self.ips: "OrderedDict[str, float]" = OrderedDict()
+
+
+class LocalUsageCounters:
+    """Same counters as USAGE_COUNTERS_SCRIPT, kept in this process"""
+
+    def __init__(
+        self,
+        license_limit: Tuple[int, int],
+        ip_limit: Tuple[int, int],
+        max_validations: Tuple[int, int],
+        max_ips: Tuple[int, int],
+        max_keys: int,
+    ):
+        self.license_limit = license_limit
+        self.ip_limit = ip_limit
+        self.max_validations = max_validations
+        self.max_ips = max_ips
+        self.max_keys = max_keys
+        self._licenses: "OrderedDict[str, LicenseUsage]" = OrderedDict()
+        self._addresses: "OrderedDict[str, SlidingWindow]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _touch(entries: OrderedDict, key: str, create, max_keys: int):
+        """Entry for key, marked most recently used; evicts the least recently used"""
+        entry = entries.get(key)
+        if entry is None:
+            entry = entries[key] = create()
+            while len(entries) > max_keys:
+                entries.popitem(last=False)
+        else:
+            entries.move_to_end(key)
+        return entry
+
+    def hit(self, license_key: str, ip_address: str, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        Count one validation and return {license, ip, validations, ips}.
+
+        Stops at the first exceeded limit, like the Redis script: counters not
+        reached are -1 and are not incremented.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            usage = self._touch(
+                self._licenses, license_key,
+                lambda: LicenseUsage(self.license_limit[1], self.max_validations[1]), self.max_keys
+            )
+            license_count = usage.rate.hit(now)
+            if license_count > self.license_limit[0]:
+                return {"license": license_count, "ip": -1, "validations": -1, "ips": -1}
+
+            address = self._touch(
+                self._addresses, ip_address, lambda: SlidingWindow(self.ip_limit[1]), self.max_keys
+            )
+            ip_count = address.hit(now)
+            if ip_count > self.ip_limit[0]:
+                return {"license": license_count, "ip": ip_count, "validations": -1, "ips": -1}
+
+            validations = usage.validations.hit(now)
+            if validations > self.max_validations[0]:
+                return {"license": license_count, "ip": ip_count, "validations": validations, "ips": -1}
+
+            ips = usage.ips
+            ips[ip_address] = now
+            ips.move_to_end(ip_address)
+            while ips and next(iter(ips.values())) <= now - self.max_ips[1]:
+                ips.popitem(last=False)
+            # Only "more than the limit" matters, so one over the limit is enough
+            while len(ips) > self.max_ips[0] + 1:
+                ips.popitem(last=False)
+            return {"license": license_count, "ip": ip_count, "validations": validations, "ips": len(ips)}
@@ -0,0 +1,79 @@
+"""
+Keyset (cursor) pagination
+
+List endpoints order by (created_at DESC, id DESC). Passing the opaque
+cursor returned in the X-Next-Cursor header of a full page switches an
+endpoint from OFFSET to a seek on that composite key, which an index on
+(created_at, id) answers in constant time regardless of page depth.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import String, and_, or_, tuple_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: Optional[datetime], row_id: str) -> str:
+    """Opaque cursor pointing just past the given row"""
+    payload = json.dumps([created_at.isoformat() if created_at else None, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Cursor -> (created_at, id); raises 400 for anything that was not issued by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _seek_condition(model, created_at: datetime, row_id: str, dialect: str):
+    """Rows strictly after (created_at, id) in (created_at DESC, id DESC) order"""
+    created_col, id_col = model.created_at, model.id
+
+    if dialect != "sqlite":
+        # Row-value comparison lets PostgreSQL walk the composite index directly
+        return tuple_(created_col, id_col) < tuple_(created_at, row_id)
+
+    # SQLite keeps timestamps as text: CURRENT_TIMESTAMP defaults are written
+    # without fractional seconds, values from Python with six digits, so an
+    # instant with zero microseconds has two spellings.
+    created_at = created_at.replace(tzinfo=None)
+    if created_at.microsecond == 0:
+        text_col = type_coerce(created_col, String)
+        plain = created_at.strftime("%Y-%m-%d %H:%M:%S")
+        return or_(
+            text_col < plain,
+            and_(text_col.in_([plain, plain + ".000000"]), id_col < row_id),
+        )
+    return or_(created_col < created_at, and_(created_col == created_at, id_col < row_id))
+
+
+def paginate(query, model, db: AsyncSession, limit: int, offset: int = 0, cursor: Optional[str] = None):
+    """
+    Order a select by (created_at DESC, id DESC) and apply either the cursor
+    seek (when a cursor is given) or the legacy OFFSET.
+    """
+    query = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        return query.where(_seek_condition(model, created_at, row_id, db.get_bind().dialect.name))
+    return query.offset(offset)
+
+
+def set_next_cursor(response: Response, rows: Sequence[Any], limit: int) -> Optional[str]:
+    """Expose the cursor for the following page when this page is full"""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    cursor = encode_cursor(last.created_at, last.id)
+    if response is not None:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return cursor
@@ -0,0 +1,157 @@
+"""
+Dialect-aware time bucketing
+
+Builds SQL expressions that truncate a timestamp column to an hour, day,
+week (Monday) or month inside the database, on both SQLite and PostgreSQL,
+plus the matching Python-side helpers to parse bucket keys and fill gaps in
+a single pass.
+"""
+from datetime import datetime, date, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import String, func, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+GRANULARITIES = ("hour", "day", "week", "month")
+
+
+def dialect_name(db: AsyncSession) -> str:
+    """Name of the SQL dialect the session talks to"""
+    return db.get_bind().dialect.name
+
+
+def bucket_expression(column, granularity: str, dialect: str):
+    """SQL expression truncating a timestamp column to the start of its bucket (UTC)"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+
+    if dialect == "postgresql":
+        # timezone('UTC', timestamptz) -> naive UTC timestamp
+        return func.date_trunc(granularity, func.timezone("UTC", column))
+
+    # SQLite stores timestamps as ISO strings in UTC
+    if granularity == "hour":
+        return func.strftime("%Y-%m-%d %H:00:00", column)
+    if granularity == "day":
+        return func.date(column)
+    if granularity == "week":
+        # Move to the next Sunday (or stay), then back six days -> Monday
+        return func.date(column, "weekday 0", "-6 days")
+    return func.strftime("%Y-%m-01", column)
+
+
+def timestamp_bound(column, value: datetime, dialect: str):
+    """
+    (expression, bound) pair for an index-friendly range comparison of a
+    timestamp column against value, e.g. ``expr >= bound``.
+
+    SQLite stores timestamps as text; CURRENT_TIMESTAMP defaults have no
+    fractional seconds while values written from Python have six digits.
+    Spelling a whole-second bound without fractions orders both correctly.
+    """
+    if dialect == "sqlite" and value.microsecond == 0:
+        value = to_naive_utc(value)
+        return type_coerce(column, String), value.strftime("%Y-%m-%d %H:%M:%S")
+    return column, value
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Aware datetime -> naive UTC, comparable with datetime.utcnow(); naive
+    values (SQLite) are assumed to be UTC already and None is passed through
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_bucket(value: Any) -> Optional[datetime]:
+    """Bucket value returned by the database -> naive UTC datetime"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return to_naive_utc(value)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value)[:19])
+
+
+def truncate(value: datetime, granularity: str) -> datetime:
+    """Python equivalent of bucket_expression for a single timestamp"""
+    value = to_naive_utc(value)
+    if granularity == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unsupported granularity: {granularity}")
+
+
+def next_bucket(value: datetime, granularity: str) -> datetime:
+    """Start of the bucket following the one starting at value"""
+    if granularity == "hour":
+        return value + timedelta(hours=1)
+    if granularity == "day":
+        return value + timedelta(days=1)
+    if granularity == "week":
+        return value + timedelta(days=7)
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+def iter_buckets(start: datetime, end: datetime, granularity: str) -> Iterator[datetime]:
+    """Every bucket start from the bucket containing start to the one containing end"""
+    current = truncate(start, granularity)
+    last = truncate(end, granularity)
+    while current <= last:
+        yield current
+        current = next_bucket(current, granularity)
+
+
+async def bucketed_totals(
+    db: AsyncSession,
+    time_column,
+    granularity: str,
+    aggregates: Iterable[Any],
+    where: Iterable[Any] = ()
+) -> Dict[datetime, Tuple]:
+    """
+    Run a GROUP BY bucket query and return {bucket_start: (aggregate values...)}.
+    The heavy lifting happens in the database; only one row per bucket comes back.
+    """
+    bucket = bucket_expression(time_column, granularity, dialect_name(db)).label("bucket")
+    query = select(bucket, *aggregates).group_by(bucket)
+    for condition in where:
+        query = query.where(condition)
+    result = await db.execute(query)
+    return {parse_bucket(row[0]): tuple(row[1:]) for row in result.all()}
+
+
+def fill_series(
+    values: Dict[datetime, Any],
+    slots: Iterable[Tuple[datetime, str]],
+    labels: Optional[List[str]] = None,
+    default: Any = 0
+) -> List[Tuple[str, Any]]:
+    """
+    Map bucketed values onto labelled slots in one linear pass.
+
+    slots yields (bucket_start, label) for every bucket in the range; buckets
+    sharing a label are summed. labels fixes the output order (defaults to the
+    order the labels first appear in slots). Missing buckets get default.
+    """
+    totals: Dict[str, Any] = {label: default for label in labels} if labels is not None else {}
+    for bucket, label in slots:
+        if label not in totals:
+            if labels is not None:
+                continue
+            totals[label] = default
+        value = values.get(bucket)
+        if value is not None:
+            totals[label] = totals[label] + value
+    return list(totals.items())
@@ -118,12 +118,34 @@ async def lifespan(app: FastAPI):
     
     # Start background scheduler
     from app.services.scheduler_service import scheduler
-    from app.core.database import get_db
     import asyncio
     
-    scheduler_task = asyncio.create_task(scheduler.start_with_db(get_db))
+    scheduler_task = asyncio.create_task(scheduler.start())
     logger.info("Background scheduler started")
     
+    # Start and warm up the PDF render workers
+    from app.services.pdf_render_pool import pdf_render_pool
+    try:
+        await pdf_render_pool.start()
+    except Exception as e:
+        logger.error(f"Failed to start PDF render pool: {e}")
+    
+    # Start the background report export worker (unless it runs as scripts/report_worker.py)
+    from app.services.report_job_service import report_job_worker
+    report_task = None
+    if config_settings.REPORT_WORKER_ENABLED:
+        report_task = asyncio.create_task(report_job_worker.start())
+    
+    # Start the email outbox worker (unless it runs as scripts/email_worker.py)
+    from app.services.email_outbox_service import email_outbox_worker
+    email_task = None
+    if config_settings.EMAIL_OUTBOX_WORKER_ENABLED:
+        email_task = asyncio.create_task(email_outbox_worker.start())
+    
+    # Start the license validation log writer
+    from app.services.validation_log_writer import validation_log_writer
+    validation_log_task = asyncio.create_task(validation_log_writer.start())
+    
     yield
     
     # Shutdown
@@ -135,6 +157,31 @@ async def lifespan(app: FastAPI):
     except asyncio.CancelledError:
         pass
     logger.info("Background scheduler stopped")
+    
+    await pdf_render_pool.shutdown()
+    
+    # Not cancelled: it writes the rows still buffered before returning
+    validation_log_writer.stop()
+    await validation_log_task
+    
+    if email_task:
+        email_outbox_worker.stop()
+        email_task.cancel()
+        try:
+            await email_task
+        except asyncio.CancelledError:
+            pass
+    
+    from app.services.email_service import close_smtp_pools
+    await close_smtp_pools()
+    
+    if report_task:
+        report_job_worker.stop()
+        report_task.cancel()
+        try:
+            await report_task
+        except asyncio.CancelledError:
+            pass
 
 
 # Create FastAPI app
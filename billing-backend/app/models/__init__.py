@@ -1,7 +1,7 @@
 """
 Database models
 """
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Float, Enum, ForeignKey, Text, JSON
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Float, Enum, ForeignKey, Text, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -69,6 +69,10 @@ class OrderStatus(str, enum.Enum):
 class User(Base):
     """User model - customers who buy licenses"""
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset pagination: ORDER BY created_at DESC, id DESC
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     email = Column(String(255), unique=True, index=True, nullable=False)
@@ -170,6 +174,10 @@ class License(Base):
 class Subscription(Base):
     """Recurring billing subscriptions"""
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        # Renewal runs: active subscriptions whose period ends soon
+        Index("ix_subscriptions_status_period_end", "status", "current_period_end"),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     license_id = Column(String(36), ForeignKey("licenses.id"), nullable=False)
@@ -252,6 +260,13 @@ class PaymentGateway(Base):
 class Payment(Base):
     """Payment transactions"""
     __tablename__ = "payments"
+    __table_args__ = (
+        # Keyset pagination: ORDER BY created_at DESC, id DESC
+        Index("ix_payments_created_at_id", "created_at", "id"),
+        # Per-owner listings and status/date filters (dashboards, dunning)
+        Index("ix_payments_user_id_created_at", "user_id", "created_at"),
+        Index("ix_payments_status_created_at", "status", "created_at"),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
@@ -299,6 +314,15 @@ class RecurringInterval(str, enum.Enum):
 class Invoice(Base):
     """Invoices for payments"""
     __tablename__ = "invoices"
+    __table_args__ = (
+        # Keyset pagination: ORDER BY created_at DESC, id DESC
+        Index("ix_invoices_created_at_id", "created_at", "id"),
+        # Per-owner listings and status/date filters (dashboards, dunning)
+        Index("ix_invoices_user_id_created_at", "user_id", "created_at"),
+        Index("ix_invoices_status_due_date", "status", "due_date"),
+        # One renewal invoice per (subscription, period), see renewal_engine
+        Index("ix_invoices_idempotency_key", "idempotency_key", unique=True),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
@@ -335,6 +359,7 @@ class Invoice(Base):
     is_recurring = Column(Boolean, default=False)
     recurring_interval = Column(Enum(RecurringInterval))
     recurring_next_date = Column(DateTime(timezone=True))
+    idempotency_key = Column(String(100))  # Set by automated runs that must not bill twice
     recurring_parent_id = Column(String(36), ForeignKey("invoices.id"))
     
     # Additional fields
@@ -396,6 +421,13 @@ class InvoiceTemplate(Base):
 class Order(Base):
     """Customer orders for products"""
     __tablename__ = "orders"
+    __table_args__ = (
+        # Keyset pagination: ORDER BY created_at DESC, id DESC
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        # Per-owner listings and status/date filters (dashboards, dunning)
+        Index("ix_orders_customer_id_created_at", "customer_id", "created_at"),
+        Index("ix_orders_status_created_at", "status", "created_at"),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     customer_id = Column(String(36), ForeignKey("users.id"), nullable=False)
@@ -531,6 +563,10 @@ class TicketPriority(str, enum.Enum):
 class SupportTicket(Base):
     """Support tickets"""
     __tablename__ = "support_tickets"
+    __table_args__ = (
+        # Keyset pagination: ORDER BY created_at DESC, id DESC
+        Index("ix_support_tickets_created_at_id", "created_at", "id"),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
@@ -866,6 +902,10 @@ class PermissionGroupPermission(Base):
 class StaffAuditLog(Base):
     """Audit log for staff management actions"""
     __tablename__ = "staff_audit_logs"
+    __table_args__ = (
+        # Keyset pagination: ORDER BY created_at DESC, id DESC
+        Index("ix_staff_audit_logs_created_at_id", "created_at", "id"),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     action_type = Column(String(50), nullable=False, index=True)  # role_assigned, role_removed, permission_changed, user_edited, etc.
@@ -888,6 +928,10 @@ class StaffAuditLog(Base):
 class StaffActivityLog(Base):
     """Activity log for tracking staff actions (orders modified, tickets handled, etc.)"""
     __tablename__ = "staff_activity_logs"
+    __table_args__ = (
+        # Keyset pagination: ORDER BY created_at DESC, id DESC
+        Index("ix_staff_activity_logs_created_at_id", "created_at", "id"),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False, index=True)
@@ -920,3 +964,20 @@ from app.models.dedicated_server import (
 )
 from app.models.vps_api_key import VPSAPIKey
 
+# Analytics rollups (maintained on flush, see app.models.rollups)
+from app.models.rollups import DailyRollup, HourlyRollup, RollupMetric
+
+# Document number sequences (see app.services.sequence_service)
+from app.models.sequences import NumberSequence
+
+# Background report exports (see app.services.report_job_service)
+from app.models.report_jobs import ReportJob, ReportJobStatus
+
+# Outgoing email queue (see app.services.email_outbox_service)
+from app.models.email_outbox import EmailOutbox, EmailOutboxStatus
+
+# Background job ownership across workers (see app.services.job_lease)
+from app.models.job_leases import JobLease
+
+# Automatic order charges (see app.services.auto_charge_scheduler)
+from app.models.charge_schedule import ChargeSchedule, ChargeScheduleStatus
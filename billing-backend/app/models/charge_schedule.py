@@ -0,0 +1,49 @@
+"""
+Charge Schedule Models
+
+One row per order with automatic charging configured (POST
+/payments/auto-charge/{order_id}). The auto-charge scheduler finds due
+charges with an index range scan on (status, next_charge_date) instead of
+reading Order.auto_charge_config JSON.
+"""
+from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, Enum, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+import enum
+import uuid
+
+
+def generate_uuid():
+    return str(uuid.uuid4())
+
+
+class ChargeScheduleStatus(str, enum.Enum):
+    SCHEDULED = "scheduled"    # charged at next_charge_date
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"          # out of attempts
+    DISABLED = "disabled"      # turned off, or the order no longer needs charging
+
+
+class ChargeSchedule(Base):
+    """Next automatic charge of an order"""
+    __tablename__ = "charge_schedule"
+    __table_args__ = (
+        # Due charges: status = 'scheduled' AND next_charge_date <= now ORDER BY next_charge_date
+        Index("ix_charge_schedule_status_next_charge_date", "status", "next_charge_date"),
+    )
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    order_id = Column(String(36), ForeignKey("orders.id"), nullable=False, unique=True)
+    payment_method_id = Column(String(255))  # Stripe payment method charged
+    status = Column(Enum(ChargeScheduleStatus), nullable=False, default=ChargeScheduleStatus.SCHEDULED)
+    next_charge_date = Column(DateTime(timezone=True), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)  # Charges tried so far
+    # Bumped whenever the schedule is (re)configured; part of the Stripe idempotency key
+    generation = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    retry_interval_days = Column(Integer, nullable=False, default=3)
+    last_attempt_at = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+    configured_by = Column(String(36), ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
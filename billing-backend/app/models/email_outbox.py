@@ -0,0 +1,50 @@
+"""
+Email Outbox Models
+
+Outgoing emails queued by EmailService in the caller's transaction and
+delivered by the outbox worker (app.services.email_outbox_service), with
+retries, per-domain throttling and dead-lettering.
+"""
+from sqlalchemy import Column, String, Integer, Text, DateTime, LargeBinary, Enum, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+import enum
+import uuid
+
+
+def generate_uuid():
+    return str(uuid.uuid4())
+
+
+class EmailOutboxStatus(str, enum.Enum):
+    PENDING = "pending"    # waiting for (re)delivery at next_attempt_at
+    SENDING = "sending"    # claimed by a worker until locked_until
+    SENT = "sent"
+    DEAD = "dead"          # permanently failed or out of attempts
+
+
+class EmailOutbox(Base):
+    """A queued outgoing email"""
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # Worker claim: due pending rows, and expired leases
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    to_email = Column(String(255), nullable=False)
+    recipient_domain = Column(String(255), nullable=False)  # throttling key
+    subject = Column(String(998), nullable=False)
+    body = Column(Text, nullable=False)  # plain text, or HTML when it carries an attachment
+    html_body = Column(Text)
+    attachment_filename = Column(String(255))
+    attachment_content = Column(LargeBinary)
+
+    status = Column(Enum(EmailOutboxStatus), nullable=False, default=EmailOutboxStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    locked_until = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True))
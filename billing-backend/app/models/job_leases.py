@@ -0,0 +1,20 @@
+"""
+Job Lease Models
+
+One row per singleton background job (renewals, dunning, auto-charge, ...).
+The process whose lease has not expired owns the job; see
+app.services.job_lease. PostgreSQL uses advisory locks instead and never
+writes these rows.
+"""
+from sqlalchemy import Column, String, DateTime
+from app.core.database import Base
+
+
+class JobLease(Base):
+    """Current owner of a named background job"""
+    __tablename__ = "job_leases"
+
+    name = Column(String(128), primary_key=True)
+    owner = Column(String(128), nullable=False)
+    acquired_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,53 @@
+"""
+Report Job Models
+
+Queued CSV exports. Rows are created by POST /reports/jobs and processed by
+the report job worker (app.services.report_job_service), which writes the
+gzip-compressed file under REPORT_EXPORT_DIR and records progress here.
+"""
+from sqlalchemy import Column, String, Integer, BigInteger, Text, DateTime, ForeignKey, Enum, JSON, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+import enum
+import uuid
+
+
+def generate_uuid():
+    return str(uuid.uuid4())
+
+
+class ReportJobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class ReportJob(Base):
+    """A background export and its output file"""
+    __tablename__ = "report_jobs"
+    __table_args__ = (
+        # Worker claim: oldest queued job first
+        Index("ix_report_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    kind = Column(String(32), nullable=False)  # orders, invoices, payments
+    parameters = Column(JSON)  # start_date, end_date, status filters
+    status = Column(Enum(ReportJobStatus), nullable=False, default=ReportJobStatus.QUEUED)
+    requested_by = Column(String(36), ForeignKey("users.id"))
+
+    # Progress
+    total_rows = Column(Integer)
+    rows_written = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+
+    # Output (gzip-compressed CSV)
+    file_path = Column(String(500))
+    file_size = Column(BigInteger)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))  # refreshed while running; stale jobs are re-queued
+    completed_at = Column(DateTime(timezone=True))
@@ -0,0 +1,289 @@
+"""
+Analytics Rollup Models
+
+Pre-aggregated per-day (and per-hour for recent days) counters for orders,
+payments, invoices and signups. Rows are kept in sync by a flush listener in
+the same transaction as the writes they summarise; see
+app.services.rollup_service for the read side and the rebuild command.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import Column, String, Integer, Float, Date, DateTime, UniqueConstraint, event, update
+from sqlalchemy.orm import Session, attributes
+from sqlalchemy.sql import func
+from app.core.database import Base
+from app.core.time_buckets import to_naive_utc
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def generate_uuid():
+    return str(uuid.uuid4())
+
+
+# Currency placeholder for metrics that carry no money (e.g. signups)
+NO_CURRENCY = ""
+
+# Hourly rows are only maintained for this many days back
+HOURLY_ROLLUP_RETENTION_DAYS = 2
+
+
+class RollupMetric:
+    """Names of the rolled-up metrics"""
+    ORDERS = "orders"                    # orders by created_at
+    PAYMENTS = "payments"                # payments by created_at
+    INVOICES = "invoices"                # invoices by created_at
+    INVOICE_REVENUE = "invoice_revenue"  # paid invoices by paid_at
+    SIGNUPS = "signups"                  # users by created_at (status: customer/admin)
+
+
+class DailyRollup(Base):
+    """Per-day aggregate for one (metric, status, currency)"""
+    __tablename__ = "daily_rollups"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    metric = Column(String(32), nullable=False)
+    bucket_date = Column(Date, nullable=False)
+    status = Column(String(32), nullable=False, default="")
+    currency = Column(String(3), nullable=False, default=NO_CURRENCY)
+    count = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0.0)
+    tax = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("metric", "bucket_date", "status", "currency", name="uq_daily_rollups_key"),
+    )
+
+
+class HourlyRollup(Base):
+    """Per-hour aggregate for one (metric, status, currency), recent days only"""
+    __tablename__ = "hourly_rollups"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    metric = Column(String(32), nullable=False)
+    bucket_hour = Column(DateTime, nullable=False)  # naive UTC, truncated to the hour
+    status = Column(String(32), nullable=False, default="")
+    currency = Column(String(3), nullable=False, default=NO_CURRENCY)
+    count = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0.0)
+    tax = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("metric", "bucket_hour", "status", "currency", name="uq_hourly_rollups_key"),
+    )
+
+
+def status_key(value: Any) -> str:
+    """Enum or string status -> the lowercase value stored in rollup rows"""
+    if value is None:
+        return ""
+    return str(getattr(value, "value", value)).lower()
+
+
+# ---------------------------------------------------------------------------
+# Flush listener: translate ORM inserts/updates/deletes into rollup deltas
+# ---------------------------------------------------------------------------
+
+# Entry = (metric, timestamp, status, currency, amount, tax)
+Entry = Tuple[str, datetime, str, str, float, float]
+
+
+def _order_entries(v: Dict[str, Any]) -> List[Entry]:
+    # Orders have no currency column; the store bills in USD
+    return [(RollupMetric.ORDERS, v["created_at"], status_key(v["status"]), "USD",
+             float(v["total"] or 0), float(v["tax"] or 0))]
+
+
+def _payment_entries(v: Dict[str, Any]) -> List[Entry]:
+    return [(RollupMetric.PAYMENTS, v["created_at"], status_key(v["status"]),
+             (v["currency"] or "USD").upper(), float(v["amount"] or 0), 0.0)]
+
+
+def _invoice_entries(v: Dict[str, Any]) -> List[Entry]:
+    currency = (v["currency"] or "USD").upper()
+    status = status_key(v["status"])
+    entries = [(RollupMetric.INVOICES, v["created_at"], status, currency,
+                float(v["total"] or 0), float(v["tax"] or 0))]
+    if status == "paid" and v["paid_at"] is not None:
+        entries.append((RollupMetric.INVOICE_REVENUE, v["paid_at"], status, currency,
+                        float(v["total"] or 0), float(v["tax"] or 0)))
+    return entries
+
+
+def _user_entries(v: Dict[str, Any]) -> List[Entry]:
+    return [(RollupMetric.SIGNUPS, v["created_at"], "admin" if v["is_admin"] else "customer",
+             NO_CURRENCY, 0.0, 0.0)]
+
+
+# model name -> (tracked attributes, entry builder)
+TRACKED_MODELS = {
+    "Order": (("created_at", "status", "total", "tax"), _order_entries),
+    "Payment": (("created_at", "status", "currency", "amount"), _payment_entries),
+    "Invoice": (("created_at", "status", "currency", "total", "tax", "paid_at"), _invoice_entries),
+    "User": (("created_at", "is_admin"), _user_entries),
+}
+
+
+def _values(obj, attrs, original: bool) -> Dict[str, Any]:
+    """Current or pre-flush values of the tracked attributes"""
+    values = {}
+    for attr in attrs:
+        if original:
+            hist = attributes.get_history(obj, attr)
+            if hist.deleted:
+                values[attr] = hist.deleted[0]
+                continue
+            if hist.unchanged:
+                values[attr] = hist.unchanged[0]
+                continue
+        values[attr] = getattr(obj, attr)
+    return values
+
+
+def _changed(obj, attrs) -> bool:
+    return any(attributes.get_history(obj, attr).has_changes() for attr in attrs)
+
+
+Deltas = Dict[Tuple[str, str, Any, str, str], List[float]]
+
+
+def _accumulator(deltas: Deltas):
+    """apply(entries, sign) adding entries to deltas, keyed by (granularity, metric, bucket, status, currency)"""
+    now = datetime.utcnow()
+    hourly_cutoff = (now - timedelta(days=HOURLY_ROLLUP_RETENTION_DAYS)).replace(minute=0, second=0, microsecond=0)
+
+    def apply(entries: List[Entry], sign: int):
+        for metric, ts, status, currency, amount, tax in entries:
+            # created_at is a server default, so new rows have no value yet
+            ts = to_naive_utc(ts) or now
+            keys = [("day", metric, ts.date(), status, currency)]
+            hour = ts.replace(minute=0, second=0, microsecond=0)
+            if hour >= hourly_cutoff:
+                keys.append(("hour", metric, hour, status, currency))
+            for key in keys:
+                bucket = deltas.setdefault(key, [0, 0.0, 0.0])
+                bucket[0] += sign
+                bucket[1] += sign * amount
+                bucket[2] += sign * tax
+
+    return apply
+
+
+def _nonzero(deltas: Deltas) -> Deltas:
+    return {k: v for k, v in deltas.items() if v[0] or abs(v[1]) > 1e-9 or abs(v[2]) > 1e-9}
+
+
+def bulk_update_deltas(model_name: str, rows: List[Dict[str, Any]], changes: Dict[str, Any]) -> Deltas:
+    """
+    Rollup changes of a bulk UPDATE, which bypasses the flush listener: rows
+    hold the tracked attributes of each updated row before the update (e.g.
+    from RETURNING), changes the values the update set.
+    """
+    deltas: Deltas = {}
+    apply = _accumulator(deltas)
+    build = TRACKED_MODELS[model_name][1]
+    for row in rows:
+        apply(build(row), -1)
+        apply(build({**row, **changes}), +1)
+    return _nonzero(deltas)
+
+
+def collect_deltas(session: Session) -> Deltas:
+    """Net rollup changes implied by the pending flush, keyed by (granularity, metric, bucket, status, currency)"""
+    deltas: Deltas = {}
+    apply = _accumulator(deltas)
+
+    def tracked(obj):
+        return TRACKED_MODELS.get(type(obj).__name__)
+
+    for obj in session.new:
+        spec = tracked(obj)
+        if spec:
+            apply(spec[1](_values(obj, spec[0], original=False)), +1)
+
+    for obj in session.dirty:
+        spec = tracked(obj)
+        if spec and session.is_modified(obj) and _changed(obj, spec[0]):
+            apply(spec[1](_values(obj, spec[0], original=True)), -1)
+            apply(spec[1](_values(obj, spec[0], original=False)), +1)
+
+    for obj in session.deleted:
+        spec = tracked(obj)
+        if spec:
+            apply(spec[1](_values(obj, spec[0], original=True)), -1)
+
+    return _nonzero(deltas)
+
+
+def _upsert_statement(dialect_name: str, table, bucket_column: str, rows: List[Dict[str, Any]]):
+    """INSERT ... ON CONFLICT DO UPDATE adding the deltas to the existing counters"""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["metric", bucket_column, "status", "currency"],
+        set_={
+            "count": table.c.count + stmt.excluded["count"],
+            "amount": table.c.amount + stmt.excluded.amount,
+            "tax": table.c.tax + stmt.excluded.tax,
+            "updated_at": func.now(),
+        },
+    )
+
+
+def apply_deltas(connection, deltas: Deltas):
+    """Write rollup deltas on the given connection (same transaction as the caller)"""
+    if not deltas:
+        return
+    dialect_name = connection.dialect.name
+    for granularity, model, bucket_column in (
+        ("day", DailyRollup, "bucket_date"),
+        ("hour", HourlyRollup, "bucket_hour"),
+    ):
+        rows = [
+            {
+                "id": generate_uuid(), "metric": metric, bucket_column: bucket,
+                "status": status, "currency": currency,
+                "count": values[0], "amount": values[1], "tax": values[2],
+            }
+            for (gran, metric, bucket, status, currency), values in deltas.items()
+            if gran == granularity
+        ]
+        if not rows:
+            continue
+        table = model.__table__
+        if dialect_name in ("postgresql", "sqlite"):
+            connection.execute(_upsert_statement(dialect_name, table, bucket_column, rows))
+            continue
+        # Generic fallback: update, then insert the keys that did not exist
+        for row in rows:
+            key_filter = (
+                (table.c.metric == row["metric"]) & (table.c[bucket_column] == row[bucket_column])
+                & (table.c.status == row["status"]) & (table.c.currency == row["currency"])
+            )
+            result = connection.execute(
+                update(table).where(key_filter).values(
+                    count=table.c.count + row["count"],
+                    amount=table.c.amount + row["amount"],
+                    tax=table.c.tax + row["tax"],
+                )
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**row))
+
+
+@event.listens_for(Session, "before_flush")
+def _maintain_rollups(session: Session, flush_context, instances):
+    """Keep rollup rows in step with order/payment/invoice/user writes"""
+    if session.info.get("skip_rollups"):
+        return
+    deltas = collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
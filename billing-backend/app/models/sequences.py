@@ -0,0 +1,19 @@
+"""
+Number Sequence Models
+
+Counter rows backing human-readable document numbers (order and invoice
+numbers). Values are handed out by app.services.sequence_service, which
+reserves them in blocks so issuing a number rarely touches the database.
+"""
+from sqlalchemy import Column, String, BigInteger, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class NumberSequence(Base):
+    """Next unreserved value of a named sequence"""
+    __tablename__ = "number_sequences"
+
+    name = Column(String(64), primary_key=True)
+    next_value = Column(BigInteger, nullable=False, default=1)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
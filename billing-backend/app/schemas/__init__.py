@@ -510,6 +510,30 @@ class BulkInvoiceRequest(BaseModel):
     send_email: Optional[bool] = False
 
 
+# Report Job Schemas
+class ReportJobRequest(BaseModel):
+    kind: str = Field(..., pattern="^(orders|invoices|payments)$")
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    status: Optional[str] = None
+
+
+class ReportJobResponse(BaseModel):
+    id: str
+    kind: str
+    parameters: Optional[Dict[str, Any]] = None
+    status: str
+    total_rows: Optional[int] = None
+    rows_written: int
+    progress: Optional[float] = None  # 0-100, once the row count is known
+    file_size: Optional[int] = None
+    error: Optional[str] = None
+    download_url: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+
 # Usage & Quota Schemas
 class QuotaResponse(BaseModel):
     license_id: Optional[str] = None
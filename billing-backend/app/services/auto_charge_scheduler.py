@@ -1,197 +1,299 @@
 """
 Auto-Charge Scheduler Service
-Handles automatic charging of orders based on configuration
+Handles automatic charging of orders based on configuration (charge_schedule
+rows kept in sync by POST /payments/auto-charge/{order_id})
 """
-import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from app.core.database import get_db
-from app.models import Order, OrderStatus
+from sqlalchemy import select, update, func
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import (
+    Order, OrderStatus, Payment, PaymentStatus, PaymentGatewayType,
+    ChargeSchedule, ChargeScheduleStatus
+)
 from app.services.stripe_service import StripeService
+from app.services.job_lease import claim_due
+from app.services.deadline_scheduler import DeadlineScheduler, ScheduledJob
 
 logger = logging.getLogger(__name__)
 
+async def next_charge_due(db: AsyncSession, now: datetime) -> Optional[datetime]:
+    """Earliest scheduled charge"""
+    return (await db.execute(
+        select(func.min(ChargeSchedule.next_charge_date))
+        .where(ChargeSchedule.status == ChargeScheduleStatus.SCHEDULED)
+    )).scalar()
+
+
+def auto_charge_idempotency_key(schedule: ChargeSchedule) -> str:
+    """
+    Stripe idempotency key of the schedule's current attempt. Reconfiguring
+    resets attempts, so the generation keeps the keys of the new configuration
+    apart from the old ones (Stripe remembers keys for 24 hours).
+    """
+    return f"auto-charge:{schedule.id}:{schedule.generation}:{schedule.attempts}"
+
+
+async def upsert_charge_schedule(
+    db: AsyncSession,
+    order: Order,
+    enabled: bool,
+    payment_method_id: Optional[str],
+    next_charge_date: Optional[datetime],
+    max_attempts: int,
+    retry_interval_days: int,
+    configured_by: Optional[str] = None
+) -> ChargeSchedule:
+    """Create or reset the order's charge schedule; the caller commits"""
+    schedule = (await db.execute(
+        select(ChargeSchedule).where(ChargeSchedule.order_id == order.id)
+    )).scalars().first()
+    if schedule is None:
+        schedule = ChargeSchedule(order_id=order.id)
+        db.add(schedule)
+    schedule.payment_method_id = payment_method_id
+    schedule.status = ChargeScheduleStatus.SCHEDULED if enabled else ChargeScheduleStatus.DISABLED
+    schedule.next_charge_date = next_charge_date or datetime.utcnow()
+    schedule.attempts = 0
+    schedule.generation = (schedule.generation or 0) + 1
+    schedule.max_attempts = max_attempts
+    schedule.retry_interval_days = retry_interval_days
+    schedule.last_error = None
+    schedule.configured_by = configured_by
+    return schedule
+
+
 class AutoChargeScheduler:
     """Service for managing automatic charging of orders"""
-    
-    def __init__(self):
+
+    def __init__(self, session_factory=None):
         self.stripe_service = StripeService()
+        self.session_factory = session_factory or AsyncSessionLocal
         self.is_running = False
-    
+        self._deadlines: Optional[DeadlineScheduler] = None
+
+    def scheduled_job(self) -> ScheduledJob:
+        """Runs at the earliest next_charge_date; workers split due charges with claim_due"""
+        return ScheduledJob(
+            "auto-charge",
+            self.process_auto_charge_queue,
+            next_charge_due,
+            max_interval=settings.SCHEDULER_RESCAN_INTERVAL,
+            exclusive=False
+        )
+
     async def start_scheduler(self):
-        """Start the auto-charge scheduler"""
+        """Start the auto-charge scheduler on its own (the API runs it in scheduler_service)"""
         if self.is_running:
             logger.warning("Auto-charge scheduler is already running")
             return
-        
+
         self.is_running = True
         logger.info("Starting auto-charge scheduler")
-        
-        while self.is_running:
-            try:
-                await self.process_auto_charge_queue()
-                # Check every 5 minutes
-                await asyncio.sleep(300)
-            except Exception as e:
-                logger.error(f"Error in auto-charge scheduler: {str(e)}")
-                await asyncio.sleep(60)  # Wait 1 minute before retrying
-    
+        self._deadlines = DeadlineScheduler()
+        self._deadlines.register(self.scheduled_job())
+        await self._deadlines.start()
+
     async def stop_scheduler(self):
         """Stop the auto-charge scheduler"""
         self.is_running = False
+        if self._deadlines:
+            self._deadlines.stop()
         logger.info("Auto-charge scheduler stopped")
-    
-    async def process_auto_charge_queue(self):
-        """Process all orders queued for automatic charging"""
+
+    async def process_auto_charge_queue(self) -> Dict[str, int]:
+        """Charge every order whose scheduled charge is due, a claimed batch at a time"""
+        started = datetime.utcnow()
+        processed = 0
+        successful = 0
+        failed = 0
+
+        lease = timedelta(seconds=settings.JOB_LEASE_TTL)
+        claimed_until = started + lease
         try:
-            # Get database session
-            async for db in get_db():
-                # Find orders ready for auto-charging
-                now = datetime.utcnow()
-                result = await db.execute(
-                    select(Order).where(
-                        and_(
-                            Order.status == OrderStatus.PENDING,
-                            Order.auto_charge_config["enabled"].astext == "true",
-                            Order.auto_charge_config["next_charge_date"].astext <= now.isoformat()
-                        )
+            while True:
+                async with self.session_factory() as db:
+                    claimed = await claim_due(
+                        db,
+                        ChargeSchedule,
+                        ChargeSchedule.next_charge_date,
+                        [ChargeSchedule.status == ChargeScheduleStatus.SCHEDULED],
+                        limit=settings.AUTO_CHARGE_BATCH_SIZE,
+                        lease_seconds=settings.JOB_LEASE_TTL,
+                        now=started,
+                        with_due=True
                     )
-                )
-                orders = result.scalars().all()
-                
-                if not orders:
-                    logger.debug("No orders ready for auto-charging")
-                    return
-                
-                logger.info(f"Processing {len(orders)} orders for auto-charging")
-                
-                processed = 0
-                successful = 0
-                failed = 0
-                
-                for order in orders:
-                    try:
-                        result = await self.process_order_auto_charge(order, db)
-                        if result["success"]:
-                            successful += 1
-                        else:
+                if not claimed:
+                    break
+
+                # Oldest first, like the claim
+                for schedule_id, _ in sorted(claimed, key=lambda item: item[1]):
+                    async with self.session_factory() as db:
+                        # Renew this row's lease just before charging it: a row still queued when
+                        # the batch lease ran out may have been claimed by another worker
+                        renewed = (await db.execute(
+                            update(ChargeSchedule)
+                            .where(
+                                ChargeSchedule.id == schedule_id,
+                                ChargeSchedule.status == ChargeScheduleStatus.SCHEDULED,
+                                ChargeSchedule.next_charge_date == claimed_until
+                            )
+                            .values(next_charge_date=datetime.utcnow() + lease)
+                            .returning(ChargeSchedule.id)
+                            .execution_options(synchronize_session=False)
+                        )).scalar()
+                        await db.commit()
+                        if renewed is None:
+                            continue
+
+                        row = (await db.execute(
+                            select(ChargeSchedule, Order)
+                            .join(Order, ChargeSchedule.order_id == Order.id)
+                            .where(ChargeSchedule.id == schedule_id)
+                        )).first()
+                        if row is None:
+                            continue
+                        schedule, order = row
+                        try:
+                            result = await self.process_order_auto_charge(schedule, order, db)
+                            # Committed per charge so a charge is never left unrecorded behind a lease
+                            await db.commit()
+                            if result["success"]:
+                                successful += 1
+                            else:
+                                failed += 1
+                        except Exception as e:
+                            await db.rollback()
+                            logger.error(f"Error processing auto-charge for order {order.id}: {str(e)}")
                             failed += 1
                         processed += 1
-                    except Exception as e:
-                        logger.error(f"Error processing auto-charge for order {order.id}: {str(e)}")
-                        failed += 1
-                        processed += 1
-                
-                await db.commit()
-                logger.info(f"Auto-charge processing complete: {processed} processed, {successful} successful, {failed} failed")
-                break  # Exit the async generator
-                
         except Exception as e:
             logger.error(f"Error in process_auto_charge_queue: {str(e)}")
-    
-    async def process_order_auto_charge(self, order: Order, db: AsyncSession) -> Dict[str, Any]:
-        """Process auto-charge for a specific order"""
-        try:
-            config = order.auto_charge_config
-            payment_method_id = config.get("payment_method_id")
-            
-            if not payment_method_id:
-                logger.warning(f"No payment method configured for order {order.id}")
-                return {"success": False, "error": "No payment method configured"}
-            
-            # Check retry attempts
-            retry_attempts = config.get("retry_attempts", 0)
-            max_retries = config.get("max_retry_attempts", 3)
-            
-            if retry_attempts >= max_retries:
-                logger.warning(f"Order {order.id} has exceeded max retry attempts ({max_retries})")
-                # Disable auto-charge for this order
-                order.auto_charge_config["enabled"] = False
-                return {"success": False, "error": "Max retry attempts exceeded"}
-            
-            # Process payment with Stripe
-            payment_result = await self.stripe_service.create_payment_intent(
-                amount=order.total,
-                currency="usd",
-                payment_method_id=payment_method_id,
-                metadata={
-                    "order_id": order.id,
-                    "invoice_number": order.invoice_number or order.order_number,
-                    "auto_charge": "true"
-                }
-            )
-            
-            if payment_result["success"]:
-                # Payment succeeded
+
+        if processed:
+            logger.info(f"Auto-charge processing complete: {processed} processed, {successful} successful, {failed} failed")
+        else:
+            logger.debug("No orders ready for auto-charging")
+        return {"processed": processed, "successful": successful, "failed": failed}
+
+    async def process_order_auto_charge(self, schedule: ChargeSchedule, order: Order, db: AsyncSession) -> Dict[str, Any]:
+        """Charge one order per its schedule; the caller commits"""
+        now = datetime.utcnow()
+
+        if order.status != OrderStatus.PENDING:
+            # Paid or cancelled since it was scheduled
+            schedule.status = ChargeScheduleStatus.DISABLED
+            return {"success": False, "error": f"Order is {order.status.value}"}
+
+        if not schedule.payment_method_id:
+            logger.warning(f"No payment method configured for order {order.id}")
+            schedule.status = ChargeScheduleStatus.DISABLED
+            schedule.last_error = "No payment method configured"
+            return {"success": False, "error": "No payment method configured"}
+
+        schedule.attempts += 1
+        schedule.last_attempt_at = now
+
+        # Process payment with Stripe (a retried attempt returns the original intent)
+        payment_result = await self.stripe_service.create_payment_intent(
+            amount=order.total,
+            currency="usd",
+            payment_method_id=schedule.payment_method_id,
+            metadata={
+                "order_id": order.id,
+                "invoice_number": order.invoice_number or order.order_number,
+                "auto_charge": "true"
+            },
+            idempotency_key=auto_charge_idempotency_key(schedule)
+        )
+
+        if payment_result["success"] or (payment_result.get("payment_intent_id") and not payment_result.get("error")):
+            # Still processing intents are settled by the Stripe webhook; never charge twice
+            succeeded = payment_result["success"]
+            if succeeded:
                 order.status = OrderStatus.COMPLETED
-                order.paid_at = datetime.utcnow()
-                order.auto_charge_config["enabled"] = False  # Disable after successful payment
-                logger.info(f"Auto-charge successful for order {order.id}")
-                return {"success": True, "payment_id": payment_result["payment_intent_id"]}
-            else:
-                # Payment failed - schedule retry
-                retry_interval_days = config.get("retry_interval_days", 3)
-                next_charge_date = datetime.utcnow() + timedelta(days=retry_interval_days)
-                
-                order.auto_charge_config["next_charge_date"] = next_charge_date.isoformat()
-                order.auto_charge_config["retry_attempts"] = retry_attempts + 1
-                
-                logger.warning(f"Auto-charge failed for order {order.id}: {payment_result.get('error', 'Unknown error')}")
-                return {"success": False, "error": payment_result.get("error", "Payment failed")}
-                
-        except Exception as e:
-            logger.error(f"Error processing auto-charge for order {order.id}: {str(e)}")
-            return {"success": False, "error": str(e)}
-    
-    async def get_auto_charge_queue_status(self) -> Dict[str, Any]:
+                order.paid_at = now
+            schedule.status = ChargeScheduleStatus.SUCCEEDED
+            schedule.last_error = None
+            if order.auto_charge_config:
+                order.auto_charge_config = {**order.auto_charge_config, "enabled": False}
+            db.add(Payment(
+                user_id=order.customer_id,
+                order_id=order.id,
+                amount=order.total,
+                currency="USD",
+                status=PaymentStatus.SUCCEEDED if succeeded else PaymentStatus.PENDING,
+                payment_method_id=schedule.payment_method_id,
+                gateway_type=PaymentGatewayType.STRIPE,
+                stripe_payment_intent_id=payment_result.get("payment_intent_id"),
+                gateway_transaction_id=payment_result.get("payment_intent_id"),
+                processed_at=now if succeeded else None
+            ))
+            logger.info(f"Auto-charge {'successful' if succeeded else 'submitted'} for order {order.id}")
+            return {"success": True, "payment_id": payment_result.get("payment_intent_id")}
+
+        error = payment_result.get("error", "Payment failed")
+        schedule.last_error = error
+        if schedule.attempts >= schedule.max_attempts:
+            logger.warning(f"Order {order.id} has exceeded max retry attempts ({schedule.max_attempts})")
+            schedule.status = ChargeScheduleStatus.FAILED
+        else:
+            # Payment failed - schedule retry
+            schedule.next_charge_date = now + timedelta(days=schedule.retry_interval_days)
+        logger.warning(f"Auto-charge failed for order {order.id}: {error}")
+        return {"success": False, "error": error}
+
+    async def get_auto_charge_queue_status(self, limit: int = 100) -> Dict[str, Any]:
         """Get status of orders in auto-charge queue"""
         try:
-            async for db in get_db():
+            async with self.session_factory() as db:
                 now = datetime.utcnow()
-                
-                # Get orders ready for charging
-                result = await db.execute(
-                    select(Order).where(
-                        and_(
-                            Order.status == OrderStatus.PENDING,
-                            Order.auto_charge_config["enabled"].astext == "true",
-                            Order.auto_charge_config["next_charge_date"].astext <= now.isoformat()
-                        )
-                    )
-                )
-                ready_orders = result.scalars().all()
-                
-                # Get all orders with auto-charge enabled
-                result = await db.execute(
-                    select(Order).where(
-                        Order.auto_charge_config["enabled"].astext == "true"
-                    )
-                )
-                all_auto_charge_orders = result.scalars().all()
-                
+                ready_orders = await due_charges(db, now, limit)
+                total_scheduled = (await db.execute(
+                    select(func.count(ChargeSchedule.id))
+                    .where(ChargeSchedule.status == ChargeScheduleStatus.SCHEDULED)
+                )).scalar()
+
                 return {
                     "ready_for_charging": len(ready_orders),
-                    "total_auto_charge_enabled": len(all_auto_charge_orders),
+                    "total_auto_charge_enabled": total_scheduled,
                     "scheduler_running": self.is_running,
-                    "ready_orders": [
-                        {
-                            "id": order.id,
-                            "invoice_number": order.invoice_number,
-                            "total": order.total,
-                            "next_charge_date": order.auto_charge_config.get("next_charge_date"),
-                            "retry_attempts": order.auto_charge_config.get("retry_attempts", 0)
-                        }
-                        for order in ready_orders
-                    ]
+                    "ready_orders": ready_orders
                 }
         except Exception as e:
             logger.error(f"Error getting auto-charge queue status: {str(e)}")
             return {"error": str(e)}
 
 
+async def due_charges(db: AsyncSession, now: datetime, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Due scheduled charges with their orders, oldest first (index range scan)"""
+    query = (
+        select(ChargeSchedule, Order)
+        .join(Order, ChargeSchedule.order_id == Order.id)
+        .where(
+            ChargeSchedule.status == ChargeScheduleStatus.SCHEDULED,
+            ChargeSchedule.next_charge_date <= now
+        )
+        .order_by(ChargeSchedule.next_charge_date)
+    )
+    if limit:
+        query = query.limit(limit)
+    return [
+        {
+            "id": order.id,
+            "invoice_number": order.invoice_number,
+            "total": order.total,
+            "next_charge_date": schedule.next_charge_date.isoformat() if schedule.next_charge_date else None,
+            "retry_attempts": schedule.attempts,
+            "max_attempts": schedule.max_attempts
+        }
+        for schedule, order in (await db.execute(query)).all()
+    ]
+
+
 # Global scheduler instance
 scheduler = AutoChargeScheduler()
 
@@ -1,153 +1,230 @@
 """
 Automation Scheduler Service
-Runs periodically to execute automation rules
+Executes due automation rules: drains the backlog in claimed batches with
+bounded concurrency and reports throughput and lag
 """
 import asyncio
 import logging
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, case, func, update
 
-from app.core.database import get_db
-from app.models import OrderAutomationRule, Order, AutomationRuleStatus
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.time_buckets import to_naive_utc
+from app.models import OrderAutomationRule, Order, User, AutomationRuleStatus
 from app.services.automation_service import AutomationService
+from app.services.deadline_scheduler import DeadlineScheduler, ScheduledJob
+from app.services.job_lease import claim_due
 
 logger = logging.getLogger(__name__)
 
 
+async def next_rule_due(db: AsyncSession, now: datetime) -> Optional[datetime]:
+    """Earliest next_execution of an active rule"""
+    return (await db.execute(
+        select(func.min(OrderAutomationRule.next_execution)).where(
+            OrderAutomationRule.is_enabled == True,
+            OrderAutomationRule.status == AutomationRuleStatus.ACTIVE
+        )
+    )).scalar()
+
+
 class AutomationScheduler:
     """Service for scheduling and executing automation rules"""
     
-    def __init__(self):
+    def __init__(self, session_factory=None, batch_size: Optional[int] = None, concurrency: Optional[int] = None):
         self.is_running = False
         self.automation_service = AutomationService()
-        self.check_interval = 60  # Check every 60 seconds
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.batch_size = batch_size or settings.AUTOMATION_BATCH_SIZE
+        self.concurrency = concurrency or settings.AUTOMATION_CONCURRENCY
+        self._deadlines: Optional[DeadlineScheduler] = None
+        # Metrics of the last run that found work, and since process start
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.totals = {"processed": 0, "successful": 0, "failed": 0}
+    
+    def scheduled_job(self) -> ScheduledJob:
+        """Runs when the earliest rule is due; several workers split the rules (claim_due)"""
+        return ScheduledJob(
+            "automation",
+            self.process_pending_rules,
+            next_rule_due,
+            max_interval=settings.SCHEDULER_RESCAN_INTERVAL,
+            exclusive=False
+        )
     
     async def start_scheduler(self):
-        """Start the automation scheduler"""
+        """Start the automation scheduler on its own (the API runs it in scheduler_service)"""
         if self.is_running:
             logger.warning("Automation scheduler is already running")
             return
         
         self.is_running = True
         logger.info("Starting automation scheduler")
-        
-        while self.is_running:
-            try:
-                await self.process_pending_rules()
-                await asyncio.sleep(self.check_interval)
-            except Exception as e:
-                logger.error(f"Error in automation scheduler: {str(e)}", exc_info=True)
-                await asyncio.sleep(60)  # Wait 1 minute before retrying
+        self._deadlines = DeadlineScheduler()
+        self._deadlines.register(self.scheduled_job())
+        await self._deadlines.start()
     
     async def stop_scheduler(self):
         """Stop the automation scheduler"""
         self.is_running = False
+        if self._deadlines:
+            self._deadlines.stop()
         logger.info("Automation scheduler stopped")
     
-    async def process_pending_rules(self):
-        """Process all automation rules that are ready to execute"""
+    async def process_pending_rules(self) -> Dict[str, Any]:
+        """
+        Execute every rule that is due, a claimed batch at a time, until the
+        backlog is drained. Orders and customers of a batch are loaded in two
+        queries and rules run concurrently, each in its own session.
+        """
+        drain_started = datetime.utcnow()
+        run = {"batches": 0, "processed": 0, "successful": 0, "failed": 0, "max_lag_seconds": 0.0}
+        lag_total = 0.0
+        
         try:
-            async for db in get_db():
-                now = datetime.utcnow()
-                
-                # Find rules ready to execute
-                result = await db.execute(
-                    select(OrderAutomationRule)
-                    .where(
-                        and_(
+            while True:
+                async with self.session_factory() as db:
+                    # Only rules due when the drain started: a rule rescheduled
+                    # during the drain waits for its next deadline
+                    claimed = await claim_due(
+                        db,
+                        OrderAutomationRule,
+                        OrderAutomationRule.next_execution,
+                        [
                             OrderAutomationRule.is_enabled == True,
-                            OrderAutomationRule.status == AutomationRuleStatus.ACTIVE,
-                            OrderAutomationRule.next_execution <= now
-                        )
+                            OrderAutomationRule.status == AutomationRuleStatus.ACTIVE
+                        ],
+                        limit=self.batch_size,
+                        now=drain_started,
+                        with_due=True
                     )
-                    .order_by(OrderAutomationRule.next_execution.asc())
-                    .limit(50)  # Process max 50 at a time
-                )
-                rules = result.scalars().all()
-                
-                if not rules:
-                    logger.debug("No automation rules ready to execute")
-                    return
+                    if not claimed:
+                        break
+                    batch = await self._load_batch(db, [rule_id for rule_id, _ in claimed])
                 
-                logger.info(f"Processing {len(rules)} automation rules")
+                started = datetime.utcnow()
+                for _, due in claimed:
+                    lag = (started - to_naive_utc(due)).total_seconds() if due else 0.0
+                    lag_total += lag
+                    run["max_lag_seconds"] = max(run["max_lag_seconds"], lag)
                 
-                processed = 0
-                successful = 0
-                failed = 0
+                semaphore = asyncio.Semaphore(self.concurrency)
                 
-                for rule in rules:
-                    try:
-                        # Get order
-                        result = await db.execute(select(Order).where(Order.id == rule.order_id))
-                        order = result.scalars().first()
-                        
-                        if not order:
-                            logger.warning(f"Order {rule.order_id} not found for rule {rule.id}")
-                            rule.status = AutomationRuleStatus.DISABLED
-                            await db.commit()
-                            continue
-                        
-                        # Execute rule
-                        result = await self.automation_service.execute_rule(rule, order, db)
-                        
-                        if result.get("success"):
-                            successful += 1
-                            logger.info(f"Successfully executed rule {rule.id} for order {rule.order_id}")
-                        else:
-                            failed += 1
-                            logger.warning(f"Failed to execute rule {rule.id}: {result.get('message', 'Unknown error')}")
-                        
-                        processed += 1
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing rule {rule.id}: {str(e)}", exc_info=True)
-                        failed += 1
-                        processed += 1
-                
-                logger.info(f"Automation processing complete: {processed} processed, {successful} successful, {failed} failed")
-                break  # Exit the async generator
+                async def execute(item):
+                    async with semaphore:
+                        return await self._execute(*item)
                 
+                results = await asyncio.gather(*(execute(item) for item in batch))
+                run["batches"] += 1
+                run["processed"] += len(results)
+                run["successful"] += sum(1 for success in results if success)
+                run["failed"] += sum(1 for success in results if not success)
         except Exception as e:
             logger.error(f"Error in process_pending_rules: {str(e)}", exc_info=True)
+        
+        duration = (datetime.utcnow() - drain_started).total_seconds()
+        run["duration_seconds"] = round(duration, 3)
+        run["rules_per_second"] = round(run["processed"] / duration, 2) if duration > 0 else 0.0
+        run["avg_lag_seconds"] = round(lag_total / run["processed"], 3) if run["processed"] else 0.0
+        run["max_lag_seconds"] = round(run["max_lag_seconds"], 3)
+        run["finished_at"] = datetime.utcnow().isoformat()
+        if run["processed"]:
+            self.last_run = run
+            self.totals["processed"] += run["processed"]
+            self.totals["successful"] += run["successful"]
+            self.totals["failed"] += run["failed"]
+            logger.info(
+                f"Automation processing complete: {run['processed']} processed in {run['batches']} batch(es), "
+                f"{run['successful']} successful, {run['failed']} failed, {run['rules_per_second']} rules/s, "
+                f"max lag {run['max_lag_seconds']}s"
+            )
+        else:
+            logger.debug("No automation rules ready to execute")
+        return run
+    
+    async def _load_batch(self, db: AsyncSession, rule_ids: List[str]) -> List[Tuple]:
+        """(rule, order, customer) for the claimed rules; rules whose order is gone are disabled"""
+        rules = (await db.execute(
+            select(OrderAutomationRule).where(OrderAutomationRule.id.in_(rule_ids))
+        )).scalars().all()
+        order_ids = {rule.order_id for rule in rules}
+        orders = {
+            order.id: order
+            for order in (await db.execute(select(Order).where(Order.id.in_(order_ids)))).scalars()
+        }
+        customer_ids = {order.customer_id for order in orders.values()}
+        customers = {
+            user.id: user
+            for user in (await db.execute(select(User).where(User.id.in_(customer_ids)))).scalars()
+        } if customer_ids else {}
+        
+        orphaned = [rule.id for rule in rules if rule.order_id not in orders]
+        if orphaned:
+            logger.warning(f"Disabling {len(orphaned)} automation rule(s) whose order no longer exists")
+            await db.execute(
+                update(OrderAutomationRule)
+                .where(OrderAutomationRule.id.in_(orphaned))
+                .values(status=AutomationRuleStatus.DISABLED)
+            )
+            await db.commit()
+        
+        return [
+            (rule, orders[rule.order_id], customers.get(orders[rule.order_id].customer_id))
+            for rule in rules if rule.order_id in orders
+        ]
+    
+    async def _execute(self, rule: OrderAutomationRule, order: Order, customer: Optional[User]) -> bool:
+        """Run one rule in its own session (sessions cannot be shared between tasks)"""
+        try:
+            async with self.session_factory() as db:
+                rule = await db.merge(rule, load=False)
+                order = await db.merge(order, load=False)
+                if customer is not None:
+                    customer = await db.merge(customer, load=False)
+                result = await self.automation_service.execute_rule(rule, order, db, customer=customer)
+            
+            if result.get("success"):
+                logger.info(f"Successfully executed rule {rule.id} for order {rule.order_id}")
+                return True
+            logger.warning(f"Failed to execute rule {rule.id}: {result.get('message', 'Unknown error')}")
+            return False
+        except Exception as e:
+            logger.error(f"Error processing rule {rule.id}: {str(e)}", exc_info=True)
+            return False
     
     async def get_scheduler_status(self) -> dict:
-        """Get scheduler status"""
+        """Get scheduler status, backlog and throughput/lag of the last run"""
         try:
-            async for db in get_db():
+            async with self.session_factory() as db:
                 now = datetime.utcnow()
-                
-                # Count pending rules
-                result = await db.execute(
-                    select(OrderAutomationRule)
-                    .where(
-                        and_(
-                            OrderAutomationRule.is_enabled == True,
-                            OrderAutomationRule.status == AutomationRuleStatus.ACTIVE,
-                            OrderAutomationRule.next_execution <= now
-                        )
-                    )
+                active = and_(
+                    OrderAutomationRule.is_enabled == True,
+                    OrderAutomationRule.status == AutomationRuleStatus.ACTIVE
                 )
-                pending_count = len(result.scalars().all())
                 
-                # Count total active rules
-                result = await db.execute(
-                    select(OrderAutomationRule)
-                    .where(
-                        and_(
-                            OrderAutomationRule.is_enabled == True,
-                            OrderAutomationRule.status == AutomationRuleStatus.ACTIVE
-                        )
-                    )
-                )
-                total_active = len(result.scalars().all())
+                total_active, pending_count, oldest_due = (await db.execute(
+                    select(
+                        func.count(OrderAutomationRule.id),
+                        func.coalesce(func.sum(case((OrderAutomationRule.next_execution <= now, 1), else_=0)), 0),
+                        func.min(OrderAutomationRule.next_execution)
+                    ).where(active)
+                )).one()
+                oldest_due = to_naive_utc(oldest_due)
                 
                 return {
                     "is_running": self.is_running,
                     "pending_rules": pending_count,
                     "total_active_rules": total_active,
-                    "check_interval_seconds": self.check_interval
+                    "backlog_lag_seconds": round((now - oldest_due).total_seconds(), 3)
+                    if pending_count and oldest_due else 0.0,
+                    "batch_size": self.batch_size,
+                    "concurrency": self.concurrency,
+                    "rescan_interval_seconds": settings.SCHEDULER_RESCAN_INTERVAL,
+                    "last_run": self.last_run,
+                    "totals": dict(self.totals)
                 }
         except Exception as e:
             logger.error(f"Error getting scheduler status: {str(e)}")
@@ -13,6 +13,7 @@ from app.models import (
     AutomationAction, AutomationTrigger, AutomationRuleStatus
 )
 from app.services.email_service import EmailService
+from app.services.email_template_compiler import compile_template
 from app.services.payment_service import PaymentService
 from app.services.stripe_service import StripeService
 
@@ -31,9 +32,10 @@ class AutomationService:
         self,
         rule: OrderAutomationRule,
         order: Order,
-        db: AsyncSession
+        db: AsyncSession,
+        customer: Optional[User] = None
     ) -> Dict[str, Any]:
-        """Execute an automation rule"""
+        """Execute an automation rule (customer: the order's customer, if already loaded)"""
         
         try:
             # Check if rule is enabled
@@ -57,11 +59,11 @@ class AutomationService:
             # Execute based on action type
             result = None
             if rule.action_type == AutomationAction.SEND_EMAIL:
-                result = await self._execute_send_email(rule, order, db)
+                result = await self._execute_send_email(rule, order, db, customer)
             elif rule.action_type == AutomationAction.CHARGE_PAYMENT:
                 result = await self._execute_charge_payment(rule, order, db)
             elif rule.action_type == AutomationAction.SEND_REMINDER:
-                result = await self._execute_send_reminder(rule, order, db)
+                result = await self._execute_send_reminder(rule, order, db, customer)
             elif rule.action_type == AutomationAction.UPDATE_STATUS:
                 result = await self._execute_update_status(rule, order, db)
             else:
@@ -118,7 +120,8 @@ class AutomationService:
         self,
         rule: OrderAutomationRule,
         order: Order,
-        db: AsyncSession
+        db: AsyncSession,
+        customer: Optional[User] = None
     ) -> Dict[str, Any]:
         """Execute send email action"""
         
@@ -130,8 +133,9 @@ class AutomationService:
             template = config.get("template")
             
             # Get customer email
-            result = await db.execute(select(User).where(User.id == order.customer_id))
-            customer = result.scalars().first()
+            if customer is None:
+                result = await db.execute(select(User).where(User.id == order.customer_id))
+                customer = result.scalars().first()
             if not customer or not customer.email:
                 return {
                     "success": False,
@@ -150,7 +154,8 @@ class AutomationService:
                 to_email=customer.email,
                 subject=subject,
                 body=body,
-                html_body=html_body
+                html_body=html_body,
+                db=db
             )
             
             if success:
@@ -246,7 +251,8 @@ class AutomationService:
         self,
         rule: OrderAutomationRule,
         order: Order,
-        db: AsyncSession
+        db: AsyncSession,
+        customer: Optional[User] = None
     ) -> Dict[str, Any]:
         """Execute send reminder action"""
         
@@ -257,8 +263,9 @@ class AutomationService:
             template = config.get("template", "payment_reminder")
             
             # Get customer
-            result = await db.execute(select(User).where(User.id == order.customer_id))
-            customer = result.scalars().first()
+            if customer is None:
+                result = await db.execute(select(User).where(User.id == order.customer_id))
+                customer = result.scalars().first()
             if not customer or not customer.email:
                 return {
                     "success": False,
@@ -279,7 +286,8 @@ class AutomationService:
                 to_email=customer.email,
                 subject=subject,
                 body=body,
-                html_body=html_body
+                html_body=html_body,
+                db=db
             )
             
             if success:
@@ -355,12 +363,12 @@ class AutomationService:
     
     def _render_template(self, template: str, order: Order, customer: User) -> str:
         """Render email template with order and customer data"""
-        # Simple template rendering - can be enhanced with Jinja2
-        template = template.replace("{{customer_name}}", customer.full_name or "Customer")
-        template = template.replace("{{order_number}}", order.invoice_number or order.order_number or order.id)
-        template = template.replace("{{order_total}}", f"${order.total:.2f}")
-        template = template.replace("{{due_date}}", order.due_date.strftime("%Y-%m-%d") if order.due_date else "N/A")
-        return template
+        return compile_template(template).render({
+            "customer_name": customer.full_name or "Customer",
+            "order_number": order.invoice_number or order.order_number or order.id,
+            "order_total": f"${order.total:.2f}",
+            "due_date": order.due_date.strftime("%Y-%m-%d") if order.due_date else "N/A",
+        })
     
     def _render_reminder_template(self, order: Order, customer: User) -> str:
         """Render payment reminder template"""
@@ -0,0 +1,200 @@
+"""
+Dashboard Statistics Service
+Computes the /dashboard/stats metrics with one conditional-aggregation query per table
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import select, func, and_, case
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine, async_sessionmaker
+from sqlalchemy.sql import Select
+
+from app.core.time_buckets import to_naive_utc
+from app.models import (
+    User, License, Plan, Payment, Domain, Subscription,
+    LicenseStatus, PaymentStatus, InvoiceStatus, SubscriptionStatus, OrderStatus
+)
+from app.models.rollups import RollupMetric
+from app.services.rollup_service import rollup_service
+
+logger = logging.getLogger(__name__)
+
+
+def count_where(condition):
+    """COUNT of rows matching condition, portable across SQLite and PostgreSQL"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+class DashboardStatsService:
+    """
+    Builds the dashboard statistics from one aggregate query per table.
+
+    Each table is scanned once with every metric expressed as a conditional
+    aggregate; orders and invoices are read from the daily rollups. When the
+    session is bound to an engine the per-table queries run concurrently, each
+    on its own pooled connection.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        bind = db.bind
+        self._session_factory = (
+            async_sessionmaker(bind, class_=AsyncSession, expire_on_commit=False)
+            if isinstance(bind, AsyncEngine) else None
+        )
+
+    def build_queries(
+        self,
+        period_start: datetime,
+        period_end: datetime,
+        now: datetime
+    ) -> List[Select]:
+        """Return the per-table aggregate statements for the given period"""
+        first_day_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        week_ago = now - timedelta(days=7)
+        day_ago = now - timedelta(days=1)
+
+        # Customers / recent payments (payments in the period)
+        payments_in_period = Payment.created_at.between(period_start, period_end)
+        payments_query = (
+            select(
+                func.count(func.distinct(Payment.user_id)).label("total_customers"),
+                func.count(func.distinct(case(
+                    (and_(User.is_admin == False, User.is_active == True), Payment.user_id),
+                    else_=None
+                ))).label("active_customers"),
+                count_where(and_(
+                    Payment.status == PaymentStatus.SUCCEEDED,
+                    Payment.created_at >= day_ago
+                )).label("recent_payments"),
+            )
+            .select_from(Payment)
+            .outerjoin(User, Payment.user_id == User.id)
+            .where(payments_in_period)
+        )
+
+        # Signups (non-admin users)
+        users_query = (
+            select(
+                count_where(User.created_at >= first_day_of_month).label("new_customers_this_month"),
+                count_where(User.created_at >= week_ago).label("new_customers_this_week"),
+                count_where(User.created_at >= day_ago).label("recent_signups"),
+            )
+            .where(User.is_admin == False)
+        )
+
+        # Products (all time)
+        plans_query = select(
+            func.count(Plan.id).label("total_products"),
+            count_where(Plan.is_active == True).label("active_products"),
+        )
+
+        licenses_query = (
+            select(
+                func.count(License.id).label("total_licenses"),
+                count_where(License.status == LicenseStatus.ACTIVE).label("active_licenses"),
+                count_where(License.status == LicenseStatus.SUSPENDED).label("suspended_licenses"),
+                count_where(License.status == LicenseStatus.EXPIRED).label("expired_licenses"),
+            )
+            .where(License.created_at.between(period_start, period_end))
+        )
+
+        subscriptions_query = (
+            select(
+                func.count(Subscription.id).label("total_subscriptions"),
+                count_where(Subscription.status == SubscriptionStatus.ACTIVE).label("active_subscriptions"),
+                count_where(Subscription.status == SubscriptionStatus.CANCELLED).label("cancelled_subscriptions"),
+            )
+            .where(Subscription.created_at.between(period_start, period_end))
+        )
+
+        domains_query = (
+            select(
+                func.count(Domain.id).label("total_domains"),
+                count_where(Domain.status == "active").label("active_domains"),
+            )
+            .where(Domain.created_at.between(period_start, period_end))
+        )
+
+        return [
+            payments_query,
+            users_query,
+            plans_query,
+            licenses_query,
+            subscriptions_query,
+            domains_query,
+        ]
+
+    async def _order_stats(self, db: AsyncSession, period_start, period_end, now) -> Dict[str, Any]:
+        """Order counts and revenue from the daily rollups"""
+        by_status = await rollup_service.totals_by_status(db, RollupMetric.ORDERS, period_start, period_end)
+        stats = {
+            "total_orders": sum(v["count"] for v in by_status.values()),
+            "pending_orders": by_status.get(OrderStatus.PENDING.value, {}).get("count", 0),
+            "completed_orders": by_status.get(OrderStatus.COMPLETED.value, {}).get("count", 0),
+            "total_revenue": by_status.get(OrderStatus.COMPLETED.value, {}).get("amount", 0.0),
+            "recent_orders": 0,
+        }
+        recent_start = max(to_naive_utc(period_start), now - timedelta(days=1))
+        if recent_start <= to_naive_utc(period_end):
+            recent = await rollup_service.totals(db, RollupMetric.ORDERS, recent_start, period_end)
+            stats["recent_orders"] = recent["count"]
+        return stats
+
+    async def _invoice_stats(self, db: AsyncSession, period_start, period_end, now) -> Dict[str, Any]:
+        """Invoice counts from the daily rollups"""
+        by_status = await rollup_service.totals_by_status(db, RollupMetric.INVOICES, period_start, period_end)
+        count = lambda *statuses: sum(by_status.get(s.value, {}).get("count", 0) for s in statuses)
+        return {
+            "total_invoices": sum(v["count"] for v in by_status.values()),
+            "paid_invoices": count(InvoiceStatus.PAID),
+            "unpaid_invoices": count(InvoiceStatus.OPEN, InvoiceStatus.DRAFT),
+            "overdue_invoices": count(InvoiceStatus.OVERDUE),
+        }
+
+    @staticmethod
+    async def _fetch_one(db: AsyncSession, statement: Select) -> Dict[str, Any]:
+        result = await db.execute(statement)
+        return dict(result.one()._mapping)
+
+    async def _run_isolated(self, task) -> Dict[str, Any]:
+        """Run a task on its own session so it can run concurrently"""
+        async with self._session_factory() as session:
+            return await task(session)
+
+    async def get_stats(
+        self,
+        period_start: datetime,
+        period_end: datetime,
+        now: datetime
+    ) -> Dict[str, Any]:
+        """Return every DashboardStatsResponse field for the period"""
+        tasks = [
+            lambda db, q=q: self._fetch_one(db, q)
+            for q in self.build_queries(period_start, period_end, now)
+        ]
+        tasks.append(lambda db: self._order_stats(db, period_start, period_end, now))
+        tasks.append(lambda db: self._invoice_stats(db, period_start, period_end, now))
+
+        if self._session_factory is not None:
+            rows = await asyncio.gather(*(self._run_isolated(task) for task in tasks))
+        else:
+            # An AsyncSession cannot run statements concurrently, so fall back to
+            # running them one after another on the caller's session.
+            rows = [await task(self.db) for task in tasks]
+
+        stats: Dict[str, Any] = {}
+        for row in rows:
+            stats.update(row)
+
+        for key, value in stats.items():
+            stats[key] = value or 0
+        revenue = float(stats["total_revenue"] or 0.0)
+        # monthly/weekly revenue represent revenue within the selected period
+        stats["total_revenue"] = revenue
+        stats["monthly_revenue"] = revenue
+        stats["weekly_revenue"] = revenue
+
+        return stats
@@ -0,0 +1,218 @@
+"""
+Deadline Scheduler
+
+One in-process loop for all periodic billing work. Each job reports when it
+next has something to do (e.g. the earliest OrderAutomationRule.next_execution)
+and the loop sleeps on a heap of those deadlines until the earliest one, so
+due work runs within about a second and an idle system issues no polling
+queries. Writers call notify() (see the session hooks in scheduler_service)
+to have a job's deadline recomputed immediately, e.g. when a rule due in ten
+seconds is created while the loop sleeps until tomorrow.
+
+A job with no known deadline, or whose deadline is further away than its
+max_interval, still runs every max_interval: this picks up rows written by
+other processes, which cannot wake this loop.
+
+A job whose deadline is still in the past after it ran (it made no progress,
+e.g. it failed or the due rows cannot be processed) is retried with an
+exponential backoff from min_interval up to max_interval instead of every
+min_interval. An exclusive job whose lease another worker holds is not tried
+again before that lease runs out.
+"""
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.time_buckets import to_naive_utc
+
+logger = logging.getLogger(__name__)
+
+# next_due(db, now) -> when the job next has work (None: unknown / nothing pending)
+NextDueFunction = Callable[[Any, datetime], Awaitable[Optional[datetime]]]
+
+
+class ScheduledJob:
+    """A unit of periodic work and how to find its next deadline"""
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[], Awaitable[Any]],
+        next_due: Optional[NextDueFunction] = None,
+        max_interval: Optional[float] = None,
+        min_interval: Optional[float] = None,
+        exclusive: bool = True
+    ):
+        self.name = name
+        self.run = run
+        self.next_due = next_due
+        self.max_interval = max_interval or settings.SCHEDULER_MAX_INTERVAL
+        self.min_interval = settings.SCHEDULER_MIN_INTERVAL if min_interval is None else min_interval
+        # Exclusive jobs run under a job lease (one worker at a time); the others
+        # must split their work themselves (e.g. with job_lease.claim_due)
+        self.exclusive = exclusive
+        self.due: Optional[datetime] = None
+        self.entry = 0  # heap entry holding the current deadline
+        self.last_run: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.runs = 0
+        self.stalled_runs = 0  # consecutive runs after which the job was still due
+        self.blocked_until: Optional[datetime] = None  # another worker's lease
+
+
+class DeadlineScheduler:
+    """Runs registered jobs at their deadlines; wakes early on notify()"""
+
+    def __init__(self, session_factory=None, leases=None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self._leases = leases
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._sequence = 0
+        self._dirty: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.running = False
+
+    @property
+    def leases(self):
+        if self._leases is None:
+            from app.services.job_lease import job_leases
+            self._leases = job_leases
+        return self._leases
+
+    def register(self, job: ScheduledJob):
+        self.jobs[job.name] = job
+
+    def notify(self, *names: str):
+        """Recompute the deadlines of the named jobs (all if none); safe from any thread"""
+        names = names or tuple(self.jobs)
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._mark_dirty(names)
+        else:
+            self._loop.call_soon_threadsafe(self._mark_dirty, names)
+
+    def _mark_dirty(self, names):
+        self._dirty.update(name for name in names if name in self.jobs)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _refresh(self, job: ScheduledJob, after_run: bool = False):
+        """Compute the job's next deadline and push it on the heap"""
+        now = datetime.utcnow()
+        due = None
+        if job.next_due is not None:
+            try:
+                async with self.session_factory() as db:
+                    due = to_naive_utc(await job.next_due(db, now))
+            except Exception as e:
+                logger.error(f"Failed to compute next deadline of {job.name}: {e}")
+        if after_run:
+            stalled = job.last_error is not None or (due is not None and due <= job.last_run)
+            job.stalled_runs = job.stalled_runs + 1 if stalled else 0
+        latest = now + timedelta(seconds=job.max_interval)
+        earliest = now
+        if job.last_run:
+            backoff = min(job.min_interval * 2 ** job.stalled_runs, job.max_interval)
+            earliest = job.last_run + timedelta(seconds=backoff)
+        if job.blocked_until:
+            earliest = max(earliest, job.blocked_until)
+        job.due = latest if due is None else min(max(due, earliest), latest)
+        self._sequence += 1
+        job.entry = self._sequence
+        heapq.heappush(self._heap, (job.due, job.entry, job.name))
+
+    async def run_job(self, job: ScheduledJob):
+        job.last_run = datetime.utcnow()
+        job.runs += 1
+        try:
+            if not job.exclusive:
+                await job.run()
+            else:
+                lease = f"billing:{job.name}"
+                job.blocked_until = None
+                async with self.leases.hold(lease) as owned:
+                    if owned:
+                        await job.run()
+                    else:
+                        logger.info(f"Skipping {job.name}: another worker holds the lease")
+                if not owned:
+                    # Its holder runs the job; look again once the lease would have run out
+                    expires_at = await self.leases.expires_at(lease)
+                    job.blocked_until = to_naive_utc(expires_at) or (
+                        datetime.utcnow() + timedelta(seconds=settings.JOB_LEASE_TTL)
+                    )
+            job.last_error = None
+        except Exception as e:
+            job.last_error = str(e)
+            logger.error(f"Scheduled job {job.name} failed: {e}", exc_info=True)
+
+    async def start(self):
+        """Run until stop()"""
+        self.running = True
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._heap.clear()
+        for job in self.jobs.values():
+            await self._refresh(job)
+        logger.info(f"Deadline scheduler started with jobs: {', '.join(self.jobs)}")
+
+        while self.running:
+            self._wakeup.clear()
+            if self._dirty:
+                dirty, self._dirty = self._dirty, set()
+                for name in dirty:
+                    await self._refresh(self.jobs[name])
+
+            # Entries superseded by a later _refresh of the same job are skipped
+            while self._heap and self._heap[0][1] != self.jobs[self._heap[0][2]].entry:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            due, _, name = self._heap[0]
+            delay = (due - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            job = self.jobs[name]
+            await self.run_job(job)
+            await self._refresh(job, after_run=True)
+
+    def stop(self):
+        self.running = False
+        if self._wakeup is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "jobs": {
+                job.name: {
+                    "next_run": job.due.isoformat() if job.due else None,
+                    "last_run": job.last_run.isoformat() if job.last_run else None,
+                    "runs": job.runs,
+                    "last_error": job.last_error,
+                    "stalled_runs": job.stalled_runs,
+                    "blocked_until": job.blocked_until.isoformat() if job.blocked_until else None,
+                    "exclusive": job.exclusive,
+                }
+                for job in self.jobs.values()
+            },
+        }
@@ -2,18 +2,76 @@
 Dunning Management Service
 Handles payment reminders, retry logic, and grace period management
 """
-import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Any, Dict, List, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
-from app.models import Invoice, InvoiceStatus, Subscription, SubscriptionStatus, User
+from sqlalchemy import select, update, and_, or_, case
+from app.models import Invoice, InvoiceStatus, License, Subscription, SubscriptionStatus, User
 from app.services.email_service import EmailService
 from app.services.invoice_service import InvoiceService
 
 logger = logging.getLogger(__name__)
 
+# Reminders: 7 days before, 3 days before, 1 day before, on due date, 3, 7 and 14 days after
+REMINDER_INTERVALS = [
+    (7, "7 days before due date"),
+    (3, "3 days before due date"),
+    (1, "1 day before due date"),
+    (0, "on due date"),
+    (-3, "3 days overdue"),
+    (-7, "7 days overdue"),
+    (-14, "14 days overdue")
+]
+
+
+def reminder_stage(now: datetime):
+    """
+    The reminder (from REMINDER_INTERVALS) an invoice is due for today: the
+    one whose day its due date falls on, else NULL
+    """
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return case(
+        *[
+            (
+                and_(
+                    Invoice.due_date >= today + timedelta(days=days_offset),
+                    Invoice.due_date < today + timedelta(days=days_offset + 1)
+                ),
+                description
+            )
+            for days_offset, description in REMINDER_INTERVALS
+        ],
+        else_=None
+    )
+
+
+async def due_reminders(db: AsyncSession, now: datetime) -> List[Tuple[Invoice, User, str]]:
+    """Every (invoice, user, reminder) to send today, in one joined query"""
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    offsets = [days_offset for days_offset, _ in REMINDER_INTERVALS]
+    stage = reminder_stage(now)
+    result = await db.execute(
+        select(Invoice, User, stage)
+        .join(User, User.id == Invoice.user_id)
+        .where(
+            and_(
+                Invoice.status.in_([InvoiceStatus.OPEN, InvoiceStatus.OVERDUE]),
+                # Range on ix_invoices_status_due_date spanning all stages
+                Invoice.due_date >= today + timedelta(days=min(offsets)),
+                Invoice.due_date < today + timedelta(days=max(offsets) + 1),
+                stage.isnot(None),
+                # At most one reminder per invoice per day
+                or_(
+                    Invoice.last_reminder_sent.is_(None),
+                    Invoice.last_reminder_sent < today
+                )
+            )
+        )
+        .order_by(Invoice.due_date)
+    )
+    return [tuple(row) for row in result.all()]
+
 
 class DunningService:
     """Service for dunning management"""
@@ -39,78 +97,19 @@ class DunningService:
     
     async def _process_overdue_invoices(self, db: AsyncSession):
         """Mark invoices as overdue"""
-        now = datetime.utcnow()
-        
-        result = await db.execute(
-            select(Invoice)
-            .where(
-                and_(
-                    Invoice.status.in_([InvoiceStatus.OPEN, InvoiceStatus.PARTIALLY_PAID]),
-                    Invoice.due_date < now
-                )
-            )
+        await self.invoice_service.mark_overdue(
+            db, datetime.utcnow(), [InvoiceStatus.OPEN, InvoiceStatus.PARTIALLY_PAID]
         )
-        invoices = result.scalars().all()
-        
-        for invoice in invoices:
-            if invoice.status != InvoiceStatus.OVERDUE:
-                invoice.status = InvoiceStatus.OVERDUE
-                logger.info(f"Marked invoice {invoice.invoice_number} as overdue")
-        
         await db.commit()
     
     async def _send_payment_reminders(self, db: AsyncSession):
         """Send payment reminder emails"""
         now = datetime.utcnow()
-        
-        # Reminders: 7 days before, 3 days before, 1 day before, on due date, 3 days after, 7 days after
-        reminder_intervals = [
-            (7, "7 days before due date"),
-            (3, "3 days before due date"),
-            (1, "1 day before due date"),
-            (0, "on due date"),
-            (-3, "3 days overdue"),
-            (-7, "7 days overdue"),
-            (-14, "14 days overdue")
-        ]
-        
-        for days_offset, description in reminder_intervals:
-            target_date = now + timedelta(days=days_offset)
-            target_date_start = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            target_date_end = target_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-            
-            # Find invoices that need this reminder
-            result = await db.execute(
-                select(Invoice)
-                .where(
-                    and_(
-                        Invoice.status.in_([InvoiceStatus.OPEN, InvoiceStatus.OVERDUE]),
-                        Invoice.due_date >= target_date_start,
-                        Invoice.due_date <= target_date_end,
-                        # Only send if not already sent for this interval
-                        or_(
-                            Invoice.last_reminder_sent.is_(None),
-                            Invoice.last_reminder_sent < target_date_start
-                        )
-                    )
-                )
-            )
-            invoices = result.scalars().all()
-            
-            for invoice in invoices:
-                try:
-                    user_result = await db.execute(select(User).where(User.id == invoice.user_id))
-                    user = user_result.scalars().first()
-                    
-                    if user:
-                        await self._send_reminder_email(invoice, user, description, db)
-                        invoice.last_reminder_sent = now
-                        await db.commit()
-                except Exception as e:
-                    logger.error(f"Error sending reminder for invoice {invoice.id}: {str(e)}")
+        reminders = await due_reminders(db, now)
+        await self.invoice_service.send_payment_reminders(db, reminders, render=self._reminder_email, now=now)
     
-    async def _send_reminder_email(self, invoice: Invoice, user: User, reminder_type: str, db: AsyncSession):
-        """Send payment reminder email"""
+    def _reminder_email(self, invoice: Invoice, user: User, reminder_type: str) -> Dict[str, Any]:
+        """Payment reminder email fields (see InvoiceService.send_payment_reminders)"""
         subject = f"Payment Reminder - Invoice {invoice.invoice_number}"
         
         days_overdue = (datetime.utcnow() - invoice.due_date).days if invoice.due_date else 0
@@ -163,23 +162,18 @@ class DunningService:
         </html>
         """
         
-        await self.email_service.send_email(
-            to_email=user.email,
-            subject=subject,
-            body=body,
-            html_body=html_body
-        )
-        
-        logger.info(f"Sent {reminder_type} reminder for invoice {invoice.invoice_number}")
+        return {"subject": subject, "body": body, "html_body": html_body}
     
     async def _process_grace_periods(self, db: AsyncSession):
         """Process grace periods and suspend services"""
         now = datetime.utcnow()
         grace_period_end = now - timedelta(days=14)  # 14 days grace period
         
-        # Find subscriptions with overdue invoices beyond grace period
+        # Subscriptions with overdue invoices beyond grace period, with their owners
         result = await db.execute(
-            select(Subscription)
+            select(Subscription, User)
+            .join(License, License.id == Subscription.license_id)
+            .join(User, User.id == License.user_id)
             .where(
                 and_(
                     Subscription.status == SubscriptionStatus.ACTIVE,
@@ -195,26 +189,26 @@ class DunningService:
                 )
             )
         )
-        subscriptions = result.scalars().all()
-        
-        for subscription in subscriptions:
+        suspended = result.all()
+        if not suspended:
+            return
+        
+        # Suspend them in one statement, queue the notices, commit once
+        await db.execute(
+            update(Subscription)
+            .where(Subscription.id.in_([subscription.id for subscription, _ in suspended]))
+            .values(status=SubscriptionStatus.PAST_DUE)
+            .execution_options(synchronize_session="fetch")
+        )
+        for subscription, user in suspended:
             try:
-                # Suspend subscription
-                subscription.status = SubscriptionStatus.PAST_DUE
-                
-                # Send suspension notice
-                user_result = await db.execute(select(User).where(User.id == subscription.user_id))
-                user = user_result.scalars().first()
-                
-                if user:
-                    await self._send_suspension_notice(subscription, user)
-                
-                await db.commit()
-                logger.info(f"Suspended subscription {subscription.id} due to overdue payment")
+                await self._send_suspension_notice(subscription, user, db)
             except Exception as e:
-                logger.error(f"Error processing grace period for subscription {subscription.id}: {str(e)}")
+                logger.error(f"Error sending suspension notice for subscription {subscription.id}: {str(e)}")
+        await db.commit()
+        logger.info(f"Suspended {len(suspended)} subscription(s) due to overdue payment")
     
-    async def _send_suspension_notice(self, subscription: Subscription, user: User):
+    async def _send_suspension_notice(self, subscription: Subscription, user: User, db: AsyncSession):
         """Send service suspension notice"""
         subject = "Service Suspended - Payment Required"
         
@@ -245,6 +239,7 @@ class DunningService:
             to_email=user.email,
             subject=subject,
             body=body,
-            html_body=html_body
+            html_body=html_body,
+            db=db
         )
 
@@ -0,0 +1,238 @@
+"""
+Email Outbox Service
+
+EmailService queues every outgoing email as an email_outbox row (in the
+caller's transaction when it passes its session); EmailOutboxWorker drains
+the table in batches over the pooled SMTP transport. Failed deliveries are
+retried with exponential backoff and dead-lettered after
+EMAIL_OUTBOX_MAX_ATTEMPTS or on a permanent (5xx) rejection. Each recipient
+domain is limited to EMAIL_OUTBOX_DOMAIN_RATE messages per minute.
+
+Claims are leases (status sending + locked_until), so rows held by a worker
+that crashed are picked up again once the lease expires.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import EmailOutbox, EmailOutboxStatus
+from app.services.email_service import EmailService, AIOSMTPLIB_AVAILABLE
+
+if AIOSMTPLIB_AVAILABLE:
+    import aiosmtplib
+
+logger = logging.getLogger(__name__)
+
+
+def recipient_domain(email: str) -> str:
+    return email.rpartition("@")[2].strip().lower() or "unknown"
+
+
+async def enqueue_email(
+    db: AsyncSession,
+    to_email: str,
+    subject: str,
+    body: str,
+    html_body: Optional[str] = None,
+    attachment_content: Optional[bytes] = None,
+    attachment_filename: Optional[str] = None
+) -> EmailOutbox:
+    """Add an email to the outbox; it is sent once the caller's transaction commits"""
+    message = EmailOutbox(
+        to_email=to_email,
+        recipient_domain=recipient_domain(to_email),
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        attachment_content=attachment_content,
+        attachment_filename=attachment_filename,
+        status=EmailOutboxStatus.PENDING,
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(message)
+    return message
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """Rejections that retrying will not fix (5xx replies, all recipients refused)"""
+    if not AIOSMTPLIB_AVAILABLE:
+        return False
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, aiosmtplib.SMTPResponseException) and 500 <= error.code < 600
+
+
+class DomainThrottle:
+    """Sliding one-minute window of sends per recipient domain"""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._sent: Dict[str, Deque[float]] = defaultdict(deque)
+
+    def reserve(self, domain: str, now: Optional[float] = None) -> float:
+        """0 and take a slot if the domain may send now, else seconds until it may"""
+        if self.per_minute <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        window = self._sent[domain]
+        while window and window[0] <= now - 60:
+            window.popleft()
+        if len(window) < self.per_minute:
+            window.append(now)
+            return 0.0
+        return window[0] + 60 - now
+
+
+class EmailOutboxWorker:
+    """Delivers queued emails"""
+
+    def __init__(self, session_factory=None, email_service: Optional[EmailService] = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.email_service = email_service
+        self.batch_size = settings.EMAIL_OUTBOX_BATCH_SIZE
+        self.concurrency = settings.EMAIL_OUTBOX_CONCURRENCY
+        self.poll_interval = settings.EMAIL_OUTBOX_POLL_INTERVAL
+        self.max_attempts = settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+        self.throttle = DomainThrottle(settings.EMAIL_OUTBOX_DOMAIN_RATE)
+        self.running = False
+
+    def _claimable(self, now: datetime):
+        return or_(
+            and_(EmailOutbox.status == EmailOutboxStatus.PENDING, EmailOutbox.next_attempt_at <= now),
+            and_(EmailOutbox.status == EmailOutboxStatus.SENDING, EmailOutbox.locked_until < now),
+        )
+
+    async def claim_batch(self) -> List[EmailOutbox]:
+        """Lease up to batch_size due emails to this worker"""
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            ids = (await db.execute(
+                select(EmailOutbox.id).where(self._claimable(now))
+                .order_by(EmailOutbox.next_attempt_at).limit(self.batch_size)
+            )).scalars().all()
+            if not ids:
+                return []
+            # Only rows still claimable are returned, so concurrent workers never share one
+            claimed = (await db.execute(
+                update(EmailOutbox)
+                .where(and_(EmailOutbox.id.in_(ids), self._claimable(now)))
+                .values(
+                    status=EmailOutboxStatus.SENDING,
+                    locked_until=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS)
+                )
+                .returning(EmailOutbox)
+                .execution_options(synchronize_session=False)
+            )).scalars().all()
+            await db.commit()
+            return list(claimed)
+
+    async def _deliver(self, message: EmailOutbox, slots: asyncio.Semaphore) -> Tuple[str, Optional[Exception], float]:
+        """('sent' | 'failed' | 'throttled', error, throttle delay)"""
+        delay = self.throttle.reserve(message.recipient_domain)
+        if delay > 0:
+            return "throttled", None, delay
+        async with slots:
+            try:
+                await (self.email_service or EmailService()).deliver(
+                    to_email=message.to_email,
+                    subject=message.subject,
+                    body=message.body,
+                    html_body=message.html_body,
+                    attachment_content=message.attachment_content,
+                    attachment_filename=message.attachment_filename
+                )
+                return "sent", None, 0.0
+            except Exception as e:
+                return "failed", e, 0.0
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(settings.EMAIL_OUTBOX_BACKOFF_MAX, settings.EMAIL_OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def run_once(self) -> int:
+        """Claim and deliver one batch; returns the number of emails claimed"""
+        batch = await self.claim_batch()
+        if not batch:
+            return 0
+
+        slots = asyncio.Semaphore(self.concurrency)
+        outcomes = await asyncio.gather(*(self._deliver(message, slots) for message in batch))
+
+        now = datetime.utcnow()
+        counts: Dict[str, int] = defaultdict(int)
+        async with self.session_factory() as db:
+            for message, (outcome, error, delay) in zip(batch, outcomes):
+                values = {"locked_until": None}
+                if outcome == "sent":
+                    values.update(status=EmailOutboxStatus.SENT, sent_at=now, attempts=message.attempts + 1, last_error=None)
+                elif outcome == "throttled":
+                    # Not an attempt: try again when the domain has capacity
+                    values.update(status=EmailOutboxStatus.PENDING, next_attempt_at=now + timedelta(seconds=delay))
+                else:
+                    attempts = message.attempts + 1
+                    dead = attempts >= self.max_attempts or is_permanent_failure(error)
+                    values.update(
+                        attempts=attempts,
+                        last_error=str(error)[:2000],
+                        status=EmailOutboxStatus.DEAD if dead else EmailOutboxStatus.PENDING,
+                        next_attempt_at=now + timedelta(seconds=self._backoff(attempts)),
+                    )
+                    outcome = "dead" if dead else "retry"
+                    log = logger.error if dead else logger.warning
+                    log(f"Email {message.id} to {message.to_email} failed (attempt {attempts}): {error}")
+                counts[outcome] += 1
+                await db.execute(update(EmailOutbox).where(EmailOutbox.id == message.id).values(**values))
+            await db.commit()
+
+        logger.info(f"Email outbox batch: {dict(counts)}")
+        return len(batch)
+
+    async def run_pending(self) -> int:
+        """Deliver batches until nothing is due; returns the number of emails claimed"""
+        total = 0
+        while True:
+            claimed = await self.run_once()
+            if not claimed:
+                return total
+            total += claimed
+
+    async def start(self):
+        """Poll the outbox until stop() is called"""
+        self.running = True
+        logger.info("Email outbox worker started")
+        while self.running:
+            try:
+                if await self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Error in email outbox worker: {e}", exc_info=True)
+            await asyncio.sleep(self.poll_interval)
+
+    def stop(self):
+        self.running = False
+        logger.info("Email outbox worker stopped")
+
+    async def retry_dead(self, db: AsyncSession, ids: Optional[List[str]] = None) -> int:
+        """Move dead-lettered emails (all, or the given ids) back to the queue; the caller commits"""
+        condition = EmailOutbox.status == EmailOutboxStatus.DEAD
+        if ids is not None:
+            condition = and_(condition, EmailOutbox.id.in_(ids))
+        result = await db.execute(
+            update(EmailOutbox).where(condition).values(
+                status=EmailOutboxStatus.PENDING, attempts=0, next_attempt_at=datetime.utcnow(), last_error=None
+            )
+        )
+        return result.rowcount
+
+
+email_outbox_worker = EmailOutboxWorker()
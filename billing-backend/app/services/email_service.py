@@ -2,16 +2,21 @@
 Email Service - Handles email notifications
 Integrates with email providers (SendGrid, AWS SES, SMTP)
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
 import logging
 import smtplib
+import time
+import weakref
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 from datetime import datetime
 import os
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
+from app.core.database import AsyncSessionLocal
 
 # Try to import aiosmtplib, but make it optional
 try:
@@ -25,6 +30,150 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
+class _PooledConnection:
+    """An authenticated SMTP client plus its usage bookkeeping"""
+    
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+        self.messages_sent = 0
+
+
+class SMTPConnectionPool:
+    """
+    Keeps up to `size` authenticated SMTP connections open and reuses them
+    across messages, instead of a TCP/TLS handshake and login per email.
+    
+    A connection is replaced when it has been idle longer than idle_timeout
+    (servers drop idle sessions), after max_messages messages, or when a send
+    fails with a connection error (the message is then retried once on a
+    fresh connection).
+    """
+    
+    # Errors after which a connection cannot be reused
+    CONNECTION_ERRORS = (ConnectionError, OSError, asyncio.TimeoutError) + (
+        (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, aiosmtplib.SMTPTimeoutError)
+        if AIOSMTPLIB_AVAILABLE else ()
+    )
+    
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        size: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        max_messages: Optional[int] = None,
+        timeout: float = 30
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size or settings.SMTP_POOL_SIZE
+        self.idle_timeout = settings.SMTP_POOL_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.max_messages = max_messages or settings.SMTP_POOL_MAX_MESSAGES
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(self.size)
+        self._idle: List[_PooledConnection] = []
+        self.connections_opened = 0
+    
+    async def _connect(self) -> _PooledConnection:
+        # 465 is implicit TLS; other ports upgrade with STARTTLS when the server offers it
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            timeout=self.timeout,
+            use_tls=self.port == 465,
+            start_tls=None if self.port != 465 else False
+        )
+        await client.connect()
+        if self.username and self.password:
+            await client.login(self.username, self.password)
+        self.connections_opened += 1
+        return _PooledConnection(client)
+    
+    async def _discard(self, connection: _PooledConnection, polite: bool = True):
+        try:
+            if polite and connection.client.is_connected:
+                await connection.client.quit()
+            else:
+                connection.client.close()
+        except Exception:
+            connection.client.close()
+    
+    async def _checkout(self) -> _PooledConnection:
+        while self._idle:
+            connection = self._idle.pop()
+            idle_for = time.monotonic() - connection.last_used
+            if connection.client.is_connected and idle_for < self.idle_timeout:
+                return connection
+            await self._discard(connection)
+        return await self._connect()
+    
+    def _checkin(self, connection: _PooledConnection):
+        connection.last_used = time.monotonic()
+        connection.messages_sent += 1
+        if connection.messages_sent >= self.max_messages:
+            asyncio.ensure_future(self._discard(connection))
+        else:
+            self._idle.append(connection)
+    
+    async def send_message(self, message) -> None:
+        """Send an email.message on a pooled connection"""
+        async with self._slots:
+            connection = await self._checkout()
+            try:
+                await connection.client.send_message(message)
+            except self.CONNECTION_ERRORS as e:
+                # Stale or broken connection: retry once on a fresh one
+                logger.info(f"SMTP connection to {self.hostname} failed ({e}), reconnecting")
+                await self._discard(connection, polite=False)
+                connection = await self._connect()
+                try:
+                    await connection.client.send_message(message)
+                except BaseException:
+                    await self._discard(connection, polite=False)
+                    raise
+            except Exception:
+                # Message-level rejection (e.g. bad recipient): the session stays usable
+                if connection.client.is_connected:
+                    self._idle.append(connection)
+                raise
+            except BaseException:
+                # Cancelled mid-transaction: the session state is unknown
+                await self._discard(connection, polite=False)
+                raise
+            self._checkin(connection)
+    
+    async def close(self):
+        """Close all idle connections"""
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await self._discard(connection)
+
+
+# One pool per event loop and SMTP account (EmailService is created per use)
+_smtp_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, SMTPConnectionPool]]" = weakref.WeakKeyDictionary()
+
+
+def get_smtp_pool(hostname: str, port: int, username: Optional[str], password: Optional[str]) -> SMTPConnectionPool:
+    """Shared pool for an SMTP account on the running event loop"""
+    pools = _smtp_pools.setdefault(asyncio.get_running_loop(), {})
+    key = (hostname, port, username, password)
+    if key not in pools:
+        pools[key] = SMTPConnectionPool(hostname, port, username, password)
+    return pools[key]
+
+
+async def close_smtp_pools():
+    """Close pooled SMTP connections of the running event loop (application shutdown)"""
+    pools = _smtp_pools.pop(asyncio.get_running_loop(), {})
+    for pool in pools.values():
+        await pool.close()
+
+
 class EmailService:
     """Service for sending email notifications"""
     
@@ -38,66 +187,63 @@ class EmailService:
         self.smtp_password = os.getenv("SMTP_PASSWORD", settings.SMTP_PASSWORD)
         logger.info(f"Initialized EmailService with provider: {provider}, host: {self.smtp_host}:{self.smtp_port}")
     
-    async def send_email(
+    def _smtp_pool(self) -> SMTPConnectionPool:
+        return get_smtp_pool(self.smtp_host, self.smtp_port, self.smtp_user, self.smtp_password)
+    
+    def build_message(
         self,
         to_email: str,
         subject: str,
         body: str,
-        html_body: Optional[str] = None
-    ) -> bool:
-        """Send an email via SMTP"""
-        try:
-            # Create message
+        html_body: Optional[str] = None,
+        attachment_content: Optional[bytes] = None,
+        attachment_filename: Optional[str] = None
+    ) -> MIMEMultipart:
+        """MIME message: text/HTML alternatives, or an HTML body plus attachment"""
+        if attachment_content is None:
             msg = MIMEMultipart('alternative')
             msg['From'] = self.from_email
             msg['To'] = to_email
             msg['Subject'] = subject
             
             # Add text and HTML parts
-            part1 = MIMEText(body, 'plain')
-            msg.attach(part1)
-            
+            msg.attach(MIMEText(body, 'plain'))
             if html_body:
-                part2 = MIMEText(html_body, 'html')
-                msg.attach(part2)
-            
-            # Send email
-            if self.smtp_user and self.smtp_password and AIOSMTPLIB_AVAILABLE:
-                # Use authenticated SMTP
-                await aiosmtplib.send(
-                    msg,
-                    hostname=self.smtp_host,
-                    port=self.smtp_port,
-                    username=self.smtp_user,
-                    password=self.smtp_password,
-                    use_tls=self.smtp_port == 587,
-                    start_tls=self.smtp_port == 587
-                )
-                logger.info(f"Email sent successfully to {to_email}: {subject}")
-                return True
-            else:
-                # Development mode - just log
-                logger.warning(f"SMTP credentials not configured. Email would be sent to {to_email}: {subject}")
-                print(f"\n{'='*60}")
-                print(f"EMAIL (SMTP not configured)")
-                print(f"{'='*60}")
-                print(f"To: {to_email}")
-                print(f"From: {self.from_email}")
-                print(f"Subject: {subject}")
-                print(f"{'='*60}\n")
-                return True
-        except Exception as e:
-            logger.error(f"Failed to send email to {to_email}: {str(e)}", exc_info=True)
-            # In development, still return True to not break workflows
-            if settings.DEBUG:
-                print(f"\n{'='*60}")
-                print(f"EMAIL ERROR (would send in production)")
-                print(f"{'='*60}")
-                print(f"To: {to_email}")
-                print(f"Error: {str(e)}")
-                print(f"{'='*60}\n")
-                return True
-            return False
+                msg.attach(MIMEText(html_body, 'html'))
+            return msg
+        
+        msg = MIMEMultipart()
+        msg['From'] = self.from_email
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        
+        # Add body
+        msg.attach(MIMEText(body, 'html'))
+        
+        # Add attachment
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(attachment_content)
+        encoders.encode_base64(part)
+        part.add_header(
+            'Content-Disposition',
+            f'attachment; filename= {attachment_filename}'
+        )
+        msg.attach(part)
+        return msg
+    
+    async def send_email(
+        self,
+        to_email: str,
+        subject: str,
+        body: str,
+        html_body: Optional[str] = None,
+        db: Optional[AsyncSession] = None
+    ) -> bool:
+        """
+        Queue an email for delivery by the outbox worker. With db, the email
+        is added to the caller's transaction and only goes out if it commits.
+        """
+        return await self._enqueue(db, to_email=to_email, subject=subject, body=body, html_body=html_body)
     
     async def send_email_with_attachment(
         self,
@@ -105,61 +251,59 @@ class EmailService:
         subject: str,
         body: str,
         attachment_content: bytes,
-        attachment_filename: str
+        attachment_filename: str,
+        db: Optional[AsyncSession] = None
     ) -> bool:
-        """Send an email with attachment via SMTP"""
+        """Queue an email with attachment (see send_email)"""
+        return await self._enqueue(
+            db, to_email=to_email, subject=subject, body=body,
+            attachment_content=attachment_content, attachment_filename=attachment_filename
+        )
+    
+    async def _enqueue(self, db: Optional[AsyncSession], **fields) -> bool:
+        from app.services.email_outbox_service import enqueue_email
+        
         try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = self.from_email
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Add body
-            msg.attach(MIMEText(body, 'html'))
-            
-            # Add attachment
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(attachment_content)
-            encoders.encode_base64(part)
-            part.add_header(
-                'Content-Disposition',
-                f'attachment; filename= {attachment_filename}'
-            )
-            msg.attach(part)
-            
-            # Send email
-            if self.smtp_user and self.smtp_password and AIOSMTPLIB_AVAILABLE:
-                await aiosmtplib.send(
-                    msg,
-                    hostname=self.smtp_host,
-                    port=self.smtp_port,
-                    username=self.smtp_user,
-                    password=self.smtp_password,
-                    use_tls=self.smtp_port == 587,
-                    start_tls=self.smtp_port == 587
-                )
-                logger.info(f"Email with attachment sent successfully to {to_email}: {subject}")
-                return True
-            else:
-                logger.warning(f"SMTP credentials not configured. Email with attachment would be sent to {to_email}: {subject}")
-                print(f"\n{'='*60}")
-                print(f"EMAIL WITH ATTACHMENT (SMTP not configured)")
-                print(f"{'='*60}")
-                print(f"To: {to_email}")
-                print(f"Attachment: {attachment_filename} ({len(attachment_content)} bytes)")
-                print(f"{'='*60}\n")
+            if db is not None:
+                await enqueue_email(db, **fields)
                 return True
+            async with AsyncSessionLocal() as session:
+                await enqueue_email(session, **fields)
+                await session.commit()
+            return True
         except Exception as e:
-            logger.error(f"Failed to send email with attachment to {to_email}: {str(e)}", exc_info=True)
-            if settings.DEBUG:
-                print(f"\n{'='*60}")
-                print(f"EMAIL ERROR (would send in production)")
-                print(f"Error: {str(e)}")
-                print(f"{'='*60}\n")
-                return True
+            logger.error(f"Failed to queue email to {fields.get('to_email')}: {str(e)}", exc_info=True)
             return False
     
+    async def deliver(
+        self,
+        to_email: str,
+        subject: str,
+        body: str,
+        html_body: Optional[str] = None,
+        attachment_content: Optional[bytes] = None,
+        attachment_filename: Optional[str] = None
+    ):
+        """Send an email via SMTP now (used by the outbox worker); raises on failure"""
+        msg = self.build_message(to_email, subject, body, html_body, attachment_content, attachment_filename)
+        
+        if self.smtp_user and self.smtp_password and AIOSMTPLIB_AVAILABLE:
+            # Use authenticated SMTP over a pooled connection
+            await self._smtp_pool().send_message(msg)
+            logger.info(f"Email sent successfully to {to_email}: {subject}")
+        else:
+            # Development mode - just log
+            logger.warning(f"SMTP credentials not configured. Email would be sent to {to_email}: {subject}")
+            print(f"\n{'='*60}")
+            print(f"EMAIL (SMTP not configured)")
+            print(f"{'='*60}")
+            print(f"To: {to_email}")
+            print(f"From: {self.from_email}")
+            print(f"Subject: {subject}")
+            if attachment_content is not None:
+                print(f"Attachment: {attachment_filename} ({len(attachment_content)} bytes)")
+            print(f"{'='*60}\n")
+    
     async def send_welcome_email(self, user_email: str, user_name: str) -> bool:
         """Send welcome email to new user"""
         subject = f"Welcome to {self.company_name}!"
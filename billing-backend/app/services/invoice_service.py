@@ -1,12 +1,11 @@
 """
 Invoice Service - Comprehensive invoice generation and management
 """
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, Iterable, List, Optional, Sequence
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func, and_, or_, update
 import logging
-from io import BytesIO
 
 logger = logging.getLogger(__name__)
 
@@ -16,25 +15,24 @@ class InvoiceService:
     
     async def generate_invoice_number(self, db: AsyncSession) -> str:
         """Generate unique invoice number in format INV-YYYY-MM-XXXX"""
+        return (await self.generate_invoice_numbers(db, 1))[0]
+    
+    async def generate_invoice_numbers(self, db: AsyncSession, count: int) -> List[str]:
+        """Reserve count invoice numbers for the current month in one allocation"""
         from app.models import Invoice
+        from app.services.sequence_service import sequence_allocator, seed_from_max
         
         now = datetime.utcnow()
-        year = now.year
-        month = now.month
+        prefix = f"INV-{now.year}-{now.month:02d}-"
         
-        # Count invoices this month
-        result = await db.execute(
-            select(func.count(Invoice.id))
-            .where(
-                func.extract('year', Invoice.created_at) == year,
-                func.extract('month', Invoice.created_at) == month
-            )
-        )
-        count = result.scalar() or 0
+        async def seed(session: AsyncSession) -> int:
+            # Numbers issued for this month before the sequence existed
+            return await seed_from_max(session, Invoice.invoice_number, prefix)
         
-        invoice_number = f"INV-{year}-{month:02d}-{(count + 1):04d}"
-        logger.info(f"Generated invoice number: {invoice_number}")
-        return invoice_number
+        numbers = await sequence_allocator.next_values(db, f"invoice:{now.year}-{now.month:02d}", count, seed=seed)
+        invoice_numbers = [f"{prefix}{number:04d}" for number in numbers]
+        logger.info(f"Generated invoice number(s): {invoice_numbers[0]}" + (f" .. {invoice_numbers[-1]}" if count > 1 else ""))
+        return invoice_numbers
     
     async def calculate_invoice_totals(
         self,
@@ -72,584 +70,68 @@ class InvoiceService:
     
     async def check_overdue_invoices(self, db: AsyncSession):
         """Check and update status of overdue invoices"""
+        count = await self.mark_overdue(db)
+        await db.commit()
+        return count
+    
+    async def mark_overdue(self, db: AsyncSession, now: Optional[datetime] = None, from_statuses: Optional[Sequence[Any]] = None) -> int:
+        """
+        Mark past-due invoices OVERDUE with one UPDATE per source status (OPEN
+        by default). A bulk UPDATE bypasses the flush listeners, so the
+        analytics rollups and PDF cache are updated here. The caller commits.
+        """
         from app.models import Invoice, InvoiceStatus
-        
-        now = datetime.utcnow()
-        
-        # Find open invoices past due date
-        result = await db.execute(
-            select(Invoice).where(
-                and_(
-                    Invoice.status == InvoiceStatus.OPEN,
-                    Invoice.due_date < now
+        from app.models.rollups import apply_deltas, bulk_update_deltas
+        
+        now = now or datetime.utcnow()
+        marked = 0
+        for status in from_statuses or [InvoiceStatus.OPEN]:
+            rows = (await db.execute(
+                update(Invoice)
+                .where(and_(Invoice.status == status, Invoice.due_date < now))
+                .values(status=InvoiceStatus.OVERDUE)
+                .returning(Invoice.id, Invoice.created_at, Invoice.currency, Invoice.total, Invoice.tax, Invoice.paid_at)
+                .execution_options(synchronize_session="fetch")
+            )).mappings().all()
+            if not rows:
+                continue
+            marked += len(rows)
+            if not db.info.get("skip_rollups"):
+                deltas = bulk_update_deltas(
+                    "Invoice", [{**row, "status": status} for row in rows], {"status": InvoiceStatus.OVERDUE}
                 )
-            )
-        )
-        overdue_invoices = result.scalars().all()
-        
-        for invoice in overdue_invoices:
-            invoice.status = InvoiceStatus.OVERDUE
-            logger.info(f"Marked invoice {invoice.invoice_number} as overdue")
+                await db.run_sync(lambda session: apply_deltas(session.connection(), deltas))
+            db.info.setdefault("pdf_cache_invalidate", set()).update(row["id"] for row in rows)
         
-        await db.commit()
-        return len(overdue_invoices)
+        if marked:
+            logger.info(f"Marked {marked} invoice(s) as overdue")
+        return marked
     
     async def generate_pdf(self, invoice: Any, user: Any, company_info: Optional[Dict] = None) -> bytes:
-        """Generate PDF from modal component HTML"""
-        # Try to import weasyprint first
-        try:
-            from weasyprint import HTML
-            from weasyprint.text.fonts import FontConfiguration
-            weasyprint_available = True
-        except ImportError:
-            weasyprint_available = False
-            logger.info("weasyprint not available, will use reportlab fallback")
-        
-        if weasyprint_available:
-            try:
-                # Get invoice data with safe date handling
-                invoice_date = invoice.invoice_date if hasattr(invoice, 'invoice_date') and invoice.invoice_date else (invoice.created_at if hasattr(invoice, 'created_at') and invoice.created_at else datetime.utcnow())
-                if not isinstance(invoice_date, datetime):
-                    if isinstance(invoice_date, str):
-                        try:
-                            invoice_date = datetime.strptime(invoice_date, '%Y-%m-%d %H:%M:%S')
-                        except ValueError:
-                            try:
-                                invoice_date = datetime.strptime(invoice_date, '%Y-%m-%d')
-                            except ValueError:
-                                invoice_date = datetime.utcnow()
-                    else:
-                        invoice_date = datetime.utcnow()
-                
-                due_date = invoice.due_date if hasattr(invoice, 'due_date') and invoice.due_date else (invoice_date + timedelta(days=30))
-                if not isinstance(due_date, datetime):
-                    if isinstance(due_date, str):
-                        try:
-                            due_date = datetime.strptime(due_date, '%Y-%m-%d %H:%M:%S')
-                        except ValueError:
-                            try:
-                                due_date = datetime.strptime(due_date, '%Y-%m-%d')
-                            except ValueError:
-                                due_date = invoice_date + timedelta(days=30)
-                    else:
-                        due_date = invoice_date + timedelta(days=30)
-                
-                invoice_number = invoice.invoice_number if hasattr(invoice, 'invoice_number') and invoice.invoice_number else f"ORD-{str(invoice.id)[:8]}"
-                
-                # Status formatting with safe handling
-                if hasattr(invoice, 'status'):
-                    if hasattr(invoice.status, 'value'):
-                        status = str(invoice.status.value).lower()
-                    else:
-                        status = str(invoice.status).lower()
-                else:
-                    status = 'pending'
-                status_text = status.capitalize()
-                status_bg_color = '#dcfce7' if status == 'paid' else '#fef3c7' if status == 'pending' else '#fee2e2'
-                status_text_color = '#166534' if status == 'paid' else '#92400e' if status == 'pending' else '#991b1b'
-                
-                # Customer info with safe handling
-                customer_name = 'Customer'
-                if user:
-                    if hasattr(user, 'full_name') and user.full_name:
-                        customer_name = user.full_name
-                    elif hasattr(user, 'email') and user.email:
-                        customer_name = user.email.split('@')[0]
-                
-                customer_email = 'customer@example.com'
-                if user and hasattr(user, 'email') and user.email:
-                    customer_email = user.email
-                
-                # Payment method
-                payment_method = ''
-                if hasattr(invoice, 'payment_method') and invoice.payment_method:
-                    payment_method = f'<p>Payment Method: {invoice.payment_method}</p>'
-                
-                # Get invoice totals with safe defaults
-                subtotal = float(getattr(invoice, 'subtotal', 0) or 0)
-                tax = float(getattr(invoice, 'tax', 0) or 0)
-                total = float(getattr(invoice, 'total', 0) or 0)
-                
-                # If total is 0, calculate from items
-                if total == 0 and subtotal == 0:
-                    items_total = sum(
-                        (item.get('unit_price') or item.get('price') or item.get('amount', 0)) * (item.get('quantity', 1))
-                        for item in (invoice.items or [])
-                    )
-                    subtotal = items_total
-                    total = subtotal + tax
-                
-                # Build items table rows
-                items_rows = ''
-                for item in (invoice.items or []):
-                    if isinstance(item, dict):
-                        unit_price = float(item.get('unit_price') or item.get('price') or item.get('amount', 0))
-                        quantity = int(item.get('quantity', 1))
-                        total_item = unit_price * quantity
-                        description = item.get('description', item.get('product_name', 'Item'))
-                    else:
-                        # Handle object attributes
-                        unit_price = float(getattr(item, 'unit_price', getattr(item, 'price', getattr(item, 'amount', 0))) or 0)
-                        quantity = int(getattr(item, 'quantity', 1) or 1)
-                        total_item = unit_price * quantity
-                        description = getattr(item, 'description', getattr(item, 'product_name', 'Item'))
-                    
-                    items_rows += f'''
-                <tr>
-                  <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">{description}</td>
-                  <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">{quantity}</td>
-                  <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${unit_price:.2f}</td>
-                  <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${total_item:.2f}</td>
-                </tr>
-                '''
-                
-                # Create HTML matching the modal component exactly
-                html_content = f'''
-<!DOCTYPE html>
-<html>
-<head>
-  <meta charset="UTF-8">
-  <style>
-    * {{
-      margin: 0;
-      padding: 0;
-      box-sizing: border-box;
-    }}
-    body {{
-      font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
-      background: white;
-      padding: 20px;
-    }}
-    .invoice-container {{
-      max-width: 1200px;
-      margin: 0 auto;
-      border: 1px solid #e5e7eb;
-      border-radius: 8px;
-      background: white;
-      box-shadow: 0 1px 3px 0 rgba(0, 0, 0, 0.1);
-      padding: 20px;
-    }}
-    .invoice-header {{
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-      margin-bottom: 16px;
-      padding-bottom: 16px;
-      border-bottom: 1px solid #e5e7eb;
-    }}
-    .invoice-title {{
-      font-size: 18px;
-      font-weight: 500;
-      color: #111827;
-    }}
-    .invoice-content {{
-      margin-top: 20px;
-    }}
-    .grid {{
-      display: grid;
-      grid-template-columns: 1fr 1fr;
-      gap: 24px;
-      margin-bottom: 24px;
-    }}
-    .bill-to h4, .invoice-details h4 {{
-      font-size: 14px;
-      font-weight: 500;
-      color: #111827;
-      margin-bottom: 8px;
-    }}
-    .bill-to p, .invoice-details p {{
-      font-size: 12px;
-      color: #4b5563;
-      margin-bottom: 4px;
-    }}
-    .status-badge {{
-      display: inline-flex;
-      align-items: center;
-      padding: 4px 10px;
-      border-radius: 9999px;
-      font-size: 12px;
-      font-weight: 500;
-      background-color: {status_bg_color};
-      color: {status_text_color};
-    }}
-    .table-container {{
-      overflow: hidden;
-      box-shadow: 0 1px 3px 0 rgba(0, 0, 0, 0.1);
-      border-radius: 8px;
-    }}
-    table {{
-      width: 100%;
-      border-collapse: collapse;
-    }}
-    thead {{
-      background-color: #f9fafb;
-    }}
-    th {{
-      padding: 12px 24px;
-      text-align: left;
-      font-size: 12px;
-      font-weight: 500;
-      color: #6b7280;
-      text-transform: uppercase;
-      letter-spacing: 0.05em;
-    }}
-    tbody tr {{
-      border-top: 1px solid #e5e7eb;
-    }}
-    tbody td {{
-      padding: 16px 24px;
-      font-size: 14px;
-      color: #111827;
-    }}
-    tfoot {{
-      background-color: #f9fafb;
-    }}
-    tfoot tr {{
-      border-top: 1px solid #e5e7eb;
-    }}
-    tfoot td {{
-      padding: 16px 24px;
-      font-size: 14px;
-      color: #111827;
-    }}
-    tfoot td:first-child {{
-      text-align: right;
-      font-weight: 500;
-    }}
-    tfoot tr:last-child td {{
-      font-weight: 600;
-    }}
-  </style>
-</head>
-<body>
-  <div class="invoice-container">
-    <div class="invoice-header">
-      <h3 class="invoice-title">Invoice {invoice_number}</h3>
-    </div>
-    
-    <div class="invoice-content">
-      <div class="grid">
-        <div class="bill-to">
-          <h4>Bill To:</h4>
-          <div>
-            <p>{customer_name}</p>
-            <p>{customer_email}</p>
-            <p>Address not available</p>
-          </div>
-        </div>
-        <div class="invoice-details">
-          <h4>Invoice Details:</h4>
-          <div>
-            <p>Date: {invoice_date.strftime("%m/%d/%Y") if hasattr(invoice_date, 'strftime') else str(invoice_date)[:10]}</p>
-            <p>Due: {due_date.strftime("%m/%d/%Y") if hasattr(due_date, 'strftime') else str(due_date)[:10]}</p>
-            <p>Status: <span class="status-badge">{status_text}</span></p>
-            {payment_method}
-          </div>
-        </div>
-      </div>
-      
-      <div class="table-container">
-        <table>
-          <thead>
-            <tr>
-              <th>Description</th>
-              <th>Qty</th>
-              <th>Price</th>
-              <th>Total</th>
-            </tr>
-          </thead>
-          <tbody>
-            {items_rows}
-          </tbody>
-          <tfoot>
-            <tr>
-              <td colspan="3">Subtotal:</td>
-              <td>${subtotal:.2f}</td>
-            </tr>
-            <tr>
-              <td colspan="3">Tax:</td>
-              <td>${tax:.2f}</td>
-            </tr>
-            <tr>
-              <td colspan="3">Total:</td>
-              <td>${total:.2f}</td>
-            </tr>
-          </tfoot>
-        </table>
-      </div>
-    </div>
-  </div>
-</body>
-</html>
-            '''
-                
-                # Convert HTML to PDF using WeasyPrint
-                font_config = FontConfiguration()
-                html_doc = HTML(string=html_content)
-                pdf_bytes = html_doc.write_pdf(font_config=font_config)
-                
-                logger.info(f"Generated PDF from modal component HTML for invoice {invoice_number}")
-                return pdf_bytes
-            except Exception as e:
-                logger.error(f"Error generating PDF with weasyprint: {e}", exc_info=True)
-                logger.info("Falling back to reportlab PDF generation")
-                # Fallback to reportlab on error
-                try:
-                    return await self._generate_pdf_fallback(invoice, user, company_info)
-                except Exception as fallback_error:
-                    logger.error(f"Fallback PDF generation also failed: {fallback_error}", exc_info=True)
-                    logger.error(f"Fallback error type: {type(fallback_error).__name__}", exc_info=True)
-                    raise Exception(f"PDF generation failed: {str(e)}. Fallback also failed: {str(fallback_error)}")
-        else:
-            # weasyprint not available, use fallback
-            logger.info("Using reportlab fallback for PDF generation")
-            try:
-                return await self._generate_pdf_fallback(invoice, user, company_info)
-            except Exception as e:
-                logger.error(f"Critical error in PDF generation fallback: {e}", exc_info=True)
-                raise Exception(f"PDF generation failed: {str(e)}")
+        """
+        Generate PDF from modal component HTML (rendered in the PDF worker pool).
+        Renditions are cached on disk by content hash, see app.services.pdf_cache.
+        """
+        from app.services.pdf_cache import pdf_cache
+        from app.services.pdf_render_pool import pdf_render_pool
+        from app.services.pdf_renderers import render_invoice_pdf, snapshot_invoice, snapshot_user
+        
+        invoice_snapshot, user_snapshot = snapshot_invoice(invoice), snapshot_user(user)
+        key = pdf_cache.key(invoice_snapshot, user_snapshot, company_info)
+        cached = pdf_cache.get(invoice_snapshot.id, key)
+        if cached is not None:
+            return cached
+        
+        pdf_content = await pdf_render_pool.render(render_invoice_pdf, invoice_snapshot, user_snapshot, company_info)
+        pdf_cache.put(invoice_snapshot.id, key, pdf_content)
+        return pdf_content
     
-    async def _generate_pdf_fallback(self, invoice: Any, user: Any, company_info: Optional[Dict] = None) -> bytes:
-        """Fallback PDF generation using reportlab"""
-        try:
-            from reportlab.lib.pagesizes import letter
-            from reportlab.lib import colors
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.units import inch
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.enums import TA_RIGHT
-        except ImportError as e:
-            logger.error(f"reportlab not available: {e}")
-            raise Exception("PDF generation libraries not available. Please install reportlab.")
+    def pdf_etag(self, invoice: Any, user: Any, company_info: Optional[Dict] = None) -> str:
+        """Quoted ETag of the PDF generate_pdf would return, without rendering it"""
+        from app.services.pdf_cache import pdf_cache
+        from app.services.pdf_renderers import snapshot_invoice, snapshot_user
         
-        try:
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=36, leftMargin=36,
-                                  topMargin=36, bottomMargin=36)
-            
-            elements = []
-            styles = getSampleStyleSheet()
-            
-            # Handle date conversion
-            if hasattr(invoice, 'invoice_date') and invoice.invoice_date:
-                invoice_date = invoice.invoice_date
-            elif hasattr(invoice, 'created_at') and invoice.created_at:
-                invoice_date = invoice.created_at
-            else:
-                invoice_date = datetime.utcnow()
-            
-            # Ensure invoice_date is a datetime object
-            if isinstance(invoice_date, str):
-                try:
-                    from dateutil import parser
-                    invoice_date = parser.parse(invoice_date)
-                except ImportError:
-                    # Fallback to datetime.strptime for common formats
-                    from datetime import datetime
-                    try:
-                        invoice_date = datetime.strptime(invoice_date, '%Y-%m-%d %H:%M:%S')
-                    except ValueError:
-                        try:
-                            invoice_date = datetime.strptime(invoice_date, '%Y-%m-%d')
-                        except ValueError:
-                            invoice_date = datetime.utcnow()
-            
-            due_date = invoice.due_date if hasattr(invoice, 'due_date') and invoice.due_date else (invoice_date + timedelta(days=30))
-            if isinstance(due_date, str):
-                try:
-                    from dateutil import parser
-                    due_date = parser.parse(due_date)
-                except ImportError:
-                    # Fallback to datetime.strptime for common formats
-                    from datetime import datetime
-                    try:
-                        due_date = datetime.strptime(due_date, '%Y-%m-%d %H:%M:%S')
-                    except ValueError:
-                        try:
-                            due_date = datetime.strptime(due_date, '%Y-%m-%d')
-                        except ValueError:
-                            due_date = invoice_date + timedelta(days=30)
-            
-            invoice_number = invoice.invoice_number if hasattr(invoice, 'invoice_number') and invoice.invoice_number else f"ORD-{str(invoice.id)[:8]}"
-            
-            title_style = ParagraphStyle(
-                'InvoiceTitle',
-                parent=styles['Heading2'],
-                fontSize=18,
-                textColor=colors.HexColor('#111827'),
-                fontName='Helvetica',
-                spaceAfter=16
-            )
-            elements.append(Paragraph(f'Invoice {invoice_number}', title_style))
-            elements.append(Spacer(1, 0.2*inch))
-            
-            # Two-column layout
-            bill_to_style = ParagraphStyle(
-                'BillToHeader',
-                parent=styles['Normal'],
-                fontSize=14,
-                textColor=colors.HexColor('#111827'),
-                fontName='Helvetica-Bold',
-                spaceAfter=8
-            )
-            bill_to_content_style = ParagraphStyle(
-                'BillToContent',
-                parent=styles['Normal'],
-                fontSize=12,
-                textColor=colors.HexColor('#4b5563'),
-                fontName='Helvetica',
-                spaceAfter=4
-            )
-            
-            # Customer info with safe handling
-            customer_name = 'Customer'
-            if user:
-                if hasattr(user, 'full_name') and user.full_name:
-                    customer_name = user.full_name
-                elif hasattr(user, 'email') and user.email:
-                    customer_name = user.email.split('@')[0]
-            
-            customer_email = 'customer@example.com'
-            if user and hasattr(user, 'email') and user.email:
-                customer_email = user.email
-            
-            bill_to_data = [
-                [Paragraph('Bill To:', bill_to_style), ''],
-                [Paragraph(customer_name, bill_to_content_style), ''],
-                [Paragraph(customer_email, bill_to_content_style), ''],
-                [Paragraph('Address not available', bill_to_content_style), ''],
-            ]
-            
-            invoice_details_style = ParagraphStyle(
-                'InvoiceDetailsHeader',
-                parent=styles['Normal'],
-                fontSize=14,
-                textColor=colors.HexColor('#111827'),
-                fontName='Helvetica-Bold',
-                spaceAfter=8
-            )
-            invoice_details_content_style = ParagraphStyle(
-                'InvoiceDetailsContent',
-                parent=styles['Normal'],
-                fontSize=12,
-                textColor=colors.HexColor('#4b5563'),
-                fontName='Helvetica',
-                spaceAfter=4
-            )
-            
-            status = str(invoice.status).lower() if hasattr(invoice.status, 'value') else str(invoice.status).lower()
-            status_text = status.capitalize()
-            
-            # Format dates safely
-            try:
-                date_str = invoice_date.strftime("%m/%d/%Y") if hasattr(invoice_date, 'strftime') else str(invoice_date)[:10]
-            except:
-                date_str = str(invoice_date)[:10] if invoice_date else "N/A"
-            
-            try:
-                due_str = due_date.strftime("%m/%d/%Y") if hasattr(due_date, 'strftime') else str(due_date)[:10]
-            except:
-                due_str = str(due_date)[:10] if due_date else "N/A"
-            
-            invoice_details_data = [
-                [Paragraph('Invoice Details:', invoice_details_style), ''],
-                [Paragraph(f'Date: {date_str}', invoice_details_content_style), ''],
-                [Paragraph(f'Due: {due_str}', invoice_details_content_style), ''],
-                [Paragraph(f'Status: {status_text}', invoice_details_content_style), ''],
-            ]
-            
-            if hasattr(invoice, 'payment_method') and invoice.payment_method:
-                invoice_details_data.append([Paragraph(f'Payment Method: {invoice.payment_method}', invoice_details_content_style), ''])
-            
-            two_col_table = Table([
-                [
-                    Table(bill_to_data, colWidths=[3*inch]),
-                    Table(invoice_details_data, colWidths=[3*inch])
-                ]
-            ], colWidths=[3.5*inch, 3.5*inch])
-            two_col_table.setStyle(TableStyle([
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('LEFTPADDING', (0, 0), (-1, -1), 0),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-                ('TOPPADDING', (0, 0), (-1, -1), 0),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-            ]))
-            elements.append(two_col_table)
-            elements.append(Spacer(1, 0.3*inch))
-            
-            items_data = [['Description', 'Qty', 'Price', 'Total']]
-            for item in (invoice.items or []):
-                unit_price = item.get('unit_price') or item.get('price') or item.get('amount', 0)
-                quantity = item.get('quantity', 1)
-                total = unit_price * quantity
-                items_data.append([
-                    item.get('description', ''),
-                    str(quantity),
-                    f"${unit_price:.2f}",
-                    f"${total:.2f}"
-                ])
-            
-            items_data.append(['', '', '', ''])
-            items_data.append([
-                Paragraph(f'<para alignment="right">Subtotal:</para>', styles['Normal']),
-                '',
-                '',
-                f"${invoice.subtotal:.2f}"
-            ])
-            items_data.append([
-                Paragraph(f'<para alignment="right">Tax:</para>', styles['Normal']),
-                '',
-                '',
-                f"${invoice.tax:.2f}"
-            ])
-            items_data.append([
-                Paragraph(f'<para alignment="right"><b>Total:</b></para>', styles['Normal']),
-                '',
-                '',
-                Paragraph(f'<b>${invoice.total:.2f}</b>', styles['Normal'])
-            ])
-            
-            items_table = Table(items_data, colWidths=[3.5*inch, 0.8*inch, 1.2*inch, 1.2*inch])
-            items_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f9fafb')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#6b7280')),
-                ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 10),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('FONT', (0, 1), (-1, -4), 'Helvetica', 10),
-                ('FONTSIZE', (0, 1), (-1, -4), 10),
-                ('TEXTCOLOR', (0, 1), (-1, -4), colors.HexColor('#111827')),
-                ('TOPPADDING', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('TOPPADDING', (0, 1), (-1, -4), 16),
-                ('BOTTOMPADDING', (0, 1), (-1, -4), 16),
-                ('GRID', (0, 0), (-1, -4), 1, colors.HexColor('#e5e7eb')),
-                ('BACKGROUND', (0, -3), (-1, -1), colors.HexColor('#f9fafb')),
-                ('FONT', (0, -3), (-1, -2), 'Helvetica', 10),
-                ('FONTSIZE', (0, -3), (-1, -2), 10),
-                ('TEXTCOLOR', (0, -3), (-1, -2), colors.HexColor('#111827')),
-                ('FONT', (0, -1), (-1, -1), 'Helvetica-Bold', 10),
-                ('FONTSIZE', (0, -1), (-1, -1), 10),
-                ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#111827')),
-                ('ALIGN', (0, -3), (-1, -1), 'RIGHT'),
-                ('ALIGN', (3, -3), (-1, -1), 'LEFT'),
-                ('TOPPADDING', (0, -3), (-1, -1), 16),
-                ('BOTTOMPADDING', (0, -3), (-1, -1), 16),
-                ('GRID', (0, -3), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-            ]))
-            elements.append(items_table)
-            
-            doc.build(elements)
-            pdf_content = buffer.getvalue()
-            buffer.close()
-            
-            if not pdf_content or len(pdf_content) == 0:
-                raise Exception("PDF generation returned empty content")
-            
-            logger.info(f"Generated PDF using reportlab fallback, size: {len(pdf_content)} bytes")
-            return pdf_content
-        except Exception as e:
-            logger.error(f"Error in PDF fallback generation: {e}", exc_info=True)
-            raise
+        return f'"{pdf_cache.key(snapshot_invoice(invoice), snapshot_user(user), company_info)}"'
     
     async def _generate_simple_pdf(self, invoice: Any, user: Any) -> bytes:
         """Generate simple text-based invoice (fallback)"""
@@ -778,7 +260,8 @@ class InvoiceService:
                 subject=subject,
                 body=body,
                 attachment_content=pdf_content,
-                attachment_filename=f"invoice-{invoice.invoice_number}.pdf"
+                attachment_filename=f"invoice-{invoice.invoice_number}.pdf",
+                db=db
             )
             
             # Update invoice
@@ -792,71 +275,76 @@ class InvoiceService:
             logger.error(f"Failed to send invoice email: {str(e)}")
             return False
     
+    def _payment_reminder_email(self, invoice: Any, user: Any):
+        """Subject and HTML body of a payment reminder"""
+        # Determine reminder type
+        if invoice.status == 'overdue':
+            subject = f"Payment Reminder: Invoice {invoice.invoice_number} is Overdue"
+            urgency = "overdue"
+        else:
+            subject = f"Payment Reminder: Invoice {invoice.invoice_number} Due Soon"
+            urgency = "upcoming"
+        
+        due_date_str = invoice.due_date.strftime('%B %d, %Y') if invoice.due_date else 'immediately'
+        
+        body = f"""
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h2 style="color: {'#dc2626' if urgency == 'overdue' else '#f59e0b'};">Payment Reminder</h2>
+                
+                <p>Dear {user.full_name},</p>
+                
+                <p>This is a friendly reminder that invoice <strong>{invoice.invoice_number}</strong> for 
+                <strong>${invoice.amount_due:.2f}</strong> is {'overdue' if urgency == 'overdue' else 'due soon'}.</p>
+                
+                <div style="background-color: {'#fef2f2' if urgency == 'overdue' else '#fef3c7'}; padding: 15px; border-radius: 5px; margin: 20px 0; border-left: 4px solid {'#dc2626' if urgency == 'overdue' else '#f59e0b'};">
+                    <table style="width: 100%;">
+                        <tr>
+                            <td><strong>Invoice Number:</strong></td>
+                            <td>{invoice.invoice_number}</td>
+                        </tr>
+                        <tr>
+                            <td><strong>Due Date:</strong></td>
+                            <td>{due_date_str}</td>
+                        </tr>
+                        <tr>
+                            <td><strong>Amount Due:</strong></td>
+                            <td style="font-size: 18px; font-weight: bold;">${invoice.amount_due:.2f}</td>
+                        </tr>
+                    </table>
+                </div>
+                
+                <p>Please log in to your account to make a payment or download your invoice.</p>
+                
+                <div style="text-align: center; margin: 30px 0;">
+                    <a href="#" style="background-color: #1a56db; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; display: inline-block;">Pay Now</a>
+                </div>
+                
+                <p>If you have already made this payment, please disregard this reminder.</p>
+                
+                <p>If you have any questions, please contact us.</p>
+                
+                <p>Thank you,<br/>NextPanel Billing Team</p>
+            </div>
+        </body>
+        </html>
+        """
+        return subject, body
+    
     async def send_payment_reminder(self, invoice: Any, user: Any, db: AsyncSession):
         """Send payment reminder for overdue/upcoming invoice"""
         from app.services.email_service import EmailService
         
         try:
             email_service = EmailService()
-            
-            # Determine reminder type
-            if invoice.status == 'overdue':
-                subject = f"Payment Reminder: Invoice {invoice.invoice_number} is Overdue"
-                urgency = "overdue"
-            else:
-                subject = f"Payment Reminder: Invoice {invoice.invoice_number} Due Soon"
-                urgency = "upcoming"
-            
-            due_date_str = invoice.due_date.strftime('%B %d, %Y') if invoice.due_date else 'immediately'
-            
-            body = f"""
-            <html>
-            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                    <h2 style="color: {'#dc2626' if urgency == 'overdue' else '#f59e0b'};">Payment Reminder</h2>
-                    
-                    <p>Dear {user.full_name},</p>
-                    
-                    <p>This is a friendly reminder that invoice <strong>{invoice.invoice_number}</strong> for 
-                    <strong>${invoice.amount_due:.2f}</strong> is {'overdue' if urgency == 'overdue' else 'due soon'}.</p>
-                    
-                    <div style="background-color: {'#fef2f2' if urgency == 'overdue' else '#fef3c7'}; padding: 15px; border-radius: 5px; margin: 20px 0; border-left: 4px solid {'#dc2626' if urgency == 'overdue' else '#f59e0b'};">
-                        <table style="width: 100%;">
-                            <tr>
-                                <td><strong>Invoice Number:</strong></td>
-                                <td>{invoice.invoice_number}</td>
-                            </tr>
-                            <tr>
-                                <td><strong>Due Date:</strong></td>
-                                <td>{due_date_str}</td>
-                            </tr>
-                            <tr>
-                                <td><strong>Amount Due:</strong></td>
-                                <td style="font-size: 18px; font-weight: bold;">${invoice.amount_due:.2f}</td>
-                            </tr>
-                        </table>
-                    </div>
-                    
-                    <p>Please log in to your account to make a payment or download your invoice.</p>
-                    
-                    <div style="text-align: center; margin: 30px 0;">
-                        <a href="#" style="background-color: #1a56db; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; display: inline-block;">Pay Now</a>
-                    </div>
-                    
-                    <p>If you have already made this payment, please disregard this reminder.</p>
-                    
-                    <p>If you have any questions, please contact us.</p>
-                    
-                    <p>Thank you,<br/>NextPanel Billing Team</p>
-                </div>
-            </body>
-            </html>
-            """
+            subject, body = self._payment_reminder_email(invoice, user)
             
             await email_service.send_email(
                 to_email=user.email,
                 subject=subject,
-                body=body
+                body=body,
+                db=db
             )
             
             # Update reminder tracking
@@ -871,6 +359,63 @@ class InvoiceService:
             logger.error(f"Failed to send payment reminder: {str(e)}")
             return False
     
+    async def send_payment_reminders(
+        self,
+        db: AsyncSession,
+        reminders: Iterable[Sequence[Any]],
+        render: Optional[Callable[..., Dict[str, Any]]] = None,
+        now: Optional[datetime] = None
+    ) -> int:
+        """
+        Queue reminders for (invoice, user, ...) rows, e.g. straight from a
+        joined query. Each batch of DUNNING_BATCH_SIZE is one outbox insert and
+        one UPDATE of the reminder tracking, committed together. render(*row)
+        returns send_email fields (subject, body, html_body); defaults to the
+        standard payment reminder.
+        """
+        from app.core.config import settings
+        from app.services.email_service import EmailService
+        
+        email_service = EmailService()
+        now = now or datetime.utcnow()
+        if render is None:
+            def render(invoice, user, *_):
+                subject, body = self._payment_reminder_email(invoice, user)
+                return {"subject": subject, "body": body}
+        
+        reminders = list(reminders)
+        sent = 0
+        for start in range(0, len(reminders), settings.DUNNING_BATCH_SIZE):
+            batch = reminders[start:start + settings.DUNNING_BATCH_SIZE]
+            invoice_ids = []
+            for row in batch:
+                invoice, user = row[0], row[1]
+                try:
+                    if await email_service.send_email(to_email=user.email, db=db, **render(*row)):
+                        invoice_ids.append(invoice.id)
+                except Exception as e:
+                    logger.error(f"Failed to queue reminder for invoice {invoice.invoice_number}: {str(e)}")
+            await self.record_reminders(db, invoice_ids, now)
+            await db.commit()
+            sent += len(invoice_ids)
+        
+        if sent:
+            logger.info(f"Queued {sent} payment reminder(s)")
+        return sent
+    
+    async def record_reminders(self, db: AsyncSession, invoice_ids: List[str], now: datetime):
+        """Stamp last_reminder_sent and bump reminder_count in one UPDATE; the caller commits"""
+        from app.models import Invoice
+        
+        if not invoice_ids:
+            return
+        await db.execute(
+            update(Invoice)
+            .where(Invoice.id.in_(invoice_ids))
+            .values(last_reminder_sent=now, reminder_count=func.coalesce(Invoice.reminder_count, 0) + 1)
+            .execution_options(synchronize_session="fetch")
+        )
+    
     async def process_partial_payment(
         self,
         invoice: Any,
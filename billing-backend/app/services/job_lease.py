@@ -0,0 +1,207 @@
+"""
+Job Lease Service
+
+Makes background jobs safe to start from every API worker. Two primitives:
+
+* Job leases: a named job (e.g. "billing:renewals") is run by exactly one
+  process at a time. On PostgreSQL this is a session advisory lock held on a
+  dedicated connection, released automatically if the process dies. On other
+  databases it is a row in job_leases with an expiry that the holder renews
+  while it works; a crashed holder's lease simply runs out.
+* Chunk claims: due work items are claimed a chunk at a time by pushing their
+  due timestamp one lease ahead in a conditional UPDATE (with FOR UPDATE SKIP
+  LOCKED on PostgreSQL), so several workers or nodes can split a large run.
+  Processing an item sets its real next due time; an item whose worker crashed
+  becomes due again when the lease runs out.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, text, update, insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.core.config import settings
+from app.core.time_buckets import dialect_name
+from app.models.job_leases import JobLease
+
+logger = logging.getLogger(__name__)
+
+
+def _insert_ignore(dialect: str, values: Dict):
+    """INSERT that leaves an existing row alone (another worker won the race)"""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert(JobLease.__table__).values(**values).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        return dialect_insert(JobLease.__table__).values(**values).on_conflict_do_nothing()
+    return insert(JobLease.__table__).values(**values)
+
+
+def advisory_key(name: str) -> int:
+    """Signed 64-bit advisory lock key of a job name"""
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+class JobLeaseManager:
+    """Acquires, renews and releases named job leases for this process"""
+
+    def __init__(self, engine: Optional[AsyncEngine] = None, ttl: Optional[int] = None, owner: Optional[str] = None):
+        self._engine = engine
+        self.ttl = ttl or settings.JOB_LEASE_TTL
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            from app.core.database import engine
+            self._engine = engine
+        return self._engine
+
+    async def acquire(self, name: str, ttl: Optional[int] = None) -> bool:
+        """Take (or extend) the row lease on name; False if another owner holds it"""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl or self.ttl)
+        table = JobLease.__table__
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                update(table)
+                .where(and_(table.c.name == name, or_(table.c.expires_at < now, table.c.owner == self.owner)))
+                .values(owner=self.owner, acquired_at=now, expires_at=expires_at)
+            )
+            if result.rowcount == 1:
+                return True
+            result = await conn.execute(_insert_ignore(conn.dialect.name, {
+                "name": name, "owner": self.owner, "acquired_at": now, "expires_at": expires_at
+            }))
+            return result.rowcount == 1
+
+    async def renew(self, name: str, ttl: Optional[int] = None) -> bool:
+        """Push our lease's expiry forward; False if it was lost"""
+        table = JobLease.__table__
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                update(table)
+                .where(and_(table.c.name == name, table.c.owner == self.owner))
+                .values(expires_at=datetime.utcnow() + timedelta(seconds=ttl or self.ttl))
+            )
+            return result.rowcount == 1
+
+    async def release(self, name: str):
+        """Give the lease up so another worker can take the next run immediately"""
+        table = JobLease.__table__
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                update(table)
+                .where(and_(table.c.name == name, table.c.owner == self.owner))
+                .values(expires_at=datetime.utcnow())
+            )
+
+    async def expires_at(self, name: str) -> Optional[datetime]:
+        """When the current row lease on name runs out (None: no row, or an advisory lock)"""
+        if self.engine.dialect.name == "postgresql":
+            return None
+        table = JobLease.__table__
+        async with self.engine.connect() as conn:
+            return (await conn.execute(select(table.c.expires_at).where(table.c.name == name))).scalar()
+
+    async def _heartbeat(self, name: str, ttl: int):
+        while True:
+            await asyncio.sleep(max(ttl / 3, 1))
+            try:
+                if not await self.renew(name, ttl):
+                    logger.warning(f"Lost lease on job {name}; another worker may run it concurrently")
+                    return
+            except Exception as e:
+                logger.error(f"Failed to renew lease on job {name}: {e}")
+
+    @asynccontextmanager
+    async def hold(self, name: str, ttl: Optional[int] = None) -> AsyncIterator[bool]:
+        """
+        async with job_leases.hold("billing:renewals") as owned:
+            if owned: ...run the job...
+
+        The lease is kept alive while the block runs and released afterwards.
+        """
+        ttl = ttl or self.ttl
+        if self.engine.dialect.name == "postgresql":
+            async with self.engine.connect() as conn:
+                key = advisory_key(name)
+                owned = (await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})).scalar()
+                await conn.commit()
+                try:
+                    yield bool(owned)
+                finally:
+                    if owned:
+                        await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+                        await conn.commit()
+            return
+
+        owned = await self.acquire(name, ttl)
+        if not owned:
+            yield False
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(name, ttl))
+        try:
+            yield True
+        finally:
+            heartbeat.cancel()
+            try:
+                await heartbeat
+            except asyncio.CancelledError:
+                pass
+            await self.release(name)
+
+
+async def claim_due(
+    db: AsyncSession,
+    model: Any,
+    due_column: Any,
+    conditions: List[Any],
+    limit: int,
+    lease_seconds: Optional[int] = None,
+    now: Optional[datetime] = None,
+    with_due: bool = False
+) -> List[Any]:
+    """
+    Claim up to limit rows of model whose due_column has passed, oldest first,
+    by moving due_column lease_seconds into the future. Returns the claimed
+    ids (with_due: (id, original due time) pairs, e.g. to measure lag);
+    concurrent callers never get the same row. Commits.
+    """
+    now = now or datetime.utcnow()
+    lease_seconds = lease_seconds or settings.JOB_LEASE_TTL
+    query = (
+        select(model.id, due_column)
+        .where(and_(due_column <= now, *conditions))
+        .order_by(due_column)
+        .limit(limit)
+    )
+    if dialect_name(db) == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+    due_by_id = dict((await db.execute(query)).all())
+    ids = list(due_by_id)
+    if not ids:
+        await db.commit()
+        return []
+    claimed = (await db.execute(
+        update(model)
+        .where(and_(model.id.in_(ids), due_column <= now))
+        .values({due_column.key: now + timedelta(seconds=lease_seconds)})
+        .returning(model.id)
+        .execution_options(synchronize_session=False)
+    )).scalars().all()
+    await db.commit()
+    if with_due:
+        return [(claimed_id, due_by_id[claimed_id]) for claimed_id in claimed]
+    return list(claimed)
+
+
+job_leases = JobLeaseManager()
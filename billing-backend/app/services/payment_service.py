@@ -2,6 +2,7 @@
 Payment Service - Handles payment processing with Stripe
 """
 from typing import Dict, Any, Optional
+import asyncio
 import logging
 import hashlib
 import hmac
@@ -90,9 +91,10 @@ class PaymentService:
         self,
         amount: float,
         currency: str = "USD",
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        idempotency_key: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Create a payment intent with Stripe"""
+        """Create a payment intent with Stripe (a repeated idempotency_key returns the original intent)"""
         try:
             logger.info(f"Starting create_payment_intent with amount: {amount}, currency: {currency}")
             # Load Stripe configuration if not already loaded
@@ -129,14 +131,16 @@ class PaymentService:
             # Convert amount to cents for Stripe
             amount_cents = int(amount * 100)
             
-            # Create payment intent with Stripe
-            intent = stripe.PaymentIntent.create(
+            # Create payment intent with Stripe (blocking HTTP call, kept off the event loop)
+            intent = await asyncio.to_thread(
+                stripe.PaymentIntent.create,
                 amount=amount_cents,
                 currency=currency.lower(),
                 metadata=metadata or {},
                 automatic_payment_methods={
                     'enabled': True,
                 },
+                **({"idempotency_key": idempotency_key} if idempotency_key else {})
             )
             
             # Safely extract values from the intent object
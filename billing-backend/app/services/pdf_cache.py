@@ -0,0 +1,192 @@
+"""
+PDF Cache
+
+Content-addressed on-disk cache for rendered invoice/order PDFs. The key is a
+hash of everything the renderer reads (invoice and customer snapshot, company
+info) plus TEMPLATE_VERSION, so an edited invoice or a changed template never
+hits a stale entry. The key doubles as the HTTP ETag. The directory is bounded
+by PDF_CACHE_MAX_BYTES with least-recently-used eviction (file mtime is bumped
+on every hit).
+
+Files are named "<document id>-<key>.pdf" so every cached rendition of an
+invoice can be dropped when the invoice changes.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models import Invoice
+from app.services.pdf_renderers import INVOICE_FIELDS, USER_FIELDS, TEMPLATE_VERSION
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+def _json_default(value: Any) -> str:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(getattr(value, "value", value))
+
+
+class PDFCache:
+    """LRU, size-bounded directory of rendered PDFs keyed by content hash"""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        directory = Path(directory or settings.PDF_CACHE_DIR)
+        self.directory = directory if directory.is_absolute() else BASE_DIR / directory
+        self.max_bytes = settings.PDF_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        # Bytes on disk as last seen by this process (None until the first scan)
+        self._size: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, invoice: Any, user: Any, company_info: Optional[Dict] = None) -> str:
+        """Hash of the rendered fields of an invoice snapshot (see pdf_renderers.snapshot_*)"""
+        payload = {
+            "template": TEMPLATE_VERSION,
+            "invoice": {field: getattr(invoice, field, None) for field in INVOICE_FIELDS},
+            "user": {field: getattr(user, field, None) for field in USER_FIELDS} if user is not None else None,
+            "company": company_info,
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=_json_default).encode()
+        return hashlib.sha256(encoded).hexdigest()[:32]
+
+    def _path(self, document_id: str, key: str) -> Path:
+        return self.directory / f"{document_id}-{key}.pdf"
+
+    def get(self, document_id: str, key: str) -> Optional[bytes]:
+        """Cached PDF bytes, or None on a miss"""
+        if not self.enabled:
+            return None
+        path = self._path(document_id, key)
+        try:
+            content = path.read_bytes()
+            os.utime(path)  # mark as recently used
+            return content
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Could not read cached PDF {path.name}: {e}")
+            return None
+
+    def put(self, document_id: str, key: str, content: bytes):
+        """Store a rendered PDF, evicting least recently used files over the size limit"""
+        if not self.enabled or len(content) > self.max_bytes:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Write to a temp file and rename so readers never see a partial PDF
+            fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(content)
+            os.replace(tmp_name, self._path(document_id, key))
+        except OSError as e:
+            logger.warning(f"Could not cache PDF for {document_id}: {e}")
+            return
+
+        if self._size is None:
+            self._size = self._scan_size()
+        else:
+            self._size += len(content)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def invalidate(self, document_id: str) -> int:
+        """Drop every cached rendition of a document; returns the number of files removed"""
+        removed = 0
+        for path in self.directory.glob(f"{document_id}-*.pdf"):
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+            if self._size is not None:
+                self._size -= size
+        if removed:
+            logger.debug(f"Invalidated {removed} cached PDF(s) for {document_id}")
+        return removed
+
+    def clear(self):
+        """Remove all cached PDFs"""
+        for path in self.directory.glob("*.pdf"):
+            path.unlink(missing_ok=True)
+        self._size = 0
+
+    def _scan_size(self) -> int:
+        return sum(path.stat().st_size for path in self.directory.glob("*.pdf"))
+
+    def _evict(self):
+        """Delete least recently used files until the cache is under 90% of the limit"""
+        entries = []
+        for path in self.directory.glob("*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        # Another process may have written or evicted too; recount from disk
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        self._size = total
+        logger.info(f"Evicted {evicted} cached PDF(s), {total} bytes remain")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value matches etag (weak comparison)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+pdf_cache = PDFCache()
+
+
+# Fields whose change makes cached renditions of an invoice obsolete
+_RENDERED_INVOICE_FIELDS = tuple(field for field in INVOICE_FIELDS if field != "id")
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_changed_invoices(session: Session, flush_context, instances):
+    """Remember invoices whose rendered fields change in this transaction"""
+    changed: Set[str] = session.info.setdefault("pdf_cache_invalidate", set())
+    for obj in session.deleted:
+        if isinstance(obj, Invoice):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Invoice):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in _RENDERED_INVOICE_FIELDS):
+                changed.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_invoices(session: Session):
+    for invoice_id in session.info.pop("pdf_cache_invalidate", ()):
+        pdf_cache.invalidate(invoice_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_changed_invoices(session: Session, previous_transaction):
+    session.info.pop("pdf_cache_invalidate", None)
@@ -0,0 +1,150 @@
+"""
+PDF Render Pool
+
+Runs the synchronous PDF renderers (app.services.pdf_renderers) in a bounded
+ProcessPoolExecutor so a render never blocks the event loop. Each worker is
+warmed up once (fonts, FontConfiguration, reportlab styles); the number of
+renders waiting or running is capped and each render has a timeout. A render
+that timed out still holds its slot until the worker actually finishes it,
+so the cap always reflects the work the workers really have.
+"""
+import asyncio
+import logging
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.services.pdf_renderers import warm_up
+
+logger = logging.getLogger(__name__)
+
+
+class PDFRenderBusy(HTTPException):
+    """Too many renders queued; the client should retry later"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="PDF rendering is busy, please retry shortly",
+            headers={"Retry-After": "5"}
+        )
+
+
+class PDFRenderTimeout(HTTPException):
+    """A render did not finish within PDF_RENDER_TIMEOUT"""
+
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="PDF rendering timed out")
+
+
+class PDFRenderPool:
+    """
+    Bounded process pool for PDF renders.
+
+    workers=0 renders in a thread pool instead (no fork; useful for tests and
+    single-process deployments) - still off the event loop.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        timeout: Optional[float] = None
+    ):
+        self.workers = settings.PDF_RENDER_WORKERS if workers is None else workers
+        self.max_queue = settings.PDF_RENDER_MAX_QUEUE if max_queue is None else max_queue
+        self.timeout = settings.PDF_RENDER_TIMEOUT if timeout is None else timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Renders currently queued or running"""
+        return self._in_flight
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up)
+            logger.info(f"Started PDF render pool with {self.workers} workers")
+        return self._executor
+
+    def _get_threads(self) -> ThreadPoolExecutor:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(thread_name_prefix="pdf-render")
+        return self._threads
+
+    def _release(self):
+        self._in_flight -= 1
+
+    async def start(self):
+        """Create the pool and wait until every worker has warmed up"""
+        executor = self._get_executor()
+        if executor is None:
+            return
+        loop = asyncio.get_running_loop()
+        # One task per worker forces all of them to spawn and run the initializer
+        await asyncio.gather(*(loop.run_in_executor(executor, warm_up) for _ in range(self.workers)))
+        logger.info("PDF render workers warmed up")
+
+    async def render(self, renderer: Callable[..., bytes], *args: Any) -> bytes:
+        """Run renderer(*args) in a worker; raises PDFRenderBusy / PDFRenderTimeout"""
+        if self._in_flight >= self.max_queue:
+            logger.warning(f"PDF render queue full ({self._in_flight} in flight)")
+            raise PDFRenderBusy()
+
+        loop = asyncio.get_running_loop()
+        executor: Executor = self._get_executor() or self._get_threads()
+        try:
+            future: Future = executor.submit(renderer, *args)
+        except BrokenProcessPool:
+            logger.error("PDF render pool is broken, restarting it", exc_info=True)
+            self._discard_executor()
+            raise
+        self._in_flight += 1
+
+        def release(_future: Future):
+            # Runs when the worker is really done (or the render was cancelled before it
+            # started), not when the caller stops waiting
+            try:
+                loop.call_soon_threadsafe(self._release)
+            except RuntimeError:
+                pass  # event loop already closed
+
+        future.add_done_callback(release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # Cancels the render if it is still queued; a running one keeps its slot
+            logger.error(f"PDF render timed out after {self.timeout}s")
+            raise PDFRenderTimeout()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); replace the pool so later renders work
+            logger.error("PDF render worker died, restarting pool", exc_info=True)
+            self._discard_executor()
+            raise
+
+    def _discard_executor(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def shutdown(self):
+        """Stop the workers (pending renders are cancelled)"""
+        executor, self._executor = self._executor, None
+        threads, self._threads = self._threads, None
+        for pool in (executor, threads):
+            if pool is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, lambda pool=pool: pool.shutdown(wait=True, cancel_futures=True)
+                )
+        if executor is not None:
+            logger.info("PDF render pool stopped")
+
+
+pdf_render_pool = PDFRenderPool()
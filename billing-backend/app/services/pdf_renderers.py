@@ -0,0 +1,639 @@
+"""
+PDF Renderers
+
+Synchronous invoice/order PDF renderers. They run inside the render worker
+processes managed by app.services.pdf_render_pool, so they only receive plain
+picklable snapshots (see snapshot_invoice / snapshot_user), never ORM objects.
+"""
+from datetime import datetime, timedelta
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the PDF layout changes so cached renditions are not reused
+TEMPLATE_VERSION = "1"
+
+# Attributes the renderers read from invoices (and invoice-like order views)
+INVOICE_FIELDS = (
+    "id", "invoice_number", "invoice_date", "created_at", "due_date", "status",
+    "payment_method", "subtotal", "tax", "total", "items",
+)
+USER_FIELDS = ("id", "email", "full_name", "company_name")
+
+# Per-process caches populated by warm_up()
+_weasyprint = None
+_font_config = None
+
+
+def snapshot_invoice(invoice: Any) -> SimpleNamespace:
+    """Picklable copy of the invoice attributes the renderers use"""
+    values = {field: getattr(invoice, field, None) for field in INVOICE_FIELDS}
+    values["items"] = [dict(item) if isinstance(item, dict) else item for item in (values["items"] or [])]
+    return SimpleNamespace(**values)
+
+
+def snapshot_user(user: Any) -> Optional[SimpleNamespace]:
+    """Picklable copy of the customer attributes the renderers use"""
+    if user is None:
+        return None
+    return SimpleNamespace(**{field: getattr(user, field, None) for field in USER_FIELDS})
+
+
+def _load_weasyprint():
+    """WeasyPrint module, or None when it (or its system libraries) is unavailable"""
+    global _weasyprint
+    if _weasyprint is None:
+        try:
+            import weasyprint
+            _weasyprint = weasyprint
+        except (ImportError, OSError) as e:
+            logger.info(f"weasyprint not available, will use reportlab fallback: {e}")
+            _weasyprint = False
+    return _weasyprint or None
+
+
+def _font_configuration():
+    """FontConfiguration built once per process (fontconfig scanning is the slow part)"""
+    global _font_config
+    if _font_config is None:
+        from weasyprint.text.fonts import FontConfiguration
+        _font_config = FontConfiguration()
+    return _font_config
+
+
+def warm_up() -> bool:
+    """
+    Load renderer libraries, fonts and stylesheets in this process and render a
+    throwaway document so the first real request does not pay for it.
+    """
+    try:
+        from reportlab.lib.styles import getSampleStyleSheet
+        getSampleStyleSheet()
+        placeholder = SimpleNamespace(
+            id="warm-up", invoice_number="WARM-UP", invoice_date=datetime.utcnow(), created_at=None,
+            due_date=None, status="paid", payment_method=None, subtotal=0.0, tax=0.0, total=0.0, items=[],
+        )
+        if _load_weasyprint():
+            _font_configuration()
+        render_invoice_pdf(placeholder, None)
+        return True
+    except Exception as e:
+        logger.warning(f"PDF renderer warm-up failed: {e}")
+        return False
+
+
+def render_invoice_pdf(invoice: Any, user: Any, company_info: Optional[Dict] = None) -> bytes:
+    """Render an invoice snapshot with WeasyPrint, falling back to reportlab"""
+    if _load_weasyprint():
+        try:
+            return _render_weasyprint(invoice, user)
+        except Exception as e:
+            logger.error(f"Error generating PDF with weasyprint: {e}", exc_info=True)
+            logger.info("Falling back to reportlab PDF generation")
+            # Fallback to reportlab on error
+            try:
+                return _render_reportlab(invoice, user, company_info)
+            except Exception as fallback_error:
+                logger.error(f"Fallback PDF generation also failed: {fallback_error}", exc_info=True)
+                raise Exception(f"PDF generation failed: {str(e)}. Fallback also failed: {str(fallback_error)}")
+
+    # weasyprint not available, use fallback
+    try:
+        return _render_reportlab(invoice, user, company_info)
+    except Exception as e:
+        logger.error(f"Critical error in PDF generation fallback: {e}", exc_info=True)
+        raise Exception(f"PDF generation failed: {str(e)}")
+
+
+def _render_weasyprint(invoice: Any, user: Any) -> bytes:
+    """Generate PDF from modal component HTML"""
+    HTML = _load_weasyprint().HTML
+
+    # Get invoice data with safe date handling
+    invoice_date = invoice.invoice_date if hasattr(invoice, 'invoice_date') and invoice.invoice_date else (invoice.created_at if hasattr(invoice, 'created_at') and invoice.created_at else datetime.utcnow())
+    if not isinstance(invoice_date, datetime):
+        if isinstance(invoice_date, str):
+            try:
+                invoice_date = datetime.strptime(invoice_date, '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                try:
+                    invoice_date = datetime.strptime(invoice_date, '%Y-%m-%d')
+                except ValueError:
+                    invoice_date = datetime.utcnow()
+        else:
+            invoice_date = datetime.utcnow()
+    
+    due_date = invoice.due_date if hasattr(invoice, 'due_date') and invoice.due_date else (invoice_date + timedelta(days=30))
+    if not isinstance(due_date, datetime):
+        if isinstance(due_date, str):
+            try:
+                due_date = datetime.strptime(due_date, '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                try:
+                    due_date = datetime.strptime(due_date, '%Y-%m-%d')
+                except ValueError:
+                    due_date = invoice_date + timedelta(days=30)
+        else:
+            due_date = invoice_date + timedelta(days=30)
+    
+    invoice_number = invoice.invoice_number if hasattr(invoice, 'invoice_number') and invoice.invoice_number else f"ORD-{str(invoice.id)[:8]}"
+    
+    # Status formatting with safe handling
+    if hasattr(invoice, 'status'):
+        if hasattr(invoice.status, 'value'):
+            status = str(invoice.status.value).lower()
+        else:
+            status = str(invoice.status).lower()
+    else:
+        status = 'pending'
+    status_text = status.capitalize()
+    status_bg_color = '#dcfce7' if status == 'paid' else '#fef3c7' if status == 'pending' else '#fee2e2'
+    status_text_color = '#166534' if status == 'paid' else '#92400e' if status == 'pending' else '#991b1b'
+    
+    # Customer info with safe handling
+    customer_name = 'Customer'
+    if user:
+        if hasattr(user, 'full_name') and user.full_name:
+            customer_name = user.full_name
+        elif hasattr(user, 'email') and user.email:
+            customer_name = user.email.split('@')[0]
+    
+    customer_email = 'customer@example.com'
+    if user and hasattr(user, 'email') and user.email:
+        customer_email = user.email
+    
+    # Payment method
+    payment_method = ''
+    if hasattr(invoice, 'payment_method') and invoice.payment_method:
+        payment_method = f'<p>Payment Method: {invoice.payment_method}</p>'
+    
+    # Get invoice totals with safe defaults
+    subtotal = float(getattr(invoice, 'subtotal', 0) or 0)
+    tax = float(getattr(invoice, 'tax', 0) or 0)
+    total = float(getattr(invoice, 'total', 0) or 0)
+    
+    # If total is 0, calculate from items
+    if total == 0 and subtotal == 0:
+        items_total = sum(
+            (item.get('unit_price') or item.get('price') or item.get('amount', 0)) * (item.get('quantity', 1))
+            for item in (invoice.items or [])
+        )
+        subtotal = items_total
+        total = subtotal + tax
+    
+    # Build items table rows
+    items_rows = ''
+    for item in (invoice.items or []):
+        if isinstance(item, dict):
+            unit_price = float(item.get('unit_price') or item.get('price') or item.get('amount', 0))
+            quantity = int(item.get('quantity', 1))
+            total_item = unit_price * quantity
+            description = item.get('description', item.get('product_name', 'Item'))
+        else:
+            # Handle object attributes
+            unit_price = float(getattr(item, 'unit_price', getattr(item, 'price', getattr(item, 'amount', 0))) or 0)
+            quantity = int(getattr(item, 'quantity', 1) or 1)
+            total_item = unit_price * quantity
+            description = getattr(item, 'description', getattr(item, 'product_name', 'Item'))
+        
+        items_rows += f'''
+    <tr>
+      <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">{description}</td>
+      <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">{quantity}</td>
+      <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${unit_price:.2f}</td>
+      <td class="px-6 py-4 whitespace-nowrap text-sm text-gray-900">${total_item:.2f}</td>
+    </tr>
+    '''
+    
+    # Create HTML matching the modal component exactly
+    html_content = f'''
+<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="UTF-8">
+  <style>
+    * {{
+      margin: 0;
+      padding: 0;
+      box-sizing: border-box;
+    }}
+    body {{
+      font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
+      background: white;
+      padding: 20px;
+    }}
+    .invoice-container {{
+      max-width: 1200px;
+      margin: 0 auto;
+      border: 1px solid #e5e7eb;
+      border-radius: 8px;
+      background: white;
+      box-shadow: 0 1px 3px 0 rgba(0, 0, 0, 0.1);
+      padding: 20px;
+    }}
+    .invoice-header {{
+      display: flex;
+      justify-content: space-between;
+      align-items: center;
+      margin-bottom: 16px;
+      padding-bottom: 16px;
+      border-bottom: 1px solid #e5e7eb;
+    }}
+    .invoice-title {{
+      font-size: 18px;
+      font-weight: 500;
+      color: #111827;
+    }}
+    .invoice-content {{
+      margin-top: 20px;
+    }}
+    .grid {{
+      display: grid;
+      grid-template-columns: 1fr 1fr;
+      gap: 24px;
+      margin-bottom: 24px;
+    }}
+    .bill-to h4, .invoice-details h4 {{
+      font-size: 14px;
+      font-weight: 500;
+      color: #111827;
+      margin-bottom: 8px;
+    }}
+    .bill-to p, .invoice-details p {{
+      font-size: 12px;
+      color: #4b5563;
+      margin-bottom: 4px;
+    }}
+    .status-badge {{
+      display: inline-flex;
+      align-items: center;
+      padding: 4px 10px;
+      border-radius: 9999px;
+      font-size: 12px;
+      font-weight: 500;
+      background-color: {status_bg_color};
+      color: {status_text_color};
+    }}
+    .table-container {{
+      overflow: hidden;
+      box-shadow: 0 1px 3px 0 rgba(0, 0, 0, 0.1);
+      border-radius: 8px;
+    }}
+    table {{
+      width: 100%;
+      border-collapse: collapse;
+    }}
+    thead {{
+      background-color: #f9fafb;
+    }}
+    th {{
+      padding: 12px 24px;
+      text-align: left;
+      font-size: 12px;
+      font-weight: 500;
+      color: #6b7280;
+      text-transform: uppercase;
+      letter-spacing: 0.05em;
+    }}
+    tbody tr {{
+      border-top: 1px solid #e5e7eb;
+    }}
+    tbody td {{
+      padding: 16px 24px;
+      font-size: 14px;
+      color: #111827;
+    }}
+    tfoot {{
+      background-color: #f9fafb;
+    }}
+    tfoot tr {{
+      border-top: 1px solid #e5e7eb;
+    }}
+    tfoot td {{
+      padding: 16px 24px;
+      font-size: 14px;
+      color: #111827;
+    }}
+    tfoot td:first-child {{
+      text-align: right;
+      font-weight: 500;
+    }}
+    tfoot tr:last-child td {{
+      font-weight: 600;
+    }}
+  </style>
+</head>
+<body>
+  <div class="invoice-container">
+    <div class="invoice-header">
+      <h3 class="invoice-title">Invoice {invoice_number}</h3>
+    </div>
+
+    <div class="invoice-content">
+      <div class="grid">
+        <div class="bill-to">
+          <h4>Bill To:</h4>
+          <div>
+<p>{customer_name}</p>
+<p>{customer_email}</p>
+<p>Address not available</p>
+          </div>
+        </div>
+        <div class="invoice-details">
+          <h4>Invoice Details:</h4>
+          <div>
+<p>Date: {invoice_date.strftime("%m/%d/%Y") if hasattr(invoice_date, 'strftime') else str(invoice_date)[:10]}</p>
+<p>Due: {due_date.strftime("%m/%d/%Y") if hasattr(due_date, 'strftime') else str(due_date)[:10]}</p>
+<p>Status: <span class="status-badge">{status_text}</span></p>
+{payment_method}
+          </div>
+        </div>
+      </div>
+
+      <div class="table-container">
+        <table>
+          <thead>
+<tr>
+  <th>Description</th>
+  <th>Qty</th>
+  <th>Price</th>
+  <th>Total</th>
+</tr>
+          </thead>
+          <tbody>
+{items_rows}
+          </tbody>
+          <tfoot>
+<tr>
+  <td colspan="3">Subtotal:</td>
+  <td>${subtotal:.2f}</td>
+</tr>
+<tr>
+  <td colspan="3">Tax:</td>
+  <td>${tax:.2f}</td>
+</tr>
+<tr>
+  <td colspan="3">Total:</td>
+  <td>${total:.2f}</td>
+</tr>
+          </tfoot>
+        </table>
+      </div>
+    </div>
+  </div>
+</body>
+</html>
+'''
+    
+    # Convert HTML to PDF using WeasyPrint (font configuration is shared per worker)
+    html_doc = HTML(string=html_content)
+    pdf_bytes = html_doc.write_pdf(font_config=_font_configuration())
+    
+    logger.info(f"Generated PDF from modal component HTML for invoice {invoice_number}")
+    return pdf_bytes
+
+
+def _render_reportlab(invoice: Any, user: Any, company_info: Optional[Dict] = None) -> bytes:
+    """Fallback PDF generation using reportlab"""
+    try:
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.enums import TA_RIGHT
+    except ImportError as e:
+        logger.error(f"reportlab not available: {e}")
+        raise Exception("PDF generation libraries not available. Please install reportlab.")
+    
+    try:
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=36, leftMargin=36,
+                              topMargin=36, bottomMargin=36)
+        
+        elements = []
+        styles = getSampleStyleSheet()
+        
+        # Handle date conversion
+        if hasattr(invoice, 'invoice_date') and invoice.invoice_date:
+            invoice_date = invoice.invoice_date
+        elif hasattr(invoice, 'created_at') and invoice.created_at:
+            invoice_date = invoice.created_at
+        else:
+            invoice_date = datetime.utcnow()
+        
+        # Ensure invoice_date is a datetime object
+        if isinstance(invoice_date, str):
+            try:
+                from dateutil import parser
+                invoice_date = parser.parse(invoice_date)
+            except ImportError:
+                # Fallback to datetime.strptime for common formats
+                from datetime import datetime
+                try:
+                    invoice_date = datetime.strptime(invoice_date, '%Y-%m-%d %H:%M:%S')
+                except ValueError:
+                    try:
+                        invoice_date = datetime.strptime(invoice_date, '%Y-%m-%d')
+                    except ValueError:
+                        invoice_date = datetime.utcnow()
+        
+        due_date = invoice.due_date if hasattr(invoice, 'due_date') and invoice.due_date else (invoice_date + timedelta(days=30))
+        if isinstance(due_date, str):
+            try:
+                from dateutil import parser
+                due_date = parser.parse(due_date)
+            except ImportError:
+                # Fallback to datetime.strptime for common formats
+                from datetime import datetime
+                try:
+                    due_date = datetime.strptime(due_date, '%Y-%m-%d %H:%M:%S')
+                except ValueError:
+                    try:
+                        due_date = datetime.strptime(due_date, '%Y-%m-%d')
+                    except ValueError:
+                        due_date = invoice_date + timedelta(days=30)
+        
+        invoice_number = invoice.invoice_number if hasattr(invoice, 'invoice_number') and invoice.invoice_number else f"ORD-{str(invoice.id)[:8]}"
+        
+        title_style = ParagraphStyle(
+            'InvoiceTitle',
+            parent=styles['Heading2'],
+            fontSize=18,
+            textColor=colors.HexColor('#111827'),
+            fontName='Helvetica',
+            spaceAfter=16
+        )
+        elements.append(Paragraph(f'Invoice {invoice_number}', title_style))
+        elements.append(Spacer(1, 0.2*inch))
+        
+        # Two-column layout
+        bill_to_style = ParagraphStyle(
+            'BillToHeader',
+            parent=styles['Normal'],
+            fontSize=14,
+            textColor=colors.HexColor('#111827'),
+            fontName='Helvetica-Bold',
+            spaceAfter=8
+        )
+        bill_to_content_style = ParagraphStyle(
+            'BillToContent',
+            parent=styles['Normal'],
+            fontSize=12,
+            textColor=colors.HexColor('#4b5563'),
+            fontName='Helvetica',
+            spaceAfter=4
+        )
+        
+        # Customer info with safe handling
+        customer_name = 'Customer'
+        if user:
+            if hasattr(user, 'full_name') and user.full_name:
+                customer_name = user.full_name
+            elif hasattr(user, 'email') and user.email:
+                customer_name = user.email.split('@')[0]
+        
+        customer_email = 'customer@example.com'
+        if user and hasattr(user, 'email') and user.email:
+            customer_email = user.email
+        
+        bill_to_data = [
+            [Paragraph('Bill To:', bill_to_style), ''],
+            [Paragraph(customer_name, bill_to_content_style), ''],
+            [Paragraph(customer_email, bill_to_content_style), ''],
+            [Paragraph('Address not available', bill_to_content_style), ''],
+        ]
+        
+        invoice_details_style = ParagraphStyle(
+            'InvoiceDetailsHeader',
+            parent=styles['Normal'],
+            fontSize=14,
+            textColor=colors.HexColor('#111827'),
+            fontName='Helvetica-Bold',
+            spaceAfter=8
+        )
+        invoice_details_content_style = ParagraphStyle(
+            'InvoiceDetailsContent',
+            parent=styles['Normal'],
+            fontSize=12,
+            textColor=colors.HexColor('#4b5563'),
+            fontName='Helvetica',
+            spaceAfter=4
+        )
+        
+        status = str(invoice.status).lower() if hasattr(invoice.status, 'value') else str(invoice.status).lower()
+        status_text = status.capitalize()
+        
+        # Format dates safely
+        try:
+            date_str = invoice_date.strftime("%m/%d/%Y") if hasattr(invoice_date, 'strftime') else str(invoice_date)[:10]
+        except:
+            date_str = str(invoice_date)[:10] if invoice_date else "N/A"
+        
+        try:
+            due_str = due_date.strftime("%m/%d/%Y") if hasattr(due_date, 'strftime') else str(due_date)[:10]
+        except:
+            due_str = str(due_date)[:10] if due_date else "N/A"
+        
+        invoice_details_data = [
+            [Paragraph('Invoice Details:', invoice_details_style), ''],
+            [Paragraph(f'Date: {date_str}', invoice_details_content_style), ''],
+            [Paragraph(f'Due: {due_str}', invoice_details_content_style), ''],
+            [Paragraph(f'Status: {status_text}', invoice_details_content_style), ''],
+        ]
+        
+        if hasattr(invoice, 'payment_method') and invoice.payment_method:
+            invoice_details_data.append([Paragraph(f'Payment Method: {invoice.payment_method}', invoice_details_content_style), ''])
+        
+        two_col_table = Table([
+            [
+                Table(bill_to_data, colWidths=[3*inch]),
+                Table(invoice_details_data, colWidths=[3*inch])
+            ]
+        ], colWidths=[3.5*inch, 3.5*inch])
+        two_col_table.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+            ('TOPPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+        ]))
+        elements.append(two_col_table)
+        elements.append(Spacer(1, 0.3*inch))
+        
+        items_data = [['Description', 'Qty', 'Price', 'Total']]
+        for item in (invoice.items or []):
+            unit_price = item.get('unit_price') or item.get('price') or item.get('amount', 0)
+            quantity = item.get('quantity', 1)
+            total = unit_price * quantity
+            items_data.append([
+                item.get('description', ''),
+                str(quantity),
+                f"${unit_price:.2f}",
+                f"${total:.2f}"
+            ])
+        
+        items_data.append(['', '', '', ''])
+        items_data.append([
+            Paragraph(f'<para alignment="right">Subtotal:</para>', styles['Normal']),
+            '',
+            '',
+            f"${invoice.subtotal:.2f}"
+        ])
+        items_data.append([
+            Paragraph(f'<para alignment="right">Tax:</para>', styles['Normal']),
+            '',
+            '',
+            f"${invoice.tax:.2f}"
+        ])
+        items_data.append([
+            Paragraph(f'<para alignment="right"><b>Total:</b></para>', styles['Normal']),
+            '',
+            '',
+            Paragraph(f'<b>${invoice.total:.2f}</b>', styles['Normal'])
+        ])
+        
+        items_table = Table(items_data, colWidths=[3.5*inch, 0.8*inch, 1.2*inch, 1.2*inch])
+        items_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f9fafb')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#6b7280')),
+            ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 10),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('FONT', (0, 1), (-1, -4), 'Helvetica', 10),
+            ('FONTSIZE', (0, 1), (-1, -4), 10),
+            ('TEXTCOLOR', (0, 1), (-1, -4), colors.HexColor('#111827')),
+            ('TOPPADDING', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('TOPPADDING', (0, 1), (-1, -4), 16),
+            ('BOTTOMPADDING', (0, 1), (-1, -4), 16),
+            ('GRID', (0, 0), (-1, -4), 1, colors.HexColor('#e5e7eb')),
+            ('BACKGROUND', (0, -3), (-1, -1), colors.HexColor('#f9fafb')),
+            ('FONT', (0, -3), (-1, -2), 'Helvetica', 10),
+            ('FONTSIZE', (0, -3), (-1, -2), 10),
+            ('TEXTCOLOR', (0, -3), (-1, -2), colors.HexColor('#111827')),
+            ('FONT', (0, -1), (-1, -1), 'Helvetica-Bold', 10),
+            ('FONTSIZE', (0, -1), (-1, -1), 10),
+            ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#111827')),
+            ('ALIGN', (0, -3), (-1, -1), 'RIGHT'),
+            ('ALIGN', (3, -3), (-1, -1), 'LEFT'),
+            ('TOPPADDING', (0, -3), (-1, -1), 16),
+            ('BOTTOMPADDING', (0, -3), (-1, -1), 16),
+            ('GRID', (0, -3), (-1, -1), 1, colors.HexColor('#e5e7eb')),
+        ]))
+        elements.append(items_table)
+        
+        doc.build(elements)
+        pdf_content = buffer.getvalue()
+        buffer.close()
+        
+        if not pdf_content or len(pdf_content) == 0:
+            raise Exception("PDF generation returned empty content")
+        
+        logger.info(f"Generated PDF using reportlab fallback, size: {len(pdf_content)} bytes")
+        return pdf_content
+    except Exception as e:
+        logger.error(f"Error in PDF fallback generation: {e}", exc_info=True)
+        raise
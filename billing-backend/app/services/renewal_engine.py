@@ -0,0 +1,283 @@
+"""
+Subscription Renewal Engine
+
+Renews due subscriptions in batches instead of one at a time:
+
+1. Load a batch of due subscriptions together with their license, plan and
+   user in one joined query (keyset-paginated on current_period_end, id).
+2. Create the missing renewal invoices for the batch and commit them. Each
+   invoice carries an idempotency key for its (subscription, period), which
+   is unique in the database, so a rerun or a concurrent run can never
+   create a second invoice for the same period.
+3. Charge the batch with bounded concurrency. The same key is sent to the
+   payment provider, so retrying a charge after a crash returns the
+   original payment instead of billing again.
+4. Apply the outcomes (advance the period or mark past due), queue the
+   notification emails in the outbox and commit once for the batch.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import (
+    Invoice, InvoiceStatus, License, Plan, RecurringInterval,
+    Subscription, SubscriptionStatus, User
+)
+from app.services.email_service import EmailService
+from app.services.invoice_service import InvoiceService
+from app.services.payment_service import PaymentService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERIOD_DAYS = 30
+# Periods at least this long are billed at the plan's yearly price
+YEARLY_PERIOD_DAYS = 360
+
+
+def renewal_idempotency_key(subscription_id: str, period_end: datetime) -> str:
+    """Stable key of one billing period of a subscription"""
+    return f"renewal:{subscription_id}:{period_end:%Y%m%d%H%M%S}"
+
+
+def period_days(subscription: Subscription) -> int:
+    """Length of the subscription's current period in days"""
+    if subscription.current_period_start and subscription.current_period_end:
+        days = (subscription.current_period_end - subscription.current_period_start).days
+        if days > 0:
+            return days
+    return DEFAULT_PERIOD_DAYS
+
+
+def renewable_subscriptions(*columns: Any):
+    """
+    select(*columns) over the subscriptions the engine can renew: active, with
+    their license, plan and user rows (anything else is never loaded, so it
+    must not count as due either)
+    """
+    return (
+        select(*columns)
+        .select_from(Subscription)
+        .join(License, Subscription.license_id == License.id)
+        .join(Plan, License.plan_id == Plan.id)
+        .join(User, License.user_id == User.id)
+        .where(Subscription.status == SubscriptionStatus.ACTIVE)
+    )
+
+
+class RenewalItem:
+    """A due subscription with the rows needed to bill it"""
+
+    def __init__(self, subscription: Subscription, license: License, plan: Plan, user: User):
+        self.subscription = subscription
+        self.license = license
+        self.plan = plan
+        self.user = user
+        self.key = renewal_idempotency_key(subscription.id, subscription.current_period_end)
+        self.invoice: Optional[Invoice] = None
+        self.charged = False
+
+
+class RenewalEngine:
+    """Batched, concurrent subscription renewals with per-period idempotency"""
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        payment_service: Optional[PaymentService] = None,
+        invoice_service: Optional[InvoiceService] = None,
+        email_service: Optional[EmailService] = None
+    ):
+        self.batch_size = batch_size or settings.RENEWAL_BATCH_SIZE
+        self.concurrency = concurrency or settings.RENEWAL_CONCURRENCY
+        self.payment_service = payment_service or PaymentService()
+        self.invoice_service = invoice_service or InvoiceService()
+        self.email_service = email_service or EmailService()
+
+    async def run(self, db: AsyncSession, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Renew every subscription whose period ends within the next 24 hours; returns counts"""
+        now = now or datetime.utcnow()
+        horizon = now + timedelta(days=1)
+        summary = {"due": 0, "renewed": 0, "failed": 0, "skipped": 0, "batches": 0, "errors": []}
+        after: Optional[Tuple[datetime, str]] = None
+
+        while True:
+            items = await self._load_batch(db, now, horizon, after)
+            if not items:
+                break
+            last = items[-1].subscription
+            after = (last.current_period_end, last.id)
+            summary["batches"] += 1
+            summary["due"] += len(items)
+            try:
+                await self._process_batch(db, items, summary)
+            except Exception as e:
+                await db.rollback()
+                summary["failed"] += len(items)
+                summary["errors"].append(f"batch after {after[1]}: {e}")
+                logger.error(f"Renewal batch ending at subscription {after[1]} failed: {e}", exc_info=True)
+
+        logger.info(
+            f"Renewals: {summary['due']} due, {summary['renewed']} renewed, {summary['failed']} failed, "
+            f"{summary['skipped']} skipped in {summary['batches']} batch(es)"
+        )
+        return summary
+
+    async def _load_batch(
+        self,
+        db: AsyncSession,
+        now: datetime,
+        horizon: datetime,
+        after: Optional[Tuple[datetime, str]]
+    ) -> List[RenewalItem]:
+        """Next batch of due subscriptions with license, plan and user in one query"""
+        query = (
+            renewable_subscriptions(Subscription, License, Plan, User)
+            .where(
+                Subscription.current_period_end <= horizon,
+                Subscription.current_period_end >= now
+            )
+            .order_by(Subscription.current_period_end, Subscription.id)
+            .limit(self.batch_size)
+        )
+        if after is not None:
+            period_end, subscription_id = after
+            query = query.where(or_(
+                Subscription.current_period_end > period_end,
+                and_(Subscription.current_period_end == period_end, Subscription.id > subscription_id)
+            ))
+        rows = (await db.execute(query)).all()
+        return [RenewalItem(*row) for row in rows]
+
+    async def _process_batch(self, db: AsyncSession, items: List[RenewalItem], summary: Dict[str, Any]):
+        # Invoices from an earlier (possibly interrupted) run of the same periods
+        existing = await db.execute(select(Invoice).where(Invoice.idempotency_key.in_([item.key for item in items])))
+        by_key = {invoice.idempotency_key: invoice for invoice in existing.scalars()}
+
+        pending = []
+        for item in items:
+            item.invoice = by_key.get(item.key)
+            if item.invoice is not None and item.invoice.status == InvoiceStatus.PAID:
+                summary["skipped"] += 1
+                continue
+            pending.append(item)
+
+        new_items = [item for item in pending if item.invoice is None]
+        if new_items:
+            numbers = await self.invoice_service.generate_invoice_numbers(db, len(new_items))
+            for item, number in zip(new_items, numbers):
+                item.invoice = self._build_invoice(item, number)
+                db.add(item.invoice)
+            try:
+                # Invoices are durable before any money moves
+                await db.commit()
+            except IntegrityError:
+                # Another run created invoices for these periods first; it owns the batch
+                await db.rollback()
+                summary["skipped"] += len(pending)
+                logger.warning(f"Renewal batch of {len(pending)} already being invoiced elsewhere, skipped")
+                return
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def charge(item: RenewalItem):
+            async with semaphore:
+                item.charged = await self.charge(item.subscription, item.invoice, item.key)
+
+        await asyncio.gather(*(charge(item) for item in pending))
+
+        now = datetime.utcnow()
+        for item in pending:
+            if item.charged:
+                self._apply_success(item, now)
+                summary["renewed"] += 1
+            else:
+                item.subscription.status = SubscriptionStatus.PAST_DUE
+                item.invoice.status = InvoiceStatus.OVERDUE
+                summary["failed"] += 1
+            await self._queue_notification(db, item)
+        await db.commit()
+
+    def _build_invoice(self, item: RenewalItem, invoice_number: str) -> Invoice:
+        days = period_days(item.subscription)
+        yearly = days >= YEARLY_PERIOD_DAYS
+        price = (item.plan.price_yearly if yearly else item.plan.price_monthly) or 0.0
+        return Invoice(
+            user_id=item.license.user_id,
+            subscription_id=item.subscription.id,
+            license_id=item.license.id,
+            invoice_number=invoice_number,
+            idempotency_key=item.key,
+            status=InvoiceStatus.OPEN,
+            subtotal=price,
+            tax=0.0,
+            tax_rate=0.0,
+            total=price,
+            amount_due=price,
+            currency="USD",
+            due_date=datetime.utcnow() + timedelta(days=7),
+            items=[{
+                "description": f"Subscription renewal - {item.plan.name or 'Plan'}",
+                "quantity": 1,
+                "unit_price": price,
+                "amount": price
+            }],
+            is_recurring=True,
+            recurring_interval=RecurringInterval.YEARLY if yearly else RecurringInterval.MONTHLY
+        )
+
+    async def charge(self, subscription: Subscription, invoice: Invoice, idempotency_key: str) -> bool:
+        """Charge a subscription invoice; touches no database session so it can run concurrently"""
+        try:
+            payment_intent = await self.payment_service.create_payment_intent(
+                amount=invoice.total,
+                currency=invoice.currency,
+                metadata={
+                    "subscription_id": subscription.id,
+                    "invoice_id": invoice.id
+                },
+                idempotency_key=idempotency_key
+            )
+            return payment_intent is not None
+        except Exception as e:
+            logger.error(f"Payment failed for subscription {subscription.id}: {str(e)}")
+            return False
+
+    def _apply_success(self, item: RenewalItem, now: datetime):
+        subscription = item.subscription
+        days = period_days(subscription)
+        subscription.current_period_start = subscription.current_period_end
+        subscription.current_period_end = subscription.current_period_end + timedelta(days=days)
+        subscription.status = SubscriptionStatus.ACTIVE
+        item.invoice.status = InvoiceStatus.PAID
+        item.invoice.paid_at = now
+        item.invoice.amount_paid = item.invoice.total
+        item.invoice.amount_due = 0.0
+
+    async def _queue_notification(self, db: AsyncSession, item: RenewalItem):
+        """Queue the renewal receipt or payment failure email in the batch transaction"""
+        invoice = item.invoice
+        name = item.user.full_name or item.user.email
+        amount = f"${invoice.total:.2f} {invoice.currency}"
+        if item.charged:
+            subject = f"Subscription renewed - invoice {invoice.invoice_number}"
+            body = (
+                f"Hello {name},\n\nYour {item.plan.name} subscription has been renewed. "
+                f"We received your payment of {amount} for invoice {invoice.invoice_number}.\n"
+            )
+        else:
+            subject = f"Payment failed for invoice {invoice.invoice_number}"
+            body = (
+                f"Hello {name},\n\nWe could not collect {amount} for invoice {invoice.invoice_number} "
+                f"to renew your {item.plan.name} subscription. Please update your payment method.\n"
+            )
+        await self.email_service.send_email(to_email=item.user.email, subject=subject, body=body, db=db)
+
+
+renewal_engine = RenewalEngine()
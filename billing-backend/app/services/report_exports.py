@@ -0,0 +1,144 @@
+"""
+Report Exports
+
+Column selections for the CSV exports (orders, invoices, payments) and the
+chunked CSV encoder shared by the streaming export endpoints and the
+background report job worker (app.services.report_job_service).
+"""
+import csv
+import io
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterable, List, Optional, Tuple
+
+from sqlalchemy import String, select, func, literal, and_, or_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Order, Invoice, Payment, User
+
+# Rows fetched from the database and encoded per chunk
+EXPORT_CHUNK_SIZE = 1000
+
+# Export kind -> model whose (created_at, id) orders the rows
+EXPORT_MODELS = {"orders": Order, "invoices": Invoice, "payments": Payment}
+EXPORT_KINDS = tuple(EXPORT_MODELS)
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """ISO date/datetime filter value, or None when missing or malformed"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def export_query(kind: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                 status: Optional[str] = None) -> Tuple[List[str], Any]:
+    """(CSV header, select of the matching rows) for an export kind"""
+    if kind == "orders":
+        # Orders have no currency column; every order is billed in USD
+        header = [
+            'Order ID', 'Invoice Number', 'Customer Email', 'Status', 'Subtotal',
+            'Tax', 'Total', 'Currency', 'Created At', 'Due Date'
+        ]
+        query = (
+            select(
+                Order.id, func.coalesce(Order.invoice_number, Order.order_number, ''), User.email, Order.status,
+                Order.subtotal, Order.tax, Order.total, literal('USD'), Order.created_at, Order.due_date
+            )
+            .outerjoin(User, User.id == Order.customer_id)
+            .order_by(Order.created_at, Order.id)
+        )
+        date_column = Order.created_at
+    elif kind == "invoices":
+        header = [
+            'Invoice Number', 'Customer Email', 'Status', 'Subtotal', 'Tax',
+            'Total', 'Amount Paid', 'Amount Due', 'Currency', 'Invoice Date', 'Due Date'
+        ]
+        query = (
+            select(
+                Invoice.invoice_number, User.email, Invoice.status, Invoice.subtotal, Invoice.tax, Invoice.total,
+                Invoice.amount_paid, Invoice.amount_due, Invoice.currency, Invoice.invoice_date, Invoice.due_date
+            )
+            .outerjoin(User, User.id == Invoice.user_id)
+            .order_by(Invoice.created_at, Invoice.id)
+        )
+        date_column = Invoice.invoice_date
+    elif kind == "payments":
+        header = [
+            'Payment ID', 'Customer Email', 'Status', 'Amount', 'Currency', 'Payment Method',
+            'Gateway Transaction ID', 'Order ID', 'Created At'
+        ]
+        query = (
+            select(
+                Payment.id, User.email, Payment.status, Payment.amount, Payment.currency, Payment.payment_method,
+                Payment.gateway_transaction_id, Payment.order_id, Payment.created_at
+            )
+            .outerjoin(User, User.id == Payment.user_id)
+            .order_by(Payment.created_at, Payment.id)
+        )
+        date_column = Payment.created_at
+    else:
+        raise ValueError(f"Unknown export kind: {kind}")
+
+    start, end = parse_date(start_date), parse_date(end_date)
+    if start:
+        query = query.where(date_column >= start)
+    if end:
+        query = query.where(date_column <= end)
+    if status:
+        query = query.where(EXPORT_MODELS[kind].status == status)
+    return header, query
+
+
+async def iter_export_batches(bind, kind: str, query, batch_size: int) -> AsyncIterator[List[Tuple]]:
+    """
+    Rows of an export_query in (created_at, id) order, batch_size at a time,
+    each batch read by a keyset seek in its own short transaction. Unlike a
+    server-side cursor this holds no read lock between batches, so progress can
+    be committed while an export runs (SQLite blocks commits behind readers).
+    """
+    model = EXPORT_MODELS[kind]
+    # SQLite compares the stored timestamp text in ORDER BY; seek on that same text
+    created_key = type_coerce(model.created_at, String) if bind.dialect.name == "sqlite" else model.created_at
+    keyed = query.add_columns(created_key.label("_seek_created_at"), model.id.label("_seek_id")).limit(batch_size)
+    last = None
+    while True:
+        batch_query = keyed
+        if last is not None:
+            batch_query = keyed.where(or_(created_key > last[0], and_(created_key == last[0], model.id > last[1])))
+        async with AsyncSession(bind) as session:
+            rows = (await session.execute(batch_query)).all()
+        if not rows:
+            return
+        last = rows[-1][-2:]
+        yield [tuple(row[:-2]) for row in rows]
+        if len(rows) < batch_size:
+            return
+
+
+def format_cell(value):
+    """CSV cell for enums and datetimes"""
+    if value is None:
+        return ''
+    if hasattr(value, 'value'):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class CSVEncoder:
+    """Encodes rows to UTF-8 CSV bytes one chunk at a time"""
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def encode(self, rows: Iterable[Iterable[Any]]) -> bytes:
+        self._writer.writerows([format_cell(value) for value in row] for row in rows)
+        data = self._buffer.getvalue().encode('utf-8')
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
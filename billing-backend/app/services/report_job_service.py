@@ -0,0 +1,177 @@
+"""
+Report Job Service
+
+Background worker for queued CSV exports (POST /reports/jobs). A job is claimed
+with a conditional UPDATE, so several workers (the API process and/or
+scripts/report_worker.py) can poll the same table. Rows are written in chunks
+to a gzip file, committing progress and a heartbeat after every chunk; a
+running job whose heartbeat goes stale (worker crashed) is picked up again.
+"""
+import asyncio
+import gzip
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, update, func, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import ReportJob, ReportJobStatus
+from app.services import report_exports
+from app.services.report_exports import CSVEncoder, export_query, iter_export_batches
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+# Filters accepted in ReportJob.parameters
+JOB_PARAMETERS = ("start_date", "end_date", "status")
+
+
+def write_rows(handle, encoder: CSVEncoder, rows):
+    """Encode rows as CSV and write them (through gzip) to handle; blocking"""
+    handle.write(encoder.encode(rows))
+
+
+class ReportJobWorker:
+    """Claims queued report jobs and writes their files"""
+
+    def __init__(self, session_factory=None, export_dir: Optional[str] = None, poll_interval: Optional[float] = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        directory = Path(export_dir or settings.REPORT_EXPORT_DIR)
+        self.directory = directory if directory.is_absolute() else BASE_DIR / directory
+        self.poll_interval = settings.REPORT_WORKER_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.running = False
+
+    async def enqueue(self, db: AsyncSession, kind: str, parameters: Dict[str, Any], requested_by: Optional[str]) -> ReportJob:
+        """Queue an export; the caller commits"""
+        job = ReportJob(
+            kind=kind,
+            parameters={key: parameters.get(key) for key in JOB_PARAMETERS if parameters.get(key)},
+            status=ReportJobStatus.QUEUED,
+            requested_by=requested_by,
+            rows_written=0,
+            attempts=0,
+        )
+        db.add(job)
+        await db.flush()
+        return job
+
+    def _claimable(self, now: datetime):
+        stale = now - timedelta(seconds=settings.REPORT_JOB_STALE_AFTER)
+        return or_(
+            ReportJob.status == ReportJobStatus.QUEUED,
+            and_(ReportJob.status == ReportJobStatus.RUNNING, ReportJob.heartbeat_at < stale),
+        )
+
+    async def claim(self) -> Optional[str]:
+        """Mark the oldest claimable job as running; returns its id (None if there is nothing to do)"""
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            job_id = (await db.execute(
+                select(ReportJob.id).where(self._claimable(now)).order_by(ReportJob.created_at).limit(1)
+            )).scalar()
+            if job_id is None:
+                return None
+            # Conditional update: only one worker wins a job
+            result = await db.execute(
+                update(ReportJob)
+                .where(and_(ReportJob.id == job_id, self._claimable(now)))
+                .values(
+                    status=ReportJobStatus.RUNNING,
+                    started_at=now,
+                    heartbeat_at=now,
+                    attempts=ReportJob.attempts + 1,
+                    rows_written=0,
+                    error=None,
+                )
+            )
+            await db.commit()
+            return job_id if result.rowcount == 1 else None
+
+    async def run_job(self, job_id: str) -> bool:
+        """Write the export file for a claimed job; False if it failed (and may be retried)"""
+        async with self.session_factory() as db:
+            job = await db.get(ReportJob, job_id)
+            if job.attempts > settings.REPORT_JOB_MAX_ATTEMPTS:
+                # Re-claimed after crashing its worker too many times
+                job.status = ReportJobStatus.FAILED
+                job.error = job.error or "Worker stopped responding"
+                await db.commit()
+                return False
+            header, query = export_query(job.kind, **(job.parameters or {}))
+            job.total_rows = (await db.execute(
+                select(func.count()).select_from(query.order_by(None).subquery())
+            )).scalar()
+            await db.commit()
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{job.id}.csv.gz"
+            tmp_path = self.directory / f"{job.id}.csv.gz.tmp"
+            encoder = CSVEncoder()
+            try:
+                handle = await asyncio.to_thread(gzip.open, tmp_path, "wb")
+                try:
+                    # Encoding and compression run off the event loop
+                    await asyncio.to_thread(write_rows, handle, encoder, [header])
+                    batches = iter_export_batches(db.bind, job.kind, query, report_exports.EXPORT_CHUNK_SIZE)
+                    async for rows in batches:
+                        await asyncio.to_thread(write_rows, handle, encoder, rows)
+                        job.rows_written += len(rows)
+                        job.heartbeat_at = datetime.utcnow()
+                        await db.commit()
+                finally:
+                    await asyncio.to_thread(handle.close)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.error(f"Report job {job.id} failed: {e}", exc_info=True)
+                tmp_path.unlink(missing_ok=True)
+                await db.rollback()
+                await db.refresh(job)
+                retry = job.attempts < settings.REPORT_JOB_MAX_ATTEMPTS
+                job.status = ReportJobStatus.QUEUED if retry else ReportJobStatus.FAILED
+                job.error = str(e)
+                await db.commit()
+                return False
+
+            job.status = ReportJobStatus.COMPLETED
+            job.file_path = str(path)
+            job.file_size = path.stat().st_size
+            job.completed_at = datetime.utcnow()
+            await db.commit()
+            logger.info(f"Report job {job.id} ({job.kind}) wrote {job.rows_written} rows, {job.file_size} bytes")
+            return True
+
+    async def run_pending(self) -> int:
+        """Process queued jobs until none are left; returns the number processed"""
+        processed = 0
+        while True:
+            job_id = await self.claim()
+            if job_id is None:
+                return processed
+            processed += 1
+            if not await self.run_job(job_id):
+                # A re-queued job is retried on the next poll, not in a tight loop
+                return processed
+
+    async def start(self):
+        """Poll for jobs until stop() is called"""
+        self.running = True
+        logger.info("Report job worker started")
+        while self.running:
+            try:
+                await self.run_pending()
+            except Exception as e:
+                logger.error(f"Error in report job worker: {e}", exc_info=True)
+            await asyncio.sleep(self.poll_interval)
+
+    def stop(self):
+        self.running = False
+        logger.info("Report job worker stopped")
+
+
+report_job_worker = ReportJobWorker()
@@ -0,0 +1,370 @@
+"""
+Analytics Rollup Service
+Reads pre-aggregated daily/hourly rollups and rebuilds them from the raw tables
+"""
+import logging
+from datetime import datetime, date, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, func, and_, or_, delete, insert, null
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.time_buckets import bucket_expression, dialect_name, parse_bucket, to_naive_utc
+from app.models import Order, Payment, Invoice, User, InvoiceStatus
+from app.models.rollups import (
+    DailyRollup, HourlyRollup, RollupMetric, HOURLY_ROLLUP_RETENTION_DAYS,
+    NO_CURRENCY, generate_uuid, status_key
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _empty() -> Dict[str, Any]:
+    return {"count": 0, "amount": 0.0, "tax": 0.0}
+
+
+def _add(target: Dict[str, Any], count, amount, tax):
+    target["count"] += int(count or 0)
+    target["amount"] += float(amount or 0)
+    target["tax"] += float(tax or 0)
+
+
+class RollupService:
+    """
+    Read side of the analytics rollups.
+
+    Range queries are answered from DailyRollup for the whole days inside the
+    range, from HourlyRollup for the whole hours of the (at most two) partial
+    days at its edges, and from the raw table for the partial hours that are
+    left (or the whole edge days, once they are older than the hourly
+    retention). Results match a raw scan exactly while the cost grows with the
+    number of days instead of the number of rows.
+    """
+
+    def _source(self, metric: str) -> Dict[str, Any]:
+        """Raw table columns a metric is computed from (None = constant/absent)"""
+        if metric == RollupMetric.ORDERS:
+            # Orders have no currency column; the store bills in USD
+            return {"time": Order.created_at, "status": Order.status, "currency": None,
+                    "amount": Order.total, "tax": Order.tax, "where": None}
+        if metric == RollupMetric.PAYMENTS:
+            return {"time": Payment.created_at, "status": Payment.status, "currency": Payment.currency,
+                    "amount": Payment.amount, "tax": None, "where": None}
+        if metric == RollupMetric.INVOICES:
+            return {"time": Invoice.created_at, "status": Invoice.status, "currency": Invoice.currency,
+                    "amount": Invoice.total, "tax": Invoice.tax, "where": None}
+        if metric == RollupMetric.INVOICE_REVENUE:
+            return {"time": Invoice.paid_at, "status": Invoice.status, "currency": Invoice.currency,
+                    "amount": Invoice.total, "tax": Invoice.tax,
+                    "where": Invoice.status == InvoiceStatus.PAID}
+        if metric == RollupMetric.SIGNUPS:
+            return {"time": User.created_at, "status": User.is_admin, "currency": None,
+                    "amount": None, "tax": None, "where": None}
+        raise ValueError(f"Unknown rollup metric: {metric}")
+
+    @staticmethod
+    def _aggregates(source: Dict[str, Any]) -> List[Any]:
+        """count, sum(amount), sum(tax) for a source; absent columns aggregate to NULL"""
+        return [
+            func.count(),
+            func.sum(source["amount"]) if source["amount"] is not None else null(),
+            func.sum(source["tax"]) if source["tax"] is not None else null(),
+        ]
+
+    def _raw_status(self, metric: str, value: Any) -> str:
+        if metric == RollupMetric.SIGNUPS:
+            return "admin" if value else "customer"
+        return status_key(value)
+
+    @staticmethod
+    def _split(lo: datetime, hi: datetime, inclusive: bool, floor, step: timedelta):
+        """
+        Split [lo, hi] ([lo, hi) when not inclusive) into whole units of step
+        (served from rollups) and partial edges. Returns (first, last, edges):
+        the whole units start at first..last inclusive (None when there are
+        none), edges are (lo, hi, inclusive) ranges left for a finer source.
+        """
+        first = floor(lo)
+        if lo != first:
+            first += step
+        # The unit holding hi is only whole when the range covers it to the last microsecond
+        last = floor(hi)
+        if not inclusive or hi < last + step - timedelta(microseconds=1):
+            last -= step
+
+        if first > last:
+            return None, None, [(lo, hi, inclusive)]
+
+        edges = []
+        if lo < first:
+            edges.append((lo, first, False))
+        after_last = last + step
+        if hi > after_last or (inclusive and hi == after_last):
+            edges.append((after_last, hi, inclusive))
+        return first, last, edges
+
+    @classmethod
+    def _split_range(cls, start: datetime, end: datetime):
+        """
+        Split [start, end] into whole days (DailyRollup), whole hours at the
+        edges (HourlyRollup, within its retention) and the remaining partial
+        hours (raw table). Returns (first_day, last_day, hours, edges): whole
+        days first_day..last_day inclusive (possibly None), hours a list of
+        (first_hour, last_hour) ranges, edges (lo, hi, inclusive) raw ranges.
+        """
+        start_n, end_n = to_naive_utc(start), to_naive_utc(end)
+        first_day, last_day, day_edges = cls._split(
+            start_n, end_n, True, lambda t: datetime.combine(t.date(), datetime.min.time()), timedelta(days=1)
+        )
+        hourly_cutoff = (datetime.utcnow() - timedelta(days=HOURLY_ROLLUP_RETENTION_DAYS)).replace(
+            minute=0, second=0, microsecond=0
+        ) + timedelta(hours=1)
+        hours, edges = [], []
+        for lo, hi, inclusive in day_edges:
+            first_hour, last_hour, hour_edges = cls._split(
+                lo, hi, inclusive, lambda t: t.replace(minute=0, second=0, microsecond=0), timedelta(hours=1)
+            )
+            if first_hour is not None and first_hour >= hourly_cutoff:
+                hours.append((first_hour, last_hour))
+                edges.extend(hour_edges)
+            else:
+                # Older hours have been pruned from the hourly table
+                edges.append((lo, hi, inclusive))
+        return (
+            first_day.date() if first_day is not None else None,
+            last_day.date() if last_day is not None else None,
+            hours,
+            edges,
+        )
+
+    async def totals_by_status(
+        self,
+        db: AsyncSession,
+        metric: str,
+        start: datetime,
+        end: datetime,
+        statuses: Optional[Iterable[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Count/amount/tax per status for timestamps in [start, end]"""
+        statuses = [status_key(s) for s in statuses] if statuses is not None else None
+        totals: Dict[str, Dict[str, Any]] = {}
+        first_day, last_day, hours, edges = self._split_range(start, end)
+
+        rollup_queries = []
+        if first_day is not None:
+            rollup_queries.append((DailyRollup, and_(
+                DailyRollup.bucket_date >= first_day,
+                DailyRollup.bucket_date <= last_day,
+            )))
+        if hours:
+            rollup_queries.append((HourlyRollup, or_(*(
+                and_(HourlyRollup.bucket_hour >= first_hour, HourlyRollup.bucket_hour <= last_hour)
+                for first_hour, last_hour in hours
+            ))))
+        for model, in_range in rollup_queries:
+            query = (
+                select(model.status, func.sum(model.count), func.sum(model.amount), func.sum(model.tax))
+                .where(and_(model.metric == metric, in_range))
+                .group_by(model.status)
+            )
+            if statuses is not None:
+                query = query.where(model.status.in_(statuses))
+            for status, count, amount, tax in (await db.execute(query)).all():
+                _add(totals.setdefault(status, _empty()), count, amount, tax)
+
+        if edges:
+            source = self._source(metric)
+            time_col = source["time"]
+            ranges = [
+                and_(time_col >= lo, time_col <= hi) if inclusive else and_(time_col >= lo, time_col < hi)
+                for lo, hi, inclusive in edges
+            ]
+            query = (
+                select(source["status"], *self._aggregates(source))
+                .where(or_(*ranges))
+                .group_by(source["status"])
+            )
+            if source["where"] is not None:
+                query = query.where(source["where"])
+            for raw_status, count, amount, tax in (await db.execute(query)).all():
+                status = self._raw_status(metric, raw_status)
+                if statuses is not None and status not in statuses:
+                    continue
+                _add(totals.setdefault(status, _empty()), count, amount, tax)
+
+        return totals
+
+    async def totals(
+        self,
+        db: AsyncSession,
+        metric: str,
+        start: datetime,
+        end: datetime,
+        statuses: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
+        """Count/amount/tax across the given statuses (all when None)"""
+        combined = _empty()
+        for values in (await self.totals_by_status(db, metric, start, end, statuses)).values():
+            _add(combined, values["count"], values["amount"], values["tax"])
+        return combined
+
+    async def daily_series(
+        self,
+        db: AsyncSession,
+        metric: str,
+        start_day: date,
+        end_day: date,
+        statuses: Optional[Iterable[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """One entry per day in [start_day, end_day], gaps filled with zeros"""
+        query = (
+            select(DailyRollup.bucket_date, func.sum(DailyRollup.count),
+                   func.sum(DailyRollup.amount), func.sum(DailyRollup.tax))
+            .where(and_(
+                DailyRollup.metric == metric,
+                DailyRollup.bucket_date >= start_day,
+                DailyRollup.bucket_date <= end_day,
+            ))
+            .group_by(DailyRollup.bucket_date)
+        )
+        if statuses is not None:
+            query = query.where(DailyRollup.status.in_([status_key(s) for s in statuses]))
+        by_day = {row[0]: row for row in (await db.execute(query)).all()}
+
+        series = []
+        day = start_day
+        while day <= end_day:
+            values = _empty()
+            if day in by_day:
+                _, count, amount, tax = by_day[day]
+                _add(values, count, amount, tax)
+            series.append({"date": day, **values})
+            day += timedelta(days=1)
+        return series
+
+    # ------------------------------------------------------------------
+    # Backfill / repair
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _as_date(value) -> date:
+        return parse_bucket(value).date()
+
+    async def rebuild(
+        self,
+        db: AsyncSession,
+        start_day: Optional[date] = None,
+        end_day: Optional[date] = None,
+        metrics: Optional[Iterable[str]] = None
+    ) -> Dict[str, int]:
+        """
+        Recompute rollups from the raw tables for [start_day, end_day] (all history
+        when omitted) and prune hourly rows outside the retention window. Runs in
+        the caller's transaction; the caller commits.
+        """
+        return await db.run_sync(self.rebuild_sync, start_day, end_day, metrics)
+
+    def rebuild_sync(
+        self,
+        db: Session,
+        start_day: Optional[date] = None,
+        end_day: Optional[date] = None,
+        metrics: Optional[Iterable[str]] = None
+    ) -> Dict[str, int]:
+        """
+        rebuild() on a synchronous session, e.g. in the migration that creates
+        the rollup tables
+        """
+        dialect = dialect_name(db)
+        metrics = list(metrics or [
+            RollupMetric.ORDERS, RollupMetric.PAYMENTS, RollupMetric.INVOICES,
+            RollupMetric.INVOICE_REVENUE, RollupMetric.SIGNUPS,
+        ])
+        hourly_cutoff = (datetime.utcnow() - timedelta(days=HOURLY_ROLLUP_RETENTION_DAYS)).replace(
+            minute=0, second=0, microsecond=0
+        )
+        written = {"daily": 0, "hourly": 0}
+
+        # Old hourly rows are never read; drop them regardless of the range
+        db.execute(delete(HourlyRollup).where(HourlyRollup.bucket_hour < hourly_cutoff))
+
+        for metric in metrics:
+            source = self._source(metric)
+            time_col = source["time"]
+            day_expr = bucket_expression(time_col, "day", dialect)
+            hour_expr = bucket_expression(time_col, "hour", dialect)
+            group_columns = [source["status"]]
+            if source["currency"] is not None:
+                group_columns.append(source["currency"])
+
+            base_conditions = [time_col.is_not(None)]
+            if source["where"] is not None:
+                base_conditions.append(source["where"])
+
+            daily_delete = delete(DailyRollup).where(DailyRollup.metric == metric)
+            day_conditions = list(base_conditions)
+            if start_day is not None:
+                daily_delete = daily_delete.where(DailyRollup.bucket_date >= start_day)
+                day_conditions.append(time_col >= datetime.combine(start_day, datetime.min.time()))
+            if end_day is not None:
+                daily_delete = daily_delete.where(DailyRollup.bucket_date <= end_day)
+                day_conditions.append(time_col < datetime.combine(end_day + timedelta(days=1), datetime.min.time()))
+            db.execute(daily_delete)
+
+            day_rows = db.execute(
+                select(day_expr, *group_columns, *self._aggregates(source))
+                .where(and_(*day_conditions))
+                .group_by(day_expr, *group_columns)
+            ).all()
+            rows = self._merge_rows(metric, "bucket_date", source, [
+                (self._as_date(row[0]), *row[1:]) for row in day_rows
+            ])
+            for i in range(0, len(rows), 1000):
+                db.execute(insert(DailyRollup), rows[i:i + 1000])
+            written["daily"] += len(rows)
+
+            db.execute(delete(HourlyRollup).where(HourlyRollup.metric == metric))
+            hour_rows = db.execute(
+                select(hour_expr, *group_columns, *self._aggregates(source))
+                .where(and_(*base_conditions, time_col >= hourly_cutoff))
+                .group_by(hour_expr, *group_columns)
+            ).all()
+            rows = self._merge_rows(metric, "bucket_hour", source, [
+                (parse_bucket(row[0]), *row[1:]) for row in hour_rows
+            ])
+            if rows:
+                db.execute(insert(HourlyRollup), rows)
+            written["hourly"] += len(rows)
+
+        logger.info(f"Rebuilt rollups: {written['daily']} daily rows, {written['hourly']} hourly rows")
+        return written
+
+    def _merge_rows(
+        self,
+        metric: str,
+        bucket_column: str,
+        source: Dict[str, Any],
+        grouped: List[tuple]
+    ) -> List[Dict[str, Any]]:
+        """Normalise raw GROUP BY rows into rollup rows (statuses/currencies may collapse)"""
+        default_currency = NO_CURRENCY if metric == RollupMetric.SIGNUPS else "USD"
+        merged: Dict[tuple, Dict[str, Any]] = {}
+        for row in grouped:
+            if source["currency"] is not None:
+                bucket, raw_status, currency, count, amount, tax = row
+            else:
+                bucket, raw_status, count, amount, tax = row
+                currency = None
+            status = self._raw_status(metric, raw_status)
+            currency = (currency or default_currency).upper()
+            key = (bucket, status, currency)
+            if key not in merged:
+                merged[key] = {
+                    "id": generate_uuid(), "metric": metric, bucket_column: bucket,
+                    "status": status, "currency": currency, "count": 0, "amount": 0.0, "tax": 0.0,
+                }
+            _add(merged[key], count, amount, tax)
+        return list(merged.values())
+
+rollup_service = RollupService()
@@ -1,78 +1,119 @@
 """
 Background Task Scheduler Service
-Runs recurring billing, dunning, and other automated tasks
+Runs recurring billing, dunning, automation rules and auto-charges at their
+deadlines (see app.services.deadline_scheduler)
 """
-import asyncio
 import logging
-from datetime import datetime
-from app.core.database import get_db
-from app.services.recurring_billing_service import RecurringBillingService
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional, Set
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.database import AsyncSessionLocal
+from app.core.time_buckets import to_naive_utc
+from app.models import ChargeSchedule, OrderAutomationRule, Subscription
+from app.services.auto_charge_scheduler import scheduler as auto_charge_scheduler
+from app.services.automation_scheduler import scheduler as automation_scheduler
+from app.services.deadline_scheduler import DeadlineScheduler, ScheduledJob
 from app.services.dunning_service import DunningService
+from app.services.recurring_billing_service import RecurringBillingService
+from app.services.renewal_engine import renewable_subscriptions
 
 logger = logging.getLogger(__name__)
 
+# Subscriptions are renewed this long before their period ends (see RenewalEngine.run)
+RENEWAL_WINDOW = timedelta(days=1)
+
+
+async def next_renewal_due(db: AsyncSession, now: datetime) -> Optional[datetime]:
+    """When the next active subscription enters the renewal window"""
+    period_end = (await db.execute(
+        renewable_subscriptions(func.min(Subscription.current_period_end))
+        .where(Subscription.current_period_end >= now)
+    )).scalar()
+    period_end = to_naive_utc(period_end)
+    return period_end - RENEWAL_WINDOW if period_end else None
+
 
 class SchedulerService:
     """Background task scheduler"""
-    
+
     def __init__(self):
-        self.running = False
         self.recurring_service = RecurringBillingService()
         self.dunning_service = DunningService()
-    
+        self.deadlines = DeadlineScheduler()
+        self.deadlines.register(ScheduledJob(
+            "renewals", self._with_session(self.recurring_service.process_renewals), next_renewal_due
+        ))
+        # No natural deadline: checked every SCHEDULER_MAX_INTERVAL (hourly)
+        self.deadlines.register(ScheduledJob("dunning", self._with_session(self.dunning_service.process_dunning)))
+        self.deadlines.register(ScheduledJob(
+            "payment-retries", self._with_session(self.recurring_service.process_payment_retries)
+        ))
+        self.deadlines.register(automation_scheduler.scheduled_job())
+        self.deadlines.register(auto_charge_scheduler.scheduled_job())
+
+    @property
+    def running(self) -> bool:
+        return self.deadlines.running
+
+    def _with_session(self, task: Callable[[AsyncSession], Awaitable[Any]]) -> Callable[[], Awaitable[Any]]:
+        async def run():
+            async with AsyncSessionLocal() as db:
+                result = await task(db)
+                await db.commit()
+                return result
+        return run
+
     async def start(self):
-        """Start the scheduler"""
-        self.running = True
+        """Start the scheduler (runs until stop())"""
         logger.info("Scheduler service started")
-        
-        while self.running:
-            try:
-                # Run every hour
-                await self._run_scheduled_tasks()
-                await asyncio.sleep(3600)  # Wait 1 hour
-            except Exception as e:
-                logger.error(f"Error in scheduler: {str(e)}", exc_info=True)
-                await asyncio.sleep(60)  # Wait 1 minute on error
-    
-    async def _run_scheduled_tasks(self, db):
-        """Run all scheduled tasks"""
-        logger.info("Running scheduled tasks...")
-        
-        try:
-            # Process recurring billing
-            await self.recurring_service.process_renewals(db)
-            
-            # Process dunning
-            await self.dunning_service.process_dunning(db)
-            
-            # Process payment retries
-            await self.recurring_service.process_payment_retries(db)
-            
-            logger.info("Scheduled tasks completed")
-        except Exception as e:
-            logger.error(f"Error running scheduled tasks: {str(e)}", exc_info=True)
-    
-    async def start_with_db(self, get_db_func):
-        """Start scheduler with database access"""
-        self.running = True
-        logger.info("Scheduler service started")
-        
-        while self.running:
-            try:
-                async for db in get_db_func():
-                    await self._run_scheduled_tasks(db)
-                    break
-                await asyncio.sleep(3600)  # Wait 1 hour
-            except Exception as e:
-                logger.error(f"Error in scheduler: {str(e)}", exc_info=True)
-                await asyncio.sleep(60)  # Wait 1 minute on error
-    
+        await self.deadlines.start()
+
+    def notify(self, *jobs: str):
+        """Re-read the deadlines of the given jobs now (e.g. after a rule was written)"""
+        self.deadlines.notify(*jobs)
+
+    def status(self) -> dict:
+        return self.deadlines.status()
+
     def stop(self):
         """Stop the scheduler"""
-        self.running = False
+        self.deadlines.stop()
         logger.info("Scheduler service stopped")
 
 
 # Global scheduler instance
 scheduler = SchedulerService()
 
+
+def _changed(obj: Any, *fields: str) -> bool:
+    state = inspect(obj)
+    return state.pending or any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_schedule_changes(session: Session, flush_context, instances):
+    """Remember which jobs' deadlines this transaction may move earlier"""
+    jobs: Set[str] = session.info.setdefault("scheduler_notify", set())
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, OrderAutomationRule) and _changed(obj, "next_execution", "status", "is_enabled"):
+            jobs.add("automation")
+        elif isinstance(obj, ChargeSchedule) and _changed(obj, "next_charge_date", "status"):
+            jobs.add("auto-charge")
+        elif isinstance(obj, Subscription) and _changed(obj, "current_period_end", "status"):
+            jobs.add("renewals")
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_scheduler(session: Session):
+    jobs = session.info.pop("scheduler_notify", None)
+    if jobs:
+        scheduler.notify(*jobs)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_schedule_changes(session: Session, previous_transaction):
+    session.info.pop("scheduler_notify", None)
@@ -0,0 +1,125 @@
+"""
+Number Sequence Service
+Hi/lo allocator for order and invoice numbers backed by the number_sequences table
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.core.config import settings
+from app.core.time_buckets import dialect_name
+from app.models.sequences import NumberSequence
+
+logger = logging.getLogger(__name__)
+
+# Returns the highest value already in use when a sequence row is first created
+SeedFunction = Callable[[AsyncSession], Awaitable[int]]
+
+
+def _insert_ignore(dialect: str, values: Dict):
+    """INSERT that leaves an existing row alone (another process won the race)"""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert(NumberSequence.__table__).values(**values).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        return dialect_insert(NumberSequence.__table__).values(**values).on_conflict_do_nothing()
+    return insert(NumberSequence.__table__).values(**values)
+
+
+async def seed_from_max(db: AsyncSession, column, prefix: str) -> int:
+    """Highest integer N among existing values spelled f"{prefix}{N}" (0 if none)"""
+    result = await db.execute(select(column).where(column.like(f"{prefix}%")))
+    highest = 0
+    for value in result.scalars():
+        suffix = value[len(prefix):]
+        if suffix.isdigit():
+            highest = max(highest, int(suffix))
+    return highest
+
+
+class SequenceAllocator:
+    """
+    Hands out increasing integers per named sequence.
+
+    On PostgreSQL (and any server database) each process reserves a block of
+    values with a single UPDATE ... RETURNING in its own short transaction and
+    then serves numbers from memory, so issuing a number is O(1) and concurrent
+    checkouts never receive the same value. Numbers are unique and increasing
+    per process but may have gaps (unused block tails after a restart).
+
+    SQLite has a single writer, so there the counter is bumped by one inside
+    the caller's transaction: a rolled-back document also rolls back its number.
+    """
+
+    # Dialects whose counter is advanced in the caller's transaction, one value at a time
+    single_writer_dialects = ("sqlite",)
+
+    def __init__(self, block_size: Optional[int] = None):
+        self.block_size = block_size or settings.NUMBER_SEQUENCE_BLOCK_SIZE
+        # (database url, sequence name) -> (next value, end of block exclusive)
+        self._blocks: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    async def next_value(self, db: AsyncSession, name: str, seed: Optional[SeedFunction] = None) -> int:
+        """Next value of the sequence"""
+        return (await self.next_values(db, name, 1, seed))[0]
+
+    async def next_values(
+        self,
+        db: AsyncSession,
+        name: str,
+        count: int,
+        seed: Optional[SeedFunction] = None
+    ) -> List[int]:
+        """count consecutive-per-block values, e.g. for a bulk renewal run"""
+        if count <= 0:
+            return []
+
+        bind = db.bind
+        if not isinstance(bind, AsyncEngine) or dialect_name(db) in self.single_writer_dialects:
+            first = await self._reserve(db, db, name, count, seed)
+            return list(range(first, first + count))
+
+        key = (str(bind.url), name)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        values: List[int] = []
+        async with lock:
+            while len(values) < count:
+                current, end = self._blocks.get(key, (0, 0))
+                if current >= end:
+                    size = max(self.block_size, count - len(values))
+                    async with bind.begin() as conn:
+                        current = await self._reserve(conn, db, name, size, seed)
+                    end = current + size
+                take = min(end - current, count - len(values))
+                values.extend(range(current, current + take))
+                self._blocks[key] = (current + take, end)
+        return values
+
+    async def _reserve(self, executor, db: AsyncSession, name: str, size: int, seed: Optional[SeedFunction]) -> int:
+        """Advance the counter by size and return the first reserved value"""
+        table = NumberSequence.__table__
+        bump = (
+            update(table)
+            .where(table.c.name == name)
+            .values(next_value=table.c.next_value + size)
+            .returning(table.c.next_value)
+        )
+        row = (await executor.execute(bump)).first()
+        if row is None:
+            start = (await seed(db)) + 1 if seed else 1
+            await executor.execute(_insert_ignore(dialect_name(db), {"name": name, "next_value": start}))
+            logger.info(f"Created number sequence {name} starting at {start}")
+            row = (await executor.execute(bump)).first()
+        return row[0] - size
+
+    def reset(self):
+        """Forget cached blocks (tests, or after restoring a database)"""
+        self._blocks.clear()
+
+
+sequence_allocator = SequenceAllocator()
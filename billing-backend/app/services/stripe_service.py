@@ -23,9 +23,10 @@ class StripeService:
         amount: float,
         currency: str = "usd",
         payment_method_id: Optional[str] = None,
-        metadata: Optional[Dict[str, str]] = None
+        metadata: Optional[Dict[str, str]] = None,
+        idempotency_key: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Create a Stripe payment intent"""
+        """Create a Stripe payment intent (a repeated idempotency_key returns the original intent)"""
         try:
             if not settings.STRIPE_SECRET_KEY:
                 return {
@@ -43,6 +44,9 @@ class StripeService:
                 intent_data["payment_method"] = payment_method_id
                 intent_data["confirm"] = True
             
+            if idempotency_key:
+                intent_data["idempotency_key"] = idempotency_key
+            
             intent = stripe.PaymentIntent.create(**intent_data)
             
             return {
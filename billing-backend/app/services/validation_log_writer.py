@@ -0,0 +1,153 @@
+"""
+License Validation Log Writer
+
+Write-behind buffer for license_validation_logs. LicenseValidator records one
+row per validation attempt; committing each one made every /licenses/validate
+call wait on an fsync plus five index updates. record() only appends to an
+in-memory buffer, and ValidationLogWriter (started in the app lifespan) writes
+the buffer with one multi-row INSERT every VALIDATION_LOG_FLUSH_MS, or as soon
+as VALIDATION_LOG_BATCH_SIZE rows are waiting. stop() writes whatever is left.
+
+String values are cut to their column lengths when recorded. If a batch
+INSERT is rejected, its rows are retried one at a time and only the rows the
+database rejects (constraint or data errors) are dropped and counted, so one
+bad row cannot hold up the rest. Rows that fail for any other reason (database
+unreachable) are kept for the next flush. At most VALIDATION_LOG_MAX_PENDING
+rows are held; beyond that the oldest are dropped (and counted) rather than
+letting a database outage grow the process.
+"""
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, String
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import LicenseValidationLog, generate_uuid
+
+logger = logging.getLogger(__name__)
+
+# Maximum lengths of the String columns (request values such as feature and
+# license_key arrive unbounded)
+COLUMN_LENGTHS = {
+    column.name: column.type.length
+    for column in LicenseValidationLog.__table__.columns
+    if isinstance(column.type, String) and column.type.length
+}
+
+
+class ValidationLogWriter:
+    """Buffers LicenseValidationLog rows and inserts them in batches"""
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.batch_size = settings.VALIDATION_LOG_BATCH_SIZE
+        self.flush_interval = settings.VALIDATION_LOG_FLUSH_MS / 1000
+        self.max_pending = settings.VALIDATION_LOG_MAX_PENDING
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.running = False
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, **values: Any):
+        """Queue one validation log row (LicenseValidationLog column values); never blocks"""
+        values.setdefault("id", generate_uuid())
+        values.setdefault("validated_at", datetime.utcnow())
+        for name, length in COLUMN_LENGTHS.items():
+            value = values.get(name)
+            if isinstance(value, str) and len(value) > length:
+                values[name] = value[:length]
+        self._pending.append(values)
+        if len(self._pending) > self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def _insert(self, rows: List[Dict[str, Any]]):
+        async with self.session_factory() as db:
+            await db.execute(insert(LicenseValidationLog).values(rows))
+            await db.commit()
+
+    async def _insert_one_by_one(self, batch: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]], Optional[Exception]]:
+        """
+        Retry a rejected batch row by row, dropping the rows the database
+        rejects; returns (rows written, rows to keep for the next flush, error)
+        """
+        written = 0
+        for index, row in enumerate(batch):
+            try:
+                await self._insert([row])
+            except (IntegrityError, DataError) as e:
+                self.dropped += 1
+                logger.error(f"Dropped license validation log row for {row.get('license_key')!r}: {e}")
+                continue
+            except Exception as e:
+                return written, batch[index:], e
+            written += 1
+        return written, [], None
+
+    async def flush(self) -> int:
+        """Insert everything buffered so far; returns the number of rows written"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        written = 0
+        async with self._flush_lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                try:
+                    await self._insert(batch)
+                    written += len(batch)
+                    continue
+                except (IntegrityError, DataError):
+                    batch_written, keep, error = await self._insert_one_by_one(batch)
+                    written += batch_written
+                except Exception as e:
+                    keep, error = batch, e
+                if keep:
+                    # Keep the rows (oldest first) for the next flush
+                    self._pending.extendleft(reversed(keep))
+                    while len(self._pending) > self.max_pending:
+                        self._pending.popleft()
+                        self.dropped += 1
+                    logger.error(f"Failed to write {len(keep)} license validation log rows: {error}")
+                    break
+        self.written += written
+        return written
+
+    async def start(self):
+        """Flush every flush_interval (or when a batch fills up) until stop() is called"""
+        self._wakeup = asyncio.Event()
+        self.running = True
+        logger.info("License validation log writer started")
+        while self.running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+        # stop() was called: write what is left before returning
+        await self.flush()
+        if self._pending:
+            logger.error(f"{len(self._pending)} license validation log rows could not be written at shutdown")
+        logger.info("License validation log writer stopped")
+
+    def stop(self):
+        """Ask start() to write the remaining rows and return"""
+        self.running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+
+validation_log_writer = ValidationLogWriter()
@@ -0,0 +1,228 @@
+"""
+Benchmark /dashboard/stats: legacy per-metric queries vs DashboardStatsService
+
+Seeds a throwaway SQLite database (100k orders by default), then compares the
+number of statements and the latency of both implementations and checks that
+they return identical numbers.
+
+Usage:
+    python scripts/bench_dashboard_stats.py [--orders 100000] [--runs 20] [--database-url URL]
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select, func, and_, event, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.database import Base
+from app.models import (
+    User, License, Plan, Payment, Domain, Invoice, Subscription, Order, generate_uuid,
+    LicenseStatus, PaymentStatus, InvoiceStatus, SubscriptionStatus, OrderStatus, DomainStatus
+)
+from app.services.dashboard_stats_service import DashboardStatsService
+from app.services.rollup_service import rollup_service
+
+
+def legacy_queries(period_start, period_end, now):
+    """The statements get_dashboard_stats issued before the stats engine, in order"""
+    first_day_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    week_ago = now - timedelta(days=7)
+    day_ago = now - timedelta(days=1)
+    in_period = lambda col: col.between(period_start, period_end)
+
+    return [
+        ("total_customers", select(func.count(func.distinct(Payment.user_id))).where(in_period(Payment.created_at))),
+        ("active_customers", select(func.count(func.distinct(Payment.user_id))).select_from(Payment)
+            .join(User, Payment.user_id == User.id)
+            .where(and_(User.is_admin == False, User.is_active == True, in_period(Payment.created_at)))),
+        ("new_customers_this_month", select(func.count(User.id)).where(and_(User.is_admin == False, User.created_at >= first_day_of_month))),
+        ("new_customers_this_week", select(func.count(User.id)).where(and_(User.is_admin == False, User.created_at >= week_ago))),
+        ("recent_signups", select(func.count(User.id)).where(and_(User.is_admin == False, User.created_at >= day_ago))),
+        ("total_products", select(func.count(Plan.id))),
+        ("active_products", select(func.count(Plan.id)).where(Plan.is_active == True)),
+        ("total_licenses", select(func.count(License.id)).where(in_period(License.created_at))),
+        ("active_licenses", select(func.count(License.id)).where(and_(License.status == LicenseStatus.ACTIVE, in_period(License.created_at)))),
+        ("suspended_licenses", select(func.count(License.id)).where(and_(License.status == LicenseStatus.SUSPENDED, in_period(License.created_at)))),
+        ("expired_licenses", select(func.count(License.id)).where(and_(License.status == LicenseStatus.EXPIRED, in_period(License.created_at)))),
+        ("total_subscriptions", select(func.count(Subscription.id)).where(in_period(Subscription.created_at))),
+        ("active_subscriptions", select(func.count(Subscription.id)).where(and_(Subscription.status == SubscriptionStatus.ACTIVE, in_period(Subscription.created_at)))),
+        ("cancelled_subscriptions", select(func.count(Subscription.id)).where(and_(Subscription.status == SubscriptionStatus.CANCELLED, in_period(Subscription.created_at)))),
+        ("total_orders", select(func.count(Order.id)).where(in_period(Order.created_at))),
+        ("pending_orders", select(func.count(Order.id)).where(and_(Order.status == OrderStatus.PENDING, in_period(Order.created_at)))),
+        ("completed_orders", select(func.count(Order.id)).where(and_(Order.status == OrderStatus.COMPLETED, in_period(Order.created_at)))),
+        ("recent_orders", select(func.count(Order.id)).where(and_(Order.created_at >= day_ago, in_period(Order.created_at)))),
+        ("total_revenue", select(func.sum(Order.total)).where(and_(Order.status == OrderStatus.COMPLETED, in_period(Order.created_at)))),
+        ("monthly_revenue", select(func.sum(Order.total)).where(and_(Order.status == OrderStatus.COMPLETED, in_period(Order.created_at)))),
+        ("weekly_revenue", select(func.sum(Order.total)).where(and_(Order.status == OrderStatus.COMPLETED, in_period(Order.created_at)))),
+        ("recent_payments", select(func.count(Payment.id)).where(and_(Payment.status == PaymentStatus.SUCCEEDED, Payment.created_at >= day_ago, in_period(Payment.created_at)))),
+        ("total_invoices", select(func.count(Invoice.id)).where(in_period(Invoice.created_at))),
+        ("paid_invoices", select(func.count(Invoice.id)).where(and_(Invoice.status == InvoiceStatus.PAID, in_period(Invoice.created_at)))),
+        ("unpaid_invoices", select(func.count(Invoice.id)).where(and_(Invoice.status.in_([InvoiceStatus.OPEN, InvoiceStatus.DRAFT]), in_period(Invoice.created_at)))),
+        ("overdue_invoices", select(func.count(Invoice.id)).where(and_(Invoice.status == InvoiceStatus.OVERDUE, in_period(Invoice.created_at)))),
+        ("total_domains", select(func.count(Domain.id)).where(in_period(Domain.created_at))),
+        ("active_domains", select(func.count(Domain.id)).where(and_(Domain.status == "active", in_period(Domain.created_at)))),
+    ]
+
+
+async def legacy_stats(db: AsyncSession, period_start, period_end, now):
+    stats = {}
+    for name, statement in legacy_queries(period_start, period_end, now):
+        result = await db.execute(statement)
+        stats[name] = result.scalar() or 0
+    for key in ("total_revenue", "monthly_revenue", "weekly_revenue"):
+        stats[key] = float(stats[key])
+    return stats
+
+
+async def seed(engine, n_orders: int, now: datetime):
+    """Insert a synthetic dataset with n_orders orders spread over ~13 months"""
+    rng = random.Random(42)
+    n_users = max(n_orders // 20, 10)
+    span = timedelta(days=400).total_seconds()
+    ts = lambda: now - timedelta(seconds=rng.random() * span)
+
+    users = [
+        {"id": generate_uuid(), "email": f"user{i}@bench.local", "password_hash": "x",
+         "full_name": f"User {i}", "is_admin": i == 0, "is_active": rng.random() > 0.1, "created_at": ts()}
+        for i in range(n_users)
+    ]
+    user_ids = [u["id"] for u in users]
+    plans = [
+        {"id": generate_uuid(), "name": f"Plan {i}", "price_monthly": 10.0 * (i + 1),
+         "price_yearly": 100.0 * (i + 1), "is_active": i != 2}
+        for i in range(3)
+    ]
+    licenses = [
+        {"id": generate_uuid(), "user_id": rng.choice(user_ids), "plan_id": rng.choice(plans)["id"],
+         "license_key": f"NP-BENCH-{i:08d}", "status": rng.choice(list(LicenseStatus)), "created_at": ts()}
+        for i in range(n_users)
+    ]
+    subscriptions = [
+        {"id": generate_uuid(), "license_id": lic["id"], "status": rng.choice(list(SubscriptionStatus)), "created_at": ts()}
+        for lic in licenses
+    ]
+    domains = [
+        {"id": generate_uuid(), "user_id": rng.choice(user_ids), "domain_name": f"bench{i}.example",
+         "status": rng.choice(list(DomainStatus)), "created_at": ts()}
+        for i in range(n_users // 2)
+    ]
+    orders = [
+        {"id": generate_uuid(), "customer_id": rng.choice(user_ids), "status": rng.choice(list(OrderStatus)),
+         "subtotal": 50.0, "total": round(rng.uniform(5, 500), 2), "created_at": ts()}
+        for _ in range(n_orders)
+    ]
+    payments = [
+        {"id": generate_uuid(), "user_id": rng.choice(user_ids), "amount": round(rng.uniform(5, 500), 2),
+         "status": rng.choice(list(PaymentStatus)), "created_at": ts()}
+        for _ in range(n_orders // 2)
+    ]
+    invoices = [
+        {"id": generate_uuid(), "user_id": rng.choice(user_ids), "invoice_number": f"INV-BENCH-{i:08d}",
+         "status": rng.choice(list(InvoiceStatus)), "subtotal": 50.0, "total": 55.0, "created_at": ts()}
+        for i in range(n_orders // 2)
+    ]
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for model, rows in (
+            (User, users), (Plan, plans), (License, licenses), (Subscription, subscriptions),
+            (Domain, domains), (Order, orders), (Payment, payments), (Invoice, invoices),
+        ):
+            for i in range(0, len(rows), 5000):
+                await conn.execute(insert(model.__table__), rows[i:i + 5000])
+
+    # Core inserts bypass the flush listener, so build the rollups explicitly
+    async with AsyncSession(engine) as db:
+        await rollup_service.rebuild(db)
+        await db.commit()
+
+
+async def measure(label, runs, fn, counter):
+    timings = []
+    counter["n"] = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = await fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    queries = counter["n"] // runs
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<28} queries/request={queries:<4} median={statistics.median(timings):8.2f} ms  p95={p95:8.2f} ms")
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--period", choices=["week", "month", "year"], default="year")
+    parser.add_argument("--database-url", default=None, help="Seed into this database instead of a temp SQLite file")
+    args = parser.parse_args()
+
+    tmpdir = None
+    url = args.database_url
+    if not url:
+        tmpdir = tempfile.mkdtemp(prefix="bench_dashboard_")
+        url = f"sqlite+aiosqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    engine = create_async_engine(url)
+    now = datetime.utcnow()
+    days = {"week": 7, "month": 30, "year": 365}[args.period]
+    period_start, period_end = now - timedelta(days=days), now
+
+    print(f"Seeding {args.orders} orders into {url} ...")
+    started = time.perf_counter()
+    await seed(engine, args.orders, now)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s\n")
+
+    counter = {"n": 0}
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter["n"] += 1
+
+    Session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def run_legacy():
+        async with Session() as db:
+            return await legacy_stats(db, period_start, period_end, now)
+
+    async def run_engine():
+        async with Session() as db:
+            return await DashboardStatsService(db).get_stats(period_start, period_end, now)
+
+    # Warm the page cache so both sides read from memory
+    await run_legacy()
+
+    legacy = await measure("legacy (sequential)", args.runs, run_legacy, counter)
+    current = await measure("stats engine (concurrent)", args.runs, run_engine, counter)
+
+    # Float sums may differ in the last ulp depending on aggregation order
+    mismatched = {
+        k: (legacy[k], current[k]) for k in legacy
+        if not math.isclose(legacy[k], current[k], rel_tol=1e-9, abs_tol=1e-6)
+    }
+    print("\nResults identical:", "yes" if not mismatched else f"NO {mismatched}")
+
+    await engine.dispose()
+    if tmpdir:
+        import shutil
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return 0 if not mismatched else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,211 @@
+"""
+Benchmark the Redis side of /licenses/validate: one command per counter vs
+the single USAGE_COUNTERS_SCRIPT call
+
+Points at --redis-url when given; otherwise runs a minimal built-in RESP
+stand-in that answers the handful of commands involved (the script itself is
+executed by a Python port of the Lua) and adds --rtt-ms to every reply to
+emulate the network round-trip to a real Redis. Reports p50/p99 latency of the
+rate-limit and anomaly checks for each approach.
+
+Usage:
+    python scripts/bench_license_validation.py [--requests 2000] [--concurrency 50] [--rtt-ms 0.5]
+    python scripts/bench_license_validation.py --redis-url redis://localhost:6379/15
+"""
+import argparse
+import asyncio
+import hashlib
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import redis.asyncio as redis
+
+from app.core.license_validation import (
+    LicenseValidator, LICENSE_RATE_LIMIT, IP_RATE_LIMIT,
+    ANOMALY_MAX_VALIDATIONS, ANOMALY_MAX_IPS
+)
+
+
+class StandInRedis:
+    """Built-in stand-in: in-memory counters, sets and sorted sets behind RESP2"""
+
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.data = {}
+        self.scripts = set()
+
+    def usage_counters(self, keys, args):
+        """Python port of USAGE_COUNTERS_SCRIPT"""
+        license_limit, license_window, ip_limit, ip_window, validations_limit, validations_window = map(int, args[:6])
+        now = float(args[7])
+        license_count = self.data[keys[0]] = self.data.get(keys[0], 0) + 1
+        if license_count > license_limit:
+            return [license_count, -1, -1, -1]
+        ip_count = self.data[keys[1]] = self.data.get(keys[1], 0) + 1
+        if ip_count > ip_limit:
+            return [license_count, ip_count, -1, -1]
+        validations = self.data.setdefault(keys[2], {})
+        validations[args[7]] = now
+        for member in [m for m, score in validations.items() if score <= now - validations_window]:
+            del validations[member]
+        if len(validations) > validations_limit:
+            return [license_count, ip_count, len(validations), -1]
+        ips = self.data.setdefault(keys[3], set())
+        ips.add(args[8])
+        return [license_count, ip_count, len(validations), len(ips)]
+
+    def execute(self, name, args):
+        if name in ("INCR", "INCRBY"):
+            self.data[args[0]] = self.data.get(args[0], 0) + (int(args[1]) if len(args) > 1 else 1)
+            return self.data[args[0]]
+        if name == "ZADD":
+            self.data.setdefault(args[0], {})[args[2]] = float(args[1])
+            return 1
+        if name == "ZREMRANGEBYSCORE":
+            members = self.data.get(args[0], {})
+            stale = [m for m, score in members.items() if float(args[1]) <= score <= float(args[2])]
+            for member in stale:
+                del members[member]
+            return len(stale)
+        if name in ("ZCARD", "SCARD"):
+            return len(self.data.get(args[0], ()))
+        if name == "SADD":
+            members = self.data.setdefault(args[0], set())
+            added = args[1] not in members
+            members.add(args[1])
+            return int(added)
+        if name == "EXPIRE":
+            return 1
+        if name == "SCRIPT" and args[0].upper() == "LOAD":
+            sha = hashlib.sha1(args[1].encode()).hexdigest()
+            self.scripts.add(sha)
+            return sha
+        if name == "EVALSHA":
+            if args[0] not in self.scripts:
+                return RuntimeError("NOSCRIPT No matching script")
+            count = int(args[1])
+            return self.usage_counters(args[2:2 + count], args[2 + count:])
+        if name == "FLUSHDB":
+            self.data.clear()
+            return "OK"
+        return "OK"
+
+    @staticmethod
+    def encode(value):
+        if isinstance(value, RuntimeError):
+            return f"-{value}\r\n".encode()
+        if isinstance(value, int):
+            return f":{value}\r\n".encode()
+        if isinstance(value, list):
+            return f"*{len(value)}\r\n".encode() + b"".join(StandInRedis.encode(v) for v in value)
+        if value == "OK":
+            return b"+OK\r\n"
+        return f"${len(value)}\r\n{value}\r\n".encode()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+                args = []
+                for _ in range(int(header[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2].decode())
+                reply = self.execute(args[0].upper(), args[1:])
+                await asyncio.sleep(self.rtt)
+                writer.write(self.encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def sequential_counters(client, license_key, ip_address):
+    """What LicenseValidator did before: one awaited command per counter"""
+    license_rate_key = f"license:rate:{license_key}"
+    license_count = await client.incr(license_rate_key)
+    if license_count == 1:
+        await client.expire(license_rate_key, LICENSE_RATE_LIMIT[1])
+    if license_count > LICENSE_RATE_LIMIT[0]:
+        return
+    ip_rate_key = f"ip:rate:{ip_address}"
+    ip_count = await client.incr(ip_rate_key)
+    if ip_count == 1:
+        await client.expire(ip_rate_key, IP_RATE_LIMIT[1])
+    if ip_count > IP_RATE_LIMIT[0]:
+        return
+    now = time.time()
+    validations_key = f"license:validations:{license_key}"
+    await client.zadd(validations_key, {str(now): now})
+    await client.zremrangebyscore(validations_key, 0, now - ANOMALY_MAX_VALIDATIONS[1])
+    await client.zcard(validations_key)
+    ips_key = f"license:ips:{license_key}"
+    await client.sadd(ips_key, ip_address)
+    await client.expire(ips_key, ANOMALY_MAX_IPS[1])
+    await client.scard(ips_key)
+
+
+async def run(label, check, requests, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(n):
+        async with slots:
+            started = time.perf_counter()
+            await check(f"BENCH-{n % 200:04d}", f"10.0.{n % 7}.{n % 250}")
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:>22}: p50 {p50:7.2f}ms  p99 {p99:7.2f}ms  {requests / elapsed:8.1f} checks/s")
+    return p50, p99
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rtt-ms", type=float, default=0.5)
+    parser.add_argument("--redis-url", help="benchmark against this Redis (its current database is flushed)")
+    args = parser.parse_args()
+
+    server = None
+    url = args.redis_url
+    if url is None:
+        stand_in = StandInRedis(args.rtt_ms / 1000)
+        server = await asyncio.start_server(stand_in.handle, "127.0.0.1", 0)
+        url = f"redis://127.0.0.1:{server.sockets[0].getsockname()[1]}/0"
+        print(f"Redis stand-in: built-in, {args.rtt_ms}ms per reply")
+
+    client = redis.from_url(url, decode_responses=True, max_connections=args.concurrency)
+    validator = LicenseValidator()
+    validator.redis_client = client
+    try:
+        await client.flushdb()
+        before = await run("command per counter", lambda key, ip: sequential_counters(client, key, ip),
+                           args.requests, args.concurrency)
+        await client.flushdb()
+        after = await run("one script call", validator._usage_counters, args.requests, args.concurrency)
+        await client.flushdb()
+    finally:
+        await client.aclose()
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+    print(f"speed-up: p50 {before[0] / after[0]:.1f}x, p99 {before[1] / after[1]:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""
+Benchmark API latency while PDFs render: inline rendering vs PDFRenderPool
+
+Starts a small FastAPI app with a trivial /ping endpoint and a /pdf endpoint,
+fires N concurrent /pdf requests and measures /ping latency meanwhile. With
+inline rendering every ping waits for the renders in front of it; with the
+process pool /ping latency should stay flat.
+
+Usage:
+    python scripts/bench_pdf_render.py [--renders 50] [--workers 2] [--interval 0.005]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from fastapi import FastAPI, Response
+
+from app.services.pdf_render_pool import PDFRenderPool
+from app.services.pdf_renderers import render_invoice_pdf, warm_up
+
+
+def sample_invoice(index):
+    items = [
+        {"description": f"Service {n}", "quantity": 1, "unit_price": 10.0 + n, "amount": 10.0 + n}
+        for n in range(15)
+    ]
+    subtotal = sum(item["amount"] for item in items)
+    return SimpleNamespace(
+        id=f"inv-{index}", invoice_number=f"INV-{index:04d}", invoice_date=datetime.utcnow(), created_at=None,
+        due_date=None, status="open", payment_method=None, subtotal=subtotal, tax=0.0, total=subtotal, items=items,
+    )
+
+
+SAMPLE_USER = SimpleNamespace(id="bench", email="bench@example.com", full_name="Bench Customer", company_name=None)
+
+
+def build_app(pool):
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/pdf/{index}")
+    async def pdf(index: int):
+        if pool is None:
+            content = render_invoice_pdf(sample_invoice(index), SAMPLE_USER)
+        else:
+            content = await pool.render(render_invoice_pdf, sample_invoice(index), SAMPLE_USER, None)
+        return Response(content=content, media_type="application/pdf")
+
+    return app
+
+
+async def run(label, pool, renders, interval):
+    app = build_app(pool)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Baseline ping latency with no renders
+        idle = []
+        for _ in range(20):
+            started = time.perf_counter()
+            await client.get("/ping")
+            idle.append((time.perf_counter() - started) * 1000)
+
+        latencies = []
+
+        renders_done = asyncio.Event()
+
+        async def probe():
+            # Pings follow a fixed schedule and latency counts from the scheduled
+            # time, so stalls of the event loop are not hidden (coordinated omission)
+            scheduled = time.perf_counter()
+            while not renders_done.is_set():
+                scheduled += interval
+                await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+                await client.get("/ping")
+                latencies.append((time.perf_counter() - scheduled) * 1000)
+
+        probe_task = asyncio.create_task(probe())
+        await asyncio.sleep(interval)
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.get(f"/pdf/{i}") for i in range(renders)))
+        render_seconds = time.perf_counter() - started
+        renders_done.set()
+        await probe_task
+
+    assert all(r.status_code == 200 and r.content.startswith(b"%PDF") for r in responses)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{label:>16}: {renders} PDFs in {render_seconds:6.2f}s | /ping idle p50 {statistics.median(idle):6.2f} ms | "
+        f"under load ({len(latencies)} probes) p50 {statistics.median(latencies):7.2f} ms  p99 {p99:7.2f} ms  max {latencies[-1]:7.2f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between /ping probes")
+    args = parser.parse_args()
+
+    warm_up()
+    await run("inline", None, args.renders, args.interval)
+
+    pool = PDFRenderPool(workers=args.workers, max_queue=args.renders, timeout=120)
+    await pool.start()
+    try:
+        await run(f"pool ({args.workers} procs)", pool, args.renders, args.interval)
+    finally:
+        await pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+"""
+Benchmark EmailService delivery: one SMTP connection per message vs the pool
+
+Runs a local SMTP stand-in (aiosmtpd when installed, otherwise a minimal
+built-in sink) that adds --handshake-ms of latency to the greeting/EHLO/AUTH
+exchange to emulate the TCP+TLS+login round-trips of a real relay, then sends
+the same batch of messages both ways and reports messages per second.
+
+Usage:
+    python scripts/bench_smtp_pool.py [--messages 500] [--concurrency 20] [--handshake-ms 30]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from email.mime.text import MIMEText
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import aiosmtplib
+
+from app.services.email_service import SMTPConnectionPool
+
+
+class SinkSMTPServer:
+    """Built-in stand-in: accepts everything, sleeps on session setup"""
+
+    def __init__(self, handshake_delay):
+        self.handshake_delay = handshake_delay
+        self.messages = 0
+
+    async def handle(self, reader, writer):
+        await asyncio.sleep(self.handshake_delay)
+        writer.write(b"220 sink ESMTP\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode().strip().upper()
+                if command.startswith(("EHLO", "HELO")):
+                    writer.write(b"250-sink\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+                elif command.startswith("AUTH"):
+                    await asyncio.sleep(self.handshake_delay)
+                    writer.write(b"235 2.7.0 Authentication successful\r\n")
+                elif command == "DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    while (await reader.readline()) != b".\r\n":
+                        pass
+                    self.messages += 1
+                    writer.write(b"250 OK\r\n")
+                elif command == "QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b"250 OK\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def start_server(handshake_delay):
+    """(port, stop coroutine function, message counter) of the SMTP stand-in"""
+    try:
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.smtp import AuthResult
+    except ImportError:
+        sink = SinkSMTPServer(handshake_delay)
+        server = await asyncio.start_server(sink.handle, "127.0.0.1", 0)
+
+        async def stop():
+            server.close()
+            await server.wait_closed()
+
+        print("SMTP stand-in: built-in sink (aiosmtpd not installed)")
+        return server.sockets[0].getsockname()[1], stop, lambda: sink.messages
+
+    class Handler:
+        messages = 0
+
+        async def handle_EHLO(self, server, session, envelope, hostname, responses):
+            await asyncio.sleep(handshake_delay * 2)  # greeting + login round-trips
+            session.host_name = hostname
+            return responses
+
+        async def handle_DATA(self, server, session, envelope):
+            Handler.messages += 1
+            return "250 OK"
+
+    controller = Controller(
+        Handler(), hostname="127.0.0.1", port=0, auth_require_tls=False,
+        authenticator=lambda *args: AuthResult(success=True)
+    )
+    controller.start()
+
+    async def stop():
+        controller.stop()
+
+    print("SMTP stand-in: aiosmtpd")
+    return controller.port, stop, lambda: Handler.messages
+
+
+def make_message(n):
+    message = MIMEText(f"Reminder {n}")
+    message["From"], message["To"], message["Subject"] = "billing@example.com", f"user{n}@example.com", "Reminder"
+    return message
+
+
+async def run(label, send, messages, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(n):
+        async with slots:
+            await send(make_message(n))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(messages)))
+    elapsed = time.perf_counter() - started
+    print(f"{label:>24}: {messages} messages in {elapsed:6.2f}s = {messages / elapsed:8.1f} msg/s")
+    return messages / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--handshake-ms", type=float, default=30.0)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    port, stop, delivered = await start_server(args.handshake_ms / 1000)
+    try:
+        async def per_message(message):
+            # What EmailService did before: connect, login, send, quit
+            await aiosmtplib.send(message, hostname="127.0.0.1", port=port, username="bench", password="bench")
+
+        before = await run("connection per message", per_message, args.messages, args.concurrency)
+
+        pool = SMTPConnectionPool("127.0.0.1", port, "bench", "bench", size=args.pool_size)
+        after = await run(f"pool ({args.pool_size} connections)", pool.send_message, args.messages, args.concurrency)
+        await pool.close()
+    finally:
+        await stop()
+
+    print(f"speed-up: {after / before:.1f}x, {delivered()} messages delivered, pool opened {pool.connections_opened} connections")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,12 +1,29 @@
 """
 Automated Billing Scheduler
 Handles recurring invoice generation, overdue checking, and payment reminders
+
+Invoices are partitioned by a hash of user_id, so a run can be split across
+processes (--workers N) or hosts (--shard i/n, one cron entry per host), each
+with its own engine. Run-wide statements (marking invoices overdue) are
+executed by shard 0 only.
+
+Each run holds a lease on the shard it was given for as long as all of its
+worker processes take, so an overlapping run of the same shard (with any
+--workers) skips. Leases only exclude runs of the same i/n: every host must
+use the same n, and an unsharded run must not be scheduled next to sharded
+ones.
 """
+import argparse
 import asyncio
+import hashlib
+import multiprocessing
 import sys
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -16,6 +33,8 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy import select, and_
 from app.models import Invoice, User, InvoiceStatus, RecurringInterval
 from app.services.invoice_service import InvoiceService
+from app.services.job_lease import JobLeaseManager
+from app.services.pdf_render_pool import pdf_render_pool
 from app.core.config import settings
 import logging
 
@@ -26,77 +45,137 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Invoices loaded (with their users) per query
+INVOICE_CHUNK_SIZE = 500
+
+
+class Shard:
+    """Partition index of count; users are assigned by a stable hash of user_id"""
+    
+    def __init__(self, index: int = 0, count: int = 1):
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard {index}/{count}")
+        self.index = index
+        self.count = count
+    
+    @classmethod
+    def parse(cls, value: str) -> "Shard":
+        """'i/n' -> Shard(i, n)"""
+        try:
+            index, count = (int(part) for part in value.split("/"))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Expected i/n, got {value!r}")
+        try:
+            return cls(index, count)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+    
+    def split(self, workers: int) -> List["Shard"]:
+        """This shard divided among workers processes"""
+        return [Shard(self.index + self.count * worker, self.count * workers) for worker in range(workers)]
+    
+    def owns(self, user_id: str) -> bool:
+        if self.count == 1:
+            return True
+        digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.count == self.index
+    
+    @property
+    def lease_name(self) -> str:
+        if self.count == 1:
+            return "billing:scheduler-script"
+        return f"billing:scheduler-script:{self.index}/{self.count}"
+    
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
 
 class BillingScheduler:
     """Automated billing scheduler"""
     
-    def __init__(self, db_session: AsyncSession):
+    def __init__(self, db_session: AsyncSession, shard: Optional[Shard] = None):
         self.db = db_session
         self.invoice_service = InvoiceService()
+        self.shard = shard or Shard()
+        # task -> {"processed", "failed", "seconds"}
+        self.stats: Dict[str, Dict[str, Any]] = {}
+    
+    def _record(self, task: str, started: float, processed: int, failed: int = 0):
+        self.stats[task] = {"processed": processed, "failed": failed, "seconds": time.monotonic() - started}
+    
+    async def _owned_invoice_ids(self, *conditions: Any) -> List[str]:
+        """Ids of the invoices matching conditions whose user belongs to this shard"""
+        result = await self.db.execute(select(Invoice.id, Invoice.user_id).where(and_(*conditions)))
+        return [invoice_id for invoice_id, user_id in result.all() if self.shard.owns(user_id)]
+    
+    async def _with_users(self, invoice_ids: List[str]) -> AsyncIterator[Sequence[Any]]:
+        """(invoice, user) rows for invoice_ids, INVOICE_CHUNK_SIZE invoices per query"""
+        for start in range(0, len(invoice_ids), INVOICE_CHUNK_SIZE):
+            result = await self.db.execute(
+                select(Invoice, User)
+                .join(User, User.id == Invoice.user_id)
+                .where(Invoice.id.in_(invoice_ids[start:start + INVOICE_CHUNK_SIZE]))
+            )
+            yield result.all()
     
     async def check_and_mark_overdue(self):
         """Check for overdue invoices and update their status"""
         logger.info("Checking for overdue invoices...")
+        started = time.monotonic()
         
         count = await self.invoice_service.check_overdue_invoices(self.db)
         
         logger.info(f"Marked {count} invoices as overdue")
+        self._record("mark_overdue", started, count)
         return count
     
     async def generate_recurring_invoices(self):
         """Generate new invoices from recurring invoices that are due"""
-        logger.info("Checking for recurring invoices to generate...")
+        logger.info(f"Checking for recurring invoices to generate (shard {self.shard})...")
         
         now = datetime.utcnow()
+        started = time.monotonic()
         generated_count = 0
+        failed_count = 0
         
-        # Find recurring invoices that need to be generated
-        result = await self.db.execute(
-            select(Invoice).where(
-                and_(
-                    Invoice.is_recurring == True,
-                    Invoice.status == InvoiceStatus.PAID,  # Only generate from paid invoices
-                    Invoice.recurring_next_date <= now
-                )
-            )
+        # Find recurring invoices that need to be generated (ids only; rows are loaded per chunk)
+        parent_ids = await self._owned_invoice_ids(
+            Invoice.is_recurring == True,
+            Invoice.status == InvoiceStatus.PAID,  # Only generate from paid invoices
+            Invoice.recurring_next_date <= now
         )
-        recurring_invoices = result.scalars().all()
         
-        for parent_invoice in recurring_invoices:
-            try:
-                # Generate new invoice
-                new_invoice = await self.invoice_service.generate_recurring_invoice(
-                    parent_invoice=parent_invoice,
-                    db=self.db
-                )
-                
-                # Update parent's next generation date
-                if parent_invoice.recurring_interval == RecurringInterval.MONTHLY:
-                    parent_invoice.recurring_next_date = now + timedelta(days=30)
-                elif parent_invoice.recurring_interval == RecurringInterval.QUARTERLY:
-                    parent_invoice.recurring_next_date = now + timedelta(days=90)
-                elif parent_invoice.recurring_interval == RecurringInterval.YEARLY:
-                    parent_invoice.recurring_next_date = now + timedelta(days=365)
-                
-                await self.db.commit()
-                
-                # Get user and send invoice
-                result = await self.db.execute(
-                    select(User).where(User.id == new_invoice.user_id)
-                )
-                user = result.scalars().first()
-                
-                if user:
+        async for rows in self._with_users(parent_ids):
+            for parent_invoice, user in rows:
+                try:
+                    # Generate new invoice
+                    new_invoice = await self.invoice_service.generate_recurring_invoice(
+                        parent_invoice=parent_invoice,
+                        db=self.db
+                    )
+                    
+                    # Update parent's next generation date
+                    if parent_invoice.recurring_interval == RecurringInterval.MONTHLY:
+                        parent_invoice.recurring_next_date = now + timedelta(days=30)
+                    elif parent_invoice.recurring_interval == RecurringInterval.QUARTERLY:
+                        parent_invoice.recurring_next_date = now + timedelta(days=90)
+                    elif parent_invoice.recurring_interval == RecurringInterval.YEARLY:
+                        parent_invoice.recurring_next_date = now + timedelta(days=365)
+                    
+                    await self.db.commit()
+                    
                     await self.invoice_service.send_invoice_email(new_invoice, user, self.db)
+                    
+                    generated_count += 1
+                    logger.info(f"Generated recurring invoice: {new_invoice.invoice_number}")
                 
-                generated_count += 1
-                logger.info(f"Generated recurring invoice: {new_invoice.invoice_number}")
-                
-            except Exception as e:
-                logger.error(f"Failed to generate recurring invoice from {parent_invoice.invoice_number}: {str(e)}")
-                continue
+                except Exception as e:
+                    logger.error(f"Failed to generate recurring invoice from {parent_invoice.invoice_number}: {str(e)}")
+                    failed_count += 1
+                    continue
         
         logger.info(f"Generated {generated_count} recurring invoices")
+        self._record("recurring_invoices", started, generated_count, failed_count)
         return generated_count
     
     async def send_payment_reminders(self, days_before: int = 3):
@@ -104,40 +183,23 @@ class BillingScheduler:
         logger.info(f"Sending payment reminders for invoices due in {days_before} days...")
         
         now = datetime.utcnow()
+        started = time.monotonic()
         target_date = now + timedelta(days=days_before)
-        sent_count = 0
         
-        # Find invoices due soon that haven't had a reminder recently
-        result = await self.db.execute(
-            select(Invoice).where(
-                and_(
-                    Invoice.status.in_([InvoiceStatus.OPEN, InvoiceStatus.PARTIALLY_PAID]),
-                    Invoice.due_date <= target_date,
-                    Invoice.due_date > now,
-                    # Only send if no reminder in last 24 hours
-                    (Invoice.last_reminder_sent.is_(None) | (Invoice.last_reminder_sent < now - timedelta(hours=24)))
-                )
-            )
+        # Invoices due soon that haven't had a reminder recently
+        invoice_ids = await self._owned_invoice_ids(
+            Invoice.status.in_([InvoiceStatus.OPEN, InvoiceStatus.PARTIALLY_PAID]),
+            Invoice.due_date <= target_date,
+            Invoice.due_date > now,
+            # Only send if no reminder in last 24 hours
+            (Invoice.last_reminder_sent.is_(None) | (Invoice.last_reminder_sent < now - timedelta(hours=24)))
         )
-        invoices = result.scalars().all()
-        
-        for invoice in invoices:
-            try:
-                # Get user
-                result = await self.db.execute(
-                    select(User).where(User.id == invoice.user_id)
-                )
-                user = result.scalars().first()
-                
-                if user:
-                    await self.invoice_service.send_payment_reminder(invoice, user, self.db)
-                    sent_count += 1
-                
-            except Exception as e:
-                logger.error(f"Failed to send reminder for invoice {invoice.invoice_number}: {str(e)}")
-                continue
+        sent_count = 0
+        async for reminders in self._with_users(invoice_ids):
+            sent_count += await self.invoice_service.send_payment_reminders(self.db, reminders, now=now)
         
         logger.info(f"Sent {sent_count} payment reminders")
+        self._record("payment_reminders", started, sent_count, len(invoice_ids) - sent_count)
         return sent_count
     
     async def send_overdue_reminders(self):
@@ -145,49 +207,33 @@ class BillingScheduler:
         logger.info("Sending reminders for overdue invoices...")
         
         now = datetime.utcnow()
-        sent_count = 0
+        started = time.monotonic()
         
-        # Find overdue invoices that need reminders
-        result = await self.db.execute(
-            select(Invoice).where(
-                and_(
-                    Invoice.status.in_([InvoiceStatus.OVERDUE, InvoiceStatus.PARTIALLY_PAID]),
-                    Invoice.due_date < now,
-                    # Send reminder every 7 days for overdue invoices
-                    (Invoice.last_reminder_sent.is_(None) | (Invoice.last_reminder_sent < now - timedelta(days=7)))
-                )
-            )
+        # Overdue invoices that need reminders
+        invoice_ids = await self._owned_invoice_ids(
+            Invoice.status.in_([InvoiceStatus.OVERDUE, InvoiceStatus.PARTIALLY_PAID]),
+            Invoice.due_date < now,
+            # Send reminder every 7 days for overdue invoices
+            (Invoice.last_reminder_sent.is_(None) | (Invoice.last_reminder_sent < now - timedelta(days=7)))
         )
-        invoices = result.scalars().all()
-        
-        for invoice in invoices:
-            try:
-                # Get user
-                result = await self.db.execute(
-                    select(User).where(User.id == invoice.user_id)
-                )
-                user = result.scalars().first()
-                
-                if user:
-                    await self.invoice_service.send_payment_reminder(invoice, user, self.db)
-                    sent_count += 1
-                
-            except Exception as e:
-                logger.error(f"Failed to send overdue reminder for invoice {invoice.invoice_number}: {str(e)}")
-                continue
+        sent_count = 0
+        async for reminders in self._with_users(invoice_ids):
+            sent_count += await self.invoice_service.send_payment_reminders(self.db, reminders, now=now)
         
         logger.info(f"Sent {sent_count} overdue reminders")
+        self._record("overdue_reminders", started, sent_count, len(invoice_ids) - sent_count)
         return sent_count
     
     async def run_all_tasks(self):
         """Run all automated billing tasks"""
         logger.info("="*60)
-        logger.info("Starting automated billing tasks")
+        logger.info(f"Starting automated billing tasks (shard {self.shard})")
         logger.info("="*60)
         
         try:
-            # Check and mark overdue invoices
-            await self.check_and_mark_overdue()
+            # Check and mark overdue invoices (one statement for every shard)
+            if self.shard.index == 0:
+                await self.check_and_mark_overdue()
             
             # Generate recurring invoices
             await self.generate_recurring_invoices()
@@ -201,28 +247,128 @@ class BillingScheduler:
             logger.info("="*60)
             logger.info("All automated billing tasks completed successfully")
             logger.info("="*60)
-            
+        
         except Exception as e:
             logger.error(f"Error running automated billing tasks: {str(e)}")
             raise
 
 
-async def main():
-    """Main entry point"""
-    # Create async engine
-    engine = create_async_engine(
+def create_engine():
+    """Async engine for this process"""
+    return create_async_engine(
         settings.DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://') if settings.DATABASE_URL.startswith('postgresql://') else settings.DATABASE_URL,
         echo=False
     )
+
+
+async def run_shard(shard: Shard) -> Dict[str, Any]:
+    """Run every task for one shard (the caller holds its lease); returns its stats"""
+    engine = create_engine()
     
     # Create async session
     async_session = sessionmaker(
         engine, class_=AsyncSession, expire_on_commit=False
     )
     
-    async with async_session() as session:
-        scheduler = BillingScheduler(session)
-        await scheduler.run_all_tasks()
+    try:
+        async with async_session() as session:
+            scheduler = BillingScheduler(session, shard)
+            try:
+                await scheduler.run_all_tasks()
+                return {"shard": str(shard), "skipped": False, "tasks": scheduler.stats}
+            except Exception as e:
+                return {"shard": str(shard), "skipped": False, "tasks": scheduler.stats, "error": str(e)}
+    finally:
+        # Invoice emails start the PDF render pool; a worker process cannot exit while it runs
+        await pdf_render_pool.shutdown()
+        await engine.dispose()
+
+
+def _run_shard_process(index: int, count: int) -> Dict[str, Any]:
+    """Worker process entry point"""
+    return asyncio.run(run_shard(Shard(index, count)))
+
+
+async def run(shard: Shard, workers: int = 1) -> List[Dict[str, Any]]:
+    """
+    Run shard split across workers processes; returns the stats of each part.
+    Skipped if another run holds the shard's lease.
+    """
+    engine = create_engine()
+    try:
+        # Overlapping cron runs (or several hosts running the same crontab) must not
+        # double-send: the lease covers every worker process of this run
+        async with JobLeaseManager(engine).hold(shard.lease_name) as owned:
+            if not owned:
+                logger.info(f"Another billing scheduler run holds shard {shard}; skipping")
+                return [{"shard": str(shard), "skipped": True, "tasks": {}}]
+            parts = shard.split(workers)
+            if len(parts) == 1:
+                return [await run_shard(parts[0])]
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(max_workers=len(parts), mp_context=multiprocessing.get_context("spawn")) as pool:
+                return list(await asyncio.gather(*[
+                    loop.run_in_executor(pool, _run_shard_process, part.index, part.count) for part in parts
+                ]))
+    finally:
+        await engine.dispose()
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Totals per task across shards, with throughput over the whole run"""
+    tasks: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        for task, stats in result["tasks"].items():
+            total = tasks.setdefault(task, {"processed": 0, "failed": 0, "seconds": 0.0})
+            total["processed"] += stats["processed"]
+            total["failed"] += stats["failed"]
+            total["seconds"] = max(total["seconds"], stats["seconds"])
+    processed = sum(task["processed"] for task in tasks.values())
+    return {
+        "shards": len(results),
+        "skipped_shards": [result["shard"] for result in results if result["skipped"]],
+        "errors": {result["shard"]: result["error"] for result in results if result.get("error")},
+        "tasks": tasks,
+        "processed": processed,
+        "failed": sum(task["failed"] for task in tasks.values()),
+        "elapsed_seconds": elapsed,
+        "items_per_second": processed / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def log_summary(summary: Dict[str, Any]):
+    logger.info("="*60)
+    logger.info(f"Billing run summary: {summary['shards']} shard(s) in {summary['elapsed_seconds']:.1f}s")
+    for task, stats in summary["tasks"].items():
+        rate = stats["processed"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+        logger.info(f"  {task:<20} {stats['processed']:>8} ok {stats['failed']:>6} failed {rate:>10.1f}/s")
+    logger.info(f"  {'total':<20} {summary['processed']:>8} ok {summary['failed']:>6} failed "
+                f"{summary['items_per_second']:>10.1f}/s")
+    if summary["skipped_shards"]:
+        logger.warning(f"Skipped shards (held by another run): {', '.join(summary['skipped_shards'])}")
+    for shard, error in summary["errors"].items():
+        logger.error(f"Shard {shard} aborted: {error}")
+    logger.info("="*60)
+
+
+async def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Run the automated billing tasks")
+    parser.add_argument("--shard", type=Shard.parse, default=Shard(),
+                        help="process only partition i of n (by hash of user_id), e.g. 0/4; every host must use the same n")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="split this shard across N processes, each with its own engine")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    
+    started = time.monotonic()
+    results = await run(args.shard, args.workers)
+    
+    summary = summarize(results, time.monotonic() - started)
+    log_summary(summary)
+    if summary["errors"]:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -234,6 +380,12 @@ if __name__ == "__main__":
     
     # Or run every hour
     0 * * * * cd /path/to/billing-backend && python scripts/billing_scheduler.py
+    
+    # Month start: 8 processes on this host
+    python scripts/billing_scheduler.py --workers 8
+    
+    # Or spread over two hosts, 4 processes each (every host must use the same n)
+    python scripts/billing_scheduler.py --shard 0/2 --workers 4   # host A
+    python scripts/billing_scheduler.py --shard 1/2 --workers 4   # host B
     """
     asyncio.run(main())
-
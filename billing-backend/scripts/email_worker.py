@@ -0,0 +1,48 @@
+"""
+Email Outbox Worker
+Delivers queued emails (email_outbox) outside the API process
+
+Run with EMAIL_OUTBOX_WORKER_ENABLED=false on the API servers so SMTP never
+competes with request handling.
+
+Usage:
+    python scripts/email_worker.py          # poll forever
+    python scripts/email_worker.py --once   # deliver everything due and exit
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.email_outbox_service import email_outbox_worker
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Deliver queued emails")
+    parser.add_argument("--once", action="store_true", help="deliver due emails and exit")
+    args = parser.parse_args()
+
+    if args.once:
+        processed = await email_outbox_worker.run_pending()
+        logger.info(f"Claimed {processed} email(s)")
+        return
+
+    try:
+        await email_outbox_worker.start()
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        email_outbox_worker.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
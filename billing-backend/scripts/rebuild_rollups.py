@@ -0,0 +1,55 @@
+"""
+Backfill / repair the analytics rollup tables from the raw tables
+
+The tables are backfilled when they are created (migration 007 or init_db);
+run this any time the rollups are suspected to have drifted (e.g. after
+manual SQL edits to orders/invoices).
+
+Usage:
+    python scripts/rebuild_rollups.py                      # full history
+    python scripts/rebuild_rollups.py --start 2025-01-01   # from a day onwards
+    python scripts/rebuild_rollups.py --start 2025-01-01 --end 2025-01-31 --metric orders
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.database import AsyncSessionLocal, init_db
+from app.models import RollupMetric
+from app.services.rollup_service import rollup_service
+
+
+METRICS = [
+    RollupMetric.ORDERS, RollupMetric.PAYMENTS, RollupMetric.INVOICES,
+    RollupMetric.INVOICE_REVENUE, RollupMetric.SIGNUPS,
+]
+
+
+async def rebuild(start_day, end_day, metrics):
+    await init_db()
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        written = await rollup_service.rebuild(session, start_day, end_day, metrics)
+        await session.commit()
+    elapsed = time.perf_counter() - started
+    print(f"✅ Rebuilt {written['daily']} daily and {written['hourly']} hourly rollup rows in {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild analytics rollups")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--metric", action="append", choices=METRICS,
+                        help="Only rebuild this metric (repeatable); default all")
+    args = parser.parse_args()
+    asyncio.run(rebuild(args.start, args.end, args.metric or METRICS))
+
+
+if __name__ == "__main__":
+    main()
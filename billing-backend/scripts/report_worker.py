@@ -0,0 +1,48 @@
+"""
+Report Job Worker
+Processes queued CSV exports (POST /reports/jobs) outside the API process
+
+Run with REPORT_WORKER_ENABLED=false on the API servers so exports never
+compete with request handling.
+
+Usage:
+    python scripts/report_worker.py          # poll forever
+    python scripts/report_worker.py --once   # drain the queue and exit
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.report_job_service import report_job_worker
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Process queued report exports")
+    parser.add_argument("--once", action="store_true", help="process pending jobs and exit")
+    args = parser.parse_args()
+
+    if args.once:
+        processed = await report_job_worker.run_pending()
+        logger.info(f"Processed {processed} report job(s)")
+        return
+
+    try:
+        await report_job_worker.start()
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        report_job_worker.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
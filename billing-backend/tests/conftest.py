@@ -2,28 +2,30 @@
 Pytest configuration and fixtures
 """
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.main import app
 from app.core.database import Base, get_db
 
 # Create test database
 TEST_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+sync_engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
 
 
 @pytest.fixture(scope="function")
 def db_session():
     """Create a fresh database for each test"""
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=sync_engine)
     db = TestingSessionLocal()
     try:
         yield db
     finally:
         db.close()
-        Base.metadata.drop_all(bind=engine)
+        Base.metadata.drop_all(bind=sync_engine)
 
 
 @pytest.fixture(scope="function")
@@ -63,3 +65,18 @@ def authenticated_client(test_client):
     
     return test_client
 
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    """Async engine on a fresh SQLite file with every table created"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    """Session factory bound to the engine fixture"""
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
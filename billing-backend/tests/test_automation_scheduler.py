@@ -0,0 +1,67 @@
+"""
+Tests for the backlog-draining automation rule executor
+"""
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+
+from app.models import (
+    User, Order, OrderStatus, OrderAutomationRule, AutomationTrigger, AutomationAction,
+    AutomationRuleStatus, EmailOutbox
+)
+from app.services.automation_scheduler import AutomationScheduler
+
+
+def email_rule(order_id, due):
+    return OrderAutomationRule(
+        order_id=order_id, name="reminder", trigger_type=AutomationTrigger.CUSTOM_INTERVAL,
+        action_type=AutomationAction.SEND_EMAIL, next_execution=due,
+        action_config={"subject": "Reminder", "template": "Hi {{customer_name}}, {{order_total}} is due"}
+    )
+
+
+class TestAutomationScheduler:
+    """A burst of due rules is drained in one run, in concurrent batches"""
+
+    @pytest.mark.asyncio
+    async def test_drains_backlog(self, session_factory):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            orders = []
+            for n in range(5):
+                user = User(email=f"auto{n}@example.com", password_hash="x", full_name=f"Customer {n}")
+                db.add(user)
+                await db.flush()
+                order = Order(customer_id=user.id, status=OrderStatus.PENDING, subtotal=5, total=5)
+                db.add(order)
+                orders.append(order)
+            await db.flush()
+            db.add_all([email_rule(orders[n % 5].id, now - timedelta(minutes=n)) for n in range(23)])
+            db.add(email_rule("missing-order", now - timedelta(minutes=1)))
+            db.add(email_rule(orders[0].id, now + timedelta(hours=1)))
+            await db.commit()
+
+        scheduler = AutomationScheduler(session_factory=session_factory, batch_size=10, concurrency=4)
+        status = await scheduler.get_scheduler_status()
+        assert (status["pending_rules"], status["total_active_rules"]) == (24, 25)
+        assert status["backlog_lag_seconds"] >= 22 * 60
+
+        run = await scheduler.process_pending_rules()
+
+        assert (run["batches"], run["processed"], run["successful"]) == (3, 23, 23)
+        assert run["max_lag_seconds"] >= 22 * 60 and run["rules_per_second"] > 0
+        async with session_factory() as db:
+            statuses = (await db.execute(
+                select(OrderAutomationRule.status, func.count()).group_by(OrderAutomationRule.status)
+            )).all()
+            assert dict(statuses) == {
+                AutomationRuleStatus.COMPLETED: 23,
+                AutomationRuleStatus.DISABLED: 1,
+                AutomationRuleStatus.ACTIVE: 1,
+            }
+            bodies = (await db.execute(select(EmailOutbox.body))).scalars().all()
+            assert len(bodies) == 23 and "Hi Customer 0, $5.00 is due" in bodies
+
+        status = await scheduler.get_scheduler_status()
+        assert (status["pending_rules"], status["total_active_rules"]) == (0, 1)
+        assert status["last_run"]["processed"] == 23 and status["totals"]["successful"] == 23
@@ -0,0 +1,104 @@
+"""
+Tests for the sharded billing scheduler script
+"""
+import argparse
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.models import User, Invoice, InvoiceStatus
+from app.services.job_lease import JobLeaseManager
+from scripts import billing_scheduler
+from scripts.billing_scheduler import BillingScheduler, Shard, run, summarize
+
+
+class TestShard:
+    """Every user belongs to exactly one shard, however the run is split"""
+
+    def test_split_partitions_users(self):
+        user_ids = [str(uuid.uuid4()) for _ in range(400)]
+        for shard, workers in ((Shard(), 4), (Shard(1, 2), 3)):
+            parts = shard.split(workers)
+            for user_id in user_ids:
+                owners = [part for part in parts if part.owns(user_id)]
+                assert len(owners) == (1 if shard.owns(user_id) else 0)
+        counts = [sum(part.owns(user_id) for user_id in user_ids) for part in Shard().split(4)]
+        assert min(counts) > 50  # roughly even
+
+    def test_parse(self):
+        shard = Shard.parse("2/8")
+        assert (shard.index, shard.count, shard.lease_name) == (2, 8, "billing:scheduler-script:2/8")
+        assert Shard().lease_name == "billing:scheduler-script"
+        for value in ("8/8", "x", "1/0"):
+            with pytest.raises(argparse.ArgumentTypeError):
+                Shard.parse(value)
+
+    def test_summarize(self):
+        results = [
+            {"shard": "0/2", "skipped": False, "tasks": {"recurring_invoices": {"processed": 30, "failed": 1, "seconds": 3.0}}},
+            {"shard": "1/2", "skipped": False, "tasks": {"recurring_invoices": {"processed": 10, "failed": 0, "seconds": 1.0}},
+             "error": "boom"},
+        ]
+        summary = summarize(results, 4.0)
+        assert summary["tasks"]["recurring_invoices"] == {"processed": 40, "failed": 1, "seconds": 3.0}
+        assert (summary["processed"], summary["failed"], summary["items_per_second"]) == (40, 1, 10.0)
+        assert summary["errors"] == {"1/2": "boom"} and summary["skipped_shards"] == []
+
+
+class TestShardedRuns:
+    """A run only loads and locks the users of its own shard"""
+
+    @pytest.mark.asyncio
+    async def test_reminders_load_only_owned_invoices(self, engine, session_factory, monkeypatch):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            users = [User(email=f"shard{n}@example.com", password_hash="x") for n in range(8)]
+            db.add_all(users)
+            await db.flush()
+            db.add_all([
+                Invoice(user_id=user.id, invoice_number=f"INV-S-{n:04d}", status=InvoiceStatus.OPEN,
+                        subtotal=10, total=10, amount_due=10, currency="USD", due_date=now + timedelta(days=2))
+                for n, user in enumerate(users)
+            ])
+            await db.commit()
+        shard = Shard(1, 2)
+        owned = {user.id for user in users if shard.owns(user.id)}
+        assert 0 < len(owned) < len(users)
+
+        sent = []
+
+        async def send_payment_reminders(db, reminders, now=None):
+            sent.extend(reminders)
+            return len(reminders)
+
+        loaded = []
+        listener = lambda *args: loaded.append(args[3]) if "JOIN users" in args[2] else None
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            async with session_factory() as db:
+                scheduler = BillingScheduler(db, shard)
+                monkeypatch.setattr(scheduler.invoice_service, "send_payment_reminders", send_payment_reminders)
+                assert await scheduler.send_payment_reminders(days_before=3) == len(owned)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+        assert {invoice.user_id for invoice, user in sent} == owned
+        # Only the owned invoices were loaded with their users
+        assert len(loaded) == 1 and len(loaded[0]) == len(owned)
+
+    @pytest.mark.asyncio
+    async def test_overlapping_run_of_the_shard_skips(self, engine, monkeypatch):
+        monkeypatch.setattr(billing_scheduler, "create_engine", lambda: create_async_engine(engine.url))
+
+        async def run_shard(shard):
+            return {"shard": str(shard), "skipped": False, "tasks": {}}
+
+        monkeypatch.setattr(billing_scheduler, "run_shard", run_shard)
+        assert await run(Shard(1, 2)) == [{"shard": "1/2", "skipped": False, "tasks": {}}]
+
+        # Another run of shard 1/2 (with any number of workers) holds its lease
+        async with JobLeaseManager(engine, owner="other-host").hold(Shard(1, 2).lease_name):
+            assert await run(Shard(1, 2), workers=4) == [{"shard": "1/2", "skipped": True, "tasks": {}}]
@@ -0,0 +1,160 @@
+"""
+Tests for the indexed auto-charge schedule
+"""
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import select, text, update
+
+from app.models import User, Order, OrderStatus, Payment, PaymentStatus, ChargeSchedule, ChargeScheduleStatus
+from app.services.auto_charge_scheduler import AutoChargeScheduler, due_charges, upsert_charge_schedule
+
+
+class FakeStripe:
+    def __init__(self, declined, on_charge=None):
+        self.declined = declined
+        self.on_charge = on_charge
+        self.charged = []
+        self.idempotency_keys = []
+
+    async def create_payment_intent(self, amount, currency="usd", payment_method_id=None, metadata=None,
+                                    idempotency_key=None):
+        self.charged.append(metadata["order_id"])
+        self.idempotency_keys.append(idempotency_key)
+        if self.on_charge:
+            await self.on_charge()
+        if payment_method_id in self.declined:
+            return {"success": False, "error": "Card error: declined"}
+        return {"success": True, "payment_intent_id": f"pi_{len(self.charged)}", "status": "succeeded"}
+
+
+class TestChargeSchedule:
+    """Due charges come off the (status, next_charge_date) index"""
+
+    @pytest.mark.asyncio
+    async def test_due_query_uses_index(self, session_factory):
+        async with session_factory() as db:
+            plan = (await db.execute(text(
+                "EXPLAIN QUERY PLAN SELECT id FROM charge_schedule "
+                "WHERE status = 'SCHEDULED' AND next_charge_date <= '2026-01-01' ORDER BY next_charge_date"
+            ))).all()
+        detail = " ".join(row[-1] for row in plan)
+        assert "ix_charge_schedule_status_next_charge_date" in detail
+        assert "TEMP B-TREE" not in detail  # rows come back already ordered
+
+    @pytest.mark.asyncio
+    async def test_charges_due_orders(self, session_factory):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            user = User(email="charge@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+            orders = [Order(customer_id=user.id, status=OrderStatus.PENDING, subtotal=10, total=10) for _ in range(4)]
+            orders[3].status = OrderStatus.CANCELLED
+            db.add_all(orders)
+            await db.flush()
+            for order, method, due in zip(
+                orders,
+                ["pm_ok", "pm_declined", "pm_ok", "pm_ok"],
+                [now - timedelta(hours=1), now - timedelta(minutes=5), now + timedelta(days=1), now - timedelta(hours=2)]
+            ):
+                await upsert_charge_schedule(db, order, True, method, due, max_attempts=2, retry_interval_days=3)
+            await db.commit()
+
+            assert [row["id"] for row in await due_charges(db, now)] == [orders[3].id, orders[0].id, orders[1].id]
+
+        scheduler = AutoChargeScheduler(session_factory=session_factory)
+        scheduler.stripe_service = FakeStripe(declined={"pm_declined"})
+        summary = await scheduler.process_auto_charge_queue()
+
+        assert summary == {"processed": 3, "successful": 1, "failed": 2}
+        assert sorted(scheduler.stripe_service.charged) == sorted([orders[0].id, orders[1].id])
+        assert len(set(scheduler.stripe_service.idempotency_keys)) == 2
+        async with session_factory() as db:
+            schedules = {
+                s.order_id: s for s in (await db.execute(select(ChargeSchedule))).scalars().all()
+            }
+            assert schedules[orders[0].id].status == ChargeScheduleStatus.SUCCEEDED
+            assert schedules[orders[3].id].status == ChargeScheduleStatus.DISABLED
+            assert schedules[orders[2].id].status == ChargeScheduleStatus.SCHEDULED
+            declined = schedules[orders[1].id]
+            assert (declined.status, declined.attempts) == (ChargeScheduleStatus.SCHEDULED, 1)
+            assert declined.next_charge_date > now + timedelta(days=2)
+            assert declined.last_error == "Card error: declined"
+
+            payment = (await db.execute(select(Payment))).scalars().one()
+            assert (payment.order_id, payment.status, payment.user_id) == (orders[0].id, PaymentStatus.SUCCEEDED, user.id)
+            assert (await db.get(Order, orders[0].id)).status == OrderStatus.COMPLETED
+
+            # Second decline uses up max_attempts
+            declined.next_charge_date = now - timedelta(seconds=1)
+            await db.commit()
+
+        summary = await scheduler.process_auto_charge_queue()
+        assert summary == {"processed": 1, "successful": 0, "failed": 1}
+        async with session_factory() as db:
+            declined = (await db.execute(
+                select(ChargeSchedule).where(ChargeSchedule.order_id == orders[1].id)
+            )).scalars().one()
+            assert (declined.status, declined.attempts) == (ChargeScheduleStatus.FAILED, 2)
+
+    @pytest.mark.asyncio
+    async def test_skips_rows_claimed_by_another_worker(self, session_factory):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            user = User(email="lease@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+            orders = [Order(customer_id=user.id, status=OrderStatus.PENDING, subtotal=10, total=10) for _ in range(2)]
+            db.add_all(orders)
+            await db.flush()
+            schedules = [
+                await upsert_charge_schedule(db, order, True, "pm_ok", now - timedelta(minutes=n + 1), 3, 1)
+                for n, order in enumerate(orders)
+            ]
+            await db.commit()
+
+        async def steal_the_other_row():
+            # Another worker re-claims the row still queued after this batch's lease ran out
+            async with session_factory() as db:
+                await db.execute(
+                    update(ChargeSchedule).where(ChargeSchedule.order_id == orders[0].id)
+                    .values(next_charge_date=datetime.utcnow() + timedelta(minutes=7))
+                )
+                await db.commit()
+
+        scheduler = AutoChargeScheduler(session_factory=session_factory)
+        scheduler.stripe_service = FakeStripe(declined=set(), on_charge=steal_the_other_row)
+        summary = await scheduler.process_auto_charge_queue()
+
+        # Oldest first: orders[1] is charged, orders[0] now belongs to the other worker
+        assert summary == {"processed": 1, "successful": 1, "failed": 0}
+        assert scheduler.stripe_service.charged == [orders[1].id]
+        assert scheduler.stripe_service.idempotency_keys == [f"auto-charge:{schedules[1].id}:1:1"]
+
+    @pytest.mark.asyncio
+    async def test_reconfigure_after_decline_uses_a_new_key(self, session_factory):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            user = User(email="retry@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+            order = Order(customer_id=user.id, status=OrderStatus.PENDING, subtotal=10, total=10)
+            db.add(order)
+            await db.flush()
+            await upsert_charge_schedule(db, order, True, "pm_declined", now - timedelta(minutes=1), 3, 1)
+            await db.commit()
+
+        scheduler = AutoChargeScheduler(session_factory=session_factory)
+        scheduler.stripe_service = FakeStripe(declined={"pm_declined"})
+        assert await scheduler.process_auto_charge_queue() == {"processed": 1, "successful": 0, "failed": 1}
+
+        # The customer switches to a new card straight away: attempts start over
+        async with session_factory() as db:
+            order = await db.get(Order, order.id)
+            schedule = await upsert_charge_schedule(db, order, True, "pm_ok", now - timedelta(seconds=1), 3, 1)
+            await db.commit()
+            assert schedule.attempts == 0
+        assert await scheduler.process_auto_charge_queue() == {"processed": 1, "successful": 1, "failed": 0}
+
+        first, second = scheduler.stripe_service.idempotency_keys
+        assert (first, second) == (f"auto-charge:{schedule.id}:1:1", f"auto-charge:{schedule.id}:2:1")
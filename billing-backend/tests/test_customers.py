@@ -0,0 +1,84 @@
+"""
+Tests for the admin customer list
+"""
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+from app.api.v1.customers import get_customers
+from app.models import (
+    User, Plan, License, Subscription, Domain, Payment, Invoice,
+    LicenseStatus, SubscriptionStatus, PaymentStatus, InvoiceStatus
+)
+
+
+async def seed_customers(db, count):
+    now = datetime.utcnow()
+    admin = User(email="admin@example.com", password_hash="x", is_admin=True)
+    plan = Plan(name="Basic", price_monthly=10, price_yearly=100)
+    db.add_all([admin, plan])
+    await db.flush()
+
+    for i in range(count):
+        user = User(email=f"customer{i}@example.com", password_hash="x", full_name=f"Customer {i}")
+        db.add(user)
+        await db.flush()
+        for j in range(2):
+            lic = License(user_id=user.id, plan_id=plan.id, license_key=f"NP-TEST-{i:04d}-{j}",
+                          status=LicenseStatus.ACTIVE if j == 0 else LicenseStatus.SUSPENDED)
+            db.add(lic)
+            await db.flush()
+            db.add(Subscription(license_id=lic.id,
+                                status=SubscriptionStatus.ACTIVE if j == 0 else SubscriptionStatus.CANCELLED))
+        db.add(Domain(user_id=user.id, domain_name=f"customer{i}.example"))
+        db.add_all([
+            Payment(user_id=user.id, amount=10.0 * (k + 1), status=PaymentStatus.SUCCEEDED,
+                    created_at=now - timedelta(days=k))
+            for k in range(3)
+        ])
+        db.add(Payment(user_id=user.id, amount=99.0, status=PaymentStatus.FAILED))
+        db.add_all([
+            Invoice(user_id=user.id, invoice_number=f"INV-{i:04d}-{k}", subtotal=10, total=10,
+                    status=status)
+            for k, status in enumerate([InvoiceStatus.PAID, InvoiceStatus.OPEN, InvoiceStatus.OVERDUE])
+        ])
+    await db.commit()
+    return admin, now
+
+
+class TestCustomerList:
+    """GET /customers enriches a whole page with a fixed number of queries"""
+
+    @pytest.mark.asyncio
+    async def test_query_count_independent_of_page_size(self, engine, session_factory):
+        async with session_factory() as db:
+            admin, now = await seed_customers(db, 12)
+
+        statements = []
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        counts = {}
+        for limit in (1, 5, 12):
+            statements.clear()
+            async with session_factory() as db:
+                customers = await get_customers(
+                    skip=0, limit=limit, search=None, is_active=None, has_licenses=None, admin=admin, db=db
+                )
+            assert len(customers) == limit
+            counts[limit] = len(statements)
+
+        assert counts[1] == counts[5] == counts[12]
+
+        customer = customers[0]
+        assert customer.total_licenses == 2
+        assert customer.active_licenses == 1
+        assert customer.total_subscriptions == 2
+        assert customer.active_subscriptions == 1
+        assert customer.total_domains == 1
+        assert customer.total_payments == pytest.approx(60.0)
+        assert customer.total_invoices == 3
+        assert customer.outstanding_invoices == 2
+        assert customer.last_payment_date.replace(tzinfo=None) == now
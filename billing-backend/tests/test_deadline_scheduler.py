@@ -0,0 +1,166 @@
+"""
+Tests for the deadline-driven background scheduler
+"""
+import asyncio
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import app.services.scheduler_service as scheduler_service
+from app.models import (
+    User, Order, OrderStatus, OrderAutomationRule, AutomationTrigger, AutomationAction,
+    Plan, License, Subscription, SubscriptionStatus
+)
+from app.services.deadline_scheduler import DeadlineScheduler, ScheduledJob
+
+
+@asynccontextmanager
+async def no_session():
+    yield None
+
+
+class OtherWorkersLease:
+    """Leases that another worker always holds, until an hour from now"""
+
+    def __init__(self):
+        self.expires = datetime.utcnow() + timedelta(hours=1)
+
+    @asynccontextmanager
+    async def hold(self, name):
+        yield False
+
+    async def expires_at(self, name):
+        return self.expires
+
+
+class TestDeadlineScheduler:
+    """Jobs run at their deadline, and a notify() re-reads it without polling"""
+
+    @pytest.mark.asyncio
+    async def test_wakes_for_earlier_deadline(self):
+        deadline = {"at": datetime.utcnow() + timedelta(hours=1)}
+        runs, lookups = [], []
+
+        async def run():
+            runs.append(datetime.utcnow())
+            deadline["at"] = None  # work done, nothing pending
+
+        async def next_due(db, now):
+            lookups.append(now)
+            return deadline["at"]
+
+        scheduler = DeadlineScheduler(session_factory=no_session)
+        scheduler.register(ScheduledJob("job", run, next_due, max_interval=3600, min_interval=0, exclusive=False))
+        task = asyncio.create_task(scheduler.start())
+        try:
+            await asyncio.sleep(0.2)
+            assert runs == [] and len(lookups) == 1  # sleeping, not polling
+
+            deadline["at"] = datetime.utcnow() + timedelta(seconds=0.2)
+            scheduler.notify("job")
+            await asyncio.sleep(0.6)
+            assert len(runs) == 1
+            assert scheduler.jobs["job"].due > datetime.utcnow() + timedelta(minutes=59)
+        finally:
+            scheduler.stop()
+            await asyncio.wait_for(task, 1)
+
+    @pytest.mark.asyncio
+    async def test_rule_writes_notify_scheduler(self, session_factory, monkeypatch):
+        notified = []
+
+        class Recorder:
+            def notify(self, *jobs):
+                notified.append(set(jobs))
+
+        monkeypatch.setattr(scheduler_service, "scheduler", Recorder())
+        async with session_factory() as db:
+            user = User(email="deadline@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+            order = Order(customer_id=user.id, status=OrderStatus.PENDING, subtotal=1, total=1)
+            db.add(order)
+            await db.commit()
+            assert notified == []
+
+            db.add(OrderAutomationRule(
+                order_id=order.id, name="soon", trigger_type=AutomationTrigger.CUSTOM_INTERVAL,
+                action_type=AutomationAction.SEND_EMAIL, next_execution=datetime.utcnow() + timedelta(seconds=10)
+            ))
+            await db.commit()
+
+        assert notified == [{"automation"}]
+
+    @pytest.mark.asyncio
+    async def test_backs_off_without_progress(self):
+        runs = []
+
+        async def run():
+            runs.append(datetime.utcnow())
+
+        async def next_due(db, now):
+            return now - timedelta(hours=1)  # never gets processed
+
+        scheduler = DeadlineScheduler(session_factory=no_session)
+        scheduler.register(ScheduledJob("stuck", run, next_due, max_interval=3600, min_interval=0.05, exclusive=False))
+        task = asyncio.create_task(scheduler.start())
+        try:
+            await asyncio.sleep(1.0)
+        finally:
+            scheduler.stop()
+            await asyncio.wait_for(task, 1)
+
+        # 0.05s, 0.1s, 0.2s, 0.4s... instead of every 0.05s
+        assert 3 <= len(runs) <= 6
+        assert scheduler.jobs["stuck"].stalled_runs == len(runs)
+
+    @pytest.mark.asyncio
+    async def test_waits_for_another_workers_lease(self):
+        runs = []
+
+        async def run():
+            runs.append(datetime.utcnow())
+
+        async def next_due(db, now):
+            return now - timedelta(minutes=5)
+
+        leases = OtherWorkersLease()
+        scheduler = DeadlineScheduler(session_factory=no_session, leases=leases)
+        scheduler.register(ScheduledJob("renewals", run, next_due, max_interval=7200, min_interval=0))
+        task = asyncio.create_task(scheduler.start())
+        try:
+            await asyncio.sleep(0.3)
+        finally:
+            scheduler.stop()
+            await asyncio.wait_for(task, 1)
+
+        job = scheduler.jobs["renewals"]
+        assert runs == [] and job.runs == 1
+        assert job.blocked_until == leases.expires and job.due >= leases.expires
+
+    @pytest.mark.asyncio
+    async def test_renewal_deadline_ignores_unrenewable_subscriptions(self, session_factory):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            # No license row: the renewal engine never loads it
+            db.add(Subscription(
+                license_id="missing", status=SubscriptionStatus.ACTIVE,
+                current_period_start=now - timedelta(days=30), current_period_end=now + timedelta(hours=2)
+            ))
+            await db.commit()
+            assert await scheduler_service.next_renewal_due(db, now) is None
+
+            plan = Plan(name="Pro", price_monthly=10.0, price_yearly=100.0)
+            user = User(email="renewable@example.com", password_hash="x")
+            db.add_all([plan, user])
+            await db.flush()
+            license = License(user_id=user.id, plan_id=plan.id, license_key="KEY-R")
+            db.add(license)
+            await db.flush()
+            end = now + timedelta(days=3)
+            db.add(Subscription(
+                license_id=license.id, status=SubscriptionStatus.ACTIVE,
+                current_period_start=end - timedelta(days=30), current_period_end=end
+            ))
+            await db.commit()
+            assert await scheduler_service.next_renewal_due(db, now) == end - timedelta(days=1)
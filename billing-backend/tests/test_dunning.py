@@ -0,0 +1,87 @@
+"""
+Tests for set-based dunning
+"""
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import event, select, func
+
+from app.models import (
+    User, Plan, License, Subscription, SubscriptionStatus, Invoice, InvoiceStatus, EmailOutbox
+)
+from app.models.rollups import DailyRollup, RollupMetric
+from app.services.dunning_service import DunningService
+
+
+def invoice(user_id, n, due_date, status=InvoiceStatus.OPEN, subscription_id=None):
+    return Invoice(
+        user_id=user_id, invoice_number=f"INV-D-{n:04d}", status=status, subtotal=10, total=10,
+        amount_due=10, currency="USD", due_date=due_date, subscription_id=subscription_id
+    )
+
+
+async def rollup_counts(db):
+    rows = (await db.execute(
+        select(DailyRollup.status, func.sum(DailyRollup.count))
+        .where(DailyRollup.metric == RollupMetric.INVOICES)
+        .group_by(DailyRollup.status)
+    )).all()
+    return {status: count for status, count in rows if count}
+
+
+class TestDunning:
+    """A dunning run is a handful of statements however many invoices are due"""
+
+    @pytest.mark.asyncio
+    async def test_process_dunning(self, engine, session_factory):
+        now = datetime.utcnow()
+        today = now.replace(hour=12, minute=0, second=0, microsecond=0)
+        async with session_factory() as db:
+            plan = Plan(name="Pro", price_monthly=10.0, price_yearly=100.0)
+            user = User(email="dunning@example.com", password_hash="x", full_name="Dee")
+            db.add_all([plan, user])
+            await db.flush()
+            license = License(user_id=user.id, plan_id=plan.id, license_key="KEY-D")
+            db.add(license)
+            await db.flush()
+            subscription = Subscription(license_id=license.id, status=SubscriptionStatus.ACTIVE)
+            db.add(subscription)
+            await db.flush()
+            invoices = [invoice(user.id, n, today + timedelta(days=3)) for n in range(20)]   # reminder stage
+            invoices += [invoice(user.id, 20 + n, today - timedelta(days=3)) for n in range(10)]  # overdue + stage
+            invoices += [invoice(user.id, 30, today + timedelta(days=5))]                    # no stage today
+            invoices += [invoice(user.id, 31, today - timedelta(days=30), InvoiceStatus.OVERDUE, subscription.id)]
+            sent_today = invoice(user.id, 32, today + timedelta(days=1))
+            sent_today.last_reminder_sent = now
+            db.add_all(invoices + [sent_today])
+            await db.commit()
+            assert await rollup_counts(db) == {"open": 32, "overdue": 1}
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            async with session_factory() as db:
+                await DunningService().process_dunning(db)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", listener)
+        assert len(statements) < 20
+
+        async with session_factory() as db:
+            statuses = dict((await db.execute(
+                select(Invoice.status, func.count()).group_by(Invoice.status)
+            )).all())
+            assert statuses == {InvoiceStatus.OPEN: 22, InvoiceStatus.OVERDUE: 11}
+            assert await rollup_counts(db) == {"open": 22, "overdue": 11}
+
+            reminded = (await db.execute(
+                select(func.count()).where(Invoice.reminder_count == 1)
+            )).scalar()
+            assert reminded == 30
+            subjects = (await db.execute(select(EmailOutbox.subject))).scalars().all()
+            assert len(subjects) == 31 and "Service Suspended - Payment Required" in subjects
+            assert (await db.get(Subscription, subscription.id)).status == SubscriptionStatus.PAST_DUE
+
+        # Nothing is sent twice on the same day
+        async with session_factory() as db:
+            await DunningService().process_dunning(db)
+            assert (await db.execute(select(func.count(EmailOutbox.id)))).scalar() == 31
@@ -0,0 +1,116 @@
+"""
+Tests for the email outbox and its delivery worker
+"""
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import select
+
+import aiosmtplib
+
+from app.models import EmailOutbox, EmailOutboxStatus
+from app.services.email_outbox_service import EmailOutboxWorker, DomainThrottle
+from app.services.email_service import EmailService
+
+
+class FakeTransport:
+    """Stands in for EmailService.deliver; fails per recipient as configured"""
+
+    def __init__(self, failures=None):
+        self.failures = failures or {}
+        self.delivered = []
+
+    async def deliver(self, to_email, **fields):
+        if to_email in self.failures:
+            raise self.failures[to_email]
+        self.delivered.append(to_email)
+
+
+async def outbox(session_factory):
+    async with session_factory() as db:
+        rows = (await db.execute(select(EmailOutbox))).scalars().all()
+        return {row.to_email: row for row in rows}
+
+
+class TestEmailOutbox:
+    """Emails are queued transactionally and delivered with retries"""
+
+    @pytest.mark.asyncio
+    async def test_enqueue_follows_caller_transaction(self, session_factory):
+        service = EmailService()
+        async with session_factory() as db:
+            assert await service.send_email("gone@example.com", "Hi", "Body", db=db)
+            await db.rollback()
+            assert await service.send_email_with_attachment(
+                "kept@example.com", "Invoice", "<p>Hi</p>", b"%PDF", "invoice.pdf", db=db
+            )
+            await db.commit()
+
+        rows = await outbox(session_factory)
+        assert list(rows) == ["kept@example.com"]
+        assert rows["kept@example.com"].status == EmailOutboxStatus.PENDING
+        assert rows["kept@example.com"].recipient_domain == "example.com"
+
+    @pytest.mark.asyncio
+    async def test_retry_backoff_and_dead_letter(self, session_factory):
+        async with session_factory() as db:
+            for address in ("ok@a.com", "flaky@b.com", "bounce@c.com"):
+                await EmailService().send_email(address, "Hi", "Body", db=db)
+            await db.commit()
+
+        transport = FakeTransport({
+            "flaky@b.com": ConnectionError("connection reset"),
+            "bounce@c.com": aiosmtplib.SMTPResponseException(550, "mailbox unavailable"),
+        })
+        worker = EmailOutboxWorker(session_factory=session_factory, email_service=transport)
+        worker.max_attempts = 2
+        assert await worker.run_pending() == 3
+
+        rows = await outbox(session_factory)
+        assert transport.delivered == ["ok@a.com"]
+        assert rows["ok@a.com"].status == EmailOutboxStatus.SENT
+        assert rows["bounce@c.com"].status == EmailOutboxStatus.DEAD
+        flaky = rows["flaky@b.com"]
+        assert flaky.status == EmailOutboxStatus.PENDING and flaky.attempts == 1
+        assert flaky.next_attempt_at > datetime.utcnow() + timedelta(seconds=20)
+
+        # Due again: the second failure exhausts the attempts
+        async with session_factory() as db:
+            flaky = await db.get(EmailOutbox, flaky.id)
+            flaky.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+            await db.commit()
+        assert await worker.run_pending() == 1
+        rows = await outbox(session_factory)
+        assert rows["flaky@b.com"].status == EmailOutboxStatus.DEAD
+        assert "connection reset" in rows["flaky@b.com"].last_error
+
+        async with session_factory() as db:
+            assert await worker.retry_dead(db) == 2
+            await db.commit()
+        transport.failures = {}
+        assert await worker.run_pending() == 2
+        assert all(row.status == EmailOutboxStatus.SENT for row in (await outbox(session_factory)).values())
+
+    @pytest.mark.asyncio
+    async def test_domain_throttle_and_expired_lease(self, session_factory):
+        async with session_factory() as db:
+            for n in range(3):
+                await EmailService().send_email(f"user{n}@busy.com", "Hi", "Body", db=db)
+            await EmailService().send_email("stuck@other.com", "Hi", "Body", db=db)
+            await db.commit()
+            # A worker crashed while holding this one
+            stuck = (await db.execute(select(EmailOutbox).where(EmailOutbox.to_email == "stuck@other.com"))).scalar_one()
+            stuck.status = EmailOutboxStatus.SENDING
+            stuck.locked_until = datetime.utcnow() - timedelta(seconds=1)
+            await db.commit()
+
+        transport = FakeTransport()
+        worker = EmailOutboxWorker(session_factory=session_factory, email_service=transport)
+        worker.throttle = DomainThrottle(per_minute=2)
+        await worker.run_pending()
+
+        rows = await outbox(session_factory)
+        assert "stuck@other.com" in transport.delivered
+        assert sum(address.endswith("@busy.com") for address in transport.delivered) == 2
+        deferred = [row for row in rows.values() if row.status == EmailOutboxStatus.PENDING]
+        assert len(deferred) == 1 and deferred[0].attempts == 0
+        assert deferred[0].next_attempt_at > datetime.utcnow() + timedelta(seconds=30)
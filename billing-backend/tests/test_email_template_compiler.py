@@ -0,0 +1,49 @@
+"""
+Tests for compiled, cached email template rendering
+"""
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.services.email_template_compiler import CompiledTemplate, EmailTemplateCompiler
+
+
+def make_template(subject, body_text=None, body_html=None, updated_at=None):
+    return SimpleNamespace(
+        id="tpl-1", subject=subject, body_text=body_text, body_html=body_html, updated_at=updated_at
+    )
+
+
+class TestEmailTemplateCompiler:
+    """Templates are parsed once per version and rendered like str.replace did"""
+
+    def test_render_matches_replace(self):
+        source = "Hi {{name}}, {{name}} owes {{amount}} by {{ due }} ({{unknown}})"
+        context = {"name": "Ada", "amount": "$5.00", "due": "tomorrow"}
+        expected = source
+        for key, value in context.items():
+            expected = expected.replace(f"{{{{{key}}}}}", str(value))
+
+        plan = CompiledTemplate(source)
+        assert plan.render(context) == expected
+        assert plan.variables == ["name", "amount", "unknown"]
+        assert CompiledTemplate("no placeholders").render(context) == "no placeholders"
+
+    def test_cached_per_version(self):
+        compiler = EmailTemplateCompiler(max_entries=8)
+        template = make_template("Invoice {{number}}", body_text="Total {{total}}")
+
+        rendered = compiler.render_batch(template, [{"number": n, "total": n * 10} for n in range(3)])
+        compiler.render(template, {"number": 9})
+        assert compiler.compilations == 1
+        assert [r["subject"] for r in rendered] == ["Invoice 0", "Invoice 1", "Invoice 2"]
+        assert rendered[2] == {"subject": "Invoice 2", "body_text": "Total 20", "body_html": None}
+
+        template.subject = "Receipt {{number}}"
+        template.updated_at = datetime(2026, 10, 17, 12, 0)
+        assert compiler.render(template, {"number": 1})["subject"] == "Receipt 1"
+        assert compiler.compilations == 2
+        assert len(compiler._entries) == 1
+
+        compiler.invalidate(template.id)
+        compiler.render(template, {})
+        assert compiler.compilations == 3
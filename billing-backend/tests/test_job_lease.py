@@ -0,0 +1,87 @@
+"""
+Tests for job leases and chunked work claims
+"""
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import update
+
+from app.models import (
+    User, Order, OrderStatus, OrderAutomationRule, AutomationTrigger, AutomationAction, JobLease
+)
+from app.services.job_lease import JobLeaseManager, claim_due
+
+
+class TestJobLease:
+    """Exactly one worker owns a job; due items are split between workers"""
+
+    @pytest.mark.asyncio
+    async def test_single_owner(self, engine):
+        first = JobLeaseManager(engine, ttl=60, owner="worker-1")
+        second = JobLeaseManager(engine, ttl=60, owner="worker-2")
+
+        async with first.hold("billing:renewals") as owned:
+            assert owned
+            async with second.hold("billing:renewals") as other:
+                assert not other
+            # Other workers can see how long to wait
+            expires_at = await second.expires_at("billing:renewals")
+            assert datetime.utcnow() + timedelta(seconds=50) < expires_at <= datetime.utcnow() + timedelta(seconds=60)
+            # Re-entrant for the owner, independent per job name
+            assert await first.acquire("billing:renewals")
+            assert await second.acquire("billing:dunning")
+
+        # Released on exit
+        assert await second.acquire("billing:renewals")
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_taken_over(self, engine):
+        crashed = JobLeaseManager(engine, ttl=60, owner="crashed")
+        survivor = JobLeaseManager(engine, ttl=60, owner="survivor")
+        assert await crashed.acquire("billing:dunning")
+        assert not await survivor.acquire("billing:dunning")
+
+        async with engine.begin() as conn:
+            await conn.execute(update(JobLease).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+
+        assert await survivor.acquire("billing:dunning")
+        assert not await crashed.renew("billing:dunning")
+
+    @pytest.mark.asyncio
+    async def test_claim_due_splits_work(self, session_factory):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            user = User(email="lease@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+            order = Order(customer_id=user.id, status=OrderStatus.PENDING, subtotal=1, total=1)
+            db.add(order)
+            await db.flush()
+            db.add_all([
+                OrderAutomationRule(
+                    order_id=order.id, name=f"rule {n}", trigger_type=AutomationTrigger.CUSTOM_INTERVAL,
+                    action_type=AutomationAction.SEND_EMAIL, next_execution=now - timedelta(minutes=n)
+                )
+                for n in range(25)
+            ] + [
+                OrderAutomationRule(
+                    order_id=order.id, name="later", trigger_type=AutomationTrigger.CUSTOM_INTERVAL,
+                    action_type=AutomationAction.SEND_EMAIL, next_execution=now + timedelta(hours=1)
+                )
+            ])
+            await db.commit()
+
+        async def worker():
+            claimed = []
+            while True:
+                async with session_factory() as db:
+                    ids = await claim_due(
+                        db, OrderAutomationRule, OrderAutomationRule.next_execution, [], limit=4, now=now
+                    )
+                if not ids:
+                    return claimed
+                claimed.extend(ids)
+
+        results = await asyncio.gather(*(worker() for _ in range(3)))
+        claimed = [rule_id for result in results for rule_id in result]
+        assert len(claimed) == len(set(claimed)) == 25
@@ -0,0 +1,123 @@
+"""
+Tests for license validation rate limiting and anomaly detection
+"""
+import pytest
+
+from app.core.license_validation import LicenseValidator, USAGE_COUNTERS_SCRIPT
+from app.core.local_rate_limiter import LocalUsageCounters, SlidingWindow
+
+
+class FakeRedis:
+    """Answers the usage-counters script with whatever counters a test sets"""
+
+    def __init__(self, counters):
+        self.counters = counters
+        self.calls = []
+
+    def register_script(self, source):
+        assert source == USAGE_COUNTERS_SCRIPT
+
+        async def script(keys, args):
+            self.calls.append((keys, args))
+            return self.counters
+
+        return script
+
+
+class DownRedis:
+    def __init__(self):
+        self.calls = 0
+
+    def register_script(self, source):
+        async def script(keys, args):
+            self.calls += 1
+            raise ConnectionError("Error 111 connecting to redis:6379")
+
+        return script
+
+
+class TestUsageCounters:
+    """Every counter comes back from a single script call"""
+
+    @pytest.mark.asyncio
+    async def test_one_call_per_request(self):
+        validator = LicenseValidator()
+        validator.redis_client = FakeRedis([3, 40, 12, 2])
+        counters = await validator._usage_counters("KEY-1", "10.0.0.1")
+        await validator._usage_counters("KEY-1", "10.0.0.1")
+
+        assert counters == {"license": 3, "ip": 40, "validations": 12, "ips": 2}
+        assert len(validator.redis_client.calls) == 2
+        keys, args = validator.redis_client.calls[0]
+        assert keys == ["license:rate:KEY-1", "ip:rate:10.0.0.1", "license:validations:KEY-1", "license:ips:KEY-1"]
+        assert args[-1] == "10.0.0.1"
+        assert validator._check_rate_limit(counters) == (True, "")
+        assert validator._check_anomalies(counters) is False
+
+    @pytest.mark.parametrize("counters, rate_limited, anomalous", [
+        ([101, -1, -1, -1], "Too many validations for this license", False),
+        ([5, 1001, -1, -1], "Too many validations from this IP", False),
+        ([5, 6, 501, -1], None, True),
+        ([5, 6, 7, 11], None, True),
+    ])
+    def test_limits(self, counters, rate_limited, anomalous):
+        validator = LicenseValidator()
+        counters = dict(zip(("license", "ip", "validations", "ips"), counters))
+        ok, message = validator._check_rate_limit(counters)
+        assert ok is (rate_limited is None)
+        if rate_limited:
+            assert rate_limited in message
+        else:
+            assert validator._check_anomalies(counters) is anomalous
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_local_counters(self):
+        validator = LicenseValidator()
+        validator.redis_client = DownRedis()
+        results = [await validator._usage_counters("KEY-1", "10.0.0.1") for _ in range(101)]
+
+        # Redis is tried once, then left alone until the retry delay is up
+        assert validator.redis_client.calls == 1
+        assert results[0] == {"license": 1, "ip": 1, "validations": 1, "ips": 1}
+        assert validator._check_rate_limit(results[99]) == (True, "")
+        ok, message = validator._check_rate_limit(results[100])
+        assert not ok and "Too many validations for this license" in message
+
+
+class TestLocalUsageCounters:
+    """Without Redis the same limits hold, per process and in bounded memory"""
+
+    def counters(self, max_keys=1000):
+        return LocalUsageCounters((100, 60), (1000, 3600), (500, 3600), (10, 86400), max_keys)
+
+    def test_sliding_window(self):
+        window = SlidingWindow(60)
+        assert [window.hit(1200.0 + n) for n in range(30)][-1] == 30
+        # Halfway through the next window, half of the previous one still counts
+        assert window.hit(1290.0) == 1 + 15
+        # After two idle windows nothing is left
+        assert window.hit(1500.0) == 1
+
+    def test_limits(self):
+        counters = self.counters()
+        results = [counters.hit("KEY-1", "10.0.0.1", now=1000.0) for _ in range(101)]
+        assert results[99] == {"license": 100, "ip": 100, "validations": 100, "ips": 1}
+        # Rejected requests do not count towards later limits
+        assert results[100] == {"license": 101, "ip": -1, "validations": -1, "ips": -1}
+        assert counters.hit("KEY-2", "10.0.0.1", now=1000.0)["ip"] == 101
+        assert counters.hit("KEY-1", "10.0.0.1", now=1200.0)["license"] == 1
+
+        for n in range(12):
+            result = counters.hit("KEY-3", f"10.0.1.{n}", now=2000.0 + n)
+        assert result["ips"] == 11  # capped at one over the limit
+        assert counters.hit("KEY-3", "10.0.1.0", now=2000.0 + 86400 + 5)["ips"] == 7
+
+    def test_evicts_least_recently_used(self):
+        counters = self.counters(max_keys=2)
+        counters.hit("KEY-1", "10.0.0.1", now=1000.0)
+        counters.hit("KEY-2", "10.0.0.2", now=1000.0)
+        counters.hit("KEY-1", "10.0.0.1", now=1000.0)
+        counters.hit("KEY-3", "10.0.0.3", now=1000.0)
+        assert list(counters._licenses) == ["KEY-1", "KEY-3"]
+        assert list(counters._addresses) == ["10.0.0.1", "10.0.0.3"]
+        assert counters.hit("KEY-2", "10.0.0.2", now=1000.0)["license"] == 1
@@ -0,0 +1,73 @@
+"""
+Tests for order endpoints
+"""
+import pytest
+import pytest_asyncio
+from fastapi import Response
+from sqlalchemy import event
+
+from app.api.v1.orders import list_orders, get_order, update_order_status
+from app.models import User, Order, OrderStatus
+
+
+def count_statements(engine):
+    statements = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    return statements
+
+
+class TestOrderCustomerLoading:
+    """Order endpoints load the customer with the order instead of one query per row"""
+
+    @pytest_asyncio.fixture
+    async def seeded(self, session_factory):
+        async with session_factory() as db:
+            admin = User(email="admin@example.com", password_hash="x", full_name="Admin", is_admin=True)
+            customers = [User(email=f"c{i}@example.com", password_hash="x", full_name=f"Customer {i}") for i in range(3)]
+            db.add_all([admin] + customers)
+            await db.flush()
+            orders = [
+                Order(customer_id=customers[i % 3].id, status=OrderStatus.PENDING, items=[], subtotal=10, total=10)
+                for i in range(30)
+            ]
+            db.add_all(orders)
+            await db.commit()
+        return session_factory, admin, customers, orders
+
+    @pytest.mark.asyncio
+    async def test_list_orders_two_queries(self, engine, seeded):
+        session_factory, admin, customers, _ = seeded
+        statements = count_statements(engine)
+        async with session_factory() as db:
+            result = await list_orders(
+                skip=0, limit=100, customer_id=None, status=None, start_date=None, end_date=None,
+                min_amount=None, max_amount=None, cursor=None, response=Response(), user_id=admin.id, db=db
+            )
+
+        assert len(result) == 30
+        assert len(statements) == 2
+        emails = {c.id: c.email for c in customers}
+        assert all(order.customer.email == emails[order.customer_id] for order in result)
+
+    @pytest.mark.asyncio
+    async def test_get_order_reuses_owner(self, engine, seeded):
+        session_factory, _, customers, orders = seeded
+        statements = count_statements(engine)
+        async with session_factory() as db:
+            result = await get_order(order_id=orders[0].id, user_id=customers[0].id, db=db)
+
+        assert result.customer.email == customers[0].email
+        assert len(statements) == 1
+
+    @pytest.mark.asyncio
+    async def test_update_status_returns_customer(self, engine, seeded):
+        session_factory, admin, customers, orders = seeded
+        async with session_factory() as db:
+            result = await update_order_status(order_id=orders[1].id, status="completed", user_id=admin.id, db=db)
+
+        assert result.status == "completed"
+        assert result.customer.email == customers[1].email
@@ -0,0 +1,77 @@
+"""
+Tests for keyset (cursor) pagination
+"""
+import pytest
+from datetime import datetime, timedelta
+from fastapi import HTTPException, Response
+from sqlalchemy import select, text
+
+from app.core.pagination import paginate, set_next_cursor, decode_cursor, encode_cursor, NEXT_CURSOR_HEADER
+from app.models import User, Order, OrderStatus
+
+
+async def seed_orders(db):
+    user = User(email="pages@example.com", password_hash="x")
+    db.add(user)
+    await db.flush()
+    base = datetime.utcnow().replace(microsecond=0) - timedelta(days=1)
+    orders = []
+    for i in range(23):
+        # Mix server-default timestamps (no fractional seconds), explicit ones with
+        # microseconds and several rows sharing the same instant
+        created_at = None if i % 5 == 0 else base + timedelta(seconds=i // 3, microseconds=(i % 2) * 250000)
+        orders.append(Order(customer_id=user.id, status=OrderStatus.PENDING, subtotal=1, total=1,
+                            created_at=created_at))
+    db.add_all(orders)
+    await db.commit()
+
+
+class TestKeysetPagination:
+    """Walking pages by cursor returns every row exactly once, in order"""
+
+    @pytest.mark.asyncio
+    async def test_cursor_walk_matches_full_ordering(self, session_factory):
+        async with session_factory() as db:
+            await seed_orders(db)
+            expected = (await db.execute(
+                select(Order.id).order_by(Order.created_at.desc(), Order.id.desc())
+            )).scalars().all()
+
+            seen, cursor, pages = [], None, 0
+            while True:
+                response = Response()
+                rows = (await db.execute(paginate(select(Order), Order, db, 5, cursor=cursor))).scalars().all()
+                set_next_cursor(response, rows, 5)
+                seen.extend(row.id for row in rows)
+                pages += 1
+                cursor = response.headers.get(NEXT_CURSOR_HEADER)
+                if not cursor:
+                    break
+
+        assert seen == expected
+        assert pages == 5
+
+    @pytest.mark.asyncio
+    async def test_offset_mode_unchanged(self, session_factory):
+        async with session_factory() as db:
+            await seed_orders(db)
+            everything = (await db.execute(paginate(select(Order), Order, db, 100))).scalars().all()
+            page = (await db.execute(paginate(select(Order), Order, db, 5, offset=10))).scalars().all()
+
+        assert [o.id for o in page] == [o.id for o in everything[10:15]]
+
+    @pytest.mark.asyncio
+    async def test_seek_uses_composite_index(self, session_factory):
+        async with session_factory() as db:
+            await seed_orders(db)
+            cursor = encode_cursor(datetime.utcnow(), "z")
+            query = paginate(select(Order), Order, db, 5, cursor=cursor)
+            compiled = query.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+            plan = (await db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+
+        assert any("ix_orders_created_at_id" in row[-1] for row in plan)
+
+    def test_invalid_cursor_rejected(self):
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor("not-a-cursor")
+        assert exc.value.status_code == 400
@@ -0,0 +1,78 @@
+"""
+Tests for the rendered PDF cache and invoice PDF ETags
+"""
+import os
+import pytest
+from datetime import datetime
+
+import app.services.pdf_cache as pdf_cache_module
+import app.services.pdf_render_pool as pdf_render_pool_module
+from app.api.v1.invoices import download_invoice_pdf
+from app.models import User, Invoice, InvoiceStatus
+from app.services.pdf_cache import PDFCache
+from app.services.pdf_render_pool import PDFRenderPool
+
+
+@pytest.fixture
+def renders(tmp_path, monkeypatch):
+    """Isolated cache directory and a thread render pool that counts renders"""
+    monkeypatch.setattr(pdf_cache_module, "pdf_cache", PDFCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024))
+    pool = PDFRenderPool(workers=0, max_queue=8, timeout=60)
+    calls = []
+    original = pool.render
+
+    async def counting_render(renderer, *args):
+        calls.append(args[0].id)
+        return await original(renderer, *args)
+
+    pool.render = counting_render
+    monkeypatch.setattr(pdf_render_pool_module, "pdf_render_pool", pool)
+    return calls
+
+
+class TestPDFCache:
+    """Repeated downloads are served from disk or answered with 304"""
+
+    def test_lru_eviction(self, tmp_path):
+        cache = PDFCache(str(tmp_path), max_bytes=3500)
+        for n in range(3):
+            cache.put(f"doc{n}", "k", bytes(1000))
+            os.utime(tmp_path / f"doc{n}-k.pdf", (n, n))
+        assert cache.get("doc0", "k") is not None  # doc0 becomes most recently used
+
+        cache.put("doc3", "k", bytes(1000))
+
+        remaining = sorted(path.name for path in tmp_path.glob("*.pdf"))
+        assert remaining == ["doc0-k.pdf", "doc2-k.pdf", "doc3-k.pdf"]
+
+    @pytest.mark.asyncio
+    async def test_download_uses_cache_etag_and_invalidation(self, session_factory, renders):
+        async with session_factory() as db:
+            user = User(email="pdf@example.com", password_hash="x", full_name="Pat Doe")
+            db.add(user)
+            await db.flush()
+            invoice = Invoice(
+                invoice_number="INV-2026-01-0001", user_id=user.id, status=InvoiceStatus.PAID,
+                subtotal=90.0, tax=10.0, total=100.0, amount_due=0.0, due_date=datetime(2026, 2, 1),
+                items=[{"description": "Hosting", "quantity": 1, "unit_price": 90.0, "amount": 90.0}],
+            )
+            db.add(invoice)
+            await db.commit()
+
+            first = await download_invoice_pdf(invoice_id=invoice.id, if_none_match=None, user_id=user.id, db=db)
+            etag = first.headers["etag"]
+            second = await download_invoice_pdf(invoice_id=invoice.id, if_none_match=None, user_id=user.id, db=db)
+            not_modified = await download_invoice_pdf(invoice_id=invoice.id, if_none_match=etag, user_id=user.id, db=db)
+
+            assert first.body.startswith(b"%PDF") and second.body == first.body
+            assert not_modified.status_code == 304 and not_modified.body == b""
+            assert renders == [invoice.id]
+
+            invoice.total = 120.0
+            await db.commit()
+            assert list(pdf_cache_module.pdf_cache.directory.glob(f"{invoice.id}-*.pdf")) == []
+
+            changed = await download_invoice_pdf(invoice_id=invoice.id, if_none_match=etag, user_id=user.id, db=db)
+
+        assert changed.status_code == 200 and changed.headers["etag"] != etag
+        assert renders == [invoice.id, invoice.id]
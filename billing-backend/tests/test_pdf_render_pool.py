@@ -0,0 +1,65 @@
+"""
+Tests for the PDF render pool
+"""
+import asyncio
+import time
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.services.pdf_render_pool import PDFRenderPool, PDFRenderBusy, PDFRenderTimeout
+from app.services.pdf_renderers import render_invoice_pdf, snapshot_invoice, snapshot_user
+
+
+def make_invoice():
+    return SimpleNamespace(
+        id="inv-1", invoice_number="INV-0001", invoice_date=datetime(2026, 1, 5), created_at=None,
+        due_date=datetime(2026, 2, 4), status="open", payment_method=None, subtotal=90.0, tax=10.0, total=100.0,
+        items=[{"description": "Hosting", "quantity": 1, "unit_price": 90.0, "amount": 90.0}],
+    )
+
+
+def slow_render(seconds):
+    time.sleep(seconds)
+    return b"%PDF-slow"
+
+
+class TestPDFRenderPool:
+    """Renders run off the event loop, bounded and with a timeout"""
+
+    @pytest.mark.asyncio
+    async def test_renders_in_worker_process(self):
+        pool = PDFRenderPool(workers=1, max_queue=4, timeout=60)
+        try:
+            await pool.start()
+            user = SimpleNamespace(id="u1", email="a@example.com", full_name="Ann Example", company_name=None, password_hash="x")
+            pdf = await pool.render(render_invoice_pdf, snapshot_invoice(make_invoice()), snapshot_user(user), None)
+        finally:
+            await pool.shutdown()
+
+        assert pdf.startswith(b"%PDF")
+        assert pool.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_queue_limit_and_timeout(self):
+        pool = PDFRenderPool(workers=0, max_queue=2, timeout=0.2)
+        busy = [asyncio.ensure_future(pool.render(slow_render, 0.5)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(PDFRenderBusy):
+            await pool.render(slow_render, 0)
+        results = await asyncio.gather(*busy, return_exceptions=True)
+
+        assert all(isinstance(r, PDFRenderTimeout) for r in results)
+        # Timed-out renders keep their slots until the workers are really done
+        assert pool.in_flight == 2
+        with pytest.raises(PDFRenderBusy):
+            await pool.render(slow_render, 0)
+
+        for _ in range(100):
+            if pool.in_flight == 0:
+                break
+            await asyncio.sleep(0.02)
+        assert pool.in_flight == 0
+        assert await pool.render(slow_render, 0) == b"%PDF-slow"
+        await pool.shutdown()
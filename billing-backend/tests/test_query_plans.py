@@ -0,0 +1,86 @@
+"""
+EXPLAIN-based checks that the hot billing queries are served by an index
+"""
+import re
+import pytest
+from datetime import datetime
+from fastapi import Response
+from sqlalchemy import event, select, func, and_
+
+from app.api.v1.invoices import list_invoices
+from app.api.v1.orders import list_orders
+from app.api.v1.payments import list_payments
+from app.models import User, Invoice, Payment, InvoiceStatus, PaymentStatus
+
+HOT_TABLES = ("orders", "invoices", "payments")
+# A SCAN (even "USING INDEX") walks the whole table or index; hot queries must SEARCH
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+
+async def full_scans(engine, statements):
+    """Hot tables that any of the captured statements reads without an index"""
+    scans = []
+    async with engine.connect() as conn:
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith("SELECT"):
+                continue
+            plan = (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)).all()
+            for row in plan:
+                match = FULL_SCAN.match(row[-1])
+                if match and match.group(1) in HOT_TABLES:
+                    scans.append((match.group(1), statement))
+    return scans
+
+
+class TestHotQueryPlans:
+    """The listed hot queries must not fall back to a full table scan"""
+
+    @pytest.mark.asyncio
+    async def test_hot_queries_use_indexes(self, engine, session_factory):
+        async with session_factory() as db:
+            admin = User(email="admin@example.com", password_hash="x", is_admin=True)
+            customer = User(email="customer@example.com", password_hash="x")
+            db.add_all([admin, customer])
+            await db.commit()
+
+        statements = []
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def _capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        async with session_factory() as db:
+            # Admin order listing with date-only filters
+            await list_orders(
+                skip=0, limit=50, customer_id=None, status=None, start_date="2026-01-01", end_date="2026-01-31",
+                min_amount=None, max_amount=None, cursor=None, response=Response(), user_id=admin.id, db=db
+            )
+            # Customer's own orders, invoices
+            await list_orders(
+                skip=0, limit=50, customer_id=None, status=None, start_date=None, end_date=None,
+                min_amount=None, max_amount=None, cursor=None, response=Response(), user_id=customer.id, db=db
+            )
+            await list_invoices(
+                user_id=customer.id, db=db, status_filter=None, start_date=None, end_date=None,
+                min_amount=None, max_amount=None, is_recurring=None, limit=50, offset=0,
+                cursor=None, response=Response()
+            )
+            # Admin payment listing filtered by status
+            await list_payments(
+                limit=50, offset=0, status="succeeded", gateway_id=None, date_from=None, date_to=None,
+                min_amount=None, max_amount=None, cursor=None, response=Response(), user_id=admin.id, db=db
+            )
+            # Dunning: overdue invoices; analytics: a customer's successful payments
+            now = datetime.utcnow()
+            await db.execute(select(Invoice).where(and_(
+                Invoice.status.in_([InvoiceStatus.OPEN, InvoiceStatus.PARTIALLY_PAID]),
+                Invoice.due_date < now
+            )))
+            await db.execute(select(func.sum(Payment.amount)).where(and_(
+                Payment.user_id == customer.id,
+                Payment.status == PaymentStatus.SUCCEEDED
+            )))
+
+        event.remove(engine.sync_engine, "before_cursor_execute", _capture)
+        assert len(statements) >= 6
+        assert await full_scans(engine, statements) == []
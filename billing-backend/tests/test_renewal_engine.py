@@ -0,0 +1,103 @@
+"""
+Tests for the batched subscription renewal engine
+"""
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+
+from app.models import (
+    User, Plan, License, Subscription, SubscriptionStatus, Invoice, InvoiceStatus, EmailOutbox
+)
+from app.services.renewal_engine import RenewalEngine
+
+
+class FakePayments:
+    """Records charges; subscriptions listed in decline fail"""
+
+    def __init__(self, decline=()):
+        self.decline = set(decline)
+        self.keys = []
+
+    async def create_payment_intent(self, amount, currency="USD", metadata=None, idempotency_key=None):
+        self.keys.append(idempotency_key)
+        if metadata["subscription_id"] in self.decline:
+            raise Exception("card declined")
+        return {"id": f"pi_{len(self.keys)}", "status": "succeeded"}
+
+
+async def seed(db, count, now):
+    plan = Plan(name="Pro", price_monthly=10.0, price_yearly=100.0)
+    db.add(plan)
+    await db.flush()
+    subscriptions = []
+    for n in range(count):
+        user = User(email=f"renew{n}@example.com", password_hash="x")
+        db.add(user)
+        await db.flush()
+        license = License(user_id=user.id, plan_id=plan.id, license_key=f"KEY-{n}")
+        db.add(license)
+        await db.flush()
+        end = now + timedelta(hours=1 + n)
+        subscription = Subscription(
+            license_id=license.id, status=SubscriptionStatus.ACTIVE,
+            current_period_start=end - timedelta(days=30), current_period_end=end
+        )
+        db.add(subscription)
+        subscriptions.append(subscription)
+    # Not due yet
+    db.add(Subscription(
+        license_id=license.id, status=SubscriptionStatus.ACTIVE,
+        current_period_start=now, current_period_end=now + timedelta(days=10)
+    ))
+    await db.commit()
+    return subscriptions
+
+
+class TestRenewalEngine:
+    """Due subscriptions are billed once per period, in batches"""
+
+    @pytest.mark.asyncio
+    async def test_batches_and_failures(self, session_factory):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            subscriptions = await seed(db, 7, now)
+            declined = subscriptions[3].id
+            payments = FakePayments(decline=[declined])
+            engine = RenewalEngine(batch_size=3, concurrency=2, payment_service=payments)
+
+            summary = await engine.run(db, now=now)
+
+            assert (summary["due"], summary["renewed"], summary["failed"], summary["batches"]) == (7, 6, 1, 3)
+            assert len(set(payments.keys)) == 7
+
+            invoices = (await db.execute(select(Invoice))).scalars().all()
+            assert len(invoices) == 7
+            assert sorted(invoice.status for invoice in invoices).count(InvoiceStatus.PAID) == 6
+            assert {invoice.total for invoice in invoices} == {10.0}
+
+            await db.refresh(subscriptions[0])
+            assert subscriptions[0].current_period_end == now + timedelta(hours=1, days=30)
+            await db.refresh(subscriptions[3])
+            assert subscriptions[3].status == SubscriptionStatus.PAST_DUE
+            assert (await db.execute(select(func.count(EmailOutbox.id)))).scalar() == 7
+
+    @pytest.mark.asyncio
+    async def test_rerun_never_double_bills(self, session_factory):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            subscriptions = await seed(db, 4, now)
+            engine = RenewalEngine(batch_size=10, payment_service=FakePayments())
+            await engine.run(db, now=now)
+
+            # Simulate a crash after a charge but before the period was advanced
+            subscription = subscriptions[0]
+            subscription.current_period_start -= timedelta(days=30)
+            subscription.current_period_end -= timedelta(days=30)
+            await db.commit()
+
+            payments = FakePayments()
+            summary = await RenewalEngine(batch_size=10, payment_service=payments).run(db, now=now)
+
+            assert (summary["due"], summary["skipped"], summary["renewed"]) == (1, 1, 0)
+            assert payments.keys == []
+            assert (await db.execute(select(func.count(Invoice.id)))).scalar() == 4
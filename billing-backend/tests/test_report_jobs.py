@@ -0,0 +1,148 @@
+"""
+Tests for background report jobs and resumable downloads
+"""
+import csv
+import gzip
+import io
+import threading
+import pytest
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from app.api.v1.reports import create_report_job, get_report_job, download_report_job, _parse_range
+from app.models import User, Order, OrderStatus, generate_uuid
+from app.schemas import ReportJobRequest
+from app.services import report_exports
+from app.services.report_exports import CSVEncoder
+from app.services.report_job_service import ReportJobWorker
+
+
+async def read_body(response):
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+class TestReportJobs:
+    """Exports are queued, written by the worker and downloadable in ranges"""
+
+    @pytest.mark.asyncio
+    async def test_job_lifecycle_and_range_download(self, session_factory, tmp_path, monkeypatch):
+        monkeypatch.setattr(report_exports, "EXPORT_CHUNK_SIZE", 40)
+        async with session_factory() as db:
+            admin = User(email="admin@example.com", password_hash="x", is_admin=True)
+            db.add(admin)
+            await db.flush()
+            # Many rows share a timestamp, so batches must break ties on id
+            timestamps = [datetime(2026, 1, 1, 12, 0, 0), datetime(2026, 1, 1, 12, 0, 0, 500000), datetime(2026, 3, 1)]
+            await db.execute(insert(Order), [
+                {"id": generate_uuid(), "customer_id": admin.id, "order_number": f"ORD-{n:05d}",
+                 "status": OrderStatus.COMPLETED, "subtotal": 10, "tax": 0, "total": 10,
+                 "created_at": timestamps[n % 3]}
+                for n in range(250)
+            ])
+            await db.commit()
+
+            job = await create_report_job(request=ReportJobRequest(kind="orders"), user_id=admin.id, db=db)
+            assert job.status == "queued" and job.download_url is None
+
+        worker = ReportJobWorker(session_factory=session_factory, export_dir=str(tmp_path / "exports"))
+        assert await worker.run_pending() == 1
+        assert await worker.claim() is None
+
+        async with session_factory() as db:
+            status = await get_report_job(job_id=job.id, user_id=admin.id, db=db)
+            full = await download_report_job(job_id=job.id, range_header=None, user_id=admin.id, db=db)
+            body = await read_body(full)
+            partial = await download_report_job(job_id=job.id, range_header="bytes=10-19", user_id=admin.id, db=db)
+            tail = await download_report_job(job_id=job.id, range_header="bytes=-5", user_id=admin.id, db=db)
+            garbled = await download_report_job(job_id=job.id, range_header="bytes=abc-", user_id=admin.id, db=db)
+            with pytest.raises(HTTPException) as unsatisfiable:
+                await download_report_job(job_id=job.id, range_header=f"bytes={len(body)}-", user_id=admin.id, db=db)
+
+        assert status.status == "completed" and status.progress == 100.0
+        assert status.total_rows == status.rows_written == 250
+        assert full.headers["accept-ranges"] == "bytes" and int(full.headers["content-length"]) == len(body)
+
+        rows = list(csv.reader(io.StringIO(gzip.decompress(body).decode())))
+        assert rows[0][0] == "Order ID"
+        assert len({row[0] for row in rows[1:]}) == len(rows) - 1 == 250
+
+        assert partial.status_code == 206
+        assert partial.headers["content-range"] == f"bytes 10-19/{len(body)}"
+        assert await read_body(partial) == body[10:20]
+        assert await read_body(tail) == body[-5:]
+        # A Range header that does not parse is ignored: the whole file, 200
+        assert garbled.status_code == 200 and await read_body(garbled) == body
+        assert unsatisfiable.value.status_code == 416
+
+    @pytest.mark.asyncio
+    async def test_download_before_completion_conflicts(self, session_factory):
+        async with session_factory() as db:
+            admin = User(email="admin2@example.com", password_hash="x", is_admin=True)
+            db.add(admin)
+            await db.commit()
+            job = await create_report_job(
+                request=ReportJobRequest(kind="payments", status="succeeded"), user_id=admin.id, db=db
+            )
+            with pytest.raises(HTTPException) as not_ready:
+                await download_report_job(job_id=job.id, range_header=None, user_id=admin.id, db=db)
+
+        assert job.parameters == {"status": "succeeded"}
+        assert not_ready.value.status_code == 409
+
+    @pytest.mark.asyncio
+    async def test_encoding_runs_off_the_event_loop(self, session_factory, tmp_path, monkeypatch):
+        monkeypatch.setattr(report_exports, "EXPORT_CHUNK_SIZE", 10)
+        async with session_factory() as db:
+            admin = User(email="admin3@example.com", password_hash="x", is_admin=True)
+            db.add(admin)
+            await db.flush()
+            await db.execute(insert(Order), [
+                {"id": generate_uuid(), "customer_id": admin.id, "order_number": f"ORD-T{n:04d}",
+                 "status": OrderStatus.COMPLETED, "subtotal": 10, "tax": 0, "total": 10}
+                for n in range(25)
+            ])
+            await db.commit()
+            await create_report_job(request=ReportJobRequest(kind="orders"), user_id=admin.id, db=db)
+
+        threads = []
+        encode = CSVEncoder.encode
+
+        def recording_encode(self, rows):
+            threads.append(threading.get_ident())
+            return encode(self, rows)
+
+        monkeypatch.setattr(CSVEncoder, "encode", recording_encode)
+        worker = ReportJobWorker(session_factory=session_factory, export_dir=str(tmp_path / "exports"))
+        assert await worker.run_pending() == 1
+        # Header plus three chunks, none of them encoded on the event loop's thread
+        assert len(threads) == 4
+        assert threading.get_ident() not in threads
+
+
+class TestParseRange:
+    """Malformed ranges are ignored; well-formed but unsatisfiable ones get 416"""
+
+    @pytest.mark.parametrize("header, expected", [
+        (None, None),
+        ("bytes=0-9", (0, 9)),
+        ("bytes=90-", (90, 99)),
+        ("bytes=-10", (90, 99)),
+        ("bytes=50-500", (50, 99)),
+        ("bytes=0-1,5-6", None),
+        ("bytes=abc-", None),
+        ("bytes=-", None),
+        ("bytes=5", None),
+        ("bytes=+5-9", None),
+        ("bytes=9-5", None),
+        ("items=0-9", None),
+    ])
+    def test_parse(self, header, expected):
+        assert _parse_range(header, 100) == expected
+
+    @pytest.mark.parametrize("header", ["bytes=100-", "bytes=150-200", "bytes=-0"])
+    def test_unsatisfiable(self, header):
+        with pytest.raises(HTTPException) as unsatisfiable:
+            _parse_range(header, 100)
+        assert unsatisfiable.value.status_code == 416
+        assert unsatisfiable.value.headers["Content-Range"] == "bytes */100"
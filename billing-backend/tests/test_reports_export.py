@@ -0,0 +1,80 @@
+"""
+Tests for the streaming CSV exports
+"""
+import csv
+import gzip
+import io
+import pytest
+from sqlalchemy import event, insert
+
+from app.services import report_exports
+from app.api.v1.reports import export_orders_csv, export_invoices_csv
+from app.models import User, Order, Invoice, OrderStatus, InvoiceStatus, generate_uuid
+
+
+async def read_body(response):
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+class TestStreamingExports:
+    """Exports stream in chunks with the customer email joined in"""
+
+    @pytest.mark.asyncio
+    async def test_orders_export_streams_chunks(self, engine, session_factory, monkeypatch):
+        monkeypatch.setattr(report_exports, "EXPORT_CHUNK_SIZE", 100)
+        async with session_factory() as db:
+            users = [User(email=f"c{n}@example.com", password_hash="x") for n in range(5)]
+            db.add_all(users)
+            await db.flush()
+            await db.execute(insert(Order), [
+                {"id": generate_uuid(), "customer_id": users[n % 5].id, "order_number": f"ORD-{n:05d}",
+                 "status": OrderStatus.COMPLETED, "subtotal": 10, "tax": 1, "total": 11}
+                for n in range(450)
+            ])
+            await db.commit()
+
+        statements = []
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        async with session_factory() as db:
+            response = await export_orders_csv(
+                start_date=None, end_date=None, status=None, gzip=False, user_id="admin", db=db
+            )
+            chunks = [chunk async for chunk in response.body_iterator]
+            compressed = await export_orders_csv(
+                start_date=None, end_date=None, status=None, gzip=True, user_id="admin", db=db
+            )
+            unpacked = gzip.decompress(await read_body(compressed))
+        event.remove(engine.sync_engine, "before_cursor_execute", _count)
+
+        rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+        assert rows[0][2] == "Customer Email" and len(rows) == 451
+        assert {row[2] for row in rows[1:]} == {f"c{n}@example.com" for n in range(5)}
+        assert rows[1][3] == "completed" and rows[1][7] == "USD"
+        # Header plus one chunk per 100 rows, from a single SELECT per export
+        assert len(chunks) == 6
+        assert len(statements) == 2
+        assert unpacked == b"".join(chunks)
+        assert compressed.headers["content-disposition"].endswith("orders_export.csv.gz")
+
+    @pytest.mark.asyncio
+    async def test_invoices_export_filters_by_status(self, session_factory):
+        async with session_factory() as db:
+            user = User(email="inv@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+            db.add_all([
+                Invoice(invoice_number="INV-1", user_id=user.id, status=InvoiceStatus.PAID, subtotal=5, total=5),
+                Invoice(invoice_number="INV-2", user_id=user.id, status=InvoiceStatus.OPEN, subtotal=7, total=7),
+            ])
+            await db.commit()
+
+            response = await export_invoices_csv(
+                start_date=None, end_date=None, status="paid", gzip=False, user_id="admin", db=db
+            )
+            rows = list(csv.reader(io.StringIO((await read_body(response)).decode())))
+
+        assert rows[1:] == [["INV-1", "inv@example.com", "paid", "5.0", "0.0", "5.0", "0.0", "0.0", "USD", rows[1][9], ""]]
@@ -0,0 +1,171 @@
+"""
+Tests for the analytics rollup tables
+"""
+import importlib.util
+from pathlib import Path
+
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, insert, select
+
+from app.core.database import Base
+from app.models import (
+    User, Order, Invoice, Payment, OrderStatus, InvoiceStatus, PaymentStatus,
+    DailyRollup, HourlyRollup, RollupMetric, generate_uuid
+)
+from app.services.rollup_service import rollup_service
+
+
+async def snapshot(db):
+    result = await db.execute(select(DailyRollup))
+    return {
+        (r.metric, r.bucket_date, r.status, r.currency): (r.count, round(r.amount, 2), round(r.tax, 2))
+        for r in result.scalars().all()
+        if r.count or abs(r.amount) > 1e-9
+    }
+
+
+class TestRollups:
+    """Rollups maintained on flush match a rebuild from the raw tables"""
+
+    @pytest.mark.asyncio
+    async def test_incremental_matches_rebuild(self, session_factory):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            user = User(email="rollup@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+
+            orders = [
+                Order(customer_id=user.id, status=OrderStatus.PENDING, subtotal=10, tax=1, total=11,
+                      created_at=now - timedelta(days=i))
+                for i in range(5)
+            ]
+            invoice = Invoice(user_id=user.id, invoice_number="INV-T-1", status=InvoiceStatus.OPEN,
+                              subtotal=100, tax=10, total=110, currency="USD")
+            payment = Payment(user_id=user.id, amount=25.5, currency="usd", status=PaymentStatus.PENDING)
+            db.add_all(orders + [invoice, payment])
+            await db.commit()
+
+            # Status transitions and a delete are reflected on the next flush
+            orders[0].status = OrderStatus.COMPLETED
+            orders[1].total = 50
+            invoice.status = InvoiceStatus.PAID
+            invoice.paid_at = now
+            payment.status = PaymentStatus.SUCCEEDED
+            await db.delete(orders[4])
+            await db.commit()
+
+            incremental = await snapshot(db)
+
+            await rollup_service.rebuild(db)
+            await db.commit()
+            rebuilt = await snapshot(db)
+
+        assert incremental == rebuilt
+        today = now.date()
+        assert incremental[(RollupMetric.ORDERS, today, "completed", "USD")] == (1, 11.0, 1.0)
+        assert incremental[(RollupMetric.INVOICE_REVENUE, today, "paid", "USD")] == (1, 110.0, 10.0)
+        assert incremental[(RollupMetric.PAYMENTS, today, "succeeded", "USD")] == (1, 25.5, 0.0)
+
+    @pytest.mark.asyncio
+    async def test_range_totals_match_raw_scan(self, session_factory):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            user = User(email="range@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+            db.add_all([
+                Order(customer_id=user.id, status=OrderStatus.COMPLETED, subtotal=1, total=float(i + 1),
+                      created_at=now - timedelta(hours=7 * i))
+                for i in range(40)
+            ])
+            await db.commit()
+
+            start, end = now - timedelta(days=5, hours=3), now - timedelta(hours=2)
+            totals = await rollup_service.totals(db, RollupMetric.ORDERS, start, end, statuses=["completed"])
+
+            raw = (await db.execute(select(Order.total).where(Order.created_at.between(start, end)))).scalars().all()
+
+        assert totals["count"] == len(raw)
+        assert totals["amount"] == pytest.approx(sum(raw))
+
+    @pytest.mark.asyncio
+    async def test_edges_use_hourly_rollups(self, session_factory):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            user = User(email="hourly@example.com", password_hash="x")
+            db.add(user)
+            await db.flush()
+            db.add_all([
+                Order(customer_id=user.id, status=OrderStatus.COMPLETED, subtotal=1, total=float(i + 1),
+                      created_at=now - timedelta(minutes=37 * i))
+                for i in range(80)
+            ])
+            await db.commit()
+
+            engine = db.bind
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(engine.sync_engine, "before_cursor_execute", listener)
+            try:
+                for start, end in [
+                    (now - timedelta(hours=30, minutes=17), now - timedelta(hours=2, minutes=5)),
+                    (now - timedelta(days=1), now),
+                ]:
+                    totals = await rollup_service.totals(db, RollupMetric.ORDERS, start, end, statuses=["completed"])
+                    raw = (await db.execute(
+                        select(Order.total).where(Order.created_at.between(start, end))
+                    )).scalars().all()
+                    assert totals["count"] == len(raw)
+                    assert totals["amount"] == pytest.approx(sum(raw))
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+        assert any("hourly_rollups" in statement for statement in statements)
+
+
+def load_migration(name):
+    path = Path(__file__).resolve().parent.parent / "alembic" / "versions" / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestRollupMigration:
+    """Creating the rollup tables rolls up the history that is already there"""
+
+    def test_upgrade_backfills_existing_rows(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+        raw_tables = [t for t in Base.metadata.sorted_tables if t.name not in ("daily_rollups", "hourly_rollups")]
+        now = datetime.utcnow()
+        user_id = generate_uuid()
+        with engine.begin() as conn:
+            Base.metadata.create_all(conn, tables=raw_tables)
+            conn.execute(insert(User.__table__).values(id=user_id, email="old@example.com", password_hash="x"))
+            conn.execute(insert(Order.__table__), [
+                {"id": generate_uuid(), "customer_id": user_id, "order_number": f"ORD-M{n}",
+                 "status": "COMPLETED", "subtotal": 10, "tax": 1, "total": 11, "created_at": now - timedelta(days=n)}
+                for n in range(3)
+            ])
+
+        migration = load_migration("007_add_analytics_rollups")
+        with engine.begin() as conn:
+            with Operations.context(MigrationContext.configure(conn)):
+                migration.upgrade()
+
+        with engine.connect() as conn:
+            daily = conn.execute(
+                select(DailyRollup.bucket_date, DailyRollup.count, DailyRollup.amount)
+                .where(DailyRollup.metric == RollupMetric.ORDERS)
+            ).all()
+            hourly = conn.execute(select(HourlyRollup.count).where(HourlyRollup.metric == RollupMetric.ORDERS)).all()
+            signups = conn.execute(select(DailyRollup.count).where(DailyRollup.metric == RollupMetric.SIGNUPS)).all()
+        engine.dispose()
+
+        assert sorted(daily) == sorted((now.date() - timedelta(days=n), 1, 11.0) for n in range(3))
+        assert sum(count for count, in hourly) == 3
+        assert signups == [(1,)]
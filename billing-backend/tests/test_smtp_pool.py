@@ -0,0 +1,111 @@
+"""
+Tests for pooled SMTP connections in EmailService
+"""
+import asyncio
+import pytest
+import pytest_asyncio
+from email.mime.text import MIMEText
+
+from app.services.email_service import EmailService, SMTPConnectionPool, get_smtp_pool, close_smtp_pools
+
+
+class SinkSMTPServer:
+    """Minimal SMTP server that accepts AUTH PLAIN and counts sessions and messages"""
+
+    def __init__(self):
+        self.sessions = 0
+        self.messages = 0
+        self.writers = []
+
+    async def handle(self, reader, writer):
+        self.sessions += 1
+        self.writers.append(writer)
+        writer.write(b"220 sink ESMTP\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode().strip().upper()
+                if command.startswith(("EHLO", "HELO")):
+                    writer.write(b"250-sink\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+                elif command.startswith("AUTH"):
+                    writer.write(b"235 2.7.0 Authentication successful\r\n")
+                elif command == "DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    while (await reader.readline()) != b".\r\n":
+                        pass
+                    self.messages += 1
+                    writer.write(b"250 OK\r\n")
+                elif command == "QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b"250 OK\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def drop_connections(self):
+        for writer in self.writers:
+            writer.close()
+        self.writers = []
+
+
+@pytest_asyncio.fixture
+async def smtp_server():
+    sink = SinkSMTPServer()
+    server = await asyncio.start_server(sink.handle, "127.0.0.1", 0)
+    sink.port = server.sockets[0].getsockname()[1]
+    yield sink
+    await close_smtp_pools()
+    server.close()
+    await server.wait_closed()
+
+
+def make_service(port):
+    service = EmailService()
+    service.smtp_host, service.smtp_port = "127.0.0.1", port
+    service.smtp_user, service.smtp_password = "mailer", "secret"
+    return service
+
+
+def plain_message():
+    message = MIMEText("Body")
+    message["From"], message["To"], message["Subject"] = "from@example.com", "to@example.com", "Hi"
+    return message
+
+
+class TestSMTPPool:
+    """Messages share a few long-lived authenticated connections"""
+
+    @pytest.mark.asyncio
+    async def test_connections_are_reused(self, smtp_server):
+        service = make_service(smtp_server.port)
+        await asyncio.gather(*(
+            service.deliver(f"user{n}@example.com", "Hello", "Body") for n in range(20)
+        ))
+
+        pool = get_smtp_pool("127.0.0.1", smtp_server.port, "mailer", "secret")
+        assert smtp_server.messages == 20
+        assert smtp_server.sessions == pool.connections_opened <= pool.size
+
+    @pytest.mark.asyncio
+    async def test_reconnects_after_server_drop_and_idle_timeout(self, smtp_server):
+        service = make_service(smtp_server.port)
+        await service.deliver("a@example.com", "Invoice", "<p>Hi</p>", attachment_content=b"%PDF", attachment_filename="a.pdf")
+
+        smtp_server.drop_connections()
+        await asyncio.sleep(0.05)
+        await service.deliver("b@example.com", "Again", "Body")
+        assert smtp_server.messages == 2 and smtp_server.sessions == 2
+
+        pool = SMTPConnectionPool("127.0.0.1", smtp_server.port, "mailer", "secret", size=1, idle_timeout=0)
+        for _ in range(2):
+            await pool.send_message(plain_message())
+        await pool.close()
+        assert pool.connections_opened == 2
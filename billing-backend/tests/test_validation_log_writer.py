@@ -0,0 +1,97 @@
+"""
+Tests for the write-behind license validation log
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import event, select, func
+
+from app.models import LicenseValidationLog
+from app.services.validation_log_writer import ValidationLogWriter
+
+
+def record(writer, n):
+    writer.record(
+        license_key=f"KEY-{n % 3}", license_id=None, feature="create_domain", success=n % 2 == 0,
+        ip_address="10.0.0.1", user_agent="agent", message="Validation successful"
+    )
+
+
+async def count_logs(session_factory):
+    async with session_factory() as db:
+        return (await db.execute(select(func.count(LicenseValidationLog.id)))).scalar()
+
+
+class TestValidationLogWriter:
+    """Validation attempts are buffered and inserted many rows per statement"""
+
+    @pytest.mark.asyncio
+    async def test_batches_and_flushes_on_stop(self, engine, session_factory):
+        writer = ValidationLogWriter(session_factory=session_factory)
+        writer.batch_size, writer.flush_interval = 50, 60.0
+
+        inserts = []
+        listener = lambda *args: inserts.append(args[2]) if args[2].startswith("INSERT") else None
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        task = asyncio.create_task(writer.start())
+        try:
+            await asyncio.sleep(0)
+            for n in range(120):
+                record(writer, n)
+            # A full batch wakes the writer without waiting for the interval
+            for _ in range(100):
+                if writer.written:
+                    break
+                await asyncio.sleep(0.01)
+            assert (writer.written, writer.pending) == (120, 0)
+
+            # Rows still buffered are written on shutdown
+            for n in range(7):
+                record(writer, n)
+            writer.stop()
+            await asyncio.wait_for(task, timeout=5)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+        assert len(inserts) == 4
+        assert (writer.written, writer.pending) == (127, 0)
+        assert await count_logs(session_factory) == 127
+        async with session_factory() as db:
+            log = (await db.execute(select(LicenseValidationLog).limit(1))).scalars().one()
+            assert log.feature == "create_domain" and log.validated_at is not None
+
+    @pytest.mark.asyncio
+    async def test_keeps_rows_when_insert_fails(self, engine, session_factory):
+        writer = ValidationLogWriter(session_factory=session_factory)
+        writer.max_pending = 5
+        async with engine.begin() as conn:
+            await conn.run_sync(LicenseValidationLog.__table__.drop)
+
+        for n in range(7):
+            record(writer, n)
+        assert await writer.flush() == 0
+        assert (writer.pending, writer.dropped) == (5, 2)
+
+        async with engine.begin() as conn:
+            await conn.run_sync(LicenseValidationLog.__table__.create)
+        assert await writer.flush() == 5
+        async with session_factory() as db:
+            keys = (await db.execute(select(LicenseValidationLog.license_key))).scalars().all()
+        assert sorted(keys) == ["KEY-0", "KEY-0", "KEY-1", "KEY-2", "KEY-2"]  # oldest two dropped
+
+    @pytest.mark.asyncio
+    async def test_drops_only_rejected_rows(self, session_factory):
+        writer = ValidationLogWriter(session_factory=session_factory)
+        writer.record(license_key="KEY-X", feature=None, success=False, message="no feature")  # NOT NULL
+        for n in range(5):
+            record(writer, n)
+        writer.record(license_key="K" * 500, feature="f" * 500, success=False, message="Invalid license key format")
+
+        assert await writer.flush() == 6
+        assert (writer.pending, writer.dropped) == (0, 1)
+        assert await writer.flush() == 0
+        async with session_factory() as db:
+            long_row = (await db.execute(
+                select(LicenseValidationLog).where(LicenseValidationLog.message == "Invalid license key format")
+            )).scalars().one()
+        assert (len(long_row.license_key), len(long_row.feature)) == (100, 50)